@@ -68,6 +68,165 @@ DEFAULT_THINKING_MODE_THINKDEEP = os.getenv("DEFAULT_THINKING_MODE_THINKDEEP", "
 DEFAULT_CONSENSUS_TIMEOUT = 120.0  # 2 minutes per model
 DEFAULT_CONSENSUS_MAX_INSTANCES_PER_COMBINATION = 2
 
+# Workflow Response Mode
+# WORKFLOW_RESPONSE_MODE: Default response format for multi-step workflow tools
+# - "full": pretty-printed JSON with the complete accumulated state on every step (default)
+# - "compact": unindented JSON carrying only what changed since the previous step;
+#   expert analysis is returned once and consensus does not resend accumulated responses
+# Clients can override per call with the response_mode parameter
+WORKFLOW_RESPONSE_MODE = os.getenv("WORKFLOW_RESPONSE_MODE", "full").lower()
+if WORKFLOW_RESPONSE_MODE not in ("full", "compact"):
+    WORKFLOW_RESPONSE_MODE = "full"
+
+# Auto Mode Routing
+# AUTO_MODEL_ROUTING: How auto mode picks a model within a tool category's eligible set
+# - "adaptive": rank candidates by observed latency, error rate and cost (default);
+#   with no observations the static preference order is kept
+# - "static": always use the static preference order
+AUTO_MODEL_ROUTING = os.getenv("AUTO_MODEL_ROUTING", "adaptive").lower()
+if AUTO_MODEL_ROUTING not in ("adaptive", "static"):
+    AUTO_MODEL_ROUTING = "adaptive"
+
+# Router weights: each candidate's score is a weighted sum of its latency relative to the
+# fastest candidate, its cost relative to the cheapest and its error rate (lower wins)
+ROUTER_LATENCY_WEIGHT = float(os.getenv("ROUTER_LATENCY_WEIGHT", "1.0"))
+ROUTER_COST_WEIGHT = float(os.getenv("ROUTER_COST_WEIGHT", "0.0"))
+ROUTER_ERROR_WEIGHT = float(os.getenv("ROUTER_ERROR_WEIGHT", "4.0"))
+# Smoothing factor for the rolling averages (higher reacts faster)
+ROUTER_EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", "0.3"))
+# Half-life in seconds of a model's error rate while it is not called, so a model routed away
+# from after failures is tried again once the penalty has faded (0 disables the decay)
+ROUTER_ERROR_HALF_LIFE = float(os.getenv("ROUTER_ERROR_HALF_LIFE", "300"))
+# Seconds a model is avoided after a rate-limit (429) response
+ROUTER_RATE_LIMIT_COOLDOWN = float(os.getenv("ROUTER_RATE_LIMIT_COOLDOWN", "60"))
+# Relative model costs for the cost weight, e.g. "o3=8,o4-mini=1.1,gemini-2.5-flash=0.6"
+ROUTER_MODEL_COSTS = os.getenv("ROUTER_MODEL_COSTS", "")
+
+# Provider Admission Control (see providers/admission.py)
+# Provider calls run concurrently; these limits keep them within endpoint capacity and quotas.
+# Per-target specs name a provider (google, openai, xai, openrouter, custom, dial) or a model,
+# e.g. "custom=2,openai=16,o3=4". Models can also set max_concurrency, requests_per_minute and
+# tokens_per_minute in custom_models.json; entries here take precedence. Unset means unlimited.
+# ADMISSION_CONCURRENCY: Calls in flight at once
+# ADMISSION_RPM / ADMISSION_TPM: Requests and estimated prompt tokens per minute (token buckets)
+ADMISSION_CONCURRENCY = os.getenv("ADMISSION_CONCURRENCY", "")
+ADMISSION_RPM = os.getenv("ADMISSION_RPM", "")
+ADMISSION_TPM = os.getenv("ADMISSION_TPM", "")
+# ADMISSION_MAX_INFLIGHT_MB: Cap on prompt text held by calls in flight (MB, counted as characters);
+# further calls wait. A single larger prompt still runs on its own. 0 disables.
+ADMISSION_MAX_INFLIGHT_MB = max(0.0, float(os.getenv("ADMISSION_MAX_INFLIGHT_MB", "256")))
+# ADMISSION_TOOL_PRIORITIES: Queue priority per tool (lower first, default 1; chat defaults to 0)
+# ADMISSION_PRIORITY_AGING: Seconds of waiting each priority level is worth, so nothing starves
+# ADMISSION_TIMEOUT: Seconds a call may wait for admission before it fails (0 waits forever)
+ADMISSION_TOOL_PRIORITIES = os.getenv("ADMISSION_TOOL_PRIORITIES", "")
+ADMISSION_PRIORITY_AGING = max(0.0, float(os.getenv("ADMISSION_PRIORITY_AGING", "10")))
+ADMISSION_TIMEOUT = max(0.0, float(os.getenv("ADMISSION_TIMEOUT", "300")))
+
+# Model Catalog Hot Reload
+# CUSTOM_MODELS_RELOAD_INTERVAL: Seconds between checks of custom_models.json for changes.
+# A changed file is re-parsed in the background and replaces the catalog without a restart;
+# an invalid edit is logged and the previous catalog stays active. Set to 0 to disable.
+CUSTOM_MODELS_RELOAD_INTERVAL = float(os.getenv("CUSTOM_MODELS_RELOAD_INTERVAL", "2"))
+
+# Metrics Export
+# METRICS_EXPORT_INTERVAL: Seconds between writes of the in-process metrics (tool and provider
+# latency, retries, errors, tokens, file bytes, storage timings, budget utilization, cache hits)
+# in Prometheus text format. Set to 0 (default) to disable; the stats tool works either way.
+METRICS_EXPORT_INTERVAL = float(os.getenv("METRICS_EXPORT_INTERVAL", "0"))
+# METRICS_EXPORT_PATH: Destination file, e.g. a node_exporter textfile collector directory
+METRICS_EXPORT_PATH = os.getenv(
+    "METRICS_EXPORT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "metrics.prom")
+)
+
+# Request Tracing
+# TRACING_ENABLED: Record a span for each stage of every tool call (thread reconstruction, file
+# expansion and reading, prompt assembly, provider request with retries, response parsing)
+# and append them as JSON lines to TRACE_FILE. Analyze with scripts/trace_analyzer.py.
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() in ("true", "1", "yes", "on")
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "traces.jsonl"))
+
+# Tool call profiling (see utils/profiling.py)
+# PROFILING_MODE: "off" (default), "cprofile" (deterministic, higher overhead) or "sampling"
+# (stack sampling thread, low overhead). A single call can also be profiled by passing
+# "_profile": true (or a mode name) in its arguments, whatever this setting is.
+# PROFILE_SAMPLE_RATE: Fraction of tool calls profiled when PROFILING_MODE is set (0.0-1.0).
+# Sampling mode at a low rate (e.g. 0.01) is cheap enough to leave on in production.
+# PROFILE_SAMPLING_INTERVAL_MS: Stack sampling interval in sampling mode; larger is cheaper.
+# PROFILE_MEMORY: Track peak memory and allocations by module with tracemalloc during profiled calls.
+# PROFILE_TRACEMALLOC_FRAMES: Traceback depth stored per allocation; more frames cost more memory.
+# PROFILE_DIR / PROFILE_MAX_FILES: Where artifacts go and how many files to keep (oldest removed first).
+PROFILING_MODE = os.getenv("PROFILING_MODE", "off").lower()
+PROFILE_SAMPLE_RATE = max(0.0, min(1.0, float(os.getenv("PROFILE_SAMPLE_RATE", "1.0"))))
+PROFILE_SAMPLING_INTERVAL_MS = max(1.0, float(os.getenv("PROFILE_SAMPLING_INTERVAL_MS", "5")))
+PROFILE_MEMORY = os.getenv("PROFILE_MEMORY", "true").lower() in ("true", "1", "yes", "on")
+PROFILE_TRACEMALLOC_FRAMES = max(1, int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "1")))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Budget dry runs (see utils/dry_run.py)
+# DRY_RUN_ENABLED: Advertise a "dry_run" flag in every tool schema. A call with "dry_run": true runs
+# thread reconstruction, file and history budgeting and the prompt checks, then returns a report of
+# the assembled context (planned/skipped files, kept/dropped turns, prompt size against the context
+# window, time per stage) instead of calling the model. Disable to keep the flag out of the schemas.
+DRY_RUN_ENABLED = os.getenv("DRY_RUN_ENABLED", "true").lower() in ("true", "1", "yes", "on")
+
+# Event-loop stall watchdog (see utils/loop_watchdog.py)
+# LOOP_WATCHDOG_ENABLED: Measure event-loop lag and capture the stack of any callback that blocks
+# the loop (synchronous I/O or sleeps in async code). Stalls are logged and aggregated by call
+# site in the stats tool and zen_event_loop_stalls_total. Off by default.
+# LOOP_WATCHDOG_THRESHOLD_MS: Lag above which the loop counts as stalled.
+# LOOP_WATCHDOG_INTERVAL_MS: Heartbeat interval; lag is measured once per interval.
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", "false").lower() in ("true", "1", "yes", "on")
+LOOP_WATCHDOG_THRESHOLD_MS = max(1.0, float(os.getenv("LOOP_WATCHDOG_THRESHOLD_MS", "100")))
+LOOP_WATCHDOG_INTERVAL_MS = max(1.0, float(os.getenv("LOOP_WATCHDOG_INTERVAL_MS", "50")))
+
+# Persistent cache (see utils/disk_cache.py)
+# DISK_CACHE_ENABLED: Keep line-numbered file content (keyed by path and stat signature) and exact
+# token counts (keyed by content hash) in a SQLite database shared by all server processes, so a
+# new session starts warm instead of re-reading and re-tokenizing the same files.
+# DISK_CACHE_DIR: Database directory (default: $XDG_CACHE_HOME/zen-mcp-server, else ~/.cache/zen-mcp-server)
+# DISK_CACHE_MAX_MB: Size limit; least recently used entries are evicted beyond it
+DISK_CACHE_ENABLED = os.getenv("DISK_CACHE_ENABLED", "true").lower() in ("true", "1", "yes", "on")
+DISK_CACHE_DIR = os.getenv("DISK_CACHE_DIR", "")
+DISK_CACHE_MAX_MB = max(1.0, float(os.getenv("DISK_CACHE_MAX_MB", "256")))
+
+# Token estimator calibration (see utils/token_calibration.py)
+# TOKEN_CALIBRATION_ENABLED: Compare each prompt's estimated size with the input tokens the provider
+# reports and keep a per-model correction factor for the character-based estimate, and use the
+# per-extension ratios measured by scripts/calibrate_tokens.py for file size estimates.
+# TOKEN_CALIBRATION_FILE: JSON file holding both (default: token_calibration.json in the disk cache
+# directory); shared by all server processes and kept across restarts.
+TOKEN_CALIBRATION_ENABLED = os.getenv("TOKEN_CALIBRATION_ENABLED", "true").lower() in ("true", "1", "yes", "on")
+TOKEN_CALIBRATION_FILE = os.getenv("TOKEN_CALIBRATION_FILE", "")
+
+# File content compaction (see utils/file_compaction.py)
+# FILE_COMPACTION: Token-saving operations applied to files embedded in prompts, joined by "+" or
+# ",": whitespace (trailing whitespace, blank runs), license (repeated license headers), gutter
+# (narrow line numbers), notebook (.ipynb cell sources without outputs), json (minified JSON).
+# "all" enables every operation, "off" (default) none. Line numbers always match the file.
+# FILE_COMPACTION_TOOLS: Per-tool overrides, e.g. "codereview=all,chat=whitespace+gutter"
+FILE_COMPACTION = os.getenv("FILE_COMPACTION", "off")
+FILE_COMPACTION_TOOLS = os.getenv("FILE_COMPACTION_TOOLS", "")
+
+# Transport (see utils/http_transport.py)
+# MCP_TRANSPORT: "stdio" (default; one process per client) or "http": one long-running process
+# serving many clients over streamable HTTP at MCP_HTTP_PATH (and legacy SSE at /sse), sharing
+# provider connections, caches and conversation storage. Each client session gets its own tool
+# instances and its own default conversation.
+# MCP_HTTP_HOST / MCP_HTTP_PORT: Listen address; keep the loopback default unless the port is
+# protected by other means, the server has no authentication of its own.
+# MCP_HTTP_MAX_SESSIONS: Client sessions open at once; further clients get HTTP 503 (0 = unlimited)
+# MCP_HTTP_SESSION_IDLE_TIMEOUT: Seconds without requests after which a session is closed
+# MCP_HTTP_MAX_CONCURRENT_CALLS: Tool calls executing at once across all sessions; further calls
+# wait for a slot (0 = unlimited)
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio").strip().lower()
+MCP_HTTP_HOST = os.getenv("MCP_HTTP_HOST", "127.0.0.1")
+MCP_HTTP_PORT = int(os.getenv("MCP_HTTP_PORT", "8765"))
+MCP_HTTP_PATH = "/" + os.getenv("MCP_HTTP_PATH", "/mcp").strip("/")
+MCP_HTTP_MAX_SESSIONS = max(0, int(os.getenv("MCP_HTTP_MAX_SESSIONS", "64")))
+MCP_HTTP_SESSION_IDLE_TIMEOUT = max(1.0, float(os.getenv("MCP_HTTP_SESSION_IDLE_TIMEOUT", "1800")))
+MCP_HTTP_MAX_CONCURRENT_CALLS = max(0, int(os.getenv("MCP_HTTP_MAX_CONCURRENT_CALLS", "16")))
+
 # NOTE: Consensus tool now uses sequential processing for MCP compatibility
 # Concurrent processing was removed to avoid async pattern violations
 
@@ -1,12 +1,23 @@
-"""Model provider abstractions for supporting multiple AI providers."""
+"""Model provider abstractions for supporting multiple AI providers.
+
+Concrete providers are imported on first attribute access so importing this
+package does not pull in provider SDKs; they load when a provider is configured
+or first used.
+"""
+
+from importlib import import_module
 
 from .base import ModelCapabilities, ModelProvider, ModelResponse
-from .gemini import GeminiModelProvider
-from .openai_compatible import OpenAICompatibleProvider
-from .openai_provider import OpenAIModelProvider
-from .openrouter import OpenRouterProvider
 from .registry import ModelProviderRegistry
 
+# Provider class -> defining submodule, resolved lazily by __getattr__
+_LAZY_PROVIDERS = {
+    "GeminiModelProvider": ".gemini",
+    "OpenAIModelProvider": ".openai_provider",
+    "OpenAICompatibleProvider": ".openai_compatible",
+    "OpenRouterProvider": ".openrouter",
+}
+
 __all__ = [
     "ModelProvider",
     "ModelResponse",
@@ -17,3 +28,12 @@ __all__ = [
     "OpenAICompatibleProvider",
     "OpenRouterProvider",
 ]
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_PROVIDERS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,453 @@
+"""
+Admission control for model provider calls
+
+Provider calls run in worker threads so that several tool calls can wait on
+models at once. Without a gate that concurrency turns into overload: a local
+Ollama/vLLM endpoint behind CustomProvider serving two requests at a time
+gets twenty, and cloud quotas (requests and tokens per minute) are exceeded
+until every call fails with 429s that the providers' retry loops only repeat.
+
+Before a call is sent, the AdmissionController checks it against limits for
+its provider ("custom", "openai", ...) and for its model:
+
+- max_concurrency: calls in flight at once
+- requests_per_minute: token bucket refilled continuously, one token per call
+- tokens_per_minute: token bucket drawn down by the prompt's estimated tokens
+
+and against a global cap on the characters of prompts in flight, which bounds
+the memory held by queued-up requests (memory backpressure).
+
+Calls that do not fit wait in one queue ordered by tool priority and arrival
+time. Each priority level is worth ADMISSION_PRIORITY_AGING seconds of waiting,
+so an interactive chat call overtakes a queued code review but a long-waiting
+low-priority call is never starved. A waiting call reserves the limits it is
+blocked on: later calls on the same provider/model cannot slip past it, while
+calls to unrelated models proceed. A call that waits longer than
+ADMISSION_TIMEOUT fails with AdmissionTimeoutError.
+
+Limits come from the environment (ADMISSION_CONCURRENCY, ADMISSION_RPM,
+ADMISSION_TPM, e.g. "custom=2,openai=500,gemini-2.5-pro=150") and, per model,
+from the max_concurrency / requests_per_minute / tokens_per_minute fields of
+conf/custom_models.json entries; the environment wins. Unset limits are
+unlimited, so without configuration only the in-flight prompt cap applies.
+"""
+
+import asyncio
+import bisect
+import itertools
+import logging
+import threading
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Priority of tools not listed in ADMISSION_TOOL_PRIORITIES (lower runs first)
+DEFAULT_PRIORITY = 1
+
+# Interactive tools go first unless ADMISSION_TOOL_PRIORITIES says otherwise
+DEFAULT_TOOL_PRIORITIES = {"chat": 0}
+
+# Pseudo-scope shared by every call when the in-flight prompt cap is set
+_BYTES_SCOPE = "*prompt-bytes*"
+
+
+class AdmissionTimeoutError(RuntimeError):
+    """A provider call waited longer than ADMISSION_TIMEOUT for admission."""
+
+
+@dataclass(frozen=True)
+class AdmissionLimits:
+    """Limits for one provider or model; 0 means unlimited."""
+
+    max_concurrency: int = 0
+    requests_per_minute: float = 0
+    tokens_per_minute: float = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.max_concurrency or self.requests_per_minute or self.tokens_per_minute)
+
+
+class TokenBucket:
+    """Continuously refilled bucket holding up to one minute of budget."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (amounts above capacity only need a full bucket)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def drain(self, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+
+@dataclass
+class _Scope:
+    """Usage of one limited provider or model."""
+
+    name: str
+    limits: AdmissionLimits
+    in_flight: int = 0
+    requests: Optional[TokenBucket] = None
+    tokens: Optional[TokenBucket] = None
+
+    def __post_init__(self) -> None:
+        self.apply(self.limits, force=True)
+
+    def apply(self, limits: AdmissionLimits, force: bool = False) -> None:
+        """Adopt new limits (e.g. after a catalog reload), keeping in-flight counts."""
+        if limits == self.limits and not force:
+            return
+        self.limits = limits
+        self.requests = TokenBucket(limits.requests_per_minute) if limits.requests_per_minute else None
+        self.tokens = TokenBucket(limits.tokens_per_minute) if limits.tokens_per_minute else None
+
+
+@dataclass(order=True)
+class _Waiter:
+    sort_key: float
+    seq: int
+    scopes: list[_Scope] = field(compare=False)
+    tokens: int = field(compare=False)
+    size: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+def _number(value: Any) -> float:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0 else 0
+
+
+def _canonical_name(model_name: str, capabilities: Any) -> str:
+    name = getattr(capabilities, "model_name", None)
+    return name if isinstance(name, str) and name else model_name
+
+
+def parse_limit_spec(spec: str) -> dict[str, float]:
+    """Parse "custom=2,gemini-2.5-pro=150" into {target: value}."""
+    limits = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, _, value = item.partition("=")
+        try:
+            limits[name.strip().lower()] = float(value)
+        except ValueError:
+            logger.warning(f"[ADMISSION] Ignoring invalid limit entry: {item!r}")
+    return limits
+
+
+class AdmissionController:
+    """Gates provider calls on concurrency, rate and in-flight prompt limits."""
+
+    def __init__(
+        self,
+        concurrency: Optional[dict[str, float]] = None,
+        requests_per_minute: Optional[dict[str, float]] = None,
+        tokens_per_minute: Optional[dict[str, float]] = None,
+        max_inflight_chars: Optional[int] = None,
+        tool_priorities: Optional[dict[str, float]] = None,
+        priority_aging: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ):
+        import config
+
+        self.concurrency = parse_limit_spec(config.ADMISSION_CONCURRENCY) if concurrency is None else concurrency
+        self.requests_per_minute = (
+            parse_limit_spec(config.ADMISSION_RPM) if requests_per_minute is None else requests_per_minute
+        )
+        self.tokens_per_minute = (
+            parse_limit_spec(config.ADMISSION_TPM) if tokens_per_minute is None else tokens_per_minute
+        )
+        self.max_inflight_chars = (
+            int(config.ADMISSION_MAX_INFLIGHT_MB * 1024 * 1024) if max_inflight_chars is None else max_inflight_chars
+        )
+        if tool_priorities is None:
+            tool_priorities = {**DEFAULT_TOOL_PRIORITIES, **parse_limit_spec(config.ADMISSION_TOOL_PRIORITIES)}
+        self.tool_priorities = tool_priorities
+        self.priority_aging = config.ADMISSION_PRIORITY_AGING if priority_aging is None else priority_aging
+        self.timeout = config.ADMISSION_TIMEOUT if timeout is None else timeout
+
+        self._scopes: dict[str, _Scope] = {}
+        self._waiters: list[_Waiter] = []
+        self._inflight_chars = 0
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timeouts = 0
+
+    # Limit resolution -------------------------------------------------------
+
+    def _env_limits(self, *names: str) -> AdmissionLimits:
+        def lookup(table: dict[str, float]) -> float:
+            for name in names:
+                if name and name.lower() in table:
+                    return table[name.lower()]
+            return 0
+
+        return AdmissionLimits(
+            max_concurrency=int(lookup(self.concurrency)),
+            requests_per_minute=lookup(self.requests_per_minute),
+            tokens_per_minute=lookup(self.tokens_per_minute),
+        )
+
+    def limits_for(self, provider: str, model_name: str, capabilities: Any = None) -> tuple[AdmissionLimits, ...]:
+        """
+        Resolve (provider limits, model limits); environment entries override catalog fields.
+
+        Args:
+            provider: Provider type value, e.g. "custom"
+            model_name: Model name as requested (alias or canonical)
+            capabilities: The model's ModelCapabilities, if known
+
+        Returns:
+            Tuple of provider and model AdmissionLimits
+        """
+        canonical = _canonical_name(model_name, capabilities)
+        catalog = AdmissionLimits(
+            max_concurrency=int(_number(getattr(capabilities, "max_concurrency", 0))),
+            requests_per_minute=_number(getattr(capabilities, "requests_per_minute", 0)),
+            tokens_per_minute=_number(getattr(capabilities, "tokens_per_minute", 0)),
+        )
+        env = self._env_limits(canonical, model_name)
+        model_limits = AdmissionLimits(
+            max_concurrency=env.max_concurrency or catalog.max_concurrency,
+            requests_per_minute=env.requests_per_minute or catalog.requests_per_minute,
+            tokens_per_minute=env.tokens_per_minute or catalog.tokens_per_minute,
+        )
+        return self._env_limits(provider), model_limits
+
+    def _scope(self, name: str, limits: AdmissionLimits) -> Optional[_Scope]:
+        scope = self._scopes.get(name)
+        if scope is None:
+            if not limits:
+                return None
+            scope = self._scopes[name] = _Scope(name=name, limits=limits)
+        else:
+            scope.apply(limits)
+        return scope
+
+    def priority_for(self, tool_name: Optional[str]) -> float:
+        return self.tool_priorities.get((tool_name or "").lower(), DEFAULT_PRIORITY)
+
+    # Queueing ---------------------------------------------------------------
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        provider: str,
+        model_name: str,
+        estimated_tokens: int,
+        prompt_chars: int,
+        tool_name: Optional[str] = None,
+        capabilities: Any = None,
+    ) -> AsyncIterator[None]:
+        """
+        Wait until a provider call fits its limits; hold its slot for the duration of the block.
+
+        Args:
+            provider: Provider type value
+            model_name: Model being called
+            estimated_tokens: Prompt token estimate, drawn from tokens-per-minute budgets
+            prompt_chars: Prompt size counted against the in-flight cap
+            tool_name: Calling tool, selects the queue priority
+            capabilities: The model's ModelCapabilities for catalog limits
+
+        Raises:
+            AdmissionTimeoutError: If the call waited longer than the admission timeout
+        """
+        from utils.metrics import record_admission
+
+        provider_limits, model_limits = self.limits_for(provider, model_name, capabilities)
+        canonical = _canonical_name(model_name, capabilities)
+        scopes = [
+            scope
+            for scope in (
+                self._scope(provider, provider_limits),
+                self._scope(f"{provider}/{canonical.lower()}", model_limits),
+            )
+            if scope is not None
+        ]
+        if not scopes and self.max_inflight_chars <= 0:
+            yield
+            return
+
+        now = time.monotonic()
+        waiter = _Waiter(
+            sort_key=now + self.priority_for(tool_name) * self.priority_aging,
+            seq=next(self._seq),
+            scopes=scopes,
+            tokens=max(0, estimated_tokens),
+            size=max(0, prompt_chars),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        bisect.insort(self._waiters, waiter)
+        self._dispatch()
+        try:
+            if not waiter.future.done():
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout if self.timeout > 0 else None)
+        except asyncio.TimeoutError:
+            # Admitted just as the wait ended: go ahead
+            if not (waiter.future.done() and not waiter.future.cancelled()):
+                waiter.future.cancel()
+                self._remove(waiter)
+                self._timeouts += 1
+                record_admission(provider, time.monotonic() - now, timed_out=True)
+                raise AdmissionTimeoutError(
+                    f"{canonical} was not admitted within {self.timeout:.0f}s "
+                    f"({len(self._waiters)} calls queued); provider limits are saturated"
+                ) from None
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(waiter)
+            else:
+                waiter.future.cancel()
+                self._remove(waiter)
+            raise
+
+        waited = time.monotonic() - now
+        record_admission(provider, waited)
+        if waited >= 1:
+            logger.info(f"[ADMISSION] {canonical} admitted after waiting {waited:.1f}s ({tool_name or 'unknown tool'})")
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    def _remove(self, waiter: _Waiter) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        self._dispatch()
+
+    def _release(self, waiter: _Waiter) -> None:
+        for scope in waiter.scopes:
+            scope.in_flight -= 1
+        self._inflight_chars -= waiter.size
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit every queued call that fits, in priority order, honouring reservations."""
+        now = time.monotonic()
+        reserved: set[str] = set()
+        next_wake: Optional[float] = None
+        for waiter in list(self._waiters):
+            if waiter.future.done():
+                self._waiters.remove(waiter)
+                continue
+            names = [scope.name for scope in waiter.scopes]
+            if self.max_inflight_chars > 0:
+                names.append(_BYTES_SCOPE)
+            if reserved.intersection(names):
+                continue
+
+            blocked: list[str] = []
+            wait = 0.0
+            for scope in waiter.scopes:
+                limits = scope.limits
+                scope_wait = 0.0
+                if scope.requests:
+                    scope_wait = max(scope_wait, scope.requests.wait_time(1, now))
+                if scope.tokens:
+                    scope_wait = max(scope_wait, scope.tokens.wait_time(waiter.tokens, now))
+                if limits.max_concurrency and scope.in_flight >= limits.max_concurrency:
+                    blocked.append(scope.name)
+                elif scope_wait > 0:
+                    blocked.append(scope.name)
+                    wait = max(wait, scope_wait)
+            # A prompt larger than the cap still runs, alone
+            if (
+                self.max_inflight_chars > 0
+                and self._inflight_chars > 0
+                and self._inflight_chars + waiter.size > self.max_inflight_chars
+            ):
+                blocked.append(_BYTES_SCOPE)
+
+            if blocked:
+                reserved.update(blocked)
+                if wait > 0:
+                    next_wake = wait if next_wake is None else min(next_wake, wait)
+                continue
+
+            for scope in waiter.scopes:
+                scope.in_flight += 1
+                if scope.requests:
+                    scope.requests.take(1, now)
+                if scope.tokens:
+                    scope.tokens.take(waiter.tokens, now)
+            self._inflight_chars += waiter.size
+            self._waiters.remove(waiter)
+            waiter.future.set_result(None)
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if next_wake is not None and self._waiters:
+            self._timer = asyncio.get_running_loop().call_later(next_wake, self._dispatch)
+
+    def note_rate_limited(self, provider: str, model_name: str, capabilities: Any = None) -> None:
+        """Empty the request buckets of a provider/model that answered 429 so queued calls back off."""
+        now = time.monotonic()
+        for name in (provider, f"{provider}/{_canonical_name(model_name, capabilities).lower()}"):
+            scope = self._scopes.get(name)
+            if scope and scope.requests:
+                scope.requests.drain(now)
+
+    def describe(self) -> dict[str, Any]:
+        """Current limits, usage and queue length for the stats tool."""
+        return {
+            "queued": len(self._waiters),
+            "timeouts": self._timeouts,
+            "inflight_prompt_chars": self._inflight_chars,
+            "max_inflight_prompt_chars": self.max_inflight_chars,
+            "scopes": {
+                name: {
+                    "in_flight": scope.in_flight,
+                    "max_concurrency": scope.limits.max_concurrency,
+                    "requests_per_minute": scope.limits.requests_per_minute,
+                    "tokens_per_minute": scope.limits.tokens_per_minute,
+                    "queued": sum(1 for waiter in self._waiters if scope in waiter.scopes),
+                }
+                for name, scope in sorted(self._scopes.items())
+            },
+        }
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Get the process-wide admission controller."""
+    global _controller
+
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
+
+
+def reset_admission_controller() -> None:
+    """Drop the controller so the next call re-reads configuration (tests)."""
+    global _controller
+
+    with _controller_lock:
+        _controller = None
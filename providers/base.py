@@ -18,6 +18,7 @@ class ProviderType(Enum):
     OPENROUTER = "openrouter"
     CUSTOM = "custom"
     DIAL = "dial"
+    MOCK = "mock"
 
 
 class TemperatureConstraint(ABC):
@@ -154,6 +155,11 @@ class ModelCapabilities:
     # Custom model flag (for models that only work with custom endpoints)
     is_custom: bool = False  # Whether this model requires custom API endpoints
 
+    # Admission control limits, 0 = unlimited (see providers/admission.py)
+    max_concurrency: int = 0  # Calls in flight at once, e.g. the slots of a local server
+    requests_per_minute: int = 0  # Request quota
+    tokens_per_minute: int = 0  # Estimated prompt token quota
+
     # Temperature constraint object - preferred way to define temperature limits
     temperature_constraint: TemperatureConstraint = field(
         default_factory=lambda: RangeTemperatureConstraint(0.0, 2.0, 0.7)
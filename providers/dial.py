@@ -6,6 +6,9 @@ import threading
 import time
 from typing import Optional
 
+from utils.metrics import record_provider_retry
+from utils.tracing import add_span_event
+
 from .base import (
     ModelCapabilities,
     ModelResponse,
@@ -348,8 +351,9 @@ class DIALModelProvider(OpenAICompatibleProvider):
             if deployment not in self._deployment_clients:
                 from openai import OpenAI
 
-                # Build deployment-specific URL
-                base_url = str(self.client.base_url)
+                # Build deployment-specific URL from the configured host (building the
+                # base client just to read its URL would load and configure it needlessly)
+                base_url = str(self.base_url)
                 if base_url.endswith("/"):
                     base_url = base_url[:-1]
 
@@ -500,6 +504,8 @@ class DIALModelProvider(OpenAICompatibleProvider):
                 # If this isn't the last attempt and error is retryable, wait and retry
                 if attempt < self.MAX_RETRIES - 1:
                     delay = self.RETRY_DELAYS[attempt]
+                    record_provider_retry(self, e)
+                    add_span_event("retry", attempt=attempt + 1, error=type(e).__name__, delay=delay)
                     logger.info(
                         f"DIAL API error (attempt {attempt + 1}/{self.MAX_RETRIES}), " f"retrying in {delay}s: {str(e)}"
                     )
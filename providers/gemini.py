@@ -6,8 +6,8 @@ import os
 import time
 from typing import Optional
 
-from google import genai
-from google.genai import types
+from utils.metrics import record_provider_retry
+from utils.tracing import add_span_event
 
 from .base import ModelCapabilities, ModelProvider, ModelResponse, ProviderType, create_temperature_constraint
 
@@ -124,6 +124,9 @@ class GeminiModelProvider(ModelProvider):
     def client(self):
         """Lazy initialization of Gemini client."""
         if self._client is None:
+            # The SDK is imported on first use to keep server startup fast
+            from google import genai
+
             self._client = genai.Client(api_key=self.api_key)
         return self._client
 
@@ -192,6 +195,8 @@ class GeminiModelProvider(ModelProvider):
         contents = [{"parts": parts}]
 
         # Prepare generation config
+        from google.genai import types
+
         generation_config = types.GenerateContentConfig(
             temperature=temperature,
             candidate_count=1,
@@ -257,6 +262,8 @@ class GeminiModelProvider(ModelProvider):
                 delay = retry_delays[attempt]
 
                 # Log retry attempt
+                record_provider_retry(self, e)
+                add_span_event("retry", attempt=attempt + 1, error=type(e).__name__, delay=delay)
                 logger.warning(
                     f"Gemini API error for model {resolved_name}, attempt {attempt + 1}/{max_retries}: {str(e)}. Retrying in {delay}s..."
                 )
@@ -269,12 +276,10 @@ class GeminiModelProvider(ModelProvider):
 
     def count_tokens(self, text: str, model_name: str) -> int:
         """Count tokens for the given text using Gemini's tokenizer."""
-        self._resolve_model_name(model_name)
+        from utils.tokenizer import get_tokenizer
 
-        # For now, use a simple estimation
-        # TODO: Use actual Gemini tokenizer when available in SDK
-        # Rough estimation: ~4 characters per token for English text
-        return len(text) // 4
+        # Gemini has no offline tokenizer; the shared service applies the standard estimate
+        return get_tokenizer().count_tokens(text, self._resolve_model_name(model_name))
 
     def get_provider_type(self) -> ProviderType:
         """Get the provider type."""
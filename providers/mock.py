@@ -0,0 +1,465 @@
+"""Offline mock/replay model provider.
+
+Load, resilience and performance work should not need API keys or depend on
+the mood of a remote API. The mock provider is registered through
+ModelProviderRegistry like any other provider (MOCK_PROVIDER_ENABLED=true) and
+answers generate_content() locally:
+
+- replay: responses recorded into a fixture file (MOCK_PROVIDER_FIXTURES) are
+  served for the same system prompt + prompt; hand-written fixtures can use a
+  "match" substring instead of an exact key
+- templates: requests without a fixture get a templated response, or an error
+  in strict mode
+
+A behaviour profile (MOCK_PROVIDER_PROFILE: a built-in profile name, a JSON file
+path or inline JSON) shapes each call:
+
+- latency drawn from a fixed / uniform / normal / lognormal distribution, plus
+  output_tokens / tokens_per_second of simulated generation time
+- rate limits: a requests-per-minute budget and/or a random 429 probability,
+  raised as MockRateLimitError carrying retry_after (Retry-After seconds)
+- timeouts (TimeoutError after timeout_seconds), server errors (5xx) and
+  malformed outputs (empty, truncated, invalid JSON)
+- max_retries: retries of rate limits/errors inside the provider, honouring
+  Retry-After like the real providers' retry loops
+
+Randomness comes from one seeded generator, so a run with the same seed,
+profile and request sequence behaves identically.
+
+Real traffic can be recorded into a fixture file by setting MOCK_RECORD_FILE
+while using real providers; every successful provider call is appended (see
+providers.router.generate_content_with_stats).
+
+Fixture files are JSON lines:
+    {"key": "<sha256>", "model": "gemini-2.5-flash", "prompt_excerpt": "...",
+     "content": "...", "usage": {...}, "metadata": {...}}
+    {"match": "review this diff", "content": "..."}
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import string
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Any, Optional
+
+from utils.metrics import record_provider_retry
+from utils.tracing import add_span_event
+
+from .base import (
+    ModelCapabilities,
+    ModelProvider,
+    ModelResponse,
+    ProviderType,
+    create_temperature_constraint,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE = "Mock response from $model for a $prompt_tokens token prompt (request $request)."
+
+MALFORMED_KINDS = ("empty", "truncated", "invalid_json")
+
+# Built-in behaviour profiles selectable by name through MOCK_PROVIDER_PROFILE
+BUILTIN_PROFILES: dict[str, dict[str, Any]] = {
+    "instant": {},
+    "realistic": {
+        "latency_distribution": "lognormal",
+        "latency_ms": 800,
+        "latency_stddev_ms": 400,
+        "tokens_per_second": 80,
+        "output_tokens": 400,
+    },
+    "flaky": {
+        "latency_distribution": "uniform",
+        "latency_min_ms": 100,
+        "latency_max_ms": 1500,
+        "error_probability": 0.05,
+        "timeout_probability": 0.02,
+        "timeout_seconds": 5,
+        "malformed_probability": 0.03,
+    },
+    "rate-limited": {
+        "latency_ms": 200,
+        "rate_limit_rpm": 30,
+        "rate_limit_retry_after": 2,
+    },
+}
+
+
+class MockProviderError(Exception):
+    """Simulated provider API error with an HTTP status code."""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class MockRateLimitError(MockProviderError):
+    """Simulated 429 response; retry_after mirrors the Retry-After header (seconds)."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message, status_code=429)
+        self.retry_after = retry_after
+
+
+@dataclass
+class MockProfile:
+    """Latency and failure behaviour of the mock provider."""
+
+    latency_distribution: str = "fixed"  # fixed, uniform, normal, lognormal
+    latency_ms: float = 0.0  # fixed value, or mean for normal/lognormal
+    latency_stddev_ms: float = 0.0
+    latency_min_ms: float = 0.0
+    latency_max_ms: float = 0.0
+    tokens_per_second: float = 0.0  # 0 = output is produced instantly
+    output_tokens: int = 0  # pad responses to about this many tokens (0 = as templated)
+    rate_limit_rpm: int = 0  # requests per rolling minute before 429s (0 = unlimited)
+    rate_limit_probability: float = 0.0
+    rate_limit_retry_after: float = 1.0
+    timeout_probability: float = 0.0
+    timeout_seconds: float = 30.0
+    error_probability: float = 0.0
+    malformed_probability: float = 0.0
+    max_retries: int = 0
+    seed: Optional[int] = None
+    strict: bool = False  # fail requests that have no fixture instead of templating
+    template: str = DEFAULT_TEMPLATE
+    models: dict[str, dict[str, Any]] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "MockProfile":
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown mock profile settings: {', '.join(sorted(unknown))}")
+        profile = cls(**data)
+        if profile.latency_distribution not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{profile.latency_distribution}'")
+        return profile
+
+    @classmethod
+    def load(cls, spec: Optional[str]) -> "MockProfile":
+        """
+        Load a profile from a built-in name, inline JSON or a JSON file path.
+
+        Args:
+            spec: Value of MOCK_PROVIDER_PROFILE (empty for the instant profile)
+
+        Returns:
+            MockProfile
+        """
+        spec = (spec or "").strip()
+        if not spec:
+            return cls()
+        if spec in BUILTIN_PROFILES:
+            return cls.from_dict(dict(BUILTIN_PROFILES[spec]))
+        if spec.startswith("{"):
+            return cls.from_dict(json.loads(spec))
+        with open(spec, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def fixture_key(prompt: str, system_prompt: Optional[str]) -> str:
+    """Replay key of a request: hash of its system prompt and prompt."""
+    digest = hashlib.sha256()
+    digest.update((system_prompt or "").encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class FixtureStore:
+    """Recorded responses loaded from a JSON lines fixture file."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.by_key: dict[str, dict[str, Any]] = {}
+        self.by_match: list[dict[str, Any]] = []
+        if path:
+            self.load(path)
+
+    def load(self, path: str) -> None:
+        with open(path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"[MOCK] Skipping invalid fixture on line {number} of {path}")
+                    continue
+                if "key" in record:
+                    self.by_key[record["key"]] = record
+                elif "match" in record:
+                    self.by_match.append(record)
+        logger.info(f"[MOCK] Loaded {len(self.by_key) + len(self.by_match)} fixtures from {path}")
+
+    def find(self, prompt: str, system_prompt: Optional[str]) -> Optional[dict[str, Any]]:
+        record = self.by_key.get(fixture_key(prompt, system_prompt))
+        if record is not None:
+            return record
+        return next((record for record in self.by_match if record["match"] in prompt), None)
+
+    def __len__(self) -> int:
+        return len(self.by_key) + len(self.by_match)
+
+
+_record_lock = threading.Lock()
+
+
+def record_fixture(
+    path: str, model_name: str, prompt: str, system_prompt: Optional[str], response: ModelResponse
+) -> None:
+    """
+    Append a real provider response to a fixture file for later replay.
+
+    Args:
+        path: Fixture file (JSON lines), created if missing
+        model_name: Model the request was made for
+        prompt: Request prompt
+        system_prompt: Request system prompt
+        response: Provider response
+    """
+    record = {
+        "key": fixture_key(prompt, system_prompt),
+        "model": response.model_name or model_name,
+        "prompt_excerpt": prompt[:200],
+        "content": response.content,
+        "usage": dict(response.usage or {}),
+        "metadata": {k: v for k, v in (response.metadata or {}).items() if isinstance(v, (str, int, float, bool))},
+    }
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _record_lock:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def _mock_capabilities(model_name: str, **overrides: Any) -> ModelCapabilities:
+    settings = {
+        "provider": ProviderType.MOCK,
+        "model_name": model_name,
+        "friendly_name": "Mock",
+        "context_window": 1_048_576,
+        "max_output_tokens": 65_536,
+        "supports_extended_thinking": False,
+        "supports_system_prompts": True,
+        "supports_streaming": False,
+        "supports_function_calling": False,
+        "supports_json_mode": True,
+        "supports_images": False,
+        "supports_temperature": True,
+        "temperature_constraint": create_temperature_constraint("range"),
+        "description": "Offline mock model (replayed or templated responses)",
+    }
+    settings.update(overrides)
+    return ModelCapabilities(**settings)
+
+
+class MockModelProvider(ModelProvider):
+    """Provider that serves fixtures or templates locally with simulated latency and failures."""
+
+    FRIENDLY_NAME = "Mock"
+
+    SUPPORTED_MODELS = {
+        "mock-model": _mock_capabilities(
+            "mock-model",
+            description="Offline mock model (1M context) for load and resilience testing",
+            aliases=["mock"],
+        ),
+        "mock-small": _mock_capabilities(
+            "mock-small",
+            context_window=128_000,
+            max_output_tokens=16_384,
+            description="Offline mock model with a small (128K) context window",
+            aliases=["mock-128k"],
+        ),
+    }
+
+    def __init__(
+        self,
+        api_key: str = "",
+        profile: Optional[MockProfile] = None,
+        fixtures: Optional[FixtureStore] = None,
+        **kwargs,
+    ):
+        """Initialize from MOCK_PROVIDER_PROFILE / MOCK_PROVIDER_FIXTURES unless given explicitly."""
+        super().__init__(api_key, **kwargs)
+        self.profile = profile or MockProfile.load(os.getenv("MOCK_PROVIDER_PROFILE"))
+        self.fixtures = fixtures if fixtures is not None else FixtureStore(os.getenv("MOCK_PROVIDER_FIXTURES") or None)
+        if self.profile.models:
+            self.SUPPORTED_MODELS = {
+                name: _mock_capabilities(name, **settings) for name, settings in self.profile.models.items()
+            }
+        self._random = random.Random(self.profile.seed)
+        self._lock = threading.Lock()
+        self._recent_requests: deque[float] = deque()
+        self.request_count = 0
+
+    def get_capabilities(self, model_name: str) -> ModelCapabilities:
+        resolved_name = self._resolve_model_name(model_name)
+        if resolved_name not in self.SUPPORTED_MODELS:
+            raise ValueError(f"Unsupported mock model: {model_name}")
+        return self.SUPPORTED_MODELS[resolved_name]
+
+    def get_provider_type(self) -> ProviderType:
+        return ProviderType.MOCK
+
+    def validate_model_name(self, model_name: str) -> bool:
+        resolved_name = self._resolve_model_name(model_name)
+        if resolved_name not in self.SUPPORTED_MODELS:
+            return False
+
+        from utils.model_restrictions import get_restriction_service
+
+        return get_restriction_service().is_allowed(ProviderType.MOCK, resolved_name, model_name)
+
+    def supports_thinking_mode(self, model_name: str) -> bool:
+        return False
+
+    def count_tokens(self, text: str, model_name: str) -> int:
+        # Same approximation the server uses for unknown tokenizers
+        return len(text) // 4
+
+    def generate_content(
+        self,
+        prompt: str,
+        model_name: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_output_tokens: Optional[int] = None,
+        **kwargs,
+    ) -> ModelResponse:
+        """Serve a fixture or templated response after the profile's simulated latency and failures."""
+        resolved_name = self._resolve_model_name(model_name)
+        self.get_capabilities(resolved_name)
+        attempts = self.profile.max_retries + 1
+        for attempt in range(attempts):
+            try:
+                return self._attempt(prompt, resolved_name, system_prompt, max_output_tokens)
+            except MockProviderError as e:
+                if attempt == attempts - 1 or not (e.status_code == 429 or e.status_code >= 500):
+                    raise
+                delay = getattr(e, "retry_after", None) or 1.0
+                record_provider_retry(self, e)
+                add_span_event("retry", attempt=attempt + 1, error=type(e).__name__, delay=delay)
+                logger.warning(
+                    f"Mock API error for model {resolved_name}, attempt {attempt + 1}/{attempts}: {e}. "
+                    f"Retrying in {delay}s..."
+                )
+                time.sleep(delay)
+
+    def _attempt(
+        self, prompt: str, model_name: str, system_prompt: Optional[str], max_output_tokens: Optional[int]
+    ) -> ModelResponse:
+        profile = self.profile
+        with self._lock:
+            self.request_count += 1
+            request_number = self.request_count
+            now = time.monotonic()
+            while self._recent_requests and now - self._recent_requests[0] >= 60:
+                self._recent_requests.popleft()
+            limited = bool(profile.rate_limit_rpm) and len(self._recent_requests) >= profile.rate_limit_rpm
+            if not limited:
+                self._recent_requests.append(now)
+            rolls = [self._random.random() for _ in range(4)]
+            latency = self._sample_latency()
+            malformed_kind = self._random.choice(MALFORMED_KINDS)
+
+        if limited or rolls[0] < profile.rate_limit_probability:
+            raise MockRateLimitError(
+                f"429 Too Many Requests (mock rate limit, retry after {profile.rate_limit_retry_after}s)",
+                retry_after=profile.rate_limit_retry_after,
+            )
+        if rolls[1] < profile.timeout_probability:
+            time.sleep(profile.timeout_seconds)
+            raise TimeoutError(f"Mock request timed out after {profile.timeout_seconds}s")
+        if rolls[2] < profile.error_probability:
+            time.sleep(latency)
+            raise MockProviderError("503 Service Unavailable (mock server error)", status_code=503)
+
+        fixture = self.fixtures.find(prompt, system_prompt)
+        if fixture is None and profile.strict:
+            raise MockProviderError(f"No fixture recorded for this request (model {model_name})", status_code=404)
+
+        prompt_tokens = self.count_tokens((system_prompt or "") + prompt, model_name)
+        if fixture is not None:
+            content = fixture.get("content", "")
+        else:
+            content = string.Template(profile.template).safe_substitute(
+                model=model_name,
+                prompt_tokens=prompt_tokens,
+                request=request_number,
+                prompt_excerpt=prompt[:200],
+            )
+            if profile.output_tokens:
+                content = self._pad(content, profile.output_tokens)
+        if max_output_tokens:
+            content = content[: max_output_tokens * 4]
+
+        metadata: dict[str, Any] = {"finish_reason": "STOP", "replayed": fixture is not None}
+        if rolls[3] < profile.malformed_probability:
+            content = self._malform(content, malformed_kind)
+            metadata["malformed"] = malformed_kind
+
+        output_tokens = self.count_tokens(content, model_name)
+        if profile.tokens_per_second > 0:
+            latency += output_tokens / profile.tokens_per_second
+        if latency > 0:
+            time.sleep(latency)
+
+        usage = dict(fixture.get("usage") or {}) if fixture else {}
+        if not usage:
+            usage = {
+                "input_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": prompt_tokens + output_tokens,
+            }
+        return ModelResponse(
+            content=content,
+            usage=usage,
+            model_name=model_name,
+            friendly_name="Mock",
+            provider=ProviderType.MOCK,
+            metadata=metadata,
+        )
+
+    def _sample_latency(self) -> float:
+        """Latency in seconds for one request (call with the lock held)."""
+        profile = self.profile
+        distribution = profile.latency_distribution
+        if distribution == "uniform":
+            value = self._random.uniform(profile.latency_min_ms, profile.latency_max_ms or profile.latency_min_ms)
+        elif distribution == "normal":
+            value = self._random.gauss(profile.latency_ms, profile.latency_stddev_ms)
+        elif distribution == "lognormal" and profile.latency_ms > 0:
+            # Parameterize by the desired mean and standard deviation of the latency itself
+            sigma_squared = math.log(1 + (profile.latency_stddev_ms / profile.latency_ms) ** 2)
+            mu = math.log(profile.latency_ms) - sigma_squared / 2
+            value = self._random.lognormvariate(mu, math.sqrt(sigma_squared))
+        else:
+            value = profile.latency_ms
+        return max(0.0, value) / 1000
+
+    @staticmethod
+    def _pad(content: str, tokens: int) -> str:
+        filler = " lorem ipsum dolor sit amet"
+        missing = tokens * 4 - len(content)
+        if missing <= 0:
+            return content
+        return content + (filler * (missing // len(filler) + 1))[:missing]
+
+    @staticmethod
+    def _malform(content: str, kind: str) -> str:
+        if kind == "empty":
+            return ""
+        if kind == "truncated":
+            return content[: max(1, len(content) // 3)]
+        return '{"status": "' + content[:40].replace('"', "")
@@ -0,0 +1,223 @@
+"""
+Precomputed model-to-provider index
+
+ModelProviderRegistry.get_provider_for_model() used to walk every registered
+provider on each call, and each validate_model_name() resolved aliases,
+consulted the restriction service and, for OpenRouter/custom providers,
+scanned registry maps. It runs several times per request, and
+get_available_models() re-listed every provider on error paths and while
+building schemas.
+
+ModelIndex is an immutable snapshot built once per configuration:
+
+- every canonical model name and alias known to any registered provider is
+  mapped to the provider that get_provider_for_model() would pick (same
+  priority order, same validate_model_name() semantics), with its canonical
+  name, capabilities and restriction status
+- get_available_models() results are computed with the snapshot
+
+The registry keeps one snapshot and checks a cheap fingerprint on access
+(registered provider classes and instances, API key / restriction / custom
+endpoint environment variables, the restriction service instance and an
+explicit generation counter). When anything changes a new snapshot is built
+and swapped in as a single reference, so readers never see a partial index.
+Names that are not in the index (e.g. arbitrary OpenRouter slugs) fall back to
+the provider walk once and the answer is memoized in the snapshot.
+"""
+
+import logging
+from collections.abc import Mapping
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Optional
+
+from .base import ModelCapabilities, ProviderType
+
+if TYPE_CHECKING:
+    from .base import ModelProvider
+
+logger = logging.getLogger(__name__)
+
+# Provider lookup order: native APIs first, then custom endpoints, then catch-all providers
+PROVIDER_PRIORITY_ORDER = (
+    ProviderType.GOOGLE,  # Direct Gemini access
+    ProviderType.OPENAI,  # Direct OpenAI access
+    ProviderType.XAI,  # Direct X.AI GROK access
+    ProviderType.DIAL,  # DIAL unified API access
+    ProviderType.MOCK,  # Offline mock/replay models
+    ProviderType.CUSTOM,  # Local/self-hosted models
+    ProviderType.OPENROUTER,  # Catch-all for cloud models
+)
+
+# Environment variables that change which providers exist or what they allow
+INDEX_ENV_VARS = (
+    "GEMINI_API_KEY",
+    "OPENAI_API_KEY",
+    "XAI_API_KEY",
+    "OPENROUTER_API_KEY",
+    "CUSTOM_API_KEY",
+    "CUSTOM_API_URL",
+    "DIAL_API_KEY",
+    "OPENAI_ALLOWED_MODELS",
+    "GOOGLE_ALLOWED_MODELS",
+    "XAI_ALLOWED_MODELS",
+    "OPENROUTER_ALLOWED_MODELS",
+    "DIAL_ALLOWED_MODELS",
+    "CUSTOM_MODELS_CONFIG_PATH",
+)
+
+
+@dataclass(frozen=True)
+class ModelIndexEntry:
+    """Resolution of one model name or alias."""
+
+    name: str
+    canonical_name: str
+    provider_type: ProviderType
+    capabilities: Optional[ModelCapabilities]
+    allowed: bool
+
+
+class ModelIndex:
+    """Immutable name -> provider snapshot for one registry configuration."""
+
+    def __init__(
+        self,
+        fingerprint: tuple,
+        providers: Mapping[ProviderType, "ModelProvider"],
+        entries: Mapping[str, ModelIndexEntry],
+        available_models: Mapping[bool, Mapping[str, ProviderType]],
+    ):
+        self.fingerprint = fingerprint
+        self.providers = MappingProxyType(dict(providers))
+        self.entries = MappingProxyType(dict(entries))
+        self._available_models = MappingProxyType({k: MappingProxyType(dict(v)) for k, v in available_models.items()})
+        # Names outside the index resolved by walking the providers; memoized for this snapshot only
+        self._misses: dict[str, Optional[ProviderType]] = {}
+
+    def lookup(self, model_name: str) -> Optional[ModelIndexEntry]:
+        """Return the index entry for a model name or alias (exact, then case-insensitive)."""
+        return self.entries.get(model_name) or self.entries.get(model_name.lower())
+
+    def provider_type_for(self, model_name: str) -> Optional[ProviderType]:
+        """Provider type serving the model, resolving names outside the index once."""
+        entry = self.lookup(model_name)
+        if entry is not None:
+            return entry.provider_type if entry.allowed else None
+        if model_name not in self._misses:
+            self._misses[model_name] = _walk_providers(self.providers, model_name)
+        return self._misses[model_name]
+
+    def available_models(self, respect_restrictions: bool = True) -> dict[str, ProviderType]:
+        """Mapping of available model names to providers (a fresh, mutable copy)."""
+        return dict(self._available_models[respect_restrictions])
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def _walk_providers(providers: Mapping[ProviderType, "ModelProvider"], model_name: str) -> Optional[ProviderType]:
+    for provider_type in PROVIDER_PRIORITY_ORDER:
+        provider = providers.get(provider_type)
+        if provider is not None and provider.validate_model_name(model_name):
+            return provider_type
+    return None
+
+
+def _known_names(provider: "ModelProvider") -> list[str]:
+    names: list[str] = []
+    for getter in (lambda: provider.list_all_known_models(), lambda: provider.list_models(respect_restrictions=False)):
+        try:
+            names.extend(name for name in getter() if isinstance(name, str))
+        except Exception as e:
+            logger.debug(f"[MODEL_INDEX] {type(provider).__name__} could not list models: {e}")
+    return names
+
+
+def _list_available(
+    providers: Mapping[ProviderType, "ModelProvider"], registered_order: list[ProviderType], respect_restrictions: bool
+) -> dict[str, ProviderType]:
+    """Same result as the registry's historic get_available_models() loop."""
+    from utils.model_restrictions import get_restriction_service
+
+    restriction_service = get_restriction_service() if respect_restrictions else None
+    models: dict[str, ProviderType] = {}
+    for provider_type in registered_order:
+        provider = providers.get(provider_type)
+        if provider is None:
+            continue
+        try:
+            available = provider.list_models(respect_restrictions=respect_restrictions)
+        except NotImplementedError:
+            logger.warning("Provider %s does not implement list_models", provider_type)
+            continue
+        for model_name in available:
+            # Providers already filter when respect_restrictions=True; never filter twice (issue #98)
+            if (
+                restriction_service
+                and not respect_restrictions
+                and not restriction_service.is_allowed(provider_type, model_name)
+            ):
+                continue
+            models[model_name] = provider_type
+    return models
+
+
+def build_model_index(
+    fingerprint: tuple, providers: Mapping[ProviderType, "ModelProvider"], registered_order: list[ProviderType]
+) -> ModelIndex:
+    """
+    Build a snapshot for the given initialized providers.
+
+    Args:
+        fingerprint: Configuration fingerprint the snapshot is valid for
+        providers: Initialized providers by type (unavailable providers omitted)
+        registered_order: Registration order, used for get_available_models() ordering
+
+    Returns:
+        ModelIndex: Immutable snapshot
+    """
+    known = {pt: set(_known_names(providers[pt])) for pt in PROVIDER_PRIORITY_ORDER if pt in providers}
+    names: dict[str, None] = {}
+    for provider_names in known.values():
+        names.update(dict.fromkeys(sorted(provider_names)))
+
+    entries: dict[str, ModelIndexEntry] = {}
+    for name in names:
+        provider_type = _walk_providers(providers, name)
+        owner = provider_type
+        if owner is None:
+            # Known but restricted everywhere: keep the first provider that knows it, marked disallowed
+            owner = next((pt for pt, provider_names in known.items() if name in provider_names), None)
+            if owner is None:
+                continue
+        provider = providers[owner]
+        canonical, capabilities = name, None
+        try:
+            canonical = provider._resolve_model_name(name)
+            capabilities = provider.get_capabilities(name)
+        except Exception as e:
+            logger.debug(f"[MODEL_INDEX] No capabilities for {name} from {owner.value}: {e}")
+        entry = ModelIndexEntry(name, canonical, owner, capabilities, provider_type is not None)
+        entries[name] = entry
+        entries.setdefault(name.lower(), entry)
+
+    available = {flag: _list_available(providers, registered_order, flag) for flag in (True, False)}
+    index = ModelIndex(fingerprint, providers, entries, available)
+    logger.debug(f"[MODEL_INDEX] Built index with {len(index)} names across {len(providers)} providers")
+    return index
+
+
+def index_fingerprint(registry: Any) -> tuple:
+    """Cheap fingerprint of everything the index depends on."""
+    import os
+
+    from utils import model_restrictions
+
+    return (
+        registry._index_generation,
+        tuple((pt, id(cls)) for pt, cls in registry._providers.items()),
+        tuple((pt, id(provider)) for pt, provider in registry._initialized_providers.items()),
+        tuple(os.environ.get(name) for name in INDEX_ENV_VARS),
+        id(model_restrictions._restriction_service),
+    )
@@ -9,7 +9,8 @@ from abc import abstractmethod
 from typing import Optional
 from urllib.parse import urlparse
 
-from openai import OpenAI
+from utils.metrics import record_provider_retry
+from utils.tracing import add_span_event
 
 from .base import (
     ModelCapabilities,
@@ -19,6 +20,22 @@ from .base import (
 )
 
 
+def __getattr__(name: str):
+    # The openai SDK is imported on first use to keep server startup fast; the
+    # module-level OpenAI name stays available (and patchable) as before
+    if name == "OpenAI":
+        from openai import OpenAI
+
+        globals()["OpenAI"] = OpenAI
+        return OpenAI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _openai_client_class():
+    """Return openai.OpenAI, importing the SDK on first use."""
+    return globals().get("OpenAI") or __getattr__("OpenAI")
+
+
 class OpenAICompatibleProvider(ModelProvider):
     """Base class for any provider using an OpenAI-compatible API.
 
@@ -244,7 +261,7 @@ class OpenAICompatibleProvider(ModelProvider):
                 logging.debug(f"OpenAI client initialized with custom httpx client and timeout: {timeout_config}")
 
                 # Create OpenAI client with custom httpx client
-                self._client = OpenAI(**client_kwargs)
+                self._client = _openai_client_class()(**client_kwargs)
 
             except Exception as e:
                 # If all else fails, try absolute minimal client without custom httpx
@@ -253,7 +270,7 @@ class OpenAICompatibleProvider(ModelProvider):
                     minimal_kwargs = {"api_key": self.api_key}
                     if self.base_url:
                         minimal_kwargs["base_url"] = self.base_url
-                    self._client = OpenAI(**minimal_kwargs)
+                    self._client = _openai_client_class()(**minimal_kwargs)
                 except Exception as fallback_error:
                     logging.error(f"Even minimal OpenAI client creation failed: {fallback_error}")
                     raise
@@ -370,6 +387,8 @@ class OpenAICompatibleProvider(ModelProvider):
 
                 if is_retryable and attempt < max_retries - 1:
                     delay = retry_delays[attempt]
+                    record_provider_retry(self, e)
+                    add_span_event("retry", attempt=attempt + 1, error=type(e).__name__, delay=delay)
                     logging.warning(
                         f"Retryable error for o3-pro responses endpoint, attempt {attempt + 1}/{max_retries}: {str(e)}. Retrying in {delay}s..."
                     )
@@ -535,6 +554,8 @@ class OpenAICompatibleProvider(ModelProvider):
                 delay = retry_delays[attempt]
 
                 # Log retry attempt
+                record_provider_retry(self, e)
+                add_span_event("retry", attempt=attempt + 1, error=type(e).__name__, delay=delay)
                 logging.warning(
                     f"{self.FRIENDLY_NAME} error for model {model_name}, attempt {attempt + 1}/{max_retries}: {str(e)}. Retrying in {delay}s..."
                 )
@@ -551,7 +572,7 @@ class OpenAICompatibleProvider(ModelProvider):
 
         Uses a layered approach:
         1. Try provider-specific token counting endpoint
-        2. Try tiktoken for known model families
+        2. Use the shared tokenizer service for known model families
         3. Fall back to character-based estimation
 
         Args:
@@ -568,31 +589,17 @@ class OpenAICompatibleProvider(ModelProvider):
             except Exception as e:
                 logging.debug(f"Remote token counting failed: {e}")
 
-        # 2. Try tiktoken for known models
-        try:
-            import tiktoken
+        # 2. Exact local tokenizer (encoders and counts are cached process-wide)
+        from utils.tokenizer import get_tokenizer
 
-            # Try to get encoding for the specific model
-            try:
-                encoding = tiktoken.encoding_for_model(model_name)
-            except KeyError:
-                # Try common encodings based on model patterns
-                if "gpt-4" in model_name or "gpt-3.5" in model_name:
-                    encoding = tiktoken.get_encoding("cl100k_base")
-                else:
-                    encoding = tiktoken.get_encoding("cl100k_base")  # Default
-
-            return len(encoding.encode(text))
-
-        except (ImportError, Exception) as e:
-            logging.debug(f"Tiktoken not available or failed: {e}")
+        tokenizer = get_tokenizer()
+        exact = tokenizer.count_exact(text, model_name)
+        if exact is not None:
+            return exact
 
         # 3. Fall back to character-based estimation
-        logging.warning(
-            f"No specific tokenizer available for '{model_name}'. "
-            "Using character-based estimation (~4 chars per token)."
-        )
-        return len(text) // 4
+        logging.debug(f"No local tokenizer for '{model_name}'; using character-based estimation")
+        return tokenizer.count_tokens(text, model_name)
 
     def validate_parameters(self, model_name: str, temperature: float, **kwargs) -> None:
         """Validate model parameters.
@@ -1,9 +1,20 @@
-"""OpenRouter model registry for managing model configurations and aliases."""
+"""OpenRouter model registry for managing model configurations and aliases.
+
+The catalog (conf/custom_models.json or CUSTOM_MODELS_CONFIG_PATH) can be edited
+while the server runs. start_catalog_watcher() polls the file's modification
+time and size on a background thread; a changed file is re-parsed and validated
+there, off the request path, and the new alias/model maps are swapped in as a
+single reference. Dependent caches (the model-to-provider index and anything
+registered with add_catalog_listener()) are then invalidated. An edit that does
+not parse or validate is logged and the previous catalog stays active.
+"""
 
 import logging
 import os
+import threading
+import weakref
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 from utils.file_utils import read_json_file
 
@@ -13,6 +24,16 @@ from .base import (
     create_temperature_constraint,
 )
 
+# Registries whose configuration file is polled for changes
+_watched_registries: "weakref.WeakSet[OpenRouterModelRegistry]" = weakref.WeakSet()
+
+# Callbacks run after any watched catalog changed
+_catalog_listeners: list[Callable[[], None]] = []
+
+_watcher_thread: Optional[threading.Thread] = None
+_watcher_stop = threading.Event()
+_watcher_lock = threading.Lock()
+
 
 class OpenRouterModelRegistry:
     """Registry for managing OpenRouter model configurations and aliases."""
@@ -23,8 +44,10 @@ class OpenRouterModelRegistry:
         Args:
             config_path: Path to config file. If None, uses default locations.
         """
-        self.alias_map: dict[str, str] = {}  # alias -> model_name
-        self.model_map: dict[str, ModelCapabilities] = {}  # model_name -> config
+        # (alias -> model_name, model_name -> config), replaced as one reference so readers
+        # never see the aliases of one catalog with the models of another
+        self._catalog: tuple[dict[str, str], dict[str, ModelCapabilities]] = ({}, {})
+        self._signature: Optional[tuple[int, int]] = None
 
         # Determine config path
         if config_path:
@@ -43,52 +66,75 @@ class OpenRouterModelRegistry:
 
         # Load configuration
         self.reload()
+        _watched_registries.add(self)
 
     def reload(self) -> None:
         """Reload configuration from disk."""
         try:
+            self._signature = self._file_signature()
             configs = self._read_config()
             self._build_maps(configs)
-            caller_info = ""
-            try:
-                import inspect
-
-                caller_frame = inspect.currentframe().f_back
-                if caller_frame:
-                    caller_name = caller_frame.f_code.co_name
-                    caller_file = (
-                        caller_frame.f_code.co_filename.split("/")[-1] if caller_frame.f_code.co_filename else "unknown"
-                    )
-                    # Look for tool context
-                    while caller_frame:
-                        frame_locals = caller_frame.f_locals
-                        if "self" in frame_locals and hasattr(frame_locals["self"], "get_name"):
-                            tool_name = frame_locals["self"].get_name()
-                            caller_info = f" (called from {tool_name} tool)"
-                            break
-                        caller_frame = caller_frame.f_back
-                    if not caller_info:
-                        caller_info = f" (called from {caller_name} in {caller_file})"
-            except Exception:
-                # If frame inspection fails, just continue without caller info
-                pass
-
             logging.debug(
-                f"Loaded {len(self.model_map)} OpenRouter models with {len(self.alias_map)} aliases{caller_info}"
+                f"Loaded {len(self.model_map)} OpenRouter models with {len(self.alias_map)} aliases "
+                f"from {self.config_path}"
             )
         except ValueError as e:
             # Re-raise ValueError only for duplicate aliases (critical config errors)
             logging.error(f"Failed to load OpenRouter model configuration: {e}")
             # Initialize with empty maps on failure
-            self.alias_map = {}
-            self.model_map = {}
+            self._catalog = ({}, {})
             if "Duplicate alias" in str(e):
                 raise
         except Exception as e:
             logging.error(f"Failed to load OpenRouter model configuration: {e}")
             # Initialize with empty maps on failure
-            self.alias_map = {}
-            self.model_map = {}
+            self._catalog = ({}, {})
+
+    def reload_if_changed(self) -> bool:
+        """Re-parse the configuration if the file changed since it was last read.
+
+        Unlike reload(), a configuration that fails to parse or validate keeps the
+        previous catalog in place; the error is logged and the file is not retried
+        until it changes again.
+
+        Returns:
+            True if a new catalog was swapped in, False otherwise
+        """
+        signature = self._file_signature()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+
+        try:
+            alias_map, model_map = self._parse_maps(self._read_config())
+        except Exception as e:
+            logging.error(
+                f"Ignoring invalid model configuration change in {self.config_path}, keeping "
+                f"{len(self.model_map)} previously loaded models: {e}"
+            )
+            return False
+
+        self._catalog = (alias_map, model_map)
+        logging.info(f"Reloaded {len(model_map)} models with {len(alias_map)} aliases from {self.config_path}")
+        return True
+
+    def _file_signature(self) -> Optional[tuple[int, int]]:
+        """Modification time and size of the configuration file, or None if it is missing."""
+        try:
+            stat = self.config_path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @property
+    def alias_map(self) -> dict[str, str]:
+        """Alias (lowercase) -> model name for the current catalog."""
+        return self._catalog[0]
+
+    @property
+    def model_map(self) -> dict[str, ModelCapabilities]:
+        """Model name -> capabilities for the current catalog."""
+        return self._catalog[1]
 
     def _read_config(self) -> list[ModelCapabilities]:
         """Read configuration from file.
@@ -140,10 +186,25 @@ class OpenRouterModelRegistry:
             raise ValueError(f"Error reading config from {self.config_path}: {e}")
 
     def _build_maps(self, configs: list[ModelCapabilities]) -> None:
-        """Build alias and model maps from configurations.
+        """Build alias and model maps from configurations and swap them in.
+
+        Args:
+            configs: List of model configurations
+        """
+        self._catalog = self._parse_maps(configs)
+
+    @staticmethod
+    def _parse_maps(configs: list[ModelCapabilities]) -> tuple[dict[str, str], dict[str, ModelCapabilities]]:
+        """Validate configurations and build (alias_map, model_map) without touching the registry.
 
         Args:
             configs: List of model configurations
+
+        Returns:
+            Tuple of alias map and model map
+
+        Raises:
+            ValueError: On duplicate model names or aliases
         """
         alias_map = {}
         model_map = {}
@@ -178,9 +239,7 @@ class OpenRouterModelRegistry:
                     )
                 alias_map[alias_lower] = config.model_name
 
-        # Atomic update
-        self.alias_map = alias_map
-        self.model_map = model_map
+        return alias_map, model_map
 
     def resolve(self, name_or_alias: str) -> Optional[ModelCapabilities]:
         """Resolve a model name or alias to configuration.
@@ -192,10 +251,10 @@ class OpenRouterModelRegistry:
             Model configuration if found, None otherwise
         """
         # Try alias lookup (case-insensitive) - this now includes model names too
-        alias_lower = name_or_alias.lower()
-        if alias_lower in self.alias_map:
-            model_name = self.alias_map[alias_lower]
-            return self.model_map.get(model_name)
+        alias_map, model_map = self._catalog
+        model_name = alias_map.get(name_or_alias.lower())
+        if model_name is not None:
+            return model_map.get(model_name)
 
         return None
 
@@ -218,3 +277,84 @@ class OpenRouterModelRegistry:
     def list_aliases(self) -> list[str]:
         """List all available aliases."""
         return list(self.alias_map.keys())
+
+
+def add_catalog_listener(callback: Callable[[], None]) -> None:
+    """Register a callback to run after a model catalog was reloaded.
+
+    Args:
+        callback: Function without arguments, e.g. one that drops a cache
+    """
+    if callback not in _catalog_listeners:
+        _catalog_listeners.append(callback)
+
+
+def check_for_catalog_changes() -> bool:
+    """Reload every watched catalog whose file changed and invalidate dependent caches.
+
+    Returns:
+        True if at least one catalog was reloaded
+    """
+    changed = False
+    for registry in list(_watched_registries):
+        try:
+            changed = registry.reload_if_changed() or changed
+        except Exception as e:
+            logging.error(f"Model catalog check failed for {registry.config_path}: {e}")
+
+    if changed:
+        from .registry import ModelProviderRegistry
+
+        ModelProviderRegistry.invalidate_model_index()
+        for callback in list(_catalog_listeners):
+            try:
+                callback()
+            except Exception as e:
+                logging.warning(f"Model catalog listener {callback!r} failed: {e}")
+    return changed
+
+
+def start_catalog_watcher(interval: Optional[float] = None) -> Optional[threading.Thread]:
+    """Start polling watched catalogs for changes on a daemon thread (idempotent).
+
+    Args:
+        interval: Seconds between checks; defaults to CUSTOM_MODELS_RELOAD_INTERVAL.
+            Zero or less disables watching.
+
+    Returns:
+        The watcher thread, or None if watching is disabled
+    """
+    global _watcher_thread
+
+    if interval is None:
+        from config import CUSTOM_MODELS_RELOAD_INTERVAL
+
+        interval = CUSTOM_MODELS_RELOAD_INTERVAL
+    if interval <= 0:
+        logging.debug("Model catalog hot reload disabled")
+        return None
+
+    with _watcher_lock:
+        if _watcher_thread is not None and _watcher_thread.is_alive():
+            return _watcher_thread
+        _watcher_stop.clear()
+
+        def _poll() -> None:
+            while not _watcher_stop.wait(interval):
+                check_for_catalog_changes()
+
+        _watcher_thread = threading.Thread(target=_poll, name="model-catalog-watcher", daemon=True)
+        _watcher_thread.start()
+        logging.debug(f"Watching model catalogs for changes every {interval}s")
+        return _watcher_thread
+
+
+def stop_catalog_watcher() -> None:
+    """Stop the watcher thread started by start_catalog_watcher()."""
+    global _watcher_thread
+
+    with _watcher_lock:
+        _watcher_stop.set()
+        if _watcher_thread is not None:
+            _watcher_thread.join(timeout=5)
+            _watcher_thread = None
@@ -2,9 +2,11 @@
 
 import logging
 import os
+import threading
 from typing import TYPE_CHECKING, Optional
 
 from .base import ModelProvider, ProviderType
+from .model_index import ModelIndex, build_model_index, index_fingerprint
 
 if TYPE_CHECKING:
     from tools.models import ToolModelCategory
@@ -14,6 +16,7 @@ class ModelProviderRegistry:
     """Registry for managing model providers."""
 
     _instance = None
+    _index_lock = threading.Lock()
 
     def __new__(cls):
         """Singleton pattern for registry."""
@@ -23,6 +26,8 @@ class ModelProviderRegistry:
             # Initialize instance dictionaries on first creation
             cls._instance._providers = {}
             cls._instance._initialized_providers = {}
+            cls._instance._index = None
+            cls._instance._index_generation = 0
             logging.debug(f"REGISTRY: Created instance {cls._instance}")
         return cls._instance
 
@@ -82,6 +87,9 @@ class ModelProviderRegistry:
                 api_key = api_key or ""
                 # Initialize custom provider with both API key and base URL
                 provider = provider_class(api_key=api_key, base_url=custom_url)
+        elif provider_type == ProviderType.MOCK:
+            # Offline provider: enabled by registration alone, no credentials
+            provider = provider_class()
         else:
             if not api_key:
                 return None
@@ -102,45 +110,19 @@ class ModelProviderRegistry:
         2. CUSTOM - For local/private models with specific endpoints
         3. OPENROUTER - Catch-all for cloud models via unified API
 
+        Resolved through the precomputed model index (O(1) for known names and aliases).
+
         Args:
             model_name: Name of the model (e.g., "gemini-2.5-flash", "o3-mini")
 
         Returns:
             ModelProvider instance that supports this model
         """
-        logging.debug(f"get_provider_for_model called with model_name='{model_name}'")
-
-        # Define explicit provider priority order
-        # Native APIs first, then custom endpoints, then catch-all providers
-        PROVIDER_PRIORITY_ORDER = [
-            ProviderType.GOOGLE,  # Direct Gemini access
-            ProviderType.OPENAI,  # Direct OpenAI access
-            ProviderType.XAI,  # Direct X.AI GROK access
-            ProviderType.DIAL,  # DIAL unified API access
-            ProviderType.CUSTOM,  # Local/self-hosted models
-            ProviderType.OPENROUTER,  # Catch-all for cloud models
-        ]
-
-        # Check providers in priority order
-        instance = cls()
-        logging.debug(f"Registry instance: {instance}")
-        logging.debug(f"Available providers in registry: {list(instance._providers.keys())}")
-
-        for provider_type in PROVIDER_PRIORITY_ORDER:
-            if provider_type in instance._providers:
-                logging.debug(f"Found {provider_type} in registry")
-                # Get or create provider instance
-                provider = cls.get_provider(provider_type)
-                if provider and provider.validate_model_name(model_name):
-                    logging.debug(f"{provider_type} validates model {model_name}")
-                    return provider
-                else:
-                    logging.debug(f"{provider_type} does not validate model {model_name}")
-            else:
-                logging.debug(f"{provider_type} not found in registry")
-
-        logging.debug(f"No provider found for model {model_name}")
-        return None
+        provider_type = cls.get_model_index().provider_type_for(model_name)
+        if provider_type is None:
+            logging.debug(f"No provider found for model {model_name}")
+            return None
+        return cls.get_provider(provider_type)
 
     @classmethod
     def get_available_providers(cls) -> list[ProviderType]:
@@ -158,45 +140,46 @@ class ModelProviderRegistry:
         Returns:
             Dict mapping model names to provider types
         """
-        # Import here to avoid circular imports
-        from utils.model_restrictions import get_restriction_service
+        return cls.get_model_index().available_models(respect_restrictions)
+
+    @classmethod
+    def get_model_index(cls) -> ModelIndex:
+        """Get the model index for the current configuration, rebuilding it if anything changed.
 
-        restriction_service = get_restriction_service() if respect_restrictions else None
-        models: dict[str, ProviderType] = {}
+        The fingerprint covers registered providers, initialized provider instances, API key,
+        restriction and custom endpoint environment variables, the restriction service and
+        invalidate_model_index() calls. A rebuilt index replaces the old one in one assignment.
+
+        Returns:
+            ModelIndex snapshot
+        """
         instance = cls()
+        index = instance._index
+        if index is not None and index.fingerprint == index_fingerprint(instance):
+            return index
 
-        for provider_type in instance._providers:
-            provider = cls.get_provider(provider_type)
-            if not provider:
-                continue
+        with cls._index_lock:
+            # Create the restriction service first so building does not change the fingerprint
+            from utils.model_restrictions import get_restriction_service
 
-            try:
-                available = provider.list_models(respect_restrictions=respect_restrictions)
-            except NotImplementedError:
-                logging.warning("Provider %s does not implement list_models", provider_type)
-                continue
-
-            for model_name in available:
-                # =====================================================================================
-                # CRITICAL: Prevent double restriction filtering (Fixed Issue #98)
-                # =====================================================================================
-                # Previously, both the provider AND registry applied restrictions, causing
-                # double-filtering that resulted in "no models available" errors.
-                #
-                # Logic: If respect_restrictions=True, provider already filtered models,
-                # so registry should NOT filter them again.
-                # TEST COVERAGE: tests/test_provider_routing_bugs.py::TestOpenRouterAliasRestrictions
-                # =====================================================================================
-                if (
-                    restriction_service
-                    and not respect_restrictions  # Only filter if provider didn't already filter
-                    and not restriction_service.is_allowed(provider_type, model_name)
-                ):
-                    logging.debug("Model %s filtered by restrictions", model_name)
-                    continue
-                models[model_name] = provider_type
+            get_restriction_service()
+            providers = {}
+            for provider_type in instance._providers:
+                provider = cls.get_provider(provider_type)
+                if provider:
+                    providers[provider_type] = provider
+            fingerprint = index_fingerprint(instance)
+            index = instance._index
+            if index is None or index.fingerprint != fingerprint:
+                index = build_model_index(fingerprint, providers, list(instance._providers))
+                instance._index = index
+        return index
 
-        return models
+    @classmethod
+    def invalidate_model_index(cls) -> None:
+        """Force the model index to be rebuilt on next use (e.g. after model config changes)."""
+        instance = cls()
+        instance._index_generation += 1
 
     @classmethod
     def get_available_model_names(cls, provider_type: Optional[ProviderType] = None) -> list[str]:
@@ -259,11 +242,17 @@ class ModelProviderRegistry:
         Returns:
             Model name string for fallback use
         """
-        # Import here to avoid circular import
-        from tools.models import ToolModelCategory
-
         # Get available models respecting restrictions
         available_models = cls.get_available_models(respect_restrictions=True)
+        return cls._select_fallback_model(tool_category, available_models)
+
+    @classmethod
+    def _select_fallback_model(
+        cls, tool_category: Optional["ToolModelCategory"], available_models: dict[str, ProviderType]
+    ) -> str:
+        """Apply the static per-category preference order to a set of available models."""
+        # Import here to avoid circular import
+        from tools.models import ToolModelCategory
 
         # Group by provider
         openai_models = [m for m, p in available_models.items() if p == ProviderType.OPENAI]
@@ -271,6 +260,11 @@ class ModelProviderRegistry:
         xai_models = [m for m, p in available_models.items() if p == ProviderType.XAI]
         openrouter_models = [m for m, p in available_models.items() if p == ProviderType.OPENROUTER]
         custom_models = [m for m, p in available_models.items() if p == ProviderType.CUSTOM]
+        mock_models = [m for m, p in available_models.items() if p == ProviderType.MOCK]
+
+        # Only the offline mock provider is configured (or this is its own routing candidate)
+        if mock_models and len(mock_models) == len(available_models):
+            return mock_models[0]
 
         openai_available = bool(openai_models)
         gemini_available = bool(gemini_models)
@@ -375,6 +369,63 @@ class ModelProviderRegistry:
             # Return a reasonable default for backward compatibility
             return "gemini-2.5-flash"
 
+    @classmethod
+    def get_routing_candidates(
+        cls, tool_category: Optional["ToolModelCategory"] = None
+    ) -> list[tuple[str, ProviderType]]:
+        """Get the eligible auto-mode models for a category, in static preference order.
+
+        The first candidate is what get_preferred_fallback_model() returns. It is followed
+        by the model each other available provider would contribute for the same category,
+        so the router can move traffic across providers without leaving the category.
+
+        Args:
+            tool_category: Category whose eligible set is wanted
+
+        Returns:
+            List of (model_name, provider_type) pairs
+        """
+        available_models = cls.get_available_models(respect_restrictions=True)
+        candidates = []
+
+        def add(model_name: str) -> None:
+            provider_type = available_models.get(model_name)
+            if provider_type is not None and all(name != model_name for name, _ in candidates):
+                candidates.append((model_name, provider_type))
+
+        add(cls._select_fallback_model(tool_category, available_models))
+        for provider_type in dict.fromkeys(available_models.values()):
+            provider_models = {m: p for m, p in available_models.items() if p == provider_type}
+            add(cls._select_fallback_model(tool_category, provider_models))
+        return candidates
+
+    @classmethod
+    def select_auto_model(cls, tool_category: Optional["ToolModelCategory"] = None) -> str:
+        """Resolve auto mode to a concrete model, routing on observed provider health.
+
+        With AUTO_MODEL_ROUTING=static, or fewer than two eligible candidates, this is
+        get_preferred_fallback_model(). Otherwise the model router ranks the candidates
+        by latency, error rate, recent rate limits and cost.
+
+        Args:
+            tool_category: Category of the tool being called
+
+        Returns:
+            Model name string
+        """
+        from config import AUTO_MODEL_ROUTING
+
+        if AUTO_MODEL_ROUTING != "adaptive":
+            return cls.get_preferred_fallback_model(tool_category)
+
+        candidates = cls.get_routing_candidates(tool_category)
+        if len(candidates) < 2:
+            return candidates[0][0] if candidates else cls.get_preferred_fallback_model(tool_category)
+
+        from .router import get_model_router
+
+        return get_model_router().select(candidates, tool_category).chosen
+
     @classmethod
     def _find_extended_thinking_model(cls) -> Optional[str]:
         """Find a model suitable for extended reasoning from custom/openrouter providers.
@@ -440,6 +491,7 @@ class ModelProviderRegistry:
         """Clear cached provider instances."""
         instance = cls()
         instance._initialized_providers.clear()
+        instance._index = None
 
     @classmethod
     def unregister_provider(cls, provider_type: ProviderType) -> None:
@@ -0,0 +1,493 @@
+"""
+Latency- and error-aware model routing for auto mode
+
+ModelProviderRegistry.get_preferred_fallback_model() picks a model from a fixed
+preference order per tool category and cannot tell that a provider is currently
+slow, rate-limited or failing. The router keeps rolling statistics for every
+(provider, model) pair that tools call:
+
+- EWMA latency and tokens per second of successful calls
+- EWMA error rate, updated on every call and decaying towards zero with
+  ROUTER_ERROR_HALF_LIFE while a model is not called
+- timestamps of recent rate-limit (429) responses
+
+When auto mode resolves a model, the registry hands the router the category's
+eligible candidates in static preference order. Each candidate gets a score
+(lower wins) from configurable weights:
+
+    score = latency_weight * (seconds per output token / fastest - 1)
+          + cost_weight    * (cost / cheapest cost - 1)
+          + error_weight   * error rate
+          + preference rank * RANK_PENALTY
+
+Speed is compared per output token (the inverse of tokens per second), so a
+model is not penalized for writing longer answers. When a candidate's provider
+does not report usage, raw call latency is compared for all candidates instead.
+
+Candidates rate-limited within the cooldown window are skipped unless every
+candidate is. Because the error rate decays, a model routed away from after a
+failure is tried again once its penalty has faded, instead of being avoided
+forever for lack of new calls. Without observations all terms but the rank are
+zero, so the static preference order is kept. Recent decisions, with each
+candidate's score breakdown, are retained for inspection via describe().
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Score added per position in the static preference order; breaks ties in its favour
+RANK_PENALTY = 0.05
+
+# Successful calls needed before latency is trusted for ranking
+MIN_LATENCY_SAMPLES = 3
+
+# Number of routing decisions kept for inspection
+DECISION_HISTORY = 50
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Whether an exception from a provider SDK represents a 429 / rate-limit response."""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status == 429:
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return "429" in text or "rate limit" in text or "ratelimit" in text or "resource_exhausted" in text
+
+
+@dataclass
+class ModelStats:
+    """Rolling statistics for one provider/model pair."""
+
+    provider: str
+    model_name: str
+    calls: int = 0
+    successes: int = 0
+    failures: int = 0
+    latency_ewma: Optional[float] = None
+    tokens_per_second_ewma: Optional[float] = None
+    error_rate_ewma: float = 0.0
+    error_rate_updated: Optional[float] = None
+    rate_limits: deque = field(default_factory=lambda: deque(maxlen=20))
+    last_error: Optional[str] = None
+    last_call: Optional[float] = None
+
+    def error_rate(self, now: float, half_life: float) -> float:
+        """Error rate EWMA decayed for the time since it was last updated."""
+        if self.error_rate_updated is None or half_life <= 0:
+            return self.error_rate_ewma
+        return self.error_rate_ewma * 0.5 ** (max(0.0, now - self.error_rate_updated) / half_life)
+
+    def update_error_rate(self, failed: bool, now: float, alpha: float, half_life: float) -> None:
+        self.error_rate_ewma = _ewma(self.error_rate(now, half_life), 1.0 if failed else 0.0, alpha)
+        self.error_rate_updated = now
+
+    def seconds_per_token(self) -> Optional[float]:
+        """Generation time per output token, from the throughput of successful calls."""
+        return 1 / self.tokens_per_second_ewma if self.tokens_per_second_ewma else None
+
+    def recent_rate_limits(self, window: float, now: float) -> int:
+        """Number of rate-limit responses within the last `window` seconds."""
+        return sum(1 for ts in self.rate_limits if now - ts <= window)
+
+    def to_dict(self, window: float, now: float, half_life: float) -> dict[str, Any]:
+        data = asdict(self)
+        data["rate_limits"] = self.recent_rate_limits(window, now)
+        data["error_rate"] = self.error_rate(now, half_life)
+        return data
+
+
+@dataclass
+class RoutingDecision:
+    """Outcome of one auto-mode resolution, kept for inspection."""
+
+    tool_category: Optional[str]
+    chosen: str
+    static_choice: str
+    candidates: list[dict[str, Any]]
+    timestamp: float = field(default_factory=time.time)
+
+
+def _ewma(previous: Optional[float], value: float, alpha: float) -> float:
+    return value if previous is None else alpha * value + (1 - alpha) * previous
+
+
+def _parse_costs(spec: str) -> dict[str, float]:
+    costs = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, _, value = item.partition("=")
+        try:
+            costs[name.strip().lower()] = float(value)
+        except ValueError:
+            logger.warning(f"[ROUTER] Ignoring invalid cost entry: {item!r}")
+    return costs
+
+
+class ModelRouter:
+    """Tracks provider/model health and ranks auto-mode candidates."""
+
+    def __init__(
+        self,
+        latency_weight: Optional[float] = None,
+        cost_weight: Optional[float] = None,
+        error_weight: Optional[float] = None,
+        alpha: Optional[float] = None,
+        rate_limit_cooldown: Optional[float] = None,
+        model_costs: Optional[dict[str, float]] = None,
+        error_half_life: Optional[float] = None,
+    ):
+        import config
+
+        self.latency_weight = config.ROUTER_LATENCY_WEIGHT if latency_weight is None else latency_weight
+        self.cost_weight = config.ROUTER_COST_WEIGHT if cost_weight is None else cost_weight
+        self.error_weight = config.ROUTER_ERROR_WEIGHT if error_weight is None else error_weight
+        self.alpha = config.ROUTER_EWMA_ALPHA if alpha is None else alpha
+        self.rate_limit_cooldown = (
+            config.ROUTER_RATE_LIMIT_COOLDOWN if rate_limit_cooldown is None else rate_limit_cooldown
+        )
+        self.model_costs = _parse_costs(config.ROUTER_MODEL_COSTS) if model_costs is None else model_costs
+        self.error_half_life = config.ROUTER_ERROR_HALF_LIFE if error_half_life is None else error_half_life
+        self._stats: dict[tuple[str, str], ModelStats] = {}
+        self._decisions: deque[RoutingDecision] = deque(maxlen=DECISION_HISTORY)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _provider_key(provider_type: Any) -> str:
+        return getattr(provider_type, "value", str(provider_type))
+
+    def _entry(self, provider_type: Any, model_name: str) -> ModelStats:
+        key = (self._provider_key(provider_type), model_name.lower())
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = ModelStats(provider=key[0], model_name=model_name)
+        return stats
+
+    def record_success(
+        self, provider_type: Any, model_name: str, latency: float, output_tokens: Optional[int] = None
+    ) -> None:
+        """
+        Record a successful model call.
+
+        Args:
+            provider_type: ProviderType of the provider that served the call
+            model_name: Model that was called
+            latency: Wall-clock seconds for the call
+            output_tokens: Generated tokens, if the provider reported usage
+        """
+        with self._lock:
+            stats = self._entry(provider_type, model_name)
+            stats.calls += 1
+            stats.successes += 1
+            stats.last_call = time.time()
+            stats.latency_ewma = _ewma(stats.latency_ewma, latency, self.alpha)
+            stats.update_error_rate(False, stats.last_call, self.alpha, self.error_half_life)
+            if output_tokens and latency > 0:
+                stats.tokens_per_second_ewma = _ewma(stats.tokens_per_second_ewma, output_tokens / latency, self.alpha)
+
+    def record_failure(
+        self, provider_type: Any, model_name: str, error: BaseException, latency: Optional[float] = None
+    ) -> None:
+        """
+        Record a failed model call; rate-limit errors also start the cooldown.
+
+        Args:
+            provider_type: ProviderType of the provider that served the call
+            model_name: Model that was called
+            error: Exception raised by the provider
+            latency: Wall-clock seconds until the failure, if known
+        """
+        with self._lock:
+            stats = self._entry(provider_type, model_name)
+            now = time.time()
+            stats.calls += 1
+            stats.failures += 1
+            stats.last_call = now
+            stats.last_error = f"{type(error).__name__}: {error}"[:200]
+            stats.update_error_rate(True, now, self.alpha, self.error_half_life)
+            if is_rate_limit_error(error):
+                stats.rate_limits.append(now)
+                logger.info(f"[ROUTER] Rate limit recorded for {stats.provider}/{model_name}")
+
+    def get_stats(self, provider_type: Any, model_name: str) -> Optional[ModelStats]:
+        """Return the statistics for a provider/model pair, if any calls were recorded."""
+        return self._stats.get((self._provider_key(provider_type), model_name.lower()))
+
+    def select(self, candidates: list[tuple[str, Any]], tool_category: Optional[Any] = None) -> RoutingDecision:
+        """
+        Pick the best candidate.
+
+        Args:
+            candidates: (model_name, provider_type) pairs in static preference order
+            tool_category: Category being resolved (recorded on the decision)
+
+        Returns:
+            RoutingDecision: Chosen model plus per-candidate score breakdown
+        """
+        if not candidates:
+            raise ValueError("No routing candidates")
+
+        now = time.time()
+        with self._lock:
+            rows = []
+            for rank, (model_name, provider_type) in enumerate(candidates):
+                stats = self.get_stats(provider_type, model_name)
+                trusted = bool(stats and stats.successes >= MIN_LATENCY_SAMPLES)
+                rows.append(
+                    {
+                        "model": model_name,
+                        "provider": self._provider_key(provider_type),
+                        "rank": rank,
+                        "latency": stats.latency_ewma if trusted else None,
+                        "seconds_per_token": stats.seconds_per_token() if trusted else None,
+                        "tokens_per_second": stats.tokens_per_second_ewma if stats else None,
+                        "error_rate": round(stats.error_rate(now, self.error_half_life), 4) if stats else 0.0,
+                        "rate_limited": bool(stats and stats.recent_rate_limits(self.rate_limit_cooldown, now)),
+                        "cost": self.model_costs.get(model_name.lower()),
+                    }
+                )
+
+        # Compare time per output token when every measured candidate reports usage, else raw latency
+        timed = [row for row in rows if row["latency"]]
+        speed_key = "seconds_per_token" if all(row["seconds_per_token"] for row in timed) else "latency"
+        speeds = [row[speed_key] for row in timed]
+        costs = [row["cost"] for row in rows if row["cost"]]
+        fastest = min(speeds) if speeds else None
+        cheapest = min(costs) if costs else None
+
+        for row in rows:
+            latency_term = row[speed_key] / fastest - 1 if fastest and row[speed_key] else 0.0
+            cost_term = row["cost"] / cheapest - 1 if cheapest and row["cost"] else 0.0
+            row["score"] = round(
+                self.latency_weight * latency_term
+                + self.cost_weight * cost_term
+                + self.error_weight * row["error_rate"]
+                + RANK_PENALTY * row["rank"],
+                4,
+            )
+
+        eligible = [row for row in rows if not row["rate_limited"]] or rows
+        best = min(eligible, key=lambda row: (row["score"], row["rank"]))
+
+        decision = RoutingDecision(
+            tool_category=getattr(tool_category, "value", tool_category),
+            chosen=best["model"],
+            static_choice=candidates[0][0],
+            candidates=rows,
+        )
+        with self._lock:
+            self._decisions.append(decision)
+
+        if decision.chosen != decision.static_choice:
+            logger.info(
+                f"[ROUTER] Routed {decision.tool_category or 'default'} to {decision.chosen} instead of "
+                f"{decision.static_choice} (scores: "
+                + ", ".join(f"{row['model']}={row['score']}" for row in rows)
+                + ")"
+            )
+        return decision
+
+    def describe(self) -> dict[str, Any]:
+        """Snapshot of per-model statistics, weights and recent decisions for inspection."""
+        now = time.time()
+        with self._lock:
+            return {
+                "weights": {
+                    "latency": self.latency_weight,
+                    "cost": self.cost_weight,
+                    "error": self.error_weight,
+                    "rank": RANK_PENALTY,
+                },
+                "rate_limit_cooldown": self.rate_limit_cooldown,
+                "error_half_life": self.error_half_life,
+                "models": [
+                    stats.to_dict(self.rate_limit_cooldown, now, self.error_half_life) for stats in self._stats.values()
+                ],
+                "decisions": [asdict(decision) for decision in self._decisions],
+            }
+
+    def reset(self) -> None:
+        """Forget all statistics and decisions."""
+        with self._lock:
+            self._stats.clear()
+            self._decisions.clear()
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Get the process-wide model router (singleton)."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
+
+
+def record_model_call(
+    provider: Any,
+    model_name: str,
+    started: float,
+    response: Any = None,
+    error: Optional[BaseException] = None,
+) -> None:
+    """
+    Record the outcome of a provider.generate_content() call for routing and metrics.
+
+    Never raises: routing statistics must not affect the request itself.
+
+    Args:
+        provider: Provider instance that served the call
+        model_name: Model name used for the call
+        started: time.monotonic() taken just before the call
+        response: ModelResponse on success
+        error: Exception on failure
+    """
+    from utils.metrics import record_provider_call
+
+    latency = time.monotonic() - started
+    record_provider_call(provider, model_name, latency, response=response, error=error)
+    try:
+        provider_type = provider.get_provider_type()
+        router = get_model_router()
+        if error is not None:
+            router.record_failure(provider_type, model_name, error, latency)
+        else:
+            usage = getattr(response, "usage", None)
+            output_tokens = usage.get("output_tokens") if isinstance(usage, dict) else None
+            router.record_success(provider_type, model_name, latency, output_tokens)
+    except Exception as e:
+        logger.debug(f"[ROUTER] Could not record model call for {model_name}: {e}")
+
+
+def generate_content_with_stats(provider: Any, **kwargs: Any) -> Any:
+    """
+    Call provider.generate_content(**kwargs) in a tracing span and record latency/errors for routing.
+
+    Reported input tokens also feed the token estimate calibration (utils/token_calibration.py).
+
+    Args:
+        provider: Provider instance
+        **kwargs: Arguments for generate_content (must include model_name)
+
+    Returns:
+        ModelResponse from the provider; exceptions propagate unchanged
+    """
+    from utils.tracing import start_span
+
+    model_name = kwargs.get("model_name", "")
+    with start_span("generate_content", model=model_name) as span:
+        if span.span_id is not None:
+            try:
+                span.set(provider=ModelRouter._provider_key(provider.get_provider_type()))
+            except Exception:
+                span.set(provider=type(provider).__name__)
+        started = time.monotonic()
+        try:
+            response = provider.generate_content(**kwargs)
+        except Exception as e:
+            record_model_call(provider, model_name, started, error=e)
+            raise
+        record_model_call(provider, model_name, started, response=response)
+        usage = getattr(response, "usage", None)
+        if isinstance(usage, dict):
+            span.set(input_tokens=usage.get("input_tokens"), output_tokens=usage.get("output_tokens"))
+            if not kwargs.get("images"):
+                from utils.token_calibration import observe_usage
+
+                # Keyed by the name callers budget with, which may be an alias
+                observe_usage(
+                    model_name or getattr(response, "model_name", ""),
+                    kwargs.get("prompt") or "",
+                    kwargs.get("system_prompt"),
+                    usage,
+                )
+    record_path = os.getenv("MOCK_RECORD_FILE")
+    if record_path:
+        _record_fixture(record_path, provider, kwargs, response)
+    return response
+
+
+async def agenerate_content_with_stats(
+    provider: Any, tool_name: Optional[str] = None, estimated_tokens: Optional[int] = None, **kwargs: Any
+) -> Any:
+    """
+    Admit a provider call through the admission controller, then run it in a worker thread.
+
+    The event loop keeps serving other requests while the call waits for admission
+    or for the provider; the tracing context follows the call into the thread.
+
+    Args:
+        provider: Provider instance
+        tool_name: Calling tool, selects the admission queue priority
+        estimated_tokens: Prompt token estimate; computed from the prompt when omitted
+        **kwargs: Arguments for generate_content (must include model_name)
+
+    Returns:
+        ModelResponse from the provider; exceptions propagate unchanged
+
+    Raises:
+        AdmissionTimeoutError: If provider limits stayed saturated for ADMISSION_TIMEOUT
+        DryRunComplete: During a dry run (utils/dry_run.py), instead of calling the provider
+    """
+    from utils.dry_run import current_dry_run
+    from utils.token_calibration import calibrated_estimate
+
+    from .admission import get_admission_controller
+
+    dry_run = current_dry_run()
+    if dry_run is not None:
+        # Budget dry run: the prompt is fully assembled, report it instead of calling the provider
+        dry_run.stop_before_model_call(provider, estimated_tokens, kwargs)
+
+    model_name = kwargs.get("model_name", "")
+    prompt_chars = len(kwargs.get("prompt") or "") + len(kwargs.get("system_prompt") or "")
+    if estimated_tokens is None:
+        estimated_tokens = calibrated_estimate(kwargs.get("prompt") or "", model_name) + calibrated_estimate(
+            kwargs.get("system_prompt") or "", model_name
+        )
+    try:
+        provider_key = ModelRouter._provider_key(provider.get_provider_type())
+    except Exception:
+        provider_key = type(provider).__name__.lower()
+    try:
+        capabilities = provider.get_capabilities(model_name)
+    except Exception:
+        capabilities = None
+
+    controller = get_admission_controller()
+    async with controller.admit(
+        provider_key, model_name, estimated_tokens, prompt_chars, tool_name=tool_name, capabilities=capabilities
+    ):
+        try:
+            return await asyncio.to_thread(generate_content_with_stats, provider, **kwargs)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                controller.note_rate_limited(provider_key, model_name, capabilities)
+            raise
+
+
+def _record_fixture(path: str, provider: Any, kwargs: dict[str, Any], response: Any) -> None:
+    """Append a real provider response to the mock provider's fixture file (MOCK_RECORD_FILE)."""
+    from .base import ProviderType
+    from .mock import record_fixture
+
+    try:
+        if provider.get_provider_type() == ProviderType.MOCK:
+            return
+        record_fixture(
+            path, kwargs.get("model_name", ""), kwargs.get("prompt", ""), kwargs.get("system_prompt"), response
+        )
+    except Exception as e:
+        logger.warning(f"[MOCK] Could not record fixture to {path}: {e}")
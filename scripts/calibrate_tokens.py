@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Token ratio calibration for Zen MCP Server
+
+File token budgets are estimated from file sizes with per-extension
+bytes-per-token ratios (utils/file_types.TOKEN_ESTIMATION_RATIOS). The
+built-in ratios are generic; this command measures them on your own code:
+
+- walks the given directories the same way tools expand directory arguments
+  (hidden, excluded and binary files are skipped)
+- tokenizes every file with the exact tokenizer of each model family
+  (o200k_base for GPT-4o/4.1/5 and the o-series, cl100k_base for GPT-4/3.5)
+- reports bytes per token per extension and family, and writes the ratios to
+  the token calibration file (see utils/token_calibration.py), where the
+  server picks them up on its next start
+
+Families without an offline tokenizer (Gemini, Grok) use the average over the
+measured families; their prompt estimates are additionally corrected online
+from the input tokens providers report.
+
+Requires the optional ``tiktoken`` package.
+
+Usage:
+    python scripts/calibrate_tokens.py DIR [DIR ...] [--families o200k_base,cl100k_base] [--dry-run] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Any
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_FAMILIES = ("o200k_base", "cl100k_base")
+
+# Extensions with less content than this are too noisy to calibrate
+DEFAULT_MIN_BYTES = 20_000
+
+# Larger files are skipped (generated code, vendored bundles)
+MAX_FILE_BYTES = 1024 * 1024
+
+# Files tokenized per encode_ordinary_batch() call
+BATCH_SIZE = 64
+
+
+def _ensure_project_path() -> None:
+    if str(PROJECT_ROOT) not in sys.path:
+        sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def collect_files(paths: list[str]) -> dict[str, list[str]]:
+    """Text files under the given paths grouped by lower-case extension."""
+    _ensure_project_path()
+    from utils.file_types import TEXT_EXTENSIONS
+    from utils.file_utils import expand_paths
+
+    by_extension: dict[str, list[str]] = defaultdict(list)
+    for file_path in expand_paths([os.path.abspath(path) for path in paths], TEXT_EXTENSIONS):
+        try:
+            if os.path.getsize(file_path) > MAX_FILE_BYTES:
+                continue
+        except OSError:
+            continue
+        by_extension[Path(file_path).suffix.lower()].append(file_path)
+    return dict(by_extension)
+
+
+def measure(
+    files: dict[str, list[str]], encoders: dict[str, Any], min_bytes: int = DEFAULT_MIN_BYTES
+) -> dict[str, Any]:
+    """
+    Tokenize the files with every encoder and compute bytes-per-token ratios.
+
+    Args:
+        files: Paths grouped by extension (see collect_files)
+        encoders: tiktoken encodings by family name
+        min_bytes: Extensions with less content are reported but not calibrated
+
+    Returns:
+        dict with "ratios" ({family: {ext: ratio}} plus the "default" average),
+        and per-extension "files", "bytes" and per-family "tokens"
+    """
+    _ensure_project_path()
+    from utils.token_calibration import ALL_FAMILIES
+
+    extensions: dict[str, dict[str, Any]] = {}
+    for extension, paths in sorted(files.items()):
+        texts = []
+        for path in paths:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    texts.append(f.read())
+            except (OSError, UnicodeDecodeError):
+                continue
+        size = sum(len(text.encode("utf-8")) for text in texts)
+        if not size:
+            continue
+        tokens = {}
+        for family, encoder in encoders.items():
+            tokens[family] = sum(
+                len(encoded)
+                for start in range(0, len(texts), BATCH_SIZE)
+                for encoded in encoder.encode_ordinary_batch(texts[start : start + BATCH_SIZE])
+            )
+        extensions[extension] = {"files": len(texts), "bytes": size, "tokens": tokens}
+
+    ratios: dict[str, dict[str, float]] = {family: {} for family in encoders}
+    ratios[ALL_FAMILIES] = {}
+    for extension, info in extensions.items():
+        if info["bytes"] < min_bytes:
+            continue
+        measured = {family: info["bytes"] / count for family, count in info["tokens"].items() if count}
+        for family, ratio in measured.items():
+            ratios[family][extension] = round(ratio, 3)
+        if measured:
+            ratios[ALL_FAMILIES][extension] = round(sum(measured.values()) / len(measured), 3)
+    return {"ratios": ratios, "extensions": extensions}
+
+
+def load_encoders(families: list[str]) -> dict[str, Any]:
+    """tiktoken encodings by name; raises RuntimeError if tiktoken is missing."""
+    _ensure_project_path()
+    # Honors TOKENIZER_ENCODINGS_DIR for offline machines, like the server does
+    from utils.tokenizer import TokenizerService
+
+    TokenizerService(exact=True)
+    try:
+        import tiktoken
+    except ImportError as e:
+        raise RuntimeError("Calibration needs the exact tokenizers: pip install tiktoken") from e
+    return {family: tiktoken.get_encoding(family) for family in families}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure per-extension token ratios on a code corpus")
+    parser.add_argument("paths", nargs="+", help="Directories or files to measure")
+    parser.add_argument(
+        "--families", default=",".join(DEFAULT_FAMILIES), help="Comma-separated tiktoken encodings to measure"
+    )
+    parser.add_argument(
+        "--min-bytes", type=int, default=DEFAULT_MIN_BYTES, help="Minimum content per extension to calibrate it"
+    )
+    parser.add_argument("--output", help="Calibration file to write (default: the server's TOKEN_CALIBRATION_FILE)")
+    parser.add_argument("--dry-run", action="store_true", help="Report ratios without writing them")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    families = [family.strip() for family in args.families.split(",") if family.strip()]
+    try:
+        encoders = load_encoders(families)
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+
+    files = collect_files(args.paths)
+    if not files:
+        print("No text files found", file=sys.stderr)
+        return 1
+    results = measure(files, encoders, args.min_bytes)
+
+    from utils.file_types import TOKEN_ESTIMATION_RATIOS
+    from utils.token_calibration import ALL_FAMILIES, TokenCalibration, calibration_path
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'Extension':<12} {'Files':>6} {'Bytes':>12} {'Built-in':>9} " + " ".join(f"{f:>12}" for f in families))
+        for extension, info in results["extensions"].items():
+            builtin = TOKEN_ESTIMATION_RATIOS.get(extension)
+            ratios = [results["ratios"][family].get(extension) for family in families]
+            measured = " ".join(f"{ratio:>12.2f}" if ratio else f"{'-':>12}" for ratio in ratios)
+            print(
+                f"{extension:<12} {info['files']:>6} {info['bytes']:>12,} "
+                f"{builtin if builtin is not None else '-':>9} {measured}"
+            )
+
+    calibrated = len(results["ratios"][ALL_FAMILIES])
+    if args.dry_run:
+        print(f"\n{calibrated} extensions calibrated (dry run, nothing written)", file=sys.stderr)
+        return 0
+    output = Path(args.output).expanduser() if args.output else calibration_path()
+    corpus = {
+        "paths": [os.path.abspath(path) for path in args.paths],
+        "files": sum(info["files"] for info in results["extensions"].values()),
+        "families": families,
+    }
+    TokenCalibration(output).set_extension_ratios(results["ratios"], corpus)
+    print(f"\n{calibrated} extensions calibrated, written to {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
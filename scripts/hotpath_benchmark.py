@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Hot-path micro-benchmarks for Zen MCP Server
+
+The functional tests say nothing about speed, so slowdowns in the code every
+tool call runs through go unnoticed. This script times those paths in-process:
+
+- expand_paths: walking a synthetic repository
+- read_files: reading and formatting every file of that repository
+- build_conversation_history: a thread of configurable depth whose turns
+  reference the repository's files
+- storage_setex / storage_get: FileBasedStorage round trips of that thread
+- schema_generation: rendering every tool's input schema (server._build_tool_list,
+  bypassing the list_tools cache)
+- token_allocation: ModelContext.calculate_token_allocation with recorded demand
+
+For each benchmark it reports p50/p95/p99/max latency over --iterations timed
+runs and the peak memory traced by tracemalloc during one extra, untimed run.
+
+Everything runs offline: the repository and session storage live in a
+temporary directory, all provider keys are removed from the environment and a
+stub provider with a 1M token model is registered in their place.
+
+Results can be saved as a baseline and later runs compared against it; a
+benchmark regresses when its p50 latency or peak memory exceeds the baseline by
+more than --threshold (relative) and by more than a small absolute margin that
+keeps sub-millisecond timer noise from failing the run. The exit status is 1
+when anything regressed, so the script can gate CI.
+
+Usage:
+    python scripts/hotpath_benchmark.py [--files 200] [--file-kb 4] [--turns 20] [--iterations 30]
+    python scripts/hotpath_benchmark.py --save-baseline
+    python scripts/hotpath_benchmark.py --threshold 0.25 [--baseline path.json] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = PROJECT_ROOT / "scripts" / "hotpath_baseline.json"
+
+PROVIDER_KEYS = (
+    "GEMINI_API_KEY",
+    "OPENAI_API_KEY",
+    "XAI_API_KEY",
+    "OPENROUTER_API_KEY",
+    "DIAL_API_KEY",
+    "CUSTOM_API_URL",
+    "CUSTOM_API_KEY",
+)
+
+STUB_MODEL = "bench-model"
+
+# Regressions smaller than these are treated as noise whatever the relative change
+MIN_LATENCY_DELTA_MS = 0.05
+MIN_MEMORY_DELTA_KB = 64
+
+
+@dataclass
+class Workload:
+    """Size of the synthetic inputs."""
+
+    files: int = 200
+    file_kb: int = 4
+    dirs: int = 10
+    turns: int = 20
+    files_per_turn: int = 3
+
+
+def prepare_environment(work_dir: Path) -> None:
+    """Point session storage at work_dir and make sure no real provider can be reached."""
+    for key in PROVIDER_KEYS:
+        os.environ.pop(key, None)
+    # The stub provider is registered as the Google provider; it never uses the key
+    os.environ["GEMINI_API_KEY"] = "hotpath-benchmark-placeholder"
+    os.environ["ZEN_SESSION_DIR"] = str(work_dir / "sessions")
+    os.environ["DEFAULT_MODEL"] = "auto"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if str(PROJECT_ROOT) not in sys.path:
+        sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def register_stub_provider() -> None:
+    """Replace every provider with an offline stub serving STUB_MODEL."""
+    from providers.base import (
+        ModelCapabilities,
+        ModelProvider,
+        ModelResponse,
+        ProviderType,
+        RangeTemperatureConstraint,
+    )
+    from providers.registry import ModelProviderRegistry
+
+    class StubProvider(ModelProvider):
+        SUPPORTED_MODELS = {
+            STUB_MODEL: ModelCapabilities(
+                provider=ProviderType.GOOGLE,
+                model_name=STUB_MODEL,
+                friendly_name="Bench",
+                context_window=1_048_576,
+                max_output_tokens=65_536,
+                supports_extended_thinking=False,
+                supports_system_prompts=True,
+                supports_streaming=False,
+                supports_function_calling=False,
+                temperature_constraint=RangeTemperatureConstraint(0.0, 2.0, 0.7),
+            )
+        }
+
+        def get_capabilities(self, model_name: str) -> ModelCapabilities:
+            return self.SUPPORTED_MODELS[STUB_MODEL]
+
+        def generate_content(self, prompt: str, model_name: str, **kwargs) -> ModelResponse:
+            return ModelResponse(
+                content="ok",
+                usage={"input_tokens": len(prompt) // 4, "output_tokens": 1, "total_tokens": len(prompt) // 4 + 1},
+                model_name=model_name,
+                friendly_name="Bench",
+                provider=ProviderType.GOOGLE,
+            )
+
+        def count_tokens(self, text: str, model_name: str) -> int:
+            return len(text) // 4
+
+        def get_provider_type(self) -> ProviderType:
+            return ProviderType.GOOGLE
+
+        def validate_model_name(self, model_name: str) -> bool:
+            return model_name == STUB_MODEL
+
+        def supports_thinking_mode(self, model_name: str) -> bool:
+            return False
+
+    for provider_type in list(ProviderType):
+        ModelProviderRegistry.unregister_provider(provider_type)
+    ModelProviderRegistry.register_provider(ProviderType.GOOGLE, StubProvider)
+    ModelProviderRegistry.clear_cache()
+    ModelProviderRegistry.invalidate_model_index()
+
+
+def build_repository(root: Path, workload: Workload) -> list[str]:
+    """Create a synthetic source tree; returns the file paths in creation order."""
+    line = "    value = compute(alpha, beta) + helper(gamma)  # synthetic benchmark line\n"
+    body = line * max(1, workload.file_kb * 1024 // len(line))
+    paths = []
+    for i in range(workload.files):
+        directory = root / f"pkg{i % max(1, workload.dirs)}" / f"sub{i % 3}"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"module_{i}.py"
+        path.write_text(f"def function_{i}(alpha, beta, gamma):\n{body}    return value\n", encoding="utf-8")
+        paths.append(str(path))
+    # Noise expand_paths has to skip
+    (root / "__pycache__").mkdir(exist_ok=True)
+    (root / "__pycache__" / "module.cpython-311.pyc").write_bytes(b"\0" * 1024)
+    (root / ".hidden").write_text("ignored", encoding="utf-8")
+    return paths
+
+
+def build_thread(files: list[str], workload: Workload):
+    """ThreadContext with workload.turns alternating turns, each referencing a few files."""
+    from utils.conversation_memory import ConversationTurn, ThreadContext
+
+    now = datetime.now(timezone.utc).isoformat()
+    turns = []
+    for i in range(workload.turns):
+        start = (i * workload.files_per_turn) % max(1, len(files))
+        assistant = i % 2 == 1
+        turns.append(
+            ConversationTurn(
+                role="assistant" if assistant else "user",
+                content=f"Turn {i}: " + "analysis of the change and its consequences. " * 40,
+                timestamp=now,
+                files=files[start : start + workload.files_per_turn],
+                tool_name="analyze",
+                model_provider="google" if assistant else None,
+                model_name=STUB_MODEL if assistant else None,
+            )
+        )
+    return ThreadContext(
+        thread_id=str(uuid.uuid4()),
+        created_at=now,
+        last_updated_at=now,
+        tool_name="analyze",
+        turns=turns,
+        initial_context={"prompt": "Benchmark thread"},
+    )
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+def measure(func: Callable[[], Any], iterations: int, warmup: int = 2) -> dict[str, float]:
+    """Latency percentiles (ms) over timed runs, plus peak traced memory (KiB) of one more run."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    # Memory is measured separately so tracemalloc's overhead does not skew the timings
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(_percentile(samples, 0.50), 3),
+        "p95_ms": round(_percentile(samples, 0.95), 3),
+        "p99_ms": round(_percentile(samples, 0.99), 3),
+        "max_ms": round(max(samples), 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(
+    workload: Workload, iterations: int, work_dir: Path, only: Optional[set[str]] = None
+) -> dict[str, dict[str, float]]:
+    """
+    Build the synthetic inputs in work_dir and time each hot path.
+
+    Args:
+        workload: Repository and thread sizes
+        iterations: Timed runs per benchmark
+        work_dir: Scratch directory for the repository and session storage
+        only: Benchmark names to run (all when None)
+
+    Returns:
+        Benchmark name -> measurements
+    """
+    prepare_environment(work_dir)
+    register_stub_provider()
+
+    from server import _build_tool_list
+    from utils.conversation_memory import build_conversation_history
+    from utils.file_utils import expand_paths, read_files
+    from utils.model_context import ModelContext
+    from utils.storage_backend import FileBasedStorage
+
+    repo = work_dir / "repo"
+    files = build_repository(repo, workload)
+    thread = build_thread(files, workload)
+    serialized = thread.model_dump_json()
+    storage = FileBasedStorage(str(work_dir / "storage"))
+    storage_key = f"thread:{thread.thread_id}"
+    storage.setex(storage_key, 3600, serialized)
+
+    def history():
+        return build_conversation_history(thread, ModelContext(STUB_MODEL))
+
+    def allocation():
+        context = ModelContext(STUB_MODEL)
+        context.update_demand(history=40_000, files=250_000, prompt=8_000, output=16_000)
+        return context.calculate_token_allocation()
+
+    benchmarks: dict[str, Callable[[], Any]] = {
+        "expand_paths": lambda: expand_paths([str(repo)]),
+        "read_files": lambda: read_files(files, max_tokens=10_000_000, reserve_tokens=0),
+        "build_conversation_history": history,
+        "storage_setex": lambda: storage.setex(storage_key, 3600, serialized),
+        "storage_get": lambda: storage.get(storage_key),
+        "schema_generation": _build_tool_list,
+        "token_allocation": allocation,
+    }
+
+    results = {}
+    for name, func in benchmarks.items():
+        if only and name not in only:
+            continue
+        results[name] = measure(func, iterations)
+    return results
+
+
+def compare_to_baseline(
+    results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], threshold: float
+) -> list[dict[str, Any]]:
+    """
+    Compare p50 latency and peak memory with a baseline.
+
+    Args:
+        results: Current measurements
+        baseline: Stored measurements (same shape)
+        threshold: Allowed relative increase, e.g. 0.2 for +20%
+
+    Returns:
+        One entry per compared metric with its change and whether it regressed
+    """
+    comparisons = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric, floor in (("p50_ms", MIN_LATENCY_DELTA_MS), ("peak_kb", MIN_MEMORY_DELTA_KB)):
+            if metric not in previous:
+                continue
+            before, after = previous[metric], current[metric]
+            change = (after - before) / before if before else 0.0
+            comparisons.append(
+                {
+                    "benchmark": name,
+                    "metric": metric,
+                    "baseline": before,
+                    "current": after,
+                    "change": round(change, 4),
+                    "regressed": change > threshold and after - before > floor,
+                }
+            )
+    return comparisons
+
+
+def load_baseline(path: Path) -> Optional[dict[str, Any]]:
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: Path, results: dict[str, dict[str, float]], workload: Workload, iterations: int) -> None:
+    data = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "workload": workload.__dict__,
+        "iterations": iterations,
+        "results": results,
+    }
+    path.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Zen MCP Server hot paths against a baseline")
+    parser.add_argument("--files", type=int, default=Workload.files, help="Files in the synthetic repository")
+    parser.add_argument("--file-kb", type=int, default=Workload.file_kb, help="Approximate size of each file (KiB)")
+    parser.add_argument("--dirs", type=int, default=Workload.dirs, help="Top-level directories to spread files over")
+    parser.add_argument("--turns", type=int, default=Workload.turns, help="Conversation turns in the thread")
+    parser.add_argument(
+        "--files-per-turn", type=int, default=Workload.files_per_turn, help="Files referenced by each turn"
+    )
+    parser.add_argument("--iterations", type=int, default=30, help="Timed runs per benchmark")
+    parser.add_argument("--only", nargs="+", help="Run only these benchmarks")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="Allowed relative increase before a regression (default 0.2)"
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    workload = Workload(args.files, args.file_kb, args.dirs, args.turns, args.files_per_turn)
+    with tempfile.TemporaryDirectory(prefix="zen-hotpath-") as tmp:
+        results = run_benchmarks(workload, args.iterations, Path(tmp), set(args.only) if args.only else None)
+
+    baseline_path = Path(args.baseline)
+    baseline = load_baseline(baseline_path)
+    comparisons = []
+    if baseline is not None and not args.save_baseline:
+        if baseline.get("workload") != workload.__dict__:
+            print(f"Warning: baseline was recorded with workload {baseline.get('workload')}", file=sys.stderr)
+        comparisons = compare_to_baseline(results, baseline.get("results", {}), args.threshold)
+    regressions = [c for c in comparisons if c["regressed"]]
+
+    if args.save_baseline:
+        save_baseline(baseline_path, results, workload, args.iterations)
+
+    if args.json:
+        print(json.dumps({"workload": workload.__dict__, "results": results, "comparisons": comparisons}, indent=2))
+    else:
+        print(
+            f"Hot-path benchmark ({workload.files} files x {workload.file_kb} KiB, {workload.turns} turns, "
+            f"{args.iterations} iterations)"
+        )
+        print(f"  {'Benchmark':<28} {'p50':>10} {'p95':>10} {'p99':>10} {'max':>10} {'peak mem':>12}")
+        changes = {(c["benchmark"], c["metric"]): c for c in comparisons}
+        for name, stats in results.items():
+            print(
+                f"  {name:<28} {stats['p50_ms']:>8.3f}ms {stats['p95_ms']:>8.3f}ms {stats['p99_ms']:>8.3f}ms "
+                f"{stats['max_ms']:>8.3f}ms {stats['peak_kb']:>9.1f}KiB"
+            )
+            for metric in ("p50_ms", "peak_kb"):
+                change = changes.get((name, metric))
+                if change:
+                    marker = "  REGRESSION" if change["regressed"] else ""
+                    print(
+                        f"    {metric:<8} vs baseline {change['baseline']:>10} -> {change['current']:<10} "
+                        f"({change['change']:+.1%}){marker}"
+                    )
+        if args.save_baseline:
+            print(f"Baseline written to {baseline_path}")
+        elif baseline is None:
+            print(f"No baseline at {baseline_path}; run with --save-baseline to create one")
+        elif regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+        else:
+            print(f"No regressions above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
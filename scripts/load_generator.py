@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+Concurrent load generator for Zen MCP Server
+
+communication_simulator_test.py runs scenarios one at a time to check
+correctness. This script measures how the server behaves when clients keep
+several tool calls in flight: it spawns server.py on stdio (or any command
+speaking MCP over stdio, e.g. `docker exec -i ...`), performs the MCP
+handshake and runs a weighted mix of scenarios from --concurrency workers:
+
+- chat: one chat call
+- continuation: a chat call followed by --turns follow-ups on the same
+  continuation_id, so each call carries a longer conversation history
+- codereview: a single-step code review (with expert analysis) of a synthetic
+  directory of --repo-files files
+- consensus: a two-model consensus workflow, one call per consulted model
+
+While the load runs it also:
+
+- sends a JSON-RPC ping every --ping-interval seconds; the round trip of a
+  ping shows how long the server's event loop was unable to respond (stalls)
+- samples the server process's resident memory every second (Linux /proc,
+  or psutil when installed)
+
+By default the server runs offline against the mock provider (see
+providers/mock.py) with all real provider keys removed; --mock-profile picks
+its latency/failure profile. --real-providers keeps the current environment
+(and its API keys) instead.
+
+Usage:
+    python scripts/load_generator.py [--concurrency 8] [--requests 200 | --duration 60]
+        [--mix chat=4,continuation=2,codereview=1,consensus=1] [--mock-profile realistic] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+PROVIDER_KEYS = (
+    "GEMINI_API_KEY",
+    "OPENAI_API_KEY",
+    "XAI_API_KEY",
+    "OPENROUTER_API_KEY",
+    "DIAL_API_KEY",
+    "CUSTOM_API_URL",
+    "CUSTOM_API_KEY",
+)
+
+SCENARIOS = ("chat", "continuation", "codereview", "consensus")
+DEFAULT_MIX = "chat=4,continuation=2,codereview=1,consensus=1"
+
+# Ping round trips above this count as event-loop stalls
+STALL_THRESHOLD_MS = 100
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize_latencies(values: list[float]) -> dict[str, float]:
+    """Latency summary in ms (values in seconds)."""
+    if not values:
+        return {"count": 0}
+    ms = [v * 1000 for v in values]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 1),
+        "p50_ms": round(_percentile(ms, 0.50), 1),
+        "p95_ms": round(_percentile(ms, 0.95), 1),
+        "p99_ms": round(_percentile(ms, 0.99), 1),
+        "max_ms": round(max(ms), 1),
+    }
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """Parse "chat=4,consensus=1" into scenario weights."""
+    mix = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}' (expected one of {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("The scenario mix needs at least one positive weight")
+    return mix
+
+
+def build_repository(root: Path, files: int, file_kb: int) -> Path:
+    """Synthetic source directory for codereview scenarios."""
+    line = "    result = transform(record, options)  # synthetic line for load testing\n"
+    body = line * max(1, file_kb * 1024 // len(line))
+    for i in range(files):
+        directory = root / f"pkg{i % 8}"
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"module_{i}.py").write_text(f"def handler_{i}(record, options):\n{body}    return result\n")
+    return root
+
+
+def server_environment(args: argparse.Namespace, work_dir: Path) -> dict[str, str]:
+    env = dict(os.environ)
+    if not args.real_providers:
+        for key in PROVIDER_KEYS:
+            env.pop(key, None)
+        env["MOCK_PROVIDER_ENABLED"] = "true"
+        if args.mock_profile:
+            env["MOCK_PROVIDER_PROFILE"] = args.mock_profile
+    env["ZEN_SESSION_DIR"] = str(work_dir / "sessions")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    return env
+
+
+def find_continuation_id(payload: Any) -> Optional[str]:
+    """First continuation_id anywhere in a tool response payload."""
+    if isinstance(payload, dict):
+        if isinstance(payload.get("continuation_id"), str):
+            return payload["continuation_id"]
+        values = payload.values()
+    elif isinstance(payload, list):
+        values = payload
+    else:
+        return None
+    for value in values:
+        found = find_continuation_id(value)
+        if found:
+            return found
+    return None
+
+
+class MCPStdioClient:
+    """Minimal JSON-RPC client for an MCP server on a subprocess's stdio."""
+
+    def __init__(self, command: list[str], env: dict[str, str]):
+        self.command = command
+        self.env = env
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._pending: dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._reader: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            cwd=PROJECT_ROOT,
+            env=self.env,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            # Tool results (e.g. consensus with accumulated responses) can be large single lines
+            limit=64 * 1024 * 1024,
+        )
+        self._reader = asyncio.create_task(self._read_loop())
+        await self.request(
+            "initialize",
+            {
+                "protocolVersion": "2024-11-05",
+                "capabilities": {},
+                "clientInfo": {"name": "load-generator", "version": "1.0"},
+            },
+        )
+        await self.notify("notifications/initialized")
+
+    async def _read_loop(self) -> None:
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            future = self._pending.pop(message.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(message)
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError("Server exited"))
+
+    async def _send(self, message: dict[str, Any]) -> None:
+        async with self._write_lock:
+            self.process.stdin.write((json.dumps(message) + "\n").encode("utf-8"))
+            await self.process.stdin.drain()
+
+    async def notify(self, method: str, params: Optional[dict[str, Any]] = None) -> None:
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+        await self._send(message)
+
+    async def request(self, method: str, params: Optional[dict[str, Any]] = None, timeout: float = 600) -> dict:
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if params is not None:
+            message["params"] = params
+        await self._send(message)
+        return await asyncio.wait_for(future, timeout)
+
+    async def call_tool(self, name: str, arguments: dict[str, Any], timeout: float = 600) -> dict[str, Any]:
+        """
+        Call a tool and decode its JSON payload.
+
+        Returns:
+            The tool payload (status, content, ...)
+
+        Raises:
+            RuntimeError: On JSON-RPC errors, MCP error results and error statuses
+        """
+        message = await self.request("tools/call", {"name": name, "arguments": arguments}, timeout)
+        if "error" in message:
+            raise RuntimeError(f"JSON-RPC error: {message['error'].get('message')}")
+        result = message.get("result", {})
+        text = "".join(item.get("text", "") for item in result.get("content", []) if item.get("type") == "text")
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError:
+            payload = {"status": "error" if result.get("isError") else "success", "content": text}
+        if result.get("isError") or payload.get("status") in ("error", "failed"):
+            raise RuntimeError(f"{name} failed: {str(payload.get('content') or payload.get('error'))[:200]}")
+        return payload
+
+    async def close(self) -> None:
+        if self.process is None:
+            return
+        if self.process.stdin and not self.process.stdin.is_closing():
+            self.process.stdin.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), 10)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+        if self._reader:
+            self._reader.cancel()
+
+
+@dataclass
+class LoadStats:
+    """Measurements collected during a run."""
+
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    error_samples: list[str] = field(default_factory=list)
+    scenarios: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    pings: list[float] = field(default_factory=list)
+    memory: list[tuple[float, float]] = field(default_factory=list)
+
+
+class LoadGenerator:
+    """Runs the scenario mix against one server process."""
+
+    def __init__(self, client: MCPStdioClient, args: argparse.Namespace, repo: Path, stats: LoadStats):
+        self.client = client
+        self.args = args
+        self.repo = repo
+        self.stats = stats
+        self.mix = parse_mix(args.mix)
+        self.random = random.Random(args.seed)
+
+    async def _timed_call(self, label: str, tool: str, arguments: dict[str, Any]) -> Optional[dict[str, Any]]:
+        start = time.perf_counter()
+        try:
+            payload = await self.client.call_tool(tool, arguments, timeout=self.args.timeout)
+        except Exception as e:
+            self.stats.errors[label] += 1
+            if len(self.stats.error_samples) < 10:
+                self.stats.error_samples.append(f"{label}: {e}")
+            return None
+        self.stats.latencies[label].append(time.perf_counter() - start)
+        return payload
+
+    async def chat(self, index: int) -> None:
+        await self._timed_call(
+            "chat", "chat", {"prompt": f"Load test request {index}: explain event loops.", "model": self.args.model}
+        )
+
+    async def continuation(self, index: int) -> None:
+        payload = await self._timed_call(
+            "continuation[1]",
+            "chat",
+            {"prompt": f"Conversation {index}: let's design a cache.", "model": self.args.model},
+        )
+        continuation_id = find_continuation_id(payload)
+        for turn in range(2, self.args.turns + 2):
+            if not continuation_id:
+                return
+            payload = await self._timed_call(
+                f"continuation[{turn}]",
+                "chat",
+                {
+                    "prompt": f"Follow-up {turn}: how would eviction work? " + "Consider this detail. " * 20,
+                    "model": self.args.model,
+                    "continuation_id": continuation_id,
+                },
+            )
+            continuation_id = find_continuation_id(payload) or continuation_id
+
+    async def codereview(self, index: int) -> None:
+        await self._timed_call(
+            "codereview",
+            "codereview",
+            {
+                "step": f"Review the synthetic repository (load test {index}) for performance problems.",
+                "step_number": 1,
+                "total_steps": 1,
+                "next_step_required": False,
+                "findings": "Handlers transform records in a loop; checking for redundant work.",
+                "relevant_files": [str(self.repo)],
+                "files_checked": [str(self.repo)],
+                "confidence": "high",
+                "model": self.args.model,
+            },
+        )
+
+    async def consensus(self, index: int) -> None:
+        models = [
+            {"model": self.args.model, "stance": "for"},
+            {"model": self.args.consensus_model or self.args.model, "stance": "against"},
+        ]
+        continuation_id = None
+        for step in range(1, len(models) + 1):
+            arguments = {
+                "step": f"Should we adopt a write-behind cache? (load test {index})",
+                "step_number": step,
+                "total_steps": len(models),
+                "next_step_required": step < len(models),
+                "findings": "Latency would improve; consistency is the risk.",
+                "model": self.args.model,
+            }
+            if step == 1:
+                arguments["models"] = models
+            if continuation_id:
+                arguments["continuation_id"] = continuation_id
+            payload = await self._timed_call(f"consensus[{step}]", "consensus", arguments)
+            if payload is None:
+                return
+            continuation_id = find_continuation_id(payload) or continuation_id
+
+    def _pick(self) -> str:
+        names = list(self.mix)
+        return self.random.choices(names, weights=[self.mix[name] for name in names])[0]
+
+    async def run(self) -> float:
+        """Run until --requests scenarios completed or --duration elapsed; returns elapsed seconds."""
+        counter = 0
+        deadline = time.monotonic() + self.args.duration if self.args.duration else None
+
+        async def worker() -> None:
+            nonlocal counter
+            while True:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return
+                if deadline is None and counter >= self.args.requests:
+                    return
+                counter += 1
+                scenario = self._pick()
+                self.stats.scenarios[scenario] += 1
+                await getattr(self, scenario)(counter)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        return time.perf_counter() - start
+
+
+def _read_rss_mb(pid: int) -> Optional[float]:
+    try:
+        import psutil
+
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+async def monitor(client: MCPStdioClient, stats: LoadStats, ping_interval: float, stop: asyncio.Event) -> None:
+    """Ping the server and sample its memory until stop is set."""
+    start = time.perf_counter()
+    last_memory = 0.0
+
+    def sample_memory(now: float) -> None:
+        rss = _read_rss_mb(client.process.pid)
+        if rss is not None:
+            stats.memory.append((round(now - start, 1), round(rss, 1)))
+
+    while not stop.is_set():
+        sent = time.perf_counter()
+        try:
+            await client.request("ping", timeout=60)
+            stats.pings.append(time.perf_counter() - sent)
+        except Exception:
+            pass
+        now = time.perf_counter()
+        if now - last_memory >= 1.0:
+            last_memory = now
+            sample_memory(now)
+        try:
+            await asyncio.wait_for(stop.wait(), ping_interval)
+        except asyncio.TimeoutError:
+            pass
+    # Final sample so short runs still show growth
+    sample_memory(time.perf_counter())
+
+
+def build_report(stats: LoadStats, elapsed: float, args: argparse.Namespace) -> dict[str, Any]:
+    calls = sum(len(values) for values in stats.latencies.values())
+    errors = sum(stats.errors.values())
+    pings_ms = [p * 1000 for p in stats.pings]
+    labels = sorted(set(stats.latencies) | set(stats.errors))
+    return {
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "scenarios": dict(stats.scenarios),
+        "calls": calls,
+        "errors": errors,
+        "throughput_calls_per_s": round(calls / elapsed, 2) if elapsed else 0.0,
+        "latency": {
+            label: {**summarize_latencies(stats.latencies.get(label, [])), "errors": stats.errors.get(label, 0)}
+            for label in labels
+        },
+        "all_calls": summarize_latencies([v for values in stats.latencies.values() for v in values]),
+        "event_loop": {
+            **summarize_latencies(stats.pings),
+            "stalls": sum(1 for p in pings_ms if p > STALL_THRESHOLD_MS),
+            "stall_threshold_ms": STALL_THRESHOLD_MS,
+        },
+        "memory_mb": {
+            "start": stats.memory[0][1] if stats.memory else None,
+            "peak": max(m for _, m in stats.memory) if stats.memory else None,
+            "end": stats.memory[-1][1] if stats.memory else None,
+            "timeline": stats.memory,
+        },
+        "error_samples": stats.error_samples,
+    }
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print(
+        f"{report['calls']} calls ({report['errors']} errors) in {report['elapsed_s']}s at concurrency "
+        f"{report['concurrency']}: {report['throughput_calls_per_s']} calls/s"
+    )
+    print(f"Scenarios: {', '.join(f'{name}={count}' for name, count in sorted(report['scenarios'].items()))}")
+    print()
+    print(f"  {'Call':<18} {'Count':>6} {'Errors':>7} {'p50':>10} {'p95':>10} {'p99':>10} {'max':>10}")
+    rows = list(report["latency"].items()) + [("all", {**report["all_calls"], "errors": report["errors"]})]
+    for label, stats in rows:
+        if not stats.get("count"):
+            print(f"  {label:<18} {0:>6} {stats['errors']:>7}")
+            continue
+        print(
+            f"  {label:<18} {stats['count']:>6} {stats['errors']:>7} {stats['p50_ms']:>8.1f}ms "
+            f"{stats['p95_ms']:>8.1f}ms {stats['p99_ms']:>8.1f}ms {stats['max_ms']:>8.1f}ms"
+        )
+    loop = report["event_loop"]
+    if loop.get("count"):
+        print()
+        print(
+            f"Event loop (ping round trip): p50 {loop['p50_ms']}ms, p99 {loop['p99_ms']}ms, max {loop['max_ms']}ms, "
+            f"{loop['stalls']} of {loop['count']} pings above {loop['stall_threshold_ms']}ms"
+        )
+    memory = report["memory_mb"]
+    if memory["peak"] is not None:
+        print(f"Server RSS: start {memory['start']} MB, peak {memory['peak']} MB, end {memory['end']} MB")
+    for sample in report["error_samples"]:
+        print(f"  error: {sample}")
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="zen-load-") as tmp:
+        work_dir = Path(tmp)
+        repo = build_repository(work_dir / "repo", args.repo_files, args.repo_file_kb)
+        command = args.command.split() if args.command else [sys.executable, str(PROJECT_ROOT / "server.py")]
+        client = MCPStdioClient(command, server_environment(args, work_dir))
+        stats = LoadStats()
+        await client.start()
+        stop = asyncio.Event()
+        monitor_task = asyncio.create_task(monitor(client, stats, args.ping_interval, stop))
+        try:
+            elapsed = await LoadGenerator(client, args, repo, stats).run()
+        finally:
+            stop.set()
+            await monitor_task
+            await client.close()
+        return build_report(stats, elapsed, args)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Drive Zen MCP Server with concurrent tool calls over stdio")
+    parser.add_argument("--concurrency", type=int, default=8, help="Scenarios in flight at once")
+    parser.add_argument("--requests", type=int, default=100, help="Scenarios to run (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="Run for this many seconds instead")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--turns", type=int, default=3, help="Follow-ups per continuation scenario")
+    parser.add_argument("--repo-files", type=int, default=200, help="Files in the codereview directory")
+    parser.add_argument("--repo-file-kb", type=int, default=4, help="Approximate size of each file (KiB)")
+    parser.add_argument("--model", default="mock-model", help="Model for every call (default mock-model)")
+    parser.add_argument("--consensus-model", default="mock-small", help="Second model consulted by consensus")
+    parser.add_argument("--mock-profile", help="MOCK_PROVIDER_PROFILE for the server (name, JSON or file)")
+    parser.add_argument(
+        "--real-providers", action="store_true", help="Keep the environment's provider keys instead of the mock"
+    )
+    parser.add_argument("--command", help="Server command speaking MCP on stdio (default: this checkout's server.py)")
+    parser.add_argument("--ping-interval", type=float, default=0.1, help="Seconds between event-loop pings")
+    parser.add_argument("--timeout", type=float, default=600, help="Per-call timeout in seconds")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the scenario sequence")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 1 if report["calls"] == 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Logging overhead benchmark for Zen MCP Server
+
+Measures how long a logging call blocks the calling thread (in the server, the
+event loop thread) with the handler setup the server used before and after
+moving I/O to a QueueListener:
+
+- direct: RotatingFileHandler attached to the logger, every record written
+  (and occasionally rotated) synchronously by the caller
+- queued: QueueHandler on the logger, RotatingFileHandler on a QueueListener
+  thread
+
+It also times a typical file-embedding debug statement with DEBUG disabled,
+formatted eagerly with an f-string versus lazily/guarded.
+
+Usage:
+    python scripts/logging_benchmark.py [--records 20000] [--write-delay-ms 0.5]
+"""
+
+import argparse
+import logging
+import queue
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class SlowDiskHandler(RotatingFileHandler):
+    """RotatingFileHandler with an added per-write delay to simulate slow or contended storage."""
+
+    def __init__(self, *args, write_delay: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.write_delay = write_delay
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.write_delay:
+            time.sleep(self.write_delay)
+        super().emit(record)
+
+
+def _rotating_handler(path: Path, write_delay: float) -> RotatingFileHandler:
+    # Small files so rotation happens during the run, as it does in long sessions
+    handler = SlowDiskHandler(path, maxBytes=1024 * 1024, backupCount=2, encoding="utf-8", write_delay=write_delay)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+def _time_calls(logger: logging.Logger, records: int) -> list[float]:
+    samples = []
+    for i in range(records):
+        start = time.perf_counter()
+        logger.info("[FILES] Added file /project/src/module_%d.py, total tokens: %d", i, i * 37)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _describe(samples: list[float]) -> str:
+    ordered = sorted(samples)
+    p99 = ordered[int(len(ordered) * 0.99) - 1]
+    mean = statistics.fmean(samples)
+    return f"mean {mean * 1e6:7.1f} us  p99 {p99 * 1e6:7.1f} us  max {ordered[-1] * 1e3:6.2f} ms"
+
+
+def benchmark_direct(directory: Path, records: int, write_delay: float) -> list[float]:
+    logger = logging.getLogger("benchmark.direct")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = _rotating_handler(directory / "direct.log", write_delay)
+    logger.addHandler(handler)
+    try:
+        return _time_calls(logger, records)
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def benchmark_queued(directory: Path, records: int, write_delay: float) -> list[float]:
+    logger = logging.getLogger("benchmark.queued")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    log_queue = queue.SimpleQueue()
+    handler = _rotating_handler(directory / "queued.log", write_delay)
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    queue_handler = QueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+    try:
+        return _time_calls(logger, records)
+    finally:
+        logger.removeHandler(queue_handler)
+        listener.stop()
+        handler.close()
+
+
+def benchmark_disabled_debug(records: int) -> tuple[float, float]:
+    """Seconds per call for an eager f-string vs a guarded debug statement with DEBUG off."""
+    logger = logging.getLogger("benchmark.debug")
+    logger.setLevel(logging.INFO)
+    files = [f"/project/src/package/module_{i}.py" for i in range(200)]
+    tokens = 123_456
+
+    start = time.perf_counter()
+    for _ in range(records):
+        logger.debug(f"tool embedding {len(files)} new files: {', '.join(files)} ({tokens:,} tokens)")
+    eager = (time.perf_counter() - start) / records
+
+    start = time.perf_counter()
+    for _ in range(records):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"tool embedding {len(files)} new files: {', '.join(files)} ({tokens:,} tokens)")
+    guarded = (time.perf_counter() - start) / records
+    return eager, guarded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure logging overhead on the calling thread")
+    parser.add_argument("--records", type=int, default=20000, help="Records logged per configuration")
+    parser.add_argument(
+        "--write-delay-ms", type=float, default=0.0, help="Simulated extra latency per disk write (slow storage)"
+    )
+    args = parser.parse_args()
+    write_delay = args.write_delay_ms / 1000
+
+    with tempfile.TemporaryDirectory() as directory:
+        direct = benchmark_direct(Path(directory), args.records, write_delay)
+        queued = benchmark_queued(Path(directory), args.records, write_delay)
+
+    eager, guarded = benchmark_disabled_debug(args.records)
+
+    print(f"Logging cost on the calling thread ({args.records} records, +{args.write_delay_ms} ms per write)")
+    print(f"  direct file handler  {_describe(direct)}")
+    print(f"  queue + listener     {_describe(queued)}")
+    print("Disabled DEBUG statement with a 200-file list")
+    print(f"  eager f-string       {eager * 1e6:7.2f} us/call")
+    print(f"  guarded              {guarded * 1e6:7.2f} us/call")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
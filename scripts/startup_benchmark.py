@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for Zen MCP Server
+
+MCP clients spawn a new server process per session, so the cost of starting
+the server is paid on every session. This script measures, over several runs:
+
+- import time: wall-clock time of `import server` in a fresh interpreter
+- time-to-ready: from process spawn until the server answers `initialize`
+- time-to-tools: from process spawn until the first `tools/list` response,
+  which is what a client waits for before it can call any tool
+
+Each run uses a fresh subprocess. If no provider API key is set in the
+environment a placeholder Gemini key is used so the server can start; no
+model is ever called.
+
+Usage:
+    python scripts/startup_benchmark.py [--runs 5] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+PROVIDER_KEYS = (
+    "GEMINI_API_KEY",
+    "OPENAI_API_KEY",
+    "XAI_API_KEY",
+    "OPENROUTER_API_KEY",
+    "DIAL_API_KEY",
+    "CUSTOM_API_URL",
+)
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import server; print(time.perf_counter() - start)"
+
+
+def benchmark_env() -> dict[str, str]:
+    """Environment for benchmark subprocesses, with a placeholder key if none is configured."""
+    env = dict(os.environ)
+    if not any(env.get(key) for key in PROVIDER_KEYS):
+        env["GEMINI_API_KEY"] = "startup-benchmark-placeholder"
+    env.setdefault("LOG_LEVEL", "WARNING")
+    return env
+
+
+def measure_import(env: dict[str, str]) -> float:
+    """Seconds spent in `import server` in a fresh interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def _send(process: subprocess.Popen, message: dict) -> None:
+    process.stdin.write(json.dumps(message) + "\n")
+    process.stdin.flush()
+
+
+def _wait_for_response(process: subprocess.Popen, request_id: int) -> dict:
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("Server exited before responding")
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if message.get("id") == request_id:
+            return message
+
+
+def measure_handshake(env: dict[str, str]) -> tuple[float, float]:
+    """
+    Spawn the server on stdio and time the MCP handshake.
+
+    Returns:
+        (time-to-ready, time-to-tools) in seconds from spawn
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, str(PROJECT_ROOT / "server.py")],
+        cwd=PROJECT_ROOT,
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    try:
+        _send(
+            process,
+            {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "initialize",
+                "params": {
+                    "protocolVersion": "2024-11-05",
+                    "capabilities": {},
+                    "clientInfo": {"name": "startup-benchmark", "version": "1.0"},
+                },
+            },
+        )
+        _wait_for_response(process, 1)
+        ready = time.perf_counter() - start
+
+        _send(process, {"jsonrpc": "2.0", "method": "notifications/initialized"})
+        _send(process, {"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+        response = _wait_for_response(process, 2)
+        tools = time.perf_counter() - start
+        if "error" in response:
+            raise RuntimeError(f"tools/list failed: {response['error']}")
+        return ready, tools
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure Zen MCP Server startup time")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh processes per measurement")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    env = benchmark_env()
+    imports, ready, tools = [], [], []
+    for _ in range(args.runs):
+        imports.append(measure_import(env))
+        ready_time, tools_time = measure_handshake(env)
+        ready.append(ready_time)
+        tools.append(tools_time)
+
+    results = {
+        "runs": args.runs,
+        "import": summarize(imports),
+        "time_to_ready": summarize(ready),
+        "time_to_tools": summarize(tools),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Startup benchmark ({args.runs} runs, median [min-max])")
+        for label, key in (
+            ("import server", "import"),
+            ("time-to-ready", "time_to_ready"),
+            ("time-to-tools", "time_to_tools"),
+        ):
+            stats = results[key]
+            print(f"  {label:<14} {stats['median_ms']:>8.1f} ms  [{stats['min_ms']:.1f}-{stats['max_ms']:.1f}]")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
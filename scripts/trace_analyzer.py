@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Trace analyzer for Zen MCP Server
+
+Reads the JSON lines span file written when TRACING_ENABLED is set (see
+utils/tracing.py) and reports where request time goes:
+
+- per stage: number of spans, total / mean / p50 / p95 duration, and self time
+  (duration minus time spent in child spans), with self time as a share of
+  all traced request time
+- per tool: number of requests and their latency
+- optionally the slowest requests with their span tree
+
+Usage:
+    python scripts/trace_analyzer.py [logs/traces.jsonl] [--tool chat] [--slowest 5] [--json]
+"""
+
+import argparse
+import json
+import statistics
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_TRACE_FILE = PROJECT_ROOT / "logs" / "traces.jsonl"
+
+
+def load_spans(path: Path) -> list[dict[str, Any]]:
+    """Parse a trace file, skipping lines that are not valid span records."""
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(span, dict) and "trace_id" in span and "duration_ms" in span:
+                spans.append(span)
+    return spans
+
+
+def group_traces(spans: list[dict[str, Any]], tool: Optional[str] = None) -> dict[str, list[dict[str, Any]]]:
+    """Spans by trace id, keeping only complete traces (with a root span) for the given tool."""
+    traces: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    for span in spans:
+        traces[span["trace_id"]].append(span)
+    result = {}
+    for trace_id, trace_spans in traces.items():
+        root = _root(trace_spans)
+        if root is None:
+            continue
+        if tool and root.get("attrs", {}).get("tool") != tool:
+            continue
+        result[trace_id] = trace_spans
+    return result
+
+
+def _root(trace_spans: list[dict[str, Any]]) -> Optional[dict[str, Any]]:
+    return next((span for span in trace_spans if span.get("parent_id") is None), None)
+
+
+def self_times(trace_spans: list[dict[str, Any]]) -> dict[str, float]:
+    """Span id -> duration not covered by its direct children."""
+    child_time: dict[str, float] = defaultdict(float)
+    for span in trace_spans:
+        if span.get("parent_id"):
+            child_time[span["parent_id"]] += span["duration_ms"]
+    return {span["span_id"]: max(0.0, span["duration_ms"] - child_time[span["span_id"]]) for span in trace_spans}
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _summarize(values: list[float]) -> dict[str, float]:
+    return {
+        "count": len(values),
+        "total_ms": round(sum(values), 1),
+        "mean_ms": round(statistics.fmean(values), 1),
+        "p50_ms": round(_percentile(values, 0.5), 1),
+        "p95_ms": round(_percentile(values, 0.95), 1),
+    }
+
+
+def analyze(traces: dict[str, list[dict[str, Any]]]) -> dict[str, Any]:
+    """Aggregate traces into per-stage and per-tool statistics."""
+    durations: dict[str, list[float]] = defaultdict(list)
+    own: dict[str, float] = defaultdict(float)
+    retries: dict[str, int] = defaultdict(int)
+    errors: dict[str, int] = defaultdict(int)
+    tools: dict[str, list[float]] = defaultdict(list)
+    request_total = 0.0
+
+    for trace_spans in traces.values():
+        root = _root(trace_spans)
+        request_total += root["duration_ms"]
+        tools[root.get("attrs", {}).get("tool", "?")].append(root["duration_ms"])
+        own_times = self_times(trace_spans)
+        for span in trace_spans:
+            name = span["name"]
+            durations[name].append(span["duration_ms"])
+            own[name] += own_times[span["span_id"]]
+            retries[name] += sum(1 for event in span.get("events", []) if event.get("name") == "retry")
+            if span.get("status") == "error":
+                errors[name] += 1
+
+    stages = {}
+    for name, values in durations.items():
+        stages[name] = {
+            **_summarize(values),
+            "self_ms": round(own[name], 1),
+            "self_share": round(own[name] / request_total, 4) if request_total else 0.0,
+            "retries": retries[name],
+            "errors": errors[name],
+        }
+    return {
+        "requests": len(traces),
+        "request_time_ms": round(request_total, 1),
+        "stages": dict(sorted(stages.items(), key=lambda item: -item[1]["self_ms"])),
+        "tools": {name: _summarize(values) for name, values in sorted(tools.items())},
+    }
+
+
+def format_tree(trace_spans: list[dict[str, Any]]) -> list[str]:
+    """Indented span tree of one trace, children in start order."""
+    children: dict[Optional[str], list[dict[str, Any]]] = defaultdict(list)
+    for span in trace_spans:
+        children[span.get("parent_id")].append(span)
+    lines = []
+
+    def visit(span: dict[str, Any], depth: int) -> None:
+        attrs = ", ".join(f"{key}={value}" for key, value in span.get("attrs", {}).items() if value is not None)
+        retry_count = sum(1 for event in span.get("events", []) if event.get("name") == "retry")
+        extra = f" [{attrs}]" if attrs else ""
+        if retry_count:
+            extra += f" retries={retry_count}"
+        if span.get("status") == "error":
+            extra += f" ERROR {span.get('error', '')}"
+        lines.append(f"{'  ' * depth}{span['name']:<{32 - 2 * depth}} {span['duration_ms']:>10.1f} ms{extra}")
+        for child in sorted(children.get(span["span_id"], []), key=lambda s: s["start"]):
+            visit(child, depth + 1)
+
+    for root in children.get(None, []):
+        visit(root, 0)
+    return lines
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Summarize Zen MCP Server request traces")
+    parser.add_argument("trace_file", nargs="?", default=str(DEFAULT_TRACE_FILE), help="JSON lines span file")
+    parser.add_argument("--tool", help="Only include requests for this tool")
+    parser.add_argument("--slowest", type=int, default=0, help="Also print the span tree of the N slowest requests")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    path = Path(args.trace_file)
+    if not path.exists():
+        print(f"Trace file not found: {path} (start the server with TRACING_ENABLED=true)", file=sys.stderr)
+        return 1
+
+    traces = group_traces(load_spans(path), args.tool)
+    if not traces:
+        print("No complete traces found", file=sys.stderr)
+        return 1
+    results = analyze(traces)
+    slowest = sorted(traces.values(), key=lambda spans: -_root(spans)["duration_ms"])[: args.slowest]
+
+    if args.json:
+        results["slowest"] = [sorted(spans, key=lambda s: s["start"]) for spans in slowest]
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"{results['requests']} requests, {results['request_time_ms'] / 1000:.1f}s traced")
+    print()
+    print(f"{'Stage':<28} {'Count':>6} {'Mean':>10} {'p50':>10} {'p95':>10} {'Self':>11} {'Share':>7} {'Retries':>8}")
+    for name, stage in results["stages"].items():
+        print(
+            f"{name:<28} {stage['count']:>6} {stage['mean_ms']:>8.1f}ms {stage['p50_ms']:>8.1f}ms "
+            f"{stage['p95_ms']:>8.1f}ms {stage['self_ms']:>9.1f}ms {stage['self_share']:>6.1%} "
+            f"{stage['retries']:>8}"
+        )
+    print()
+    print(f"{'Tool':<28} {'Count':>6} {'Mean':>10} {'p50':>10} {'p95':>10}")
+    for name, tool in results["tools"].items():
+        print(
+            f"{name:<28} {tool['count']:>6} {tool['mean_ms']:>8.1f}ms {tool['p50_ms']:>8.1f}ms {tool['p95_ms']:>8.1f}ms"
+        )
+    for spans in slowest:
+        print()
+        print(f"Trace {spans[0]['trace_id']}")
+        for line in format_tree(spans):
+            print(f"  {line}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,16 +15,20 @@ Key Components:
 - Configuration: Manages API keys and model settings
 
 The server runs on stdio (standard input/output) and communicates using JSON-RPC messages
-as defined by the MCP protocol.
+as defined by the MCP protocol. With MCP_TRANSPORT=http a single long-running process
+serves many clients over streamable HTTP / SSE instead.
 """
 
 import asyncio
 import atexit
+import functools
+import json
 import logging
 import os
+import queue
 import sys
 import time
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from typing import Any, Optional
 
@@ -75,12 +79,15 @@ from tools import (  # noqa: E402
     PrecommitTool,
     RefactorTool,
     SecauditTool,
+    StatsTool,
     TestGenTool,
     ThinkDeepTool,
     TracerTool,
     VersionTool,
 )
-from tools.models import ToolOutput  # noqa: E402
+from tools.models import ToolOutput, ToolResultContent  # noqa: E402
+from utils.profiling import profile_tool_call  # noqa: E402
+from utils.tracing import traced  # noqa: E402
 
 # Configure logging for server operations
 # Can be controlled via LOG_LEVEL environment variable (DEBUG, INFO, WARNING, ERROR)
@@ -112,7 +119,6 @@ root_logger.handlers.clear()
 stderr_handler = logging.StreamHandler(sys.stderr)
 stderr_handler.setLevel(getattr(logging, log_level, logging.INFO))
 stderr_handler.setFormatter(LocalTimeFormatter(log_format))
-root_logger.addHandler(stderr_handler)
 
 # Note: MCP stdio_server interferes with stderr during tool execution
 # All logs are properly written to logs/mcp_server.log for monitoring
@@ -120,6 +126,10 @@ root_logger.addHandler(stderr_handler)
 # Set root logger level
 root_logger.setLevel(getattr(logging, log_level, logging.INFO))
 
+# Handlers that do I/O run on a background QueueListener thread. Loggers only enqueue
+# records, so disk writes and file rotation never block the event loop thread.
+output_handlers: list[logging.Handler] = [stderr_handler]
+
 # Add rotating file handler for local log monitoring
 
 try:
@@ -137,7 +147,7 @@ try:
     )
     file_handler.setLevel(getattr(logging, log_level, logging.INFO))
     file_handler.setFormatter(LocalTimeFormatter(log_format))
-    logging.getLogger().addHandler(file_handler)
+    output_handlers.append(file_handler)
 
     # Create a special logger for MCP activity tracking with size-based rotation
     mcp_logger = logging.getLogger("mcp_activity")
@@ -149,18 +159,28 @@ try:
     )
     mcp_file_handler.setLevel(logging.INFO)
     mcp_file_handler.setFormatter(LocalTimeFormatter("%(asctime)s - %(message)s"))
-    mcp_logger.addHandler(mcp_file_handler)
+    # MCP activity records reach the shared queue through the root logger; only they go to this file
+    mcp_file_handler.addFilter(logging.Filter("mcp_activity"))
+    output_handlers.append(mcp_file_handler)
     mcp_logger.setLevel(logging.INFO)
     # Ensure MCP activity also goes to stderr
     mcp_logger.propagate = True
 
+except Exception as e:
+    print(f"Warning: Could not set up file logging: {e}", file=sys.stderr)
+
+log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+root_logger.addHandler(QueueHandler(log_queue))
+log_listener = QueueListener(log_queue, *output_handlers, respect_handler_level=True)
+log_listener.start()
+# Flush queued records on shutdown
+atexit.register(log_listener.stop)
+
+if len(output_handlers) > 1:
     # Log setup info directly to root logger since logger isn't defined yet
     logging.info(f"Logging to: {log_dir / 'mcp_server.log'}")
     logging.info(f"Process PID: {os.getpid()}")
 
-except Exception as e:
-    print(f"Warning: Could not set up file logging: {e}", file=sys.stderr)
-
 logger = logging.getLogger(__name__)
 
 
@@ -279,6 +299,7 @@ TOOLS = {
     "challenge": ChallengeTool(),  # Critical challenge prompt wrapper to avoid automatic agreement
     "listmodels": ListModelsTool(),  # List all available AI models by provider
     "version": VersionTool(),  # Display server version and system information
+    "stats": StatsTool(),  # Latency, token and cache metrics for this server process
 }
 TOOLS = filter_disabled_tools(TOOLS)
 
@@ -364,6 +385,11 @@ PROMPT_TEMPLATES = {
         "description": "Show server version and system information",
         "template": "Show Zen MCP Server version",
     },
+    "stats": {
+        "name": "stats",
+        "description": "Show server latency, token and cache metrics",
+        "template": "Show Zen MCP Server metrics",
+    },
 }
 
 
@@ -388,6 +414,7 @@ def configure_providers():
     from providers.custom import CustomProvider
     from providers.dial import DIALModelProvider
     from providers.gemini import GeminiModelProvider
+    from providers.mock import MockModelProvider
     from providers.openai_provider import OpenAIModelProvider
     from providers.openrouter import OpenRouterProvider
     from providers.xai import XAIModelProvider
@@ -397,6 +424,7 @@ def configure_providers():
     has_native_apis = False
     has_openrouter = False
     has_custom = False
+    has_mock = False
 
     # Check for Gemini API key
     gemini_key = os.getenv("GEMINI_API_KEY")
@@ -462,6 +490,12 @@ def configure_providers():
         else:
             logger.debug("No custom API key provided (using unauthenticated access)")
 
+    # Check for the offline mock/replay provider (load testing, no API key needed)
+    if os.getenv("MOCK_PROVIDER_ENABLED", "false").lower() in ("true", "1", "yes", "on"):
+        valid_providers.append("Mock (offline)")
+        has_mock = True
+        logger.info("Mock provider enabled - mock-model and mock-small serve replayed/templated responses")
+
     # Register providers in priority order:
     # 1. Native APIs first (most direct and efficient)
     if has_native_apis:
@@ -474,6 +508,10 @@ def configure_providers():
         if dial_key and dial_key != "your_dial_api_key_here":
             ModelProviderRegistry.register_provider(ProviderType.DIAL, DIALModelProvider)
 
+    # Mock models have their own names, so their position only matters for name lookups
+    if has_mock:
+        ModelProviderRegistry.register_provider(ProviderType.MOCK, MockModelProvider)
+
     # 2. Custom provider second (for local/private models)
     if has_custom:
         # Factory function that creates CustomProvider with proper parameters
@@ -497,7 +535,8 @@ def configure_providers():
             "- XAI_API_KEY for X.AI GROK models\n"
             "- DIAL_API_KEY for DIAL models\n"
             "- OPENROUTER_API_KEY for OpenRouter (multiple models)\n"
-            "- CUSTOM_API_URL for local models (Ollama, vLLM, etc.)"
+            "- CUSTOM_API_URL for local models (Ollama, vLLM, etc.)\n"
+            "- MOCK_PROVIDER_ENABLED=true for the offline mock provider"
         )
 
     logger.info(f"Available providers: {', '.join(valid_providers)}")
@@ -585,6 +624,9 @@ async def handle_list_tools() -> list[Tool]:
     - description: Detailed explanation of what the tool does
     - inputSchema: JSON Schema defining the expected parameters
 
+    Schemas are built once and reused until the available models, restrictions,
+    default model or enabled tools change (see _get_tool_list).
+
     Returns:
         List of Tool objects representing all available tools
     """
@@ -610,6 +652,42 @@ async def handle_list_tools() -> list[Tool]:
                 pass
     except Exception as e:
         logger.debug(f"Could not log client info during list_tools: {e}")
+    tools = _get_tool_list()
+    logger.debug(f"Returning {len(tools)} tools to MCP client")
+    return tools
+
+
+# Tool list served by handle_list_tools: (fingerprint, tools). Building it renders every tool's
+# JSON schema, which in auto mode lists and describes every available model, so it is only
+# rebuilt when something the schemas depend on changes.
+_tool_list_cache: Optional[tuple[tuple, list[Tool]]] = None
+
+
+def _tool_list_fingerprint() -> tuple:
+    """
+    Fingerprint of everything the tool schemas depend on.
+
+    The model index fingerprint already covers registered providers, API key, restriction and
+    custom endpoint environment variables and catalog reloads; the default model decides
+    between auto-mode and normal model field schemas.
+    """
+    import config
+    from providers.registry import ModelProviderRegistry
+
+    return (
+        ModelProviderRegistry.get_model_index().fingerprint,
+        config.DEFAULT_MODEL,
+        os.getenv("DISABLED_TOOLS", ""),
+        tuple((name, id(tool)) for name, tool in TOOLS.items()),
+        config.DRY_RUN_ENABLED,
+    )
+
+
+def _build_tool_list() -> list[Tool]:
+    """Render Tool objects (schemas and annotations) for every enabled tool."""
+    import config
+    from utils.dry_run import DRY_RUN_ARGUMENT, DRY_RUN_FIELD_SCHEMA
+
     tools = []
 
     # Add all registered AI-powered tools from the TOOLS registry
@@ -618,24 +696,115 @@ async def handle_list_tools() -> list[Tool]:
         annotations = tool.get_annotations()
         tool_annotations = ToolAnnotations(**annotations) if annotations else None
 
+        input_schema = tool.get_input_schema()
+        if config.DRY_RUN_ENABLED and "properties" in input_schema:
+            # Handled by the server for every tool; never reaches the tool itself
+            input_schema = {**input_schema, "properties": {**input_schema["properties"]}}
+            input_schema["properties"][DRY_RUN_ARGUMENT] = DRY_RUN_FIELD_SCHEMA
+
         tools.append(
             Tool(
                 name=tool.name,
                 description=tool.description,
-                inputSchema=tool.get_input_schema(),
+                inputSchema=input_schema,
                 annotations=tool_annotations,
             )
         )
+    return tools
 
-    # Log cache efficiency info
-    if os.getenv("OPENROUTER_API_KEY") and os.getenv("OPENROUTER_API_KEY") != "your_openrouter_api_key_here":
-        logger.debug("OpenRouter registry cache used efficiently across all tool schemas")
 
-    logger.debug(f"Returning {len(tools)} tools to MCP client")
-    return tools
+def _get_tool_list() -> list[Tool]:
+    """
+    Return the tool list, rebuilding it only when the fingerprint changed.
+
+    Returns:
+        A new list of the cached Tool objects
+    """
+    global _tool_list_cache
+
+    from utils.metrics import record_cache_access
+
+    fingerprint = _tool_list_fingerprint()
+    cached = _tool_list_cache
+    hit = cached is not None and cached[0] == fingerprint
+    record_cache_access("tool_list", hit)
+    if not hit:
+        start = time.perf_counter()
+        cached = _tool_list_cache = (fingerprint, _build_tool_list())
+        logger.debug(f"Built tool schemas for {len(cached[1])} tools in {(time.perf_counter() - start) * 1000:.1f}ms")
+    return list(cached[1])
+
+
+def invalidate_tool_list_cache() -> None:
+    """Force the next list_tools request to rebuild every tool schema."""
+    global _tool_list_cache
+    _tool_list_cache = None
+
+
+def _tool_result_status(result: Any) -> str:
+    """Status label for tool metrics: the ToolOutput status of the first result item, or "ok"."""
+    if result and isinstance(result, list) and isinstance(result[0], ToolResultContent):
+        payload = result[0].payload
+        status = payload.status if isinstance(payload, ToolOutput) else (payload or {}).get("status")
+        if isinstance(status, str):
+            return status
+    return "ok"
+
+
+def _instrument_tool_call(handler):
+    """
+    Wrap the call_tool handler with per-call instrumentation.
+
+    Every call gets a root tracing span (a new trace id that the pipeline's child spans
+    attach to) and its latency and outcome are recorded in utils.metrics.
+    """
+
+    @functools.wraps(handler)
+    async def wrapper(name: str, arguments: dict[str, Any]) -> list[TextContent]:
+        from utils.metrics import record_tool_call
+        from utils.tracing import start_trace
+
+        start = time.perf_counter()
+        with start_trace("tool_call", tool=name, continuation=bool(arguments.get("continuation_id"))) as span:
+            try:
+                result = await handler(name, arguments)
+            except Exception:
+                record_tool_call(name, time.perf_counter() - start, "exception")
+                raise
+            status = _tool_result_status(result)
+            span.set(status=status)
+        record_tool_call(name, time.perf_counter() - start, status)
+        return result
+
+    return wrapper
+
+
+def _client_session_scope(handler):
+    """
+    Run the call_tool handler as the MCP session the request arrived on.
+
+    Over the HTTP transport this gives each client its own tool instances and default
+    conversation and holds one of the MCP_HTTP_MAX_CONCURRENT_CALLS slots for the call
+    (see utils/client_session.py). Over stdio it does nothing.
+    """
+
+    @functools.wraps(handler)
+    async def wrapper(name: str, arguments: dict[str, Any]) -> list[TextContent]:
+        from utils.client_session import client_call_scope
+
+        try:
+            session = server.request_context.session
+        except LookupError:
+            session = None
+        async with client_call_scope(session):
+            return await handler(name, arguments)
+
+    return wrapper
 
 
 @server.call_tool()
+@_instrument_tool_call
+@_client_session_scope
 async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
     """
     Handle incoming tool execution requests from MCP clients.
@@ -702,6 +871,51 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[TextCon
     except Exception:
         pass
 
+    # Per-call profiling request; never forwarded to the tool or stored in the thread
+    profile_request = arguments.pop("_profile", None)
+
+    # Budget dry run: assemble the context and report it instead of calling the model
+    import config
+    from utils.dry_run import DRY_RUN_ARGUMENT, is_dry_run_requested
+
+    if is_dry_run_requested(arguments.pop(DRY_RUN_ARGUMENT, False)) and config.DRY_RUN_ENABLED and name in TOOLS:
+        return await _dry_run_tool_call(name, arguments, profile_request)
+    return await _dispatch_tool_call(name, arguments, profile_request)
+
+
+async def _dry_run_tool_call(name: str, arguments: dict[str, Any], profile_request: Any) -> list[TextContent]:
+    """
+    Run a tool call as a budget dry run and return the context assembly report.
+
+    The call goes through the normal pipeline on a copy of the tool and stops where the
+    provider would be called (see utils/dry_run.py). Conversation threads are not modified.
+    """
+    from utils.dry_run import DryRunComplete, dry_run_scope, format_report
+
+    logger.info(f"Dry run of tool '{name}'")
+    with dry_run_scope(name) as report:
+        try:
+            result = await _dispatch_tool_call(name, arguments, profile_request)
+            report.outcome = _tool_result_status(result)
+            if report.outcome == "ok" and result and isinstance(result[0], TextContent):
+                # Some early returns (e.g. prompt size checks) are plain JSON text
+                try:
+                    report.outcome = json.loads(result[0].text).get("status", "ok")
+                except (ValueError, AttributeError):
+                    pass
+        except DryRunComplete:
+            pass
+    output = ToolOutput(
+        status="dry_run",
+        content=format_report(report),
+        content_type="markdown",
+        metadata={"dry_run": report.to_dict()},
+    )
+    return [ToolResultContent.from_output(output)]
+
+
+async def _dispatch_tool_call(name: str, arguments: dict[str, Any], profile_request: Any) -> list[TextContent]:
+    """Reconstruct conversation context, resolve the model and execute the tool (see handle_call_tool)."""
     # Handle thread context reconstruction if continuation_id is present
     if "continuation_id" in arguments and arguments["continuation_id"]:
         continuation_id = arguments["continuation_id"]
@@ -726,7 +940,16 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[TextCon
     # Route to AI-powered tools that require Gemini API calls
     if name in TOOLS:
         logger.info(f"Executing tool '{name}' with {len(arguments)} parameter(s)")
-        tool = TOOLS[name]
+        from utils.client_session import session_tool
+
+        # Over the HTTP transport each client session gets its own tool instances
+        tool = session_tool(name, TOOLS[name])
+
+        from utils.dry_run import current_dry_run, isolated_tool, note_model
+
+        if current_dry_run() is not None:
+            # A dry run must not advance the tool's workflow state
+            tool = isolated_tool(tool)
 
         # EARLY MODEL RESOLUTION AT MCP BOUNDARY
         # Resolve model before passing to tool - this ensures consistent model handling
@@ -751,13 +974,13 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[TextCon
         if not tool.requires_model():
             logger.debug(f"Tool {name} doesn't require model resolution - skipping model validation")
             # Execute tool directly without model context
-            return await tool.execute(arguments)
+            return await profile_tool_call(name, tool.execute, arguments, profile_request)
 
         # Handle auto mode at MCP boundary - resolve to specific model
         if model_name.lower() == "auto":
             # Get tool category to determine appropriate model
             tool_category = tool.get_model_category()
-            resolved_model = ModelProviderRegistry.get_preferred_fallback_model(tool_category)
+            resolved_model = ModelProviderRegistry.select_auto_model(tool_category)
             logger.info(f"Auto mode resolved to {resolved_model} for {name} (category: {tool_category.value})")
             model_name = resolved_model
             # Update arguments with resolved model
@@ -783,12 +1006,13 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[TextCon
                 content_type="text",
                 metadata={"tool_name": name, "requested_model": model_name},
             )
-            return [TextContent(type="text", text=error_output.model_dump_json())]
+            return [ToolResultContent.from_output(error_output)]
 
         # Create model context with resolved model and option
         model_context = ModelContext(model_name, model_option)
         arguments["_model_context"] = model_context
         arguments["_resolved_model_name"] = model_name
+        note_model(model_name, model_context.capabilities.context_window)
         logger.debug(
             f"Model context created for {model_name} with {model_context.capabilities.context_window} token capacity"
         )
@@ -802,27 +1026,19 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[TextCon
             file_size_check = check_total_file_size(arguments["files"], model_name)
             if file_size_check:
                 logger.warning(f"File size check failed for {name} with model {model_name}")
-                return [TextContent(type="text", text=ToolOutput(**file_size_check).model_dump_json())]
+                return [ToolResultContent.from_output(ToolOutput(**file_size_check))]
 
         # Execute tool with pre-resolved model context
-        result = await tool.execute(arguments)
+        result = await profile_tool_call(name, tool.execute, arguments, profile_request)
         logger.info(f"Tool '{name}' execution completed")
 
         # After execution, add the assistant's response to the conversation thread
         if "continuation_id" in arguments and arguments["continuation_id"]:
             try:
                 from utils.conversation_memory import add_turn
-                import json
 
-                if result and isinstance(result, list) and result and isinstance(result[0], TextContent):
-                    response_text = result[0].text
-                    
-                    try:
-                        parsed_output = json.loads(response_text)
-                        if isinstance(parsed_output, dict) and 'content' in parsed_output:
-                            response_text = parsed_output['content']
-                    except (json.JSONDecodeError, TypeError):
-                        pass
+                if result and isinstance(result, list) and isinstance(result[0], TextContent):
+                    response_text = _extract_response_content(result[0])
 
                     add_turn(
                         thread_id=arguments["continuation_id"],
@@ -848,6 +1064,27 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[TextCon
         return [TextContent(type="text", text=f"Unknown tool: {name}")]
 
 
+def _extract_response_content(item: TextContent) -> str:
+    """
+    Get the assistant content to record in conversation memory from a tool result.
+
+    In-tree tools return ToolResultContent, whose structured payload is read directly
+    so large responses are never parsed back from their JSON text. Plain TextContent
+    (e.g. from a tool that builds its own response) falls back to parsing the text.
+    """
+    if isinstance(item, ToolResultContent) and item.payload is not None:
+        content = item.result_content
+        return content if content is not None else item.text
+
+    try:
+        parsed_output = json.loads(item.text)
+        if isinstance(parsed_output, dict) and isinstance(parsed_output.get("content"), str):
+            return parsed_output["content"]
+    except (json.JSONDecodeError, TypeError):
+        pass
+    return item.text
+
+
 def parse_model_option(model_string: str) -> tuple[str, Optional[str]]:
     """
     Parse model:option format into model name and option.
@@ -935,6 +1172,7 @@ Remember: Only suggest follow-ups when they would genuinely add value to the dis
 "Claude to use the continuation_id when you do."""
 
 
+@traced()
 async def reconstruct_thread_context(arguments: dict[str, Any]) -> dict[str, Any]:
     """
     Reconstruct conversation context for stateless-to-stateful thread continuation.
@@ -1077,6 +1315,14 @@ async def reconstruct_thread_context(arguments: dict[str, Any]) -> dict[str, Any
 
     model_context = ModelContext.from_arguments(arguments)
 
+    # Record demand so the context window is split by what this thread actually needs
+    from utils.conversation_memory import estimate_thread_demand
+
+    model_context.update_demand(
+        prompt=model_context.estimate_tokens(arguments.get("prompt", "")),
+        **estimate_thread_demand(context, arguments.get("files")),
+    )
+
     # Build conversation history with model-specific limits
     logger.debug(f"[CONVERSATION_DEBUG] Building conversation history for thread {continuation_id}")
     logger.debug(f"[CONVERSATION_DEBUG] Thread has {len(context.turns)} turns, tool: {context.tool_name}")
@@ -1324,11 +1570,32 @@ async def main():
     disconnects or an error occurs.
 
     The server communicates via standard input/output streams using the
-    MCP protocol's JSON-RPC message format.
+    MCP protocol's JSON-RPC message format. With MCP_TRANSPORT=http it instead
+    serves many clients over streamable HTTP / SSE (see utils/http_transport.py).
     """
     # Validate and configure providers based on available API keys
     configure_providers()
 
+    # Pick up edits to custom_models.json without restarting the server
+    from providers.openrouter_registry import start_catalog_watcher
+
+    start_catalog_watcher()
+
+    # Periodically write metrics for Prometheus when METRICS_EXPORT_INTERVAL is set
+    from utils.metrics import start_metrics_exporter
+
+    start_metrics_exporter()
+
+    # Record per-stage request spans when TRACING_ENABLED is set
+    from utils.tracing import configure_tracing
+
+    configure_tracing()
+
+    # Report callbacks that block the event loop when LOOP_WATCHDOG_ENABLED is set
+    from utils.loop_watchdog import start_loop_watchdog
+
+    start_loop_watchdog()
+
     # Log startup message
     logger.info("Zen MCP Server starting up...")
     logger.info(f"Log level: {log_level}")
@@ -1352,21 +1619,33 @@ async def main():
     logger.info(f"Available tools: {list(TOOLS.keys())}")
     logger.info("Server ready - waiting for tool requests...")
 
+    from config import MCP_TRANSPORT
+
+    if MCP_TRANSPORT == "http":
+        # One long-running process serving many clients over streamable HTTP / SSE
+        from utils.http_transport import serve_http
+
+        await serve_http(server, _initialization_options())
+        return
+    if MCP_TRANSPORT != "stdio":
+        logger.warning(f"Unknown MCP_TRANSPORT '{MCP_TRANSPORT}', using stdio")
+
     # Run the server using stdio transport (standard input/output)
     # This allows the server to be launched by MCP clients as a subprocess
     async with stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="zen",
-                server_version=__version__,
-                capabilities=ServerCapabilities(
-                    tools=ToolsCapability(),  # Advertise tool support capability
-                    prompts=PromptsCapability(),  # Advertise prompt support capability
-                ),
-            ),
-        )
+        await server.run(read_stream, write_stream, _initialization_options())
+
+
+def _initialization_options() -> InitializationOptions:
+    """Server identity and capabilities announced to clients during the handshake."""
+    return InitializationOptions(
+        server_name="zen",
+        server_version=__version__,
+        capabilities=ServerCapabilities(
+            tools=ToolsCapability(),  # Advertise tool support capability
+            prompts=PromptsCapability(),  # Advertise prompt support capability
+        ),
+    )
 
 
 def run():
@@ -6,6 +6,7 @@ import asyncio
 import importlib
 import os
 import sys
+import tempfile
 from pathlib import Path
 
 import pytest
@@ -23,6 +24,13 @@ if not os.environ.get("OPENAI_API_KEY"):
 if not os.environ.get("XAI_API_KEY"):
     os.environ["XAI_API_KEY"] = "dummy-key-for-tests"
 
+# Keep conversation storage (and its blob store) out of the repository root
+os.environ["ZEN_SESSION_DIR"] = tempfile.mkdtemp(prefix="zen-session-")
+# Same for the persistent disk cache, which would otherwise live in ~/.cache
+os.environ["DISK_CACHE_DIR"] = tempfile.mkdtemp(prefix="zen-disk-cache-")
+# Learned token estimate corrections would make budgets depend on test order
+os.environ["TOKEN_CALIBRATION_ENABLED"] = "false"
+
 # Set default model to a specific value for tests to avoid auto mode
 # This prevents all tests from failing due to missing model parameter
 os.environ["DEFAULT_MODEL"] = "gemini-2.5-flash"
@@ -188,3 +196,12 @@ def mock_provider_availability(request, monkeypatch):
         return False
 
     monkeypatch.setattr(BaseTool, "is_effective_auto_mode", mock_is_effective_auto_mode)
+
+
+@pytest.fixture(autouse=True)
+def reset_model_router():
+    """Keep routing statistics recorded by one test from steering auto mode in another."""
+    from providers.router import get_model_router
+
+    get_model_router().reset()
+    yield
@@ -0,0 +1,286 @@
+"""
+Tests for provider admission control
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from providers.admission import (
+    AdmissionController,
+    AdmissionLimits,
+    AdmissionTimeoutError,
+    TokenBucket,
+    get_admission_controller,
+    parse_limit_spec,
+    reset_admission_controller,
+)
+from providers.base import ModelCapabilities, ProviderType
+from providers.mock import FixtureStore, MockModelProvider, MockProfile, MockProviderError, MockRateLimitError
+from providers.registry import ModelProviderRegistry
+from providers.router import agenerate_content_with_stats
+
+
+def _controller(**kwargs) -> AdmissionController:
+    options = {
+        "concurrency": {},
+        "requests_per_minute": {},
+        "tokens_per_minute": {},
+        "max_inflight_chars": 0,
+        "tool_priorities": {},
+        "priority_aging": 10,
+        "timeout": 5,
+    }
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+def _mock(**profile) -> MockModelProvider:
+    return MockModelProvider(profile=MockProfile.from_dict(profile), fixtures=FixtureStore())
+
+
+async def _hold(controller, log, name, seconds=0.05, model="llama3.2", tokens=0, size=0, tool=None):
+    async with controller.admit("custom", model, tokens, size, tool_name=tool):
+        log.append(name)
+        await asyncio.sleep(seconds)
+
+
+@pytest.fixture(autouse=True)
+def fresh_controller():
+    reset_admission_controller()
+    yield
+    reset_admission_controller()
+
+
+class TestLimits:
+    """Limit parsing, precedence and token buckets."""
+
+    def test_parse_limit_spec(self):
+        assert parse_limit_spec("custom=2, O3=4,bad,x=y") == {"custom": 2.0, "o3": 4.0}
+
+    def test_environment_overrides_catalog(self):
+        capabilities = ModelCapabilities(
+            provider=ProviderType.CUSTOM,
+            model_name="llama3.2",
+            friendly_name="Custom",
+            context_window=128_000,
+            max_output_tokens=8_000,
+            max_concurrency=4,
+            tokens_per_minute=50_000,
+        )
+        controller = _controller(concurrency={"custom": 2, "llama3.2": 1}, requests_per_minute={"local-llama": 30})
+
+        provider_limits, model_limits = controller.limits_for("custom", "local-llama", capabilities)
+
+        assert provider_limits == AdmissionLimits(max_concurrency=2)
+        assert model_limits == AdmissionLimits(max_concurrency=1, requests_per_minute=30, tokens_per_minute=50_000)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(per_minute=600)
+        now = bucket.updated
+        bucket.take(600, now)
+
+        assert bucket.wait_time(10, now) == pytest.approx(1.0)
+        assert bucket.wait_time(10, now + 1.0) == 0
+        # Requests larger than a minute of budget only need a full bucket
+        assert bucket.wait_time(10_000, now + 60) == 0
+
+
+class TestQueueing:
+    """Concurrency slots, priorities, rate limits and memory backpressure."""
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit(self):
+        controller = _controller(concurrency={"custom": 2})
+        active = peak = 0
+
+        async def call():
+            nonlocal active, peak
+            async with controller.admit("custom", "llama3.2", 10, 10):
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.02)
+                active -= 1
+
+        await asyncio.gather(*(call() for _ in range(6)))
+
+        assert peak == 2
+        assert controller.describe()["scopes"]["custom"]["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_priority_order_with_aging(self):
+        controller = _controller(concurrency={"custom": 1}, tool_priorities={"chat": 0, "codereview": 2})
+        log = []
+
+        holder = asyncio.create_task(_hold(controller, log, "first", seconds=0.05))
+        await asyncio.sleep(0.01)
+        review = asyncio.create_task(_hold(controller, log, "codereview", seconds=0, tool="codereview"))
+        await asyncio.sleep(0.01)
+        chat = asyncio.create_task(_hold(controller, log, "chat", seconds=0, tool="chat"))
+        await asyncio.gather(holder, review, chat)
+
+        assert log == ["first", "chat", "codereview"]
+
+    @pytest.mark.asyncio
+    async def test_tokens_per_minute_budget(self):
+        controller = _controller(tokens_per_minute={"llama3.2": 6_000})
+        log = []
+
+        await _hold(controller, log, "big", seconds=0, tokens=6_000)
+        start = time.monotonic()
+        await _hold(controller, log, "small", seconds=0, tokens=30)
+
+        # 6000 tokens/minute refill at 100 per second
+        assert time.monotonic() - start >= 0.25
+
+    @pytest.mark.asyncio
+    async def test_waiting_call_reserves_its_model_only(self):
+        controller = _controller(tokens_per_minute={"llama3.2": 6_000})
+        log = []
+        await _hold(controller, log, "drain", seconds=0, tokens=6_000)
+
+        blocked = asyncio.create_task(_hold(controller, log, "large", seconds=0, tokens=20))
+        await asyncio.sleep(0.01)
+        later = asyncio.create_task(_hold(controller, log, "later", seconds=0, tokens=1))
+        other = asyncio.create_task(_hold(controller, log, "other-model", seconds=0, model="qwen"))
+        await asyncio.gather(blocked, later, other)
+
+        assert log == ["drain", "other-model", "large", "later"]
+
+    @pytest.mark.asyncio
+    async def test_inflight_prompt_cap(self):
+        controller = _controller(max_inflight_chars=100)
+        log = []
+
+        first = asyncio.create_task(_hold(controller, log, "80", seconds=0.05, size=80))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(_hold(controller, log, "50", seconds=0, size=50))
+        await asyncio.sleep(0.01)
+        assert log == ["80"]
+        await asyncio.gather(first, second)
+
+        # A prompt above the cap runs once nothing else is in flight
+        await _hold(controller, log, "500", seconds=0, size=500)
+        assert log == ["80", "50", "500"]
+
+    @pytest.mark.asyncio
+    async def test_timeout(self):
+        controller = _controller(concurrency={"custom": 1}, timeout=0.05)
+        log = []
+        holder = asyncio.create_task(_hold(controller, log, "holder", seconds=0.2))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(AdmissionTimeoutError):
+            await _hold(controller, log, "late", seconds=0)
+        assert controller.describe()["queued"] == 0
+        await holder
+
+
+class TestProviderCalls:
+    """agenerate_content_with_stats runs admitted calls off the event loop."""
+
+    @pytest.mark.asyncio
+    async def test_calls_run_concurrently_within_limits(self, monkeypatch):
+        monkeypatch.setattr("config.ADMISSION_CONCURRENCY", "mock-model=2")
+        provider = _mock(latency_ms=100)
+
+        start = time.monotonic()
+        responses = await asyncio.gather(
+            *(agenerate_content_with_stats(provider, prompt=f"q{i}", model_name="mock") for i in range(4))
+        )
+        elapsed = time.monotonic() - start
+
+        assert len(responses) == 4
+        # Two waves of two parallel calls
+        assert 0.2 <= elapsed < 0.35
+        assert get_admission_controller().describe()["scopes"]["mock/mock-model"]["max_concurrency"] == 2
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_drains_request_bucket(self, monkeypatch):
+        monkeypatch.setattr("config.ADMISSION_RPM", "mock=600")
+        provider = _mock(rate_limit_probability=1.0, max_retries=0)
+
+        with pytest.raises(MockRateLimitError):
+            await agenerate_content_with_stats(provider, prompt="x", model_name="mock")
+
+        bucket = get_admission_controller()._scopes["mock"].requests
+        assert bucket.wait_time(1, time.monotonic()) > 0
+
+    @pytest.mark.asyncio
+    async def test_provider_errors_release_the_slot(self, monkeypatch):
+        monkeypatch.setattr("config.ADMISSION_CONCURRENCY", "mock=1")
+        provider = _mock(error_probability=1.0, max_retries=0)
+
+        for _ in range(2):
+            with pytest.raises(MockProviderError):
+                await agenerate_content_with_stats(provider, prompt="x", model_name="mock")
+        assert get_admission_controller().describe()["scopes"]["mock"]["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_chat_calls(self, monkeypatch):
+        from server import handle_call_tool
+
+        monkeypatch.setenv("MOCK_PROVIDER_PROFILE", '{"latency_ms": 200}')
+        ModelProviderRegistry.register_provider(ProviderType.MOCK, MockModelProvider)
+        ModelProviderRegistry.invalidate_model_index()
+        try:
+            start = time.monotonic()
+            results = await asyncio.gather(
+                *(handle_call_tool("chat", {"prompt": f"Question {i}", "model": "mock"}) for i in range(3))
+            )
+            elapsed = time.monotonic() - start
+        finally:
+            ModelProviderRegistry.unregister_provider(ProviderType.MOCK)
+            ModelProviderRegistry.invalidate_model_index()
+
+        for result in results:
+            assert json.loads(result[0].text)["status"] in ("success", "continuation_available")
+        assert elapsed < 0.5
+
+    @pytest.mark.asyncio
+    async def test_overlapping_workflow_calls_keep_their_own_steps(self, monkeypatch):
+        from server import handle_call_tool
+
+        monkeypatch.setenv("MOCK_PROVIDER_PROFILE", '{"latency_ms": 200}')
+        ModelProviderRegistry.register_provider(ProviderType.MOCK, MockModelProvider)
+        ModelProviderRegistry.invalidate_model_index()
+
+        def arguments(topic):
+            return {
+                "step": f"Think about {topic}",
+                "step_number": 1,
+                "total_steps": 1,
+                "next_step_required": False,
+                "findings": f"Finding about {topic}",
+                "model": "mock",
+            }
+
+        try:
+            first, second = await asyncio.gather(
+                handle_call_tool("thinkdeep", arguments("caching")), handle_call_tool("thinkdeep", arguments("routing"))
+            )
+        finally:
+            ModelProviderRegistry.unregister_provider(ProviderType.MOCK)
+            ModelProviderRegistry.invalidate_model_index()
+
+        first, second = json.loads(first[0].text), json.loads(second[0].text)
+        # The second call only starts once the first one's expert call has returned
+        assert first["complete_thinkdeep"]["initial_request"] == "Think about caching"
+        assert first["complete_thinking"]["key_findings"][-1] == "Step 1: Finding about caching"
+        assert "Step 1: Finding about routing" not in first["complete_thinking"]["key_findings"]
+        assert second["complete_thinkdeep"]["initial_request"] == "Think about routing"
+        assert second["complete_thinking"]["key_findings"][-1] == "Step 1: Finding about routing"
+
+    @pytest.mark.asyncio
+    async def test_stats_tool_reports_admission(self, monkeypatch):
+        from tools.stats import StatsTool
+
+        monkeypatch.setattr("config.ADMISSION_CONCURRENCY", "mock=3")
+        await agenerate_content_with_stats(_mock(), prompt="x", model_name="mock", tool_name="chat")
+
+        result = await StatsTool().execute({})
+        content = json.loads(result[0].text)["content"]
+        assert "## Admission Control" in content
+        assert "- mock (concurrency 3): 0 in flight, 0 queued" in content
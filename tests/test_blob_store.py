@@ -0,0 +1,121 @@
+"""
+Tests for the content-addressed blob store used for large conversation attachments
+"""
+
+import time
+from unittest.mock import patch
+
+from utils.blob_store import BLOB_REF_PREFIX, BlobStore, is_blob_ref
+from utils.conversation_memory import add_turn, create_thread, get_conversation_image_list, get_thread
+from utils.storage_backend import FileBasedStorage
+
+DATA_URL = "data:image/png;base64," + "iVBORw0KGgo" * 2000
+
+
+class TestBlobStore:
+    """Test blob storage, reference counting and garbage collection"""
+
+    def test_put_is_content_addressed(self, tmp_path):
+        """Identical content is stored once and resolves back unchanged"""
+        store = BlobStore(tmp_path / "blobs")
+
+        ref_a = store.put(DATA_URL, "thread-a")
+        ref_b = store.put(DATA_URL, "thread-b")
+
+        assert ref_a == ref_b
+        assert is_blob_ref(ref_a)
+        assert ref_a.startswith(BLOB_REF_PREFIX)
+        assert store.get(ref_a) == DATA_URL
+        assert store.refcount(ref_a) == 2
+        assert len(list((tmp_path / "blobs").glob("??/*"))) == 1
+
+    def test_release_owner_collects_unreferenced_blobs(self, tmp_path):
+        """A blob survives until its last owner is released"""
+        store = BlobStore(tmp_path / "blobs")
+        ref = store.put(DATA_URL, "thread-a")
+        store.put(DATA_URL, "thread-b")
+
+        assert store.release_owner("thread-a") == 0
+        assert store.get(ref) == DATA_URL
+
+        assert store.release_owner("thread-b") == 1
+        assert store.get(ref) is None
+        assert store.refcount(ref) == 0
+
+    def test_reference_index_survives_restart(self, tmp_path):
+        """Refcounts are reloaded from the persisted index"""
+        ref = BlobStore(tmp_path / "blobs").put(DATA_URL, "thread-a")
+
+        reopened = BlobStore(tmp_path / "blobs")
+
+        assert reopened.refcount(ref) == 1
+        assert reopened.owners() == ["thread-a"]
+
+    def test_collect_garbage_removes_orphans_only(self, tmp_path):
+        """Blobs without owners are removed; referenced blobs are kept"""
+        store = BlobStore(tmp_path / "blobs")
+        kept = store.put(DATA_URL, "thread-a")
+        orphan = tmp_path / "blobs" / "ab" / ("ab" + "0" * 62)
+        orphan.parent.mkdir(parents=True, exist_ok=True)
+        orphan.write_text("stale")
+
+        assert store.collect_garbage(grace_seconds=0) == 1
+        assert not orphan.exists()
+        assert store.get(kept) == DATA_URL
+
+    def test_processes_sharing_a_directory_keep_each_others_references(self, tmp_path):
+        """Index updates merge with the file, so one process never drops another's references"""
+        first = BlobStore(tmp_path / "blobs")
+        second = BlobStore(tmp_path / "blobs")
+
+        other = second.put(DATA_URL + "other", "thread-b")
+        first.put(DATA_URL, "thread-a")
+        first.put(DATA_URL + "more", "thread-c")
+        first.release_owner("thread-c")
+
+        assert first.refcount(other) == 1
+        assert first.collect_garbage(grace_seconds=0) == 0
+        assert second.get(other) == DATA_URL + "other"
+        assert sorted(BlobStore(tmp_path / "blobs").owners()) == ["thread-a", "thread-b"]
+
+    def test_thread_expiry_releases_blobs(self, tmp_path):
+        """Purging an expired thread from storage garbage-collects its blobs"""
+        storage = FileBasedStorage(storage_dir=str(tmp_path))
+        ref = storage.blobs.put(DATA_URL, "12345678-1234-1234-1234-123456789012")
+        storage.setex("thread:12345678-1234-1234-1234-123456789012", 1, "{}")
+
+        with patch("utils.storage_backend.time.time", return_value=time.time() + 10):
+            assert storage.purge_expired() == 1
+
+        assert storage.blobs.get(ref) is None
+
+    def test_get_reloads_from_file_without_deadlock(self, tmp_path):
+        """Loading a thread from disk re-populates the cache under the same lock"""
+        FileBasedStorage(storage_dir=str(tmp_path)).setex(
+            "thread:12345678-1234-1234-1234-123456789012",
+            60,
+            '{"thread_id": "12345678-1234-1234-1234-123456789012", "turns": []}',
+        )
+
+        fresh = FileBasedStorage(storage_dir=str(tmp_path))
+
+        assert fresh.get("thread:12345678-1234-1234-1234-123456789012") is not None
+
+
+class TestConversationBlobReferences:
+    """Test that conversation turns hold blob references instead of raw image data"""
+
+    def test_large_images_stored_as_references(self, tmp_path):
+        """Data-URL images are moved to the blob store and resolved on read"""
+        storage = FileBasedStorage(storage_dir=str(tmp_path))
+        with patch("utils.conversation_memory.get_storage", return_value=storage):
+            thread_id = create_thread("chat", {"prompt": "look"})
+            assert add_turn(thread_id, "user", "see screenshot", images=[DATA_URL, "/tmp/diagram.png"])
+
+            context = get_thread(thread_id)
+            stored_images = context.turns[0].images
+
+            assert is_blob_ref(stored_images[0])
+            assert stored_images[1] == "/tmp/diagram.png"
+            assert len(context.model_dump_json()) < len(DATA_URL)
+            assert get_conversation_image_list(context) == [DATA_URL, "/tmp/diagram.png"]
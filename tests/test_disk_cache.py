@@ -0,0 +1,195 @@
+"""
+Tests for the persistent cross-process disk cache
+"""
+
+import multiprocessing
+import sqlite3
+import time
+
+import pytest
+
+from utils import disk_cache
+from utils.disk_cache import DiskCache, FileSignature, get_disk_cache, reset_disk_cache
+from utils.file_utils import read_file_content
+from utils.tokenizer import TokenizerService
+
+
+class FakeEncoding:
+    """Stand-in for a tiktoken Encoding: one token per whitespace-separated word"""
+
+    name = "o200k_base"
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode_ordinary(self, text):
+        self.calls += 1
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        self.calls += len(texts)
+        return [text.split() for text in texts]
+
+
+def _signature(**fields) -> FileSignature:
+    values = {"size": 10, "mtime_ns": 1_000_000_000, "ctime_ns": 1_000_000_000, "inode": 1}
+    values.update(fields)
+    return FileSignature(**values)
+
+
+def _writer(directory: str, worker: int) -> int:
+    cache = DiskCache(directory, max_bytes=10 * 1024 * 1024)
+    stored = 0
+    for i in range(50):
+        stored += cache.put("artifact", f"{worker}-{i}", b"x" * 100)
+        assert cache.get("artifact", f"{(worker + 1) % 4}-0") in (None, b"x" * 100)
+    cache.close()
+    return stored
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr("config.DISK_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr("config.DISK_CACHE_ENABLED", True)
+    reset_disk_cache()
+    yield tmp_path / "cache"
+    reset_disk_cache()
+
+
+class TestDiskCache:
+    """Entries, signatures, eviction and robustness."""
+
+    def test_round_trip_and_signature(self, tmp_path):
+        cache = DiskCache(tmp_path, max_bytes=1024 * 1024)
+
+        assert cache.put_file("derived", "/a.py", _signature(), b"value")
+        assert cache.get_file("derived", "/a.py", _signature()) == b"value"
+        assert cache.get_file("derived", "/a.py", _signature(mtime_ns=2_000_000_000)) is None
+        assert cache.get("derived", "/b.py") is None
+        assert cache.stats["hits"] == 1 and cache.stats["misses"] == 2
+
+    def test_recently_modified_and_oversized_entries_are_not_stored(self, tmp_path):
+        cache = DiskCache(tmp_path, max_bytes=1024 * 1024)
+        now_ns = time.time_ns()
+
+        assert not cache.put_file("derived", "/a.py", _signature(mtime_ns=now_ns, ctime_ns=now_ns - 10**10), b"x")
+        assert not cache.put("derived", "/b.py", b"x" * 200_000)
+        assert cache.describe()["entries"] == 0
+
+    def test_least_recently_used_entries_are_evicted(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(disk_cache, "EVICTION_CHECK_INTERVAL", 1)
+        cache = DiskCache(tmp_path, max_bytes=10_000)
+
+        cache.put("artifact", "old", b"a" * 1000)
+        cache.put("artifact", "used", b"b" * 1000)
+        for i in range(7):
+            cache.put("artifact", f"filler-{i}", b"c" * 1000)
+        # Reading "used" makes it recent once the access time is flushed with the next write
+        assert cache.get("artifact", "used") is not None
+        cache.put("artifact", "overflow", b"d" * 1000)
+        cache.put("artifact", "overflow-2", b"d" * 1000)
+
+        info = cache.describe()
+        assert info["bytes"] <= 10_000
+        assert cache.get("artifact", "old") is None
+        assert cache.get("artifact", "used") is not None
+        assert info["evicted"] >= 2
+
+    def test_corrupt_database_is_replaced(self, tmp_path):
+        (tmp_path / disk_cache.DB_FILENAME).write_bytes(b"not a database" * 100)
+
+        cache = DiskCache(tmp_path, max_bytes=1024 * 1024)
+
+        assert cache.put("artifact", "k", b"v")
+        assert cache.get("artifact", "k") == b"v"
+        assert list(tmp_path.glob(f"{disk_cache.DB_FILENAME}.corrupt-*"))
+
+    def test_locked_database_is_retried_not_replaced(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(disk_cache, "BUSY_TIMEOUT_MS", 10)
+        monkeypatch.setattr(disk_cache, "OPEN_RETRY_DELAY", 0)
+        monkeypatch.setattr(disk_cache, "REOPEN_INTERVAL", 0)
+        # Another process holds an exclusive lock on a database that is not in WAL mode yet
+        holder = sqlite3.connect(str(tmp_path / disk_cache.DB_FILENAME), isolation_level=None)
+        holder.execute("CREATE TABLE other (x)")
+        holder.execute("BEGIN EXCLUSIVE")
+
+        cache = DiskCache(tmp_path, max_bytes=1024 * 1024)
+
+        assert cache.get("artifact", "k") is None
+        assert not cache.put("artifact", "k", b"v")
+        assert cache.stats["errors"] >= 1
+        assert not list(tmp_path.glob(f"{disk_cache.DB_FILENAME}.corrupt-*"))
+
+        holder.execute("ROLLBACK")
+        holder.close()
+        assert cache.put("artifact", "k", b"v")
+        assert cache.get("artifact", "k") == b"v"
+        assert not list(tmp_path.glob(f"{disk_cache.DB_FILENAME}.corrupt-*"))
+
+    def test_schema_change_resets_entries(self, tmp_path):
+        cache = DiskCache(tmp_path, max_bytes=1024 * 1024)
+        cache.put("artifact", "k", b"v")
+        cache.close()
+        conn = sqlite3.connect(str(tmp_path / disk_cache.DB_FILENAME))
+        conn.execute("PRAGMA user_version = 0")
+        conn.close()
+
+        assert DiskCache(tmp_path, max_bytes=1024 * 1024).get("artifact", "k") is None
+
+    def test_concurrent_processes(self, tmp_path):
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(4) as pool:
+            stored = pool.starmap(_writer, [(str(tmp_path), worker) for worker in range(4)])
+
+        assert stored == [50] * 4
+        assert DiskCache(tmp_path, max_bytes=10 * 1024 * 1024).describe()["entries"] == 200
+
+
+class TestWarmStart:
+    """A new process reuses file content and token counts cached by an earlier one."""
+
+    def test_numbered_file_content_survives_the_process(self, cache_dir, tmp_path, monkeypatch):
+        monkeypatch.setattr(disk_cache, "RACY_WINDOW_SECONDS", 0)
+        source = tmp_path / "module.py"
+        source.write_text("def f():\n    return 1\n")
+
+        first, tokens = read_file_content(str(source), include_line_numbers=True)
+        reset_disk_cache()  # as if a new server process started
+        with monkeypatch.context() as patched:
+            patched.setattr("utils.file_utils._add_line_numbers", lambda content: pytest.fail("re-formatted"))
+            assert read_file_content(str(source), include_line_numbers=True) == (first, tokens)
+        assert get_disk_cache().stats["hits"] == 1
+
+        # A changed file is read again
+        source.write_text("def f():\n    return 2\n")
+        changed, _ = read_file_content(str(source), include_line_numbers=True)
+        assert "return 2" in changed
+
+    def test_plain_reads_are_not_cached(self, cache_dir, tmp_path, monkeypatch):
+        monkeypatch.setattr(disk_cache, "RACY_WINDOW_SECONDS", 0)
+        source = tmp_path / "notes.txt"
+        source.write_text("plain text")
+
+        read_file_content(str(source))
+
+        assert get_disk_cache().describe()["entries"] == 0
+
+    def test_exact_token_counts_survive_the_process(self, cache_dir):
+        text = "word " * 1000
+        first = TokenizerService(exact=True)
+        first._encoders["o200k_base"] = FakeEncoding()
+        assert first.count_tokens(text, "gpt-4o") == 1000
+
+        second = TokenizerService(exact=True)
+        encoder = second._encoders["o200k_base"] = FakeEncoding()
+        assert second.count_tokens_batch([text, "short text"], "gpt-4o") == [1000, 2]
+        assert second.count_tokens(text, "gpt-4o") == 1000
+        # Only the short text (below the disk threshold) was encoded
+        assert encoder.calls == 1
+        assert second.stats["disk_hits"] == 1
+
+    def test_disabled(self, cache_dir, monkeypatch):
+        monkeypatch.setattr("config.DISK_CACHE_ENABLED", False)
+        reset_disk_cache()
+
+        assert get_disk_cache() is None
@@ -0,0 +1,196 @@
+"""
+Tests for budget dry runs (context assembly reports without a model call)
+"""
+
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from providers.base import ProviderType
+from providers.mock import MockModelProvider
+from providers.registry import ModelProviderRegistry
+from utils import tracing
+from utils.conversation_memory import add_turn, build_conversation_history, create_thread, get_thread
+from utils.dry_run import DryRunComplete, dry_run_scope, note_planned_file
+from utils.model_context import TokenAllocation
+
+
+@pytest.fixture
+def registered_mock():
+    ModelProviderRegistry.register_provider(ProviderType.MOCK, MockModelProvider)
+    ModelProviderRegistry.invalidate_model_index()
+    yield
+    ModelProviderRegistry.unregister_provider(ProviderType.MOCK)
+    ModelProviderRegistry.invalidate_model_index()
+
+
+def _report(result) -> dict:
+    payload = json.loads(result[0].text)
+    assert payload["status"] == "dry_run"
+    return payload["metadata"]["dry_run"]
+
+
+class TestServerDryRun:
+    """dry_run through handle_call_tool."""
+
+    @pytest.mark.asyncio
+    async def test_chat_reports_context_without_calling_model(self, registered_mock, tmp_path):
+        from server import handle_call_tool
+
+        old_file = tmp_path / "old.py"
+        old_file.write_text("def old():\n    return 1\n")
+        new_file = tmp_path / "new.py"
+        new_file.write_text("def new():\n    return 2\n")
+        thread_id = create_thread("chat", {"prompt": "first"})
+        add_turn(thread_id, "user", "first question", files=[str(old_file), str(tmp_path / "gone.py")])
+        add_turn(thread_id, "assistant", "first answer", tool_name="chat", model_name="mock-model")
+
+        with patch.object(MockModelProvider, "generate_content") as generate:
+            result = await handle_call_tool(
+                "chat",
+                {
+                    "prompt": "And now?",
+                    "files": [str(new_file)],
+                    "model": "mock",
+                    "continuation_id": thread_id,
+                    "dry_run": True,
+                },
+            )
+
+        generate.assert_not_called()
+        report = _report(result)
+        assert report["model_call"] is True
+        assert report["model"] == "mock"
+        assert report["prompt"]["fits"] is True
+        assert report["prompt"]["context_window"] == report["context_window"] > 0
+        assert report["prompt"]["total_tokens"] >= report["prompt"]["tokens"] > 0
+
+        planned = {(entry["path"], entry["source"]) for entry in report["files"]["planned"]}
+        assert planned == {(str(old_file), "history"), (str(new_file), "request")}
+        skipped = report["files"]["skipped"]
+        assert [(entry["path"], entry["reason"]) for entry in skipped] == [
+            (str(tmp_path / "gone.py"), "file no longer exists")
+        ]
+        assert report["history"]["kept_turns"] == [1, 2]
+        assert report["history"]["dropped_turns"] == []
+        assert {"reconstruct_thread_context", "prepare_prompt", "read_files"} <= {
+            stage["name"] for stage in report["stages"]
+        }
+        assert any(check["name"] == "prompt_size" and check["passed"] for check in report["checks"])
+
+        # The thread is left as it was
+        assert len(get_thread(thread_id).turns) == 2
+        assert report["suppressed_writes"]
+
+    @pytest.mark.asyncio
+    async def test_workflow_step_does_not_advance_tool_state(self, registered_mock, tmp_path):
+        from server import TOOLS, handle_call_tool
+
+        source = tmp_path / "module.py"
+        source.write_text("x = 1\n")
+        arguments = {
+            "step": "Review the module",
+            "step_number": 1,
+            "total_steps": 2,
+            "next_step_required": True,
+            "findings": "Nothing yet",
+            "relevant_files": [str(source)],
+            "model": "mock",
+            "dry_run": True,
+        }
+        history_before = list(TOOLS["codereview"].work_history)
+
+        report = _report(await handle_call_tool("codereview", arguments))
+
+        assert report["model_call"] is False
+        assert report["outcome"] and report["outcome"] != "dry_run"
+        assert TOOLS["codereview"].work_history == history_before
+
+    @pytest.mark.asyncio
+    async def test_failed_size_check_is_reported(self, registered_mock):
+        from server import handle_call_tool
+
+        with patch.object(MockModelProvider, "generate_content") as generate:
+            report = _report(
+                await handle_call_tool("chat", {"prompt": "x" * 70_000, "model": "mock", "dry_run": "true"})
+            )
+
+        generate.assert_not_called()
+        assert report["model_call"] is False
+        assert report["outcome"] == "resend_prompt"
+        assert {"name": "prompt_size", "passed": False, "detail": "70,000 of 60,000 characters"} in report["checks"]
+
+    @pytest.mark.asyncio
+    async def test_flag_is_advertised_in_schemas(self, monkeypatch):
+        import server
+
+        tools = await server.handle_list_tools()
+        assert all("dry_run" in tool.inputSchema["properties"] for tool in tools)
+        assert "dry_run" not in server.TOOLS["codereview"].get_input_schema()["properties"]
+
+        monkeypatch.setattr("config.DRY_RUN_ENABLED", False)
+        tools = await server.handle_list_tools()
+        assert not any("dry_run" in tool.inputSchema["properties"] for tool in tools)
+
+
+class TestReport:
+    """Recording outside the server."""
+
+    def test_dropped_history_turns(self):
+        thread_id = create_thread("chat", {"prompt": "first"})
+        for number in range(6):
+            add_turn(thread_id, "user" if number % 2 == 0 else "assistant", f"turn {number} " + "word " * 400)
+        model_context = MagicMock()
+        model_context.model_name = "mock-model"
+        model_context.estimate_tokens.side_effect = lambda text: len(text) // 4
+        model_context.calculate_token_allocation.return_value = TokenAllocation(
+            total_tokens=10_000, content_tokens=8_000, response_tokens=2_000, file_tokens=2_000, history_tokens=1_500
+        )
+
+        with dry_run_scope("chat") as report:
+            build_conversation_history(get_thread(thread_id), model_context)
+
+        assert report.history["total_turns"] == 6
+        assert report.history["kept_turns"] == [5, 6]
+        assert report.history["dropped_turns"] == [1, 2, 3, 4]
+        assert report.history["history_budget"] == 1_500
+
+    def test_helpers_are_noops_outside_dry_run(self):
+        note_planned_file("/a.py", 10, "request")
+        thread_id = create_thread("chat", {"prompt": "first"})
+        assert add_turn(thread_id, "user", "hello")
+        assert len(get_thread(thread_id).turns) == 1
+
+    @pytest.mark.asyncio
+    async def test_provider_call_is_replaced(self):
+        from providers.router import agenerate_content_with_stats
+
+        provider = MagicMock()
+        provider.get_capabilities.return_value = MagicMock(context_window=1_000, max_output_tokens=100)
+
+        with dry_run_scope("chat") as report:
+            with pytest.raises(DryRunComplete):
+                await agenerate_content_with_stats(
+                    provider, prompt="x" * 8_000, model_name="m", system_prompt="s" * 400, images=["/a.png"]
+                )
+
+        provider.generate_content.assert_not_called()
+        assert report.prompt["tokens"] == 2_000
+        assert report.prompt["system_prompt_tokens"] == 100
+        assert report.prompt["fits"] is False
+
+    def test_spans_are_collected_with_tracing_disabled(self):
+        tracing.configure_tracing(enabled=False, path=None)
+
+        with dry_run_scope("chat") as report:
+            with tracing.start_span("prepare_prompt"):
+                with tracing.start_span("read_files"):
+                    pass
+
+        assert [(stage["name"], stage["depth"]) for stage in report.stages()] == [
+            ("prepare_prompt", 0),
+            ("read_files", 1),
+        ]
+        with tracing.start_span("outside") as span:
+            assert span is tracing._NOOP_SPAN
@@ -0,0 +1,186 @@
+"""
+Tests for token compaction of embedded file content
+"""
+
+import json
+
+import pytest
+
+from tools.chat import ChatTool
+from tools.codereview import CodeReviewTool
+from utils.file_compaction import (
+    COMPACTION_OPERATIONS,
+    compact_file_content,
+    compaction_for_tool,
+    drop_repeated_license,
+    parse_compaction,
+)
+from utils.file_utils import read_file_content, read_file_segments
+
+ALL = frozenset(COMPACTION_OPERATIONS)
+
+LICENSE = (
+    "# Copyright 2024 Example Corp\n#\n# Licensed under the Apache License, Version 2.0\n# See LICENSE for details\n"
+)
+
+
+def _numbers(formatted: str) -> dict[int, str]:
+    """Line number -> text for every numbered line of formatted content."""
+    result = {}
+    for line in formatted.split("\n"):
+        number, sep, text = line.partition("│")
+        if sep and number.strip().isdigit():
+            result[int(number)] = text[1:] if text.startswith(" ") else text
+    return result
+
+
+class TestCompactFileContent:
+    """Per-file operations."""
+
+    def test_parse_compaction(self):
+        assert parse_compaction("off") == frozenset()
+        assert parse_compaction("all") == ALL
+        assert parse_compaction("whitespace+gutter") == {"whitespace", "gutter"}
+        assert parse_compaction("json, bogus") == {"json"}
+
+    def test_numbered_lines_keep_their_file_numbers(self):
+        source = "a = 1   \n\n\n\n\nb = 2\t\nc = 3\n"
+
+        body = compact_file_content(source, "/x.py", frozenset({"whitespace", "gutter"}), add_line_numbers=True)
+
+        assert body.split("\n") == ["1│ a = 1", "2│", "6│ b = 2", "7│ c = 3", "8│"]
+        original = source.split("\n")
+        for number, text in _numbers(body).items():
+            assert original[number - 1].rstrip() == text
+
+    def test_unnumbered_content_keeps_its_line_count(self):
+        source = "a = 1   \n\n\n\nb = 2\n"
+
+        body = compact_file_content(source, "/x.py", ALL, add_line_numbers=False)
+
+        assert body == "a = 1\n\n\n\nb = 2\n"
+
+    def test_default_gutter_is_kept_without_gutter_operation(self):
+        body = compact_file_content("x\n", "/x.py", frozenset({"whitespace"}), add_line_numbers=True)
+
+        assert body.split("\n")[0] == "   1│ x"
+
+    def test_notebook_outputs_are_removed(self):
+        notebook = {
+            "cells": [
+                {"cell_type": "markdown", "source": ["# Title\n"], "metadata": {}},
+                {
+                    "cell_type": "code",
+                    "source": ["import pandas as pd\n", "df = pd.read_csv('x.csv')"],
+                    "outputs": [{"output_type": "stream", "text": ["row\n"] * 500}],
+                    "execution_count": 3,
+                },
+            ],
+            "metadata": {"kernelspec": {"language": "python"}},
+        }
+        raw = json.dumps(notebook, indent=1)
+
+        body = compact_file_content(raw, "/n.ipynb", ALL, add_line_numbers=False)
+
+        assert "row" not in body
+        assert "# %% [code python] cell 2\nimport pandas as pd\ndf = pd.read_csv('x.csv')" in body
+        assert len(body) < len(raw) / 10
+
+    def test_json_is_minified_or_dedented(self):
+        raw = json.dumps({"a": [1, 2], "b": {"c": "d e"}}, indent=4)
+
+        assert compact_file_content(raw, "/d.json", ALL, add_line_numbers=False) == '{"a":[1,2],"b":{"c":"d e"}}'
+        numbered = compact_file_content(raw, "/d.json", ALL, add_line_numbers=True)
+        assert len(numbered.split("\n")) == len(raw.split("\n"))
+        assert "3│ 1," in numbered
+
+
+class TestLicenseHeaders:
+    """A license header repeated across files is embedded once."""
+
+    def _formatted(self, path: str, content: str) -> str:
+        body = compact_file_content(content, path, ALL, add_line_numbers=True)
+        return f"\n--- BEGIN FILE: {path} ---\n{body}\n--- END FILE: {path} ---\n"
+
+    def test_repeat_is_replaced_by_reference(self):
+        seen = {}
+        first = self._formatted("/a.py", LICENSE + "\nimport os\n")
+        second = self._formatted("/b.py", "#!/usr/bin/env python\n" + LICENSE + "\nimport sys\n")
+
+        assert drop_repeated_license(first, "/a.py", seen) == first
+        compacted = drop_repeated_license(second, "/b.py", seen)
+
+        assert "Apache" not in compacted
+        assert "2-5│ (license header identical to /a.py)" in compacted
+        assert _numbers(compacted)[1] == "#!/usr/bin/env python"
+        assert _numbers(compacted)[7] == "import sys"
+
+    def test_other_comments_are_kept(self):
+        seen = {}
+        comment = "# Helper functions\n# for parsing\n# input files\nimport os\n"
+        for path in ("/a.py", "/b.py"):
+            formatted = self._formatted(path, comment)
+            assert drop_repeated_license(formatted, path, seen) == formatted
+
+
+class TestReadFiles:
+    """Compaction inside read_file_content / read_file_segments."""
+
+    def test_read_files_compacts_and_deduplicates(self, tmp_path):
+        paths = []
+        for name in ("a.py", "b.py", "c.py"):
+            path = tmp_path / name
+            path.write_text(LICENSE + "\n\n\ndef f():   \n    return 1\n")
+            paths.append(str(path))
+
+        plain = read_file_segments(paths, include_line_numbers=True)
+        compacted = read_file_segments(paths, include_line_numbers=True, compaction=ALL)
+
+        text = compacted.render()
+        assert text.count("Apache") == 1
+        assert text.count("license header identical to") == 2
+        assert compacted.token_count < plain.token_count
+        assert len(text) < len(plain.render()) * 0.9
+
+    def test_compacted_content_is_cached_separately(self, tmp_path):
+        path = tmp_path / "a.py"
+        path.write_text("x = 1   \n")
+
+        plain, _ = read_file_content(str(path), include_line_numbers=True)
+        compacted, _ = read_file_content(str(path), include_line_numbers=True, compaction=ALL)
+
+        assert "   1│ x = 1   " in plain
+        assert "\n1│ x = 1\n" in compacted
+
+    def test_header_of_skipped_file_is_not_referenced(self, tmp_path):
+        big = tmp_path / "a_big.py"
+        big.write_text(LICENSE + "x = 1\n" * 5000)
+        small = tmp_path / "b_small.py"
+        small.write_text(LICENSE + "y = 2\n")
+
+        text = read_file_segments(
+            [str(big), str(small)], max_tokens=2000, reserve_tokens=0, include_line_numbers=True, compaction=ALL
+        ).render()
+
+        assert "Apache" in text
+        assert "identical to" not in text
+
+
+class TestToolConfiguration:
+    """Per-tool settings."""
+
+    def test_default_is_off(self):
+        assert ChatTool().get_file_compaction() == frozenset()
+
+    def test_per_tool_override(self, monkeypatch):
+        monkeypatch.setattr("config.FILE_COMPACTION", "whitespace")
+        monkeypatch.setattr("config.FILE_COMPACTION_TOOLS", "codereview=all, chat=off")
+
+        assert CodeReviewTool().get_file_compaction() == ALL
+        assert ChatTool().get_file_compaction() == frozenset()
+        assert compaction_for_tool("analyze") == {"whitespace"}
+
+    @pytest.mark.parametrize("spec", ["", "off"])
+    def test_disabled_specs(self, monkeypatch, spec):
+        monkeypatch.setattr("config.FILE_COMPACTION", spec)
+        assert compaction_for_tool("chat") == frozenset()
@@ -0,0 +1,85 @@
+"""
+Tests for the hot-path benchmark script and its baseline comparison
+"""
+
+import importlib.util
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+_SCRIPT_PATH = Path(__file__).resolve().parent.parent / "scripts" / "hotpath_benchmark.py"
+_spec = importlib.util.spec_from_file_location("hotpath_benchmark", _SCRIPT_PATH)
+hotpath_benchmark = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(hotpath_benchmark)
+
+
+def _run(*args):
+    return subprocess.run(
+        [sys.executable, str(_SCRIPT_PATH), "--files", "6", "--turns", "4", "--iterations", "3", *args],
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+
+
+class TestBaselineComparison:
+    """Regression detection against stored results."""
+
+    def test_relative_threshold_and_noise_floor(self):
+        baseline = {
+            "read_files": {"p50_ms": 10.0, "peak_kb": 1000.0},
+            "token_allocation": {"p50_ms": 0.01, "peak_kb": 2.0},
+        }
+        results = {
+            "read_files": {"p50_ms": 13.0, "peak_kb": 1100.0},
+            # +100% but only 0.01 ms / 2 KiB: timer and allocator noise
+            "token_allocation": {"p50_ms": 0.02, "peak_kb": 4.0},
+            "storage_get": {"p50_ms": 1.0, "peak_kb": 1.0},
+        }
+
+        comparisons = hotpath_benchmark.compare_to_baseline(results, baseline, threshold=0.2)
+
+        regressed = {(c["benchmark"], c["metric"]) for c in comparisons if c["regressed"]}
+        assert regressed == {("read_files", "p50_ms")}
+        assert {c["benchmark"] for c in comparisons} == {"read_files", "token_allocation"}
+        assert not any(c["regressed"] for c in hotpath_benchmark.compare_to_baseline(results, baseline, 0.5))
+
+    def test_measure_reports_percentiles_and_memory(self):
+        stats = hotpath_benchmark.measure(lambda: [0] * 100_000, iterations=5, warmup=0)
+
+        assert stats["iterations"] == 5
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["max_ms"]
+        assert stats["peak_kb"] > 700
+
+
+class TestBenchmarkRun:
+    """The script runs offline on a small workload and gates on its baseline."""
+
+    def test_save_then_compare(self, tmp_path):
+        baseline = tmp_path / "baseline.json"
+
+        saved = _run("--save-baseline", "--baseline", str(baseline))
+        assert saved.returncode == 0, saved.stderr
+        data = json.loads(baseline.read_text())
+        assert set(data["results"]) == {
+            "expand_paths",
+            "read_files",
+            "build_conversation_history",
+            "storage_setex",
+            "storage_get",
+            "schema_generation",
+            "token_allocation",
+        }
+        assert data["workload"]["files"] == 6
+
+        # Shrink the baseline so every measurable benchmark looks like a regression
+        for stats in data["results"].values():
+            stats["p50_ms"] = stats["p50_ms"] / 100
+        baseline.write_text(json.dumps(data))
+        compared = _run("--baseline", str(baseline), "--json", "--only", "read_files", "expand_paths")
+        output = json.loads(compared.stdout)
+
+        assert set(output["results"]) == {"read_files", "expand_paths"}
+        assert compared.returncode == 1
+        assert any(c["regressed"] for c in output["comparisons"])
@@ -0,0 +1,195 @@
+"""
+Tests for the multi-client HTTP transport
+"""
+
+import asyncio
+import contextlib
+import json
+import socket
+import time
+
+import httpx
+import pytest
+import uvicorn
+from mcp import ClientSession
+
+from providers.base import ProviderType
+from providers.mock import MockModelProvider
+from providers.registry import ModelProviderRegistry
+from server import _initialization_options, server
+from utils.client_session import ClientState, active_sessions, client_call_scope, current_client_state
+from utils.http_transport import HTTPTransport
+
+try:
+    from mcp.client.streamable_http import streamable_http_client as _http_client
+except ImportError:  # mcp < 1.24
+    from mcp.client.streamable_http import streamablehttp_client as _http_client
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def _serve(**options):
+    port = _free_port()
+    transport = HTTPTransport(server, _initialization_options(), **options)
+    web = uvicorn.Server(uvicorn.Config(transport.app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(web.serve())
+    while not web.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}", transport
+    finally:
+        web.should_exit = True
+        await task
+
+
+@contextlib.asynccontextmanager
+async def _connect(url: str):
+    async with _http_client(f"{url}/mcp") as (read_stream, write_stream, _):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            yield session
+
+
+async def _chat(session: ClientSession, prompt: str, **arguments) -> dict:
+    result = await session.call_tool("chat", {"prompt": prompt, "model": "mock", **arguments})
+    return json.loads(result.content[0].text)
+
+
+@pytest.fixture(autouse=True)
+def mock_provider(monkeypatch):
+    monkeypatch.setenv("MOCK_PROVIDER_PROFILE", '{"latency_ms": 200}')
+    ModelProviderRegistry.register_provider(ProviderType.MOCK, MockModelProvider)
+    ModelProviderRegistry.invalidate_model_index()
+    yield
+    ModelProviderRegistry.unregister_provider(ProviderType.MOCK)
+    ModelProviderRegistry.invalidate_model_index()
+
+
+class TestClientSessions:
+    """Per-session state and the concurrent call bound, without a network."""
+
+    def test_each_session_gets_its_own_tool_instances(self):
+        from tools import CodeReviewTool
+
+        shared = CodeReviewTool()
+        first, second = ClientState(session_id="a"), ClientState(session_id="b")
+
+        assert first.tool("codereview", shared) is first.tool("codereview", shared)
+        assert first.tool("codereview", shared) is not second.tool("codereview", shared)
+        assert first.tool("codereview", shared) is not shared
+
+    @pytest.mark.asyncio
+    async def test_scope_is_a_no_op_without_isolation(self):
+        async with client_call_scope(object()) as state:
+            assert state is None
+            assert current_client_state() is None
+
+
+class TestHTTPTransport:
+    """Many clients served by one in-process server over HTTP."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_clients_share_one_process(self, monkeypatch):
+        # Long enough provider calls that request overhead cannot be mistaken for serialization
+        monkeypatch.setenv("MOCK_PROVIDER_PROFILE", '{"latency_ms": 500}')
+        async with _serve() as (url, _):
+            async with _connect(url) as first, _connect(url) as second:
+                tools = await first.list_tools()
+                assert {"chat", "codereview", "stats"} <= {tool.name for tool in tools.tools}
+
+                start = time.monotonic()
+                replies = await asyncio.gather(_chat(first, "one"), _chat(second, "two"))
+                elapsed = time.monotonic() - start
+
+                assert active_sessions() == 2
+        for reply in replies:
+            assert reply["status"] in ("success", "continuation_available")
+        # Both 500ms provider calls overlapped
+        assert elapsed < 1.0
+
+    @pytest.mark.asyncio
+    async def test_default_conversation_is_per_client(self):
+        async with _serve() as (url, _):
+            async with _connect(url) as first, _connect(url) as second:
+                first_thread = (await _chat(first, "first client"))["continuation_offer"]["continuation_id"]
+                second_thread = (await _chat(second, "second client"))["continuation_offer"]["continuation_id"]
+                # The second client wrote the newest thread, but the first continues its own
+                follow_up = await _chat(first, "follow-up")
+
+                # Explicit continuation ids still work across clients (shared storage)
+                shared = await _chat(second, "join", continuation_id=first_thread)
+
+        assert first_thread != second_thread
+        assert follow_up["continuation_offer"]["continuation_id"] == first_thread
+        assert shared["continuation_offer"]["continuation_id"] == first_thread
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_are_bounded(self):
+        async with _serve(max_concurrent_calls=1) as (url, _):
+            async with _connect(url) as first, _connect(url) as second:
+                start = time.monotonic()
+                await asyncio.gather(_chat(first, "one"), _chat(second, "two"))
+                elapsed = time.monotonic() - start
+
+        assert elapsed >= 0.4
+
+    @pytest.mark.asyncio
+    async def test_session_limit(self):
+        initialize = {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "initialize",
+            "params": {
+                "protocolVersion": "2025-03-26",
+                "capabilities": {},
+                "clientInfo": {"name": "test", "version": "1"},
+            },
+        }
+        async with _serve(max_sessions=1) as (url, transport):
+            async with _connect(url) as session:
+                async with httpx.AsyncClient() as client:
+                    response = await client.post(
+                        f"{url}/mcp",
+                        json=initialize,
+                        headers={"Accept": "application/json, text/event-stream"},
+                    )
+                assert response.status_code == 503
+                assert transport.open_sessions() == 1
+
+                # The admitted client is unaffected
+                assert (await session.list_tools()).tools
+
+    def test_session_limit_needs_the_session_table(self, monkeypatch):
+        from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+
+        original_init = StreamableHTTPSessionManager.__init__
+
+        def init_without_table(manager, *args, **kwargs):
+            original_init(manager, *args, **kwargs)
+            del manager._server_instances
+
+        monkeypatch.setattr(StreamableHTTPSessionManager, "__init__", init_without_table)
+
+        with pytest.raises(RuntimeError, match="MCP_HTTP_MAX_SESSIONS"):
+            HTTPTransport(server, _initialization_options(), max_sessions=1)
+        with pytest.raises(RuntimeError):
+            HTTPTransport(server, _initialization_options()).open_sessions()
+
+    @pytest.mark.asyncio
+    async def test_sse_client(self):
+        from mcp.client.sse import sse_client
+
+        async with _serve() as (url, transport):
+            async with sse_client(f"{url}/sse") as (read_stream, write_stream):
+                async with ClientSession(read_stream, write_stream) as session:
+                    await session.initialize()
+                    assert transport.open_sse_sessions == 1
+                    reply = json.loads((await session.call_tool("version", {})).content[0].text)
+
+        assert reply["status"] == "success"
+        assert transport.open_sse_sessions == 0
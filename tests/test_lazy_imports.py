@@ -0,0 +1,47 @@
+"""
+Tests that server startup does not import provider SDKs
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _loaded_modules(statement: str, modules: list[str]) -> dict[str, bool]:
+    code = f"import sys; {statement}; print([m in sys.modules for m in {modules!r}])"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return dict(zip(modules, eval(output.strip().splitlines()[-1])))
+
+
+class TestLazyImports:
+    """Test that heavy modules load on first use"""
+
+    def test_server_import_skips_provider_sdks(self):
+        """Importing the server and configuring providers does not load openai or google.genai"""
+        loaded = _loaded_modules(
+            "import os; os.environ['GEMINI_API_KEY'] = 'x'; os.environ['OPENAI_API_KEY'] = 'y'; "
+            "import server; server.configure_providers()",
+            ["openai", "google.genai"],
+        )
+
+        assert loaded == {"openai": False, "google.genai": False}
+
+    def test_tools_submodule_import_skips_tools(self):
+        """tools.models can be imported without loading every tool"""
+        loaded = _loaded_modules("import tools.models", ["tools.chat", "tools.consensus"])
+
+        assert not any(loaded.values())
+
+    def test_lazy_names_still_resolve(self):
+        """Package-level names keep working"""
+        from providers import GeminiModelProvider
+        from providers.openai_compatible import OpenAI
+        from tools import ChatTool
+
+        assert GeminiModelProvider.__name__ == "GeminiModelProvider"
+        assert OpenAI.__module__.startswith("openai")
+        assert ChatTool.__name__ == "ChatTool"
@@ -0,0 +1,87 @@
+"""
+Tests for scripts/load_generator.py
+"""
+
+import importlib.util
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "load_generator.py"
+
+
+def _load_script():
+    spec = importlib.util.spec_from_file_location("load_generator", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+load_generator = _load_script()
+
+
+class TestHelpers:
+    """Mix parsing, percentiles and response parsing."""
+
+    def test_parse_mix(self):
+        assert load_generator.parse_mix("chat=3, consensus=1") == {"chat": 3.0, "consensus": 1.0}
+        assert load_generator.parse_mix("codereview") == {"codereview": 1.0}
+        with pytest.raises(ValueError):
+            load_generator.parse_mix("chat=1,planner=2")
+        with pytest.raises(ValueError):
+            load_generator.parse_mix("chat=0")
+
+    def test_summarize_latencies(self):
+        summary = load_generator.summarize_latencies([i / 1000 for i in range(1, 101)])
+
+        assert summary["count"] == 100
+        assert summary["p50_ms"] == 50.0
+        assert summary["p99_ms"] == 99.0
+        assert summary["max_ms"] == 100.0
+        assert load_generator.summarize_latencies([]) == {"count": 0}
+
+    def test_find_continuation_id(self):
+        payload = {"status": "success", "continuation_offer": {"continuation_id": "abc", "remaining_turns": 3}}
+
+        assert load_generator.find_continuation_id(payload) == "abc"
+        assert load_generator.find_continuation_id({"content": "no thread"}) is None
+        assert load_generator.find_continuation_id(None) is None
+
+
+class TestLoadRun:
+    """End-to-end run against the offline mock provider."""
+
+    def test_mixed_load_against_mock_provider(self):
+        result = subprocess.run(
+            [
+                sys.executable,
+                str(SCRIPT),
+                "--concurrency",
+                "3",
+                "--requests",
+                "6",
+                "--mix",
+                "chat=1,continuation=1,codereview=1,consensus=1",
+                "--turns",
+                "1",
+                "--repo-files",
+                "5",
+                "--seed",
+                "7",
+                "--json",
+            ],
+            capture_output=True,
+            text=True,
+            timeout=300,
+        )
+        assert result.returncode == 0, result.stderr
+
+        report = json.loads(result.stdout)
+        assert report["errors"] == 0, report["error_samples"]
+        assert sum(report["scenarios"].values()) == 6
+        assert report["calls"] >= 6
+        assert report["throughput_calls_per_s"] > 0
+        assert report["memory_mb"]["timeline"]
@@ -0,0 +1,61 @@
+"""
+Tests for the queue-based server logging pipeline
+"""
+
+import logging
+import threading
+import time
+from logging.handlers import QueueHandler
+
+import pytest
+
+
+class SlowHandler(logging.Handler):
+    """Handler that simulates a slow disk write"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.received = threading.Event()
+
+    def emit(self, record):
+        time.sleep(self.delay)
+        self.received.set()
+
+
+class TestLoggingPipeline:
+    """Test that logging calls only enqueue records"""
+
+    def test_root_logger_only_enqueues(self):
+        """The server attaches a single QueueHandler; I/O handlers live on the listener"""
+        import server
+
+        queue_handlers = [h for h in logging.getLogger().handlers if isinstance(h, QueueHandler)]
+        assert len(queue_handlers) == 1
+        assert server.stderr_handler in server.log_listener.handlers
+
+    def test_slow_handler_does_not_block_caller(self):
+        """A slow output handler delays delivery, not the logging call"""
+        import server
+
+        slow = SlowHandler(delay=0.5)
+        original = server.log_listener.handlers
+        server.log_listener.handlers = (slow,)
+        try:
+            start = time.perf_counter()
+            logging.getLogger("tests.logging_pipeline").warning("queued record")
+            elapsed = time.perf_counter() - start
+
+            assert elapsed < 0.25
+            assert slow.received.wait(timeout=5)
+        finally:
+            server.log_listener.handlers = original
+
+    def test_activity_file_only_gets_activity_records(self):
+        """The activity file handler filters out non-activity records"""
+        import server
+
+        if not hasattr(server, "mcp_file_handler"):
+            pytest.skip("file logging could not be set up (logs directory not writable)")
+        assert server.mcp_file_handler.filter(logging.makeLogRecord({"name": "mcp_activity", "msg": "x"}))
+        assert not server.mcp_file_handler.filter(logging.makeLogRecord({"name": "server", "msg": "x"}))
@@ -0,0 +1,121 @@
+"""
+Tests for the event-loop stall watchdog
+"""
+
+import asyncio
+import json
+import time
+import traceback
+
+import pytest
+
+from utils.loop_watchdog import UNKNOWN_SITE, LoopWatchdog, attribute_stack, get_stall_reports, stop_loop_watchdog
+from utils.metrics import get_metrics
+
+
+def _blocking_helper(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    stop_loop_watchdog()
+    get_metrics().reset()
+    yield
+    stop_loop_watchdog()
+    get_metrics().reset()
+
+
+class TestAttribution:
+    """Picking the responsible call site from a stack."""
+
+    def test_innermost_project_frame_wins(self):
+        stack = traceback.StackSummary.from_list(
+            [
+                ("/usr/lib/python3/asyncio/events.py", 80, "_run", None),
+                (__file__, 10, "handler", None),
+                ("/venv/lib/python3/site-packages/httpx/_client.py", 900, "send", None),
+                ("/usr/lib/python3/socket.py", 700, "readinto", None),
+            ]
+        )
+
+        site, innermost = attribute_stack(stack)
+
+        assert site == "tests/test_loop_watchdog.py:10 in handler"
+        assert innermost == "/usr/lib/python3/socket.py:700 in readinto"
+
+    def test_stack_without_project_code(self):
+        stack = traceback.StackSummary.from_list([("/usr/lib/python3/socket.py", 700, "readinto", None)])
+
+        assert attribute_stack(stack) == ("/usr/lib/python3/socket.py:700 in readinto",) * 2
+        assert attribute_stack(traceback.StackSummary())[0] == UNKNOWN_SITE
+
+
+class TestWatchdog:
+    """Detecting and aggregating stalls on a running loop."""
+
+    @pytest.mark.asyncio
+    async def test_blocking_call_is_reported_with_its_call_site(self):
+        watchdog = LoopWatchdog(threshold=0.05, interval=0.01)
+        watchdog.start()
+        try:
+            await asyncio.sleep(0.05)
+            for _ in range(2):
+                _blocking_helper(0.3)
+                await asyncio.sleep(0.05)
+        finally:
+            watchdog.stop()
+
+        (report,) = [r for r in watchdog.summary() if r["site"] != UNKNOWN_SITE]
+        assert report["site"].startswith("tests/test_loop_watchdog.py:")
+        assert report["site"].endswith("in _blocking_helper")
+        assert report["count"] == 2
+        assert report["max_ms"] >= 200
+        assert any("test_blocking_call_is_reported" in line for line in report["stack"])
+
+        metrics = get_metrics().snapshot()["metrics"]
+        stalls = {s["labels"]["site"]: s["value"] for s in metrics["zen_event_loop_stalls_total"]["series"]}
+        assert stalls[report["site"]] == 2
+        assert metrics["zen_event_loop_lag_seconds"]["series"][0]["count"] > 2
+
+    @pytest.mark.asyncio
+    async def test_non_blocking_code_records_no_stalls(self):
+        watchdog = LoopWatchdog(threshold=0.2, interval=0.01)
+        watchdog.start()
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            watchdog.stop()
+
+        assert watchdog.stalls == 0
+        assert watchdog.summary() == []
+
+
+class TestReporting:
+    """Opt-in startup and the stats tool."""
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self):
+        from utils.loop_watchdog import start_loop_watchdog
+
+        assert start_loop_watchdog() is None
+        assert get_stall_reports() is None
+
+    @pytest.mark.asyncio
+    async def test_stats_tool_lists_stalls(self):
+        from tools.stats import StatsTool
+        from utils.loop_watchdog import start_loop_watchdog
+
+        start_loop_watchdog(threshold=0.05, interval=0.01)
+        await asyncio.sleep(0.03)
+        _blocking_helper(0.25)
+        await asyncio.sleep(0.05)
+
+        result = await StatsTool().execute({})
+        content = json.loads(result[0].text)["content"]
+        assert "## Event Loop" in content
+        assert "in _blocking_helper" in content
+
+        result = await StatsTool().execute({"format": "json"})
+        stalls = json.loads(json.loads(result[0].text)["content"])["event_loop_stalls"]
+        assert any(report["site"].endswith("in _blocking_helper") for report in stalls)
@@ -0,0 +1,217 @@
+"""
+Tests for the in-process metrics registry, its instrumentation points and the stats tool
+"""
+
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from providers.base import ModelResponse, ProviderType
+from utils import metrics
+from utils.metrics import Counter, Histogram, MetricsRegistry
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.get_metrics().reset()
+    yield
+    metrics.get_metrics().reset()
+
+
+def _provider(provider_type=ProviderType.OPENAI):
+    provider = MagicMock()
+    provider.get_provider_type.return_value = provider_type
+    return provider
+
+
+class TestPrimitives:
+    """Counter, histogram and registry behaviour."""
+
+    def test_counter_labels_are_independent(self):
+        counter = Counter("requests_total", "Requests")
+        counter.inc(tool="chat")
+        counter.inc(2, tool="chat")
+        counter.inc(tool="debug")
+
+        assert counter.value(tool="chat") == 3
+        assert counter.value(tool="debug") == 1
+        assert counter.value(tool="other") == 0
+
+    def test_histogram_quantiles_use_bucket_bounds(self):
+        histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0, 10.0))
+        for value in (0.05, 0.05, 0.5, 5.0):
+            histogram.observe(value, tool="chat")
+
+        assert histogram.quantile(0.5, tool="chat") == 0.1
+        assert histogram.quantile(0.95, tool="chat") == 10.0
+        assert histogram.quantile(0.5, tool="missing") is None
+
+        (series,) = histogram.snapshot()
+        assert series["count"] == 4
+        assert series["sum"] == pytest.approx(5.6)
+
+    def test_registry_returns_existing_metric_and_rejects_kind_change(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("things_total", "Things")
+        assert registry.counter("things_total", "Things") is counter
+        with pytest.raises(ValueError):
+            registry.histogram("things_total", "Things")
+
+    def test_prometheus_rendering(self):
+        registry = MetricsRegistry()
+        registry.counter("errors_total", "Errors").inc(provider="openai", error='Bad"Quote')
+        histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        histogram.observe(0.5, tool="chat")
+
+        text = registry.render_prometheus()
+        assert "# TYPE errors_total counter" in text
+        assert 'errors_total{error="Bad\\"Quote",provider="openai"} 1' in text
+        assert "# TYPE latency_seconds histogram" in text
+        assert 'latency_seconds_bucket{tool="chat",le="0.1"} 0' in text
+        assert 'latency_seconds_bucket{tool="chat",le="1"} 1' in text
+        assert 'latency_seconds_bucket{tool="chat",le="+Inf"} 1' in text
+        assert 'latency_seconds_count{tool="chat"} 1' in text
+
+
+class TestRecording:
+    """Helpers used by the instrumented code paths."""
+
+    def test_provider_call_records_latency_and_usage(self):
+        response = ModelResponse(content="ok", usage={"input_tokens": 120, "output_tokens": 30, "total_tokens": 150})
+        metrics.record_provider_call(_provider(), "o3", 1.5, response=response)
+
+        assert metrics.TOKENS.value(provider="openai", kind="prompt") == 120
+        assert metrics.TOKENS.value(provider="openai", kind="completion") == 30
+        assert metrics.PROVIDER_DURATION.quantile(0.5, provider="openai", model="o3") == 2.5
+
+    def test_provider_error_counted_by_class(self):
+        metrics.record_provider_call(_provider(), "o3", 0.2, error=TimeoutError("slow"))
+        metrics.record_provider_retry(_provider(), ConnectionError("reset"))
+
+        assert metrics.PROVIDER_ERRORS.value(provider="openai", error="TimeoutError") == 1
+        assert metrics.PROVIDER_RETRIES.value(provider="openai", error="ConnectionError") == 1
+
+    def test_wrapped_provider_error_counted_by_cause(self):
+        try:
+            try:
+                raise ConnectionError("reset")
+            except ConnectionError as e:
+                raise RuntimeError("OpenAI API error after 4 attempts") from e
+        except RuntimeError as wrapped:
+            metrics.record_provider_call(_provider(), "o3", 0.2, error=wrapped)
+
+        assert metrics.PROVIDER_ERRORS.value(provider="openai", error="ConnectionError") == 1
+
+    def test_router_hook_records_metrics(self):
+        from providers.router import generate_content_with_stats
+
+        provider = _provider(ProviderType.GOOGLE)
+        provider.generate_content.return_value = ModelResponse(
+            content="ok", usage={"input_tokens": 10, "output_tokens": 5}
+        )
+        generate_content_with_stats(provider, prompt="hi", model_name="gemini-2.5-flash")
+
+        assert metrics.TOKENS.value(provider="google", kind="prompt") == 10
+        assert metrics.PROVIDER_DURATION.quantile(1.0, provider="google", model="gemini-2.5-flash") is not None
+
+    def test_file_reads_count_bytes(self, tmp_path):
+        from utils.file_utils import read_file_content
+
+        path = tmp_path / "example.py"
+        path.write_text("print('hello')\n")
+        read_file_content(str(path))
+
+        assert metrics.FILE_BYTES_READ.value() == path.stat().st_size
+
+    def test_storage_operations_are_timed(self, tmp_path):
+        from utils.storage_backend import FileBasedStorage
+
+        storage = FileBasedStorage(str(tmp_path))
+        storage.setex("thread:abc", 60, "{}")
+        storage.get("thread:abc")
+        storage.expire("thread:abc", 60)
+
+        ops = {item["labels"]["op"] for item in metrics.STORAGE_DURATION.snapshot()}
+        assert ops == {"setex", "get", "expire"}
+
+    def test_cache_hit_ratio(self):
+        assert metrics.cache_hit_ratio("tool_list") is None
+        metrics.record_cache_access("tool_list", False)
+        metrics.record_cache_access("tool_list", True)
+        metrics.record_cache_access("tool_list", True)
+        metrics.record_cache_access("tool_list", True)
+
+        assert metrics.cache_hit_ratio("tool_list") == 0.75
+
+    def test_prometheus_file_is_written(self, tmp_path):
+        metrics.record_tool_call("chat", 0.3, "success")
+        target = metrics.write_prometheus_file(str(tmp_path / "out" / "metrics.prom"))
+
+        text = target.read_text()
+        assert 'zen_tool_duration_seconds_count{status="success",tool="chat"} 1' in text
+        assert not list(target.parent.glob("*.tmp"))
+
+    def test_exporter_disabled_by_default(self):
+        assert metrics.start_metrics_exporter(interval=0) is None
+
+    def test_final_write_goes_to_the_exporter_path(self, tmp_path):
+        target = tmp_path / "custom.prom"
+        metrics.start_metrics_exporter(interval=3600, path=str(target))
+        metrics.record_tool_call("chat", 0.3, "success")
+        metrics.stop_metrics_exporter()
+
+        assert 'zen_tool_duration_seconds_count{status="success",tool="chat"} 1' in target.read_text()
+
+    def test_recorders_never_raise(self, monkeypatch):
+        def broken(*args, **kwargs):
+            raise RuntimeError("registry unavailable")
+
+        monkeypatch.setattr(metrics.FILE_BYTES_READ, "inc", broken)
+        monkeypatch.setattr(metrics.LOOP_STALLS, "inc", broken)
+
+        metrics.record_file_read(100)
+        metrics.record_loop_stall("chat")
+
+
+class TestToolMetrics:
+    """Tool calls through the server are measured."""
+
+    @pytest.mark.asyncio
+    async def test_tool_call_latency_recorded_with_status(self):
+        from server import handle_call_tool
+
+        await handle_call_tool("version", {})
+
+        (series,) = metrics.TOOL_DURATION.snapshot()
+        assert series["labels"] == {"tool": "version", "status": "success"}
+        assert series["count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stats_tool_reports_metrics(self):
+        from tools.stats import StatsTool
+
+        metrics.record_tool_call("chat", 0.3, "success")
+        metrics.record_provider_retry(_provider(), ConnectionError("reset"))
+        metrics.record_cache_access("token_count", True)
+
+        result = await StatsTool().execute({})
+        data = json.loads(result[0].text)
+        assert data["status"] == "success"
+        content = data["content"]
+        assert "## Tool Latency" in content
+        assert "| chat | success | 1 |" in content
+        assert "openai, ConnectionError: 1" in content
+        assert "token_count: 100.0% hit ratio" in content
+
+    @pytest.mark.asyncio
+    async def test_stats_tool_json_format(self):
+        from tools.stats import StatsTool
+
+        metrics.record_file_read(2048)
+        result = await StatsTool().execute({"format": "json"})
+        snapshot = json.loads(json.loads(result[0].text)["content"])
+
+        series = snapshot["metrics"]["zen_file_bytes_read_total"]["series"]
+        assert series[0]["value"] == 2048
+        assert "budget_utilization" in snapshot
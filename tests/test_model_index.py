@@ -0,0 +1,98 @@
+"""
+Tests for the precomputed model-to-provider index
+"""
+
+import os
+from unittest.mock import patch
+
+import pytest
+
+import utils.model_restrictions
+from providers.base import ProviderType
+from providers.gemini import GeminiModelProvider
+from providers.registry import ModelProviderRegistry
+
+
+@pytest.fixture
+def gemini_only():
+    """Registry with just the Gemini provider and fresh restriction state"""
+    registry = ModelProviderRegistry()
+    saved_providers = dict(registry._providers)
+    saved_instances = dict(registry._initialized_providers)
+    registry._providers.clear()
+    registry._initialized_providers.clear()
+    utils.model_restrictions._restriction_service = None
+    with patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"}):
+        os.environ.pop("GOOGLE_ALLOWED_MODELS", None)
+        ModelProviderRegistry.register_provider(ProviderType.GOOGLE, GeminiModelProvider)
+        yield registry
+    registry._providers.clear()
+    registry._providers.update(saved_providers)
+    registry._initialized_providers.clear()
+    registry._initialized_providers.update(saved_instances)
+    utils.model_restrictions._restriction_service = None
+
+
+@pytest.mark.no_mock_provider
+class TestModelIndex:
+    """Test index contents, O(1) lookups and rebuilds"""
+
+    def test_aliases_resolve_with_capabilities(self, gemini_only):
+        """Aliases map to the provider, canonical name and capabilities"""
+        entry = ModelProviderRegistry.get_model_index().lookup("flash")
+
+        assert entry.provider_type == ProviderType.GOOGLE
+        assert entry.canonical_name == "gemini-2.5-flash"
+        assert entry.capabilities.context_window > 0
+        assert entry.allowed
+
+    def test_lookups_do_not_revalidate(self, gemini_only):
+        """After the index is built, provider lookups skip validate_model_name"""
+        ModelProviderRegistry.get_model_index()
+
+        with patch.object(GeminiModelProvider, "validate_model_name") as mock_validate:
+            provider = ModelProviderRegistry.get_provider_for_model("pro")
+
+        assert provider.get_provider_type() == ProviderType.GOOGLE
+        mock_validate.assert_not_called()
+
+    def test_index_is_reused_until_config_changes(self, gemini_only):
+        """The same snapshot serves lookups until a restriction variable changes"""
+        first = ModelProviderRegistry.get_model_index()
+        assert ModelProviderRegistry.get_model_index() is first
+
+        with patch.dict(os.environ, {"GOOGLE_ALLOWED_MODELS": "pro"}):
+            utils.model_restrictions._restriction_service = None
+            rebuilt = ModelProviderRegistry.get_model_index()
+
+            assert rebuilt is not first
+            assert ModelProviderRegistry.get_provider_for_model("flash") is None
+            assert ModelProviderRegistry.get_provider_for_model("pro") is not None
+            assert not rebuilt.lookup("flash").allowed
+            assert "gemini-2.5-flash" not in ModelProviderRegistry.get_available_models()
+
+    def test_invalidate_forces_rebuild(self, gemini_only):
+        """invalidate_model_index() swaps in a new snapshot"""
+        first = ModelProviderRegistry.get_model_index()
+
+        ModelProviderRegistry.invalidate_model_index()
+
+        assert ModelProviderRegistry.get_model_index() is not first
+
+    def test_unknown_names_fall_back_once(self, gemini_only):
+        """Names outside the index are resolved by the provider walk and memoized"""
+        index = ModelProviderRegistry.get_model_index()
+
+        with patch.object(GeminiModelProvider, "validate_model_name", return_value=False) as mock_validate:
+            assert ModelProviderRegistry.get_provider_for_model("no-such-model") is None
+            assert ModelProviderRegistry.get_provider_for_model("no-such-model") is None
+
+        assert mock_validate.call_count == 1
+        assert "no-such-model" in index._misses
+
+    def test_available_models_copy_is_mutable(self, gemini_only):
+        """Callers get their own dict and cannot corrupt the snapshot"""
+        models = ModelProviderRegistry.get_available_models()
+        models.clear()
+
+        assert ModelProviderRegistry.get_available_models()
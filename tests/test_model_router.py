@@ -0,0 +1,187 @@
+"""
+Tests for latency- and error-aware auto mode routing
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from providers.base import ModelResponse, ProviderType
+from providers.registry import ModelProviderRegistry
+from providers.router import (
+    MIN_LATENCY_SAMPLES,
+    ModelRouter,
+    generate_content_with_stats,
+    get_model_router,
+    is_rate_limit_error,
+)
+from tools.models import ToolModelCategory
+
+CANDIDATES = [("o4-mini", ProviderType.OPENAI), ("gemini-2.5-flash", ProviderType.GOOGLE)]
+
+
+def _router(**kwargs):
+    kwargs.setdefault("latency_weight", 1.0)
+    kwargs.setdefault("cost_weight", 0.0)
+    kwargs.setdefault("error_weight", 4.0)
+    kwargs.setdefault("alpha", 0.5)
+    kwargs.setdefault("rate_limit_cooldown", 60)
+    kwargs.setdefault("model_costs", {})
+    kwargs.setdefault("error_half_life", 300)
+    return ModelRouter(**kwargs)
+
+
+def _warm(router, provider_type, model, latency, count=MIN_LATENCY_SAMPLES):
+    for _ in range(count):
+        router.record_success(provider_type, model, latency, output_tokens=100)
+
+
+class TestModelRouter:
+    """Test scoring and selection"""
+
+    def test_static_order_without_observations(self):
+        """No statistics means the static preference wins"""
+        decision = _router().select(CANDIDATES)
+
+        assert decision.chosen == "o4-mini"
+        assert decision.static_choice == "o4-mini"
+
+    def test_slow_provider_loses(self):
+        """A much slower preferred model is routed around"""
+        router = _router()
+        _warm(router, ProviderType.OPENAI, "o4-mini", 20.0)
+        _warm(router, ProviderType.GOOGLE, "gemini-2.5-flash", 2.0)
+
+        assert router.select(CANDIDATES).chosen == "gemini-2.5-flash"
+
+    def test_errors_are_penalized(self):
+        """A failing model is avoided even when it is fast"""
+        router = _router()
+        _warm(router, ProviderType.OPENAI, "o4-mini", 1.0)
+        for _ in range(3):
+            router.record_failure(ProviderType.OPENAI, "o4-mini", RuntimeError("boom"))
+
+        assert router.select(CANDIDATES).chosen == "gemini-2.5-flash"
+
+    def test_error_penalty_decays_while_idle(self):
+        """A model avoided after a failure is picked again once its penalty fades"""
+        router = _router(error_half_life=60)
+        router.record_failure(ProviderType.OPENAI, "o4-mini", RuntimeError("boom"))
+        assert router.select(CANDIDATES).chosen == "gemini-2.5-flash"
+
+        # No further calls reach o4-mini; only time passes
+        router.get_stats(ProviderType.OPENAI, "o4-mini").error_rate_updated -= 600
+        decision = router.select(CANDIDATES)
+
+        assert decision.chosen == "o4-mini"
+        assert decision.candidates[0]["error_rate"] < 0.001
+
+    def test_speed_is_compared_per_output_token(self):
+        """A model writing longer answers is not penalized for its longer calls"""
+        router = _router()
+        for _ in range(MIN_LATENCY_SAMPLES):
+            router.record_success(ProviderType.OPENAI, "o4-mini", 10.0, output_tokens=2_000)
+            router.record_success(ProviderType.GOOGLE, "gemini-2.5-flash", 2.0, output_tokens=100)
+
+        decision = router.select(CANDIDATES)
+
+        assert decision.chosen == "o4-mini"
+        assert decision.candidates[0]["seconds_per_token"] == pytest.approx(0.005)
+
+        # Without usage from one provider, raw latency is compared
+        router.reset()
+        _warm(router, ProviderType.OPENAI, "o4-mini", 10.0)
+        for _ in range(MIN_LATENCY_SAMPLES):
+            router.record_success(ProviderType.GOOGLE, "gemini-2.5-flash", 2.0)
+        assert router.select(CANDIDATES).chosen == "gemini-2.5-flash"
+
+    def test_rate_limited_model_skipped_during_cooldown(self):
+        """A recent 429 removes the model from the eligible set"""
+        router = _router()
+        router.record_failure(ProviderType.OPENAI, "o4-mini", RuntimeError("Error code: 429 - rate limit"))
+
+        decision = router.select(CANDIDATES)
+
+        assert decision.chosen == "gemini-2.5-flash"
+        assert decision.candidates[0]["rate_limited"] is True
+
+    def test_cost_weight(self):
+        """Configured costs steer selection when their weight is set"""
+        router = _router(cost_weight=1.0, model_costs={"o4-mini": 4.0, "gemini-2.5-flash": 1.0})
+
+        assert router.select(CANDIDATES).chosen == "gemini-2.5-flash"
+
+    def test_decisions_are_inspectable(self):
+        """describe() exposes statistics, weights and score breakdowns"""
+        router = _router()
+        _warm(router, ProviderType.OPENAI, "o4-mini", 1.0)
+        router.select(CANDIDATES, ToolModelCategory.FAST_RESPONSE)
+
+        snapshot = router.describe()
+
+        assert snapshot["models"][0]["model_name"] == "o4-mini"
+        assert snapshot["models"][0]["tokens_per_second_ewma"] == pytest.approx(100.0)
+        assert snapshot["decisions"][0]["tool_category"] == "fast_response"
+        assert {"score", "latency", "error_rate"} <= set(snapshot["decisions"][0]["candidates"][0])
+
+    def test_rate_limit_detection(self):
+        """429s are recognized by status code or message"""
+        error = Exception("too many requests")
+        error.status_code = 429
+        assert is_rate_limit_error(error)
+        assert is_rate_limit_error(RuntimeError("RESOURCE_EXHAUSTED: quota"))
+        assert not is_rate_limit_error(ValueError("bad request"))
+
+
+class TestRoutingIntegration:
+    """Test call recording and registry resolution"""
+
+    def test_generate_content_with_stats_records_calls(self):
+        """Successful and failing calls update the global router"""
+        provider = Mock()
+        provider.get_provider_type.return_value = ProviderType.GOOGLE
+        provider.generate_content.return_value = ModelResponse(
+            content="ok", usage={"output_tokens": 10}, model_name="gemini-2.5-flash"
+        )
+
+        generate_content_with_stats(provider, prompt="hi", model_name="gemini-2.5-flash")
+        provider.generate_content.side_effect = RuntimeError("429")
+        with pytest.raises(RuntimeError):
+            generate_content_with_stats(provider, prompt="hi", model_name="gemini-2.5-flash")
+
+        stats = get_model_router().get_stats(ProviderType.GOOGLE, "gemini-2.5-flash")
+        assert (stats.successes, stats.failures, len(stats.rate_limits)) == (1, 1, 1)
+
+    def test_select_auto_model_uses_router(self):
+        """Auto-mode resolution routes within the category's candidates"""
+        with patch.object(ModelProviderRegistry, "get_routing_candidates", return_value=CANDIDATES):
+            get_model_router().record_failure(ProviderType.OPENAI, "o4-mini", RuntimeError("429 Too Many Requests"))
+
+            assert ModelProviderRegistry.select_auto_model(ToolModelCategory.FAST_RESPONSE) == "gemini-2.5-flash"
+
+    def test_static_routing_setting(self):
+        """AUTO_MODEL_ROUTING=static bypasses the router"""
+        with patch("config.AUTO_MODEL_ROUTING", "static"):
+            with patch.object(ModelProviderRegistry, "get_preferred_fallback_model", return_value="o4-mini"):
+                get_model_router().record_failure(ProviderType.OPENAI, "o4-mini", RuntimeError("429"))
+
+                assert ModelProviderRegistry.select_auto_model(ToolModelCategory.FAST_RESPONSE) == "o4-mini"
+
+    def test_routing_candidates_start_with_static_choice(self):
+        """The eligible set leads with the static pick and adds one model per other provider"""
+        available = {
+            "o3": ProviderType.OPENAI,
+            "o4-mini": ProviderType.OPENAI,
+            "grok-3": ProviderType.XAI,
+            "gemini-2.5-pro": ProviderType.GOOGLE,
+            "gemini-2.5-flash": ProviderType.GOOGLE,
+        }
+
+        with patch.object(ModelProviderRegistry, "get_available_models", return_value=available):
+            candidates = ModelProviderRegistry.get_routing_candidates(ToolModelCategory.EXTENDED_REASONING)
+
+        assert candidates == [
+            ("o3", ProviderType.OPENAI),
+            ("grok-3", ProviderType.XAI),
+            ("gemini-2.5-pro", ProviderType.GOOGLE),
+        ]
@@ -236,3 +236,72 @@ class TestOpenRouterModelRegistry:
         assert caps.supports_streaming
         assert caps.supports_function_calling
         # Note: supports_json_mode is not in ModelCapabilities yet
+
+
+def _write_catalog(path, models, mtime_offset):
+    models = [{"context_window": 1000, "max_output_tokens": 500, **model} for model in models]
+    path.write_text(json.dumps({"models": models}))
+    # Bump mtime explicitly so rapid rewrites are always detected
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset * 1_000_000_000))
+
+
+class TestCatalogHotReload:
+    """Test reloading the catalog when its file changes"""
+
+    def test_changed_file_is_swapped_in(self, tmp_path):
+        """Edits are picked up and unchanged files are not re-read"""
+        path = tmp_path / "custom_models.json"
+        _write_catalog(path, [{"model_name": "a/one", "aliases": ["one"], "context_window": 1000}], 0)
+        registry = OpenRouterModelRegistry(config_path=str(path))
+
+        assert not registry.reload_if_changed()
+
+        _write_catalog(path, [{"model_name": "a/one", "aliases": ["uno"], "context_window": 5000}], 10)
+        assert registry.reload_if_changed()
+        assert registry.resolve("uno").context_window == 5000
+        assert registry.resolve("one") is None
+
+    def test_invalid_edit_keeps_previous_catalog(self, tmp_path):
+        """A duplicate alias or broken JSON does not replace the working catalog"""
+        path = tmp_path / "custom_models.json"
+        _write_catalog(path, [{"model_name": "a/one", "aliases": ["one"]}], 0)
+        registry = OpenRouterModelRegistry(config_path=str(path))
+
+        _write_catalog(path, [{"model_name": "a/one", "aliases": ["x"]}, {"model_name": "b/two", "aliases": ["x"]}], 10)
+        assert not registry.reload_if_changed()
+        assert registry.resolve("one").model_name == "a/one"
+
+        path.write_text("{not json")
+        os.utime(path, ns=(0, path.stat().st_mtime_ns + 20_000_000_000))
+        assert not registry.reload_if_changed()
+        assert registry.list_models() == ["a/one"]
+
+    def test_change_invalidates_dependent_caches(self, tmp_path):
+        """A reload invalidates the model index and runs catalog listeners"""
+        from unittest.mock import Mock, patch
+
+        from providers import openrouter_registry
+        from providers.registry import ModelProviderRegistry
+
+        path = tmp_path / "custom_models.json"
+        _write_catalog(path, [{"model_name": "a/one", "aliases": ["one"]}], 0)
+        registry = OpenRouterModelRegistry(config_path=str(path))
+        listener = Mock()
+
+        with patch.object(openrouter_registry, "_watched_registries", {registry}):
+            with patch.object(openrouter_registry, "_catalog_listeners", [listener]):
+                with patch.object(ModelProviderRegistry, "invalidate_model_index") as invalidate:
+                    assert not openrouter_registry.check_for_catalog_changes()
+                    invalidate.assert_not_called()
+
+                    _write_catalog(path, [{"model_name": "a/one", "aliases": ["two"]}], 10)
+                    assert openrouter_registry.check_for_catalog_changes()
+                    invalidate.assert_called_once()
+                    listener.assert_called_once()
+
+    def test_watcher_disabled_with_zero_interval(self):
+        """CUSTOM_MODELS_RELOAD_INTERVAL=0 starts no thread"""
+        from providers.openrouter_registry import start_catalog_watcher
+
+        assert start_catalog_watcher(interval=0) is None
@@ -0,0 +1,129 @@
+"""
+Tests for per-call CPU and memory profiling
+"""
+
+import os
+import pstats
+import time
+from unittest.mock import patch
+
+import pytest
+
+from utils import profiling
+
+
+def _busy(duration: float = 0.05) -> int:
+    deadline = time.perf_counter() + duration
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+async def _execute(arguments):
+    _busy()
+    return [bytearray(256 * 1024)]
+
+
+@pytest.fixture
+def profile_config(tmp_path):
+    with patch.multiple(
+        "config",
+        PROFILING_MODE="off",
+        PROFILE_SAMPLE_RATE=1.0,
+        PROFILE_SAMPLING_INTERVAL_MS=1.0,
+        PROFILE_MEMORY=True,
+        PROFILE_TRACEMALLOC_FRAMES=1,
+        PROFILE_DIR=str(tmp_path),
+        PROFILE_MAX_FILES=200,
+    ):
+        yield tmp_path
+
+
+def _files(directory, suffix):
+    return sorted(p for p in directory.iterdir() if p.name.endswith(suffix))
+
+
+class TestProfileSession:
+    """Artifacts and summaries for each profiler mode."""
+
+    @pytest.mark.asyncio
+    async def test_cprofile_writes_pstats_and_summary(self, profile_config):
+        result = await profiling.profile_tool_call("chat", _execute, {}, requested="cprofile")
+
+        assert len(result[0]) == 256 * 1024
+        (prof,) = _files(profile_config, ".prof")
+        stats = pstats.Stats(str(prof))
+        assert any(func[2] == "_busy" for func in stats.stats)
+        (summary,) = _files(profile_config, ".summary.txt")
+        text = summary.read_text()
+        assert "Tool: chat" in text and "Mode: cprofile" in text
+        assert "_busy" in text
+        assert "Peak traced memory" in text
+        assert "tests.test_profiling" in text
+
+    @pytest.mark.asyncio
+    async def test_sampling_collects_stacks(self, profile_config):
+        await profiling.profile_tool_call("analyze", _execute, {}, requested="sampling")
+
+        (folded,) = _files(profile_config, ".folded")
+        lines = folded.read_text().splitlines()
+        assert lines
+        assert any("tests.test_profiling:_busy" in line for line in lines)
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) >= 1
+        summary = _files(profile_config, ".summary.txt")[0].read_text()
+        assert "samples every 1 ms" in summary
+
+    @pytest.mark.asyncio
+    async def test_exceptions_propagate_and_profile_is_still_written(self, profile_config):
+        async def failing(arguments):
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await profiling.profile_tool_call("debug", failing, {}, requested=True)
+        assert _files(profile_config, ".summary.txt")
+        assert not profiling._session_lock.locked()
+
+    def test_prune_removes_oldest(self, tmp_path):
+        for i in range(5):
+            path = tmp_path / f"{i}.prof"
+            path.write_text("x")
+            os.utime(path, (1000 + i, 1000 + i))
+
+        assert profiling.prune_profiles(tmp_path, 3) == 2
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["2.prof", "3.prof", "4.prof"]
+
+
+class TestProfileSelection:
+    """Environment and per-call control over which calls are profiled."""
+
+    def test_off_by_default(self, profile_config):
+        assert profiling.resolve_profile_mode() is None
+
+    def test_per_call_request_overrides_mode(self, profile_config):
+        assert profiling.resolve_profile_mode(True) == "cprofile"
+        assert profiling.resolve_profile_mode("sampling") == "sampling"
+        with patch("config.PROFILING_MODE", "sampling"):
+            assert profiling.resolve_profile_mode(True) == "sampling"
+
+    def test_sample_rate(self, profile_config):
+        with patch("config.PROFILING_MODE", "sampling"):
+            assert profiling.resolve_profile_mode() == "sampling"
+            with patch("config.PROFILE_SAMPLE_RATE", 0.0):
+                assert profiling.resolve_profile_mode() is None
+
+    @pytest.mark.asyncio
+    async def test_unprofiled_call_writes_nothing(self, profile_config):
+        await profiling.profile_tool_call("chat", _execute, {})
+        assert list(profile_config.iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_profile_argument_through_server(self, profile_config):
+        from server import handle_call_tool
+
+        result = await handle_call_tool("listmodels", {"_profile": True})
+
+        assert result
+        (summary,) = _files(profile_config, ".summary.txt")
+        assert "Tool: listmodels" in summary.read_text()
@@ -0,0 +1,121 @@
+"""
+Tests for the segment-based prompt representation
+"""
+
+import json
+from unittest.mock import patch
+
+import pytest
+
+from config import MCP_PROMPT_SIZE_LIMIT
+from providers.base import ProviderType
+from providers.mock import MockModelProvider
+from providers.registry import ModelProviderRegistry
+from tools.chat import ChatTool
+from utils.file_utils import read_file_segments, read_files
+from utils.prompt_segments import PromptSegment, SegmentedPrompt
+from utils.token_utils import estimate_tokens
+
+
+class TestSegmentedPrompt:
+    """Test segment bookkeeping and rendering"""
+
+    def test_token_and_char_counts_are_segment_sums(self):
+        """Counts come from the segments without rendering"""
+        prompt = SegmentedPrompt()
+        prompt.append("history " * 100, kind="history", tokens=123)
+        prompt.append("\n\n=== NEW USER INPUT ===\n", kind="instructions", tokens=0)
+        prompt.append("question")
+
+        assert prompt.token_count == 123 + estimate_tokens("question")
+        assert prompt.char_count == len("history " * 100) + len("\n\n=== NEW USER INPUT ===\n") + len("question")
+        assert prompt.breakdown() == {"history": 123, "instructions": 0, "text": estimate_tokens("question")}
+
+    def test_render_is_cached_until_mutation(self):
+        """render() joins once and re-joins only after a change"""
+        prompt = SegmentedPrompt.from_text("a")
+        prompt.append("b")
+        first = prompt.render()
+
+        assert prompt.render() is first
+        prompt.append("c")
+        assert prompt.render() == "abc"
+
+    def test_empty_segments_are_ignored(self):
+        """Empty text does not create segments"""
+        prompt = SegmentedPrompt()
+        prompt.append("")
+        prompt.add_segment(PromptSegment("", 5))
+
+        assert not prompt
+        assert prompt.render() == ""
+
+    def test_extend_shares_segments(self):
+        """Extending reuses segment objects instead of copying text"""
+        files = SegmentedPrompt.from_text("file body", kind="file")
+        prompt = SegmentedPrompt.from_text("header").extend(files)
+
+        assert prompt.segments[1] is files.segments[0]
+        assert prompt.render() == "headerfile body"
+
+
+class TestFileSegments:
+    """Test that segment-based file reading matches read_files output"""
+
+    def test_read_file_segments_matches_read_files(self, project_path):
+        """render() reproduces read_files exactly, with one segment per file"""
+        paths = []
+        for name in ("a.py", "b.py"):
+            path = project_path / name
+            path.write_text(f"def {name[0]}():\n    return 1\n")
+            paths.append(str(path))
+
+        segments = read_file_segments(paths, code="print('hi')")
+
+        assert segments.render() == read_files(paths, code="print('hi')")
+        assert [s.source for s in segments.segments if s.kind == "file"] == paths
+
+
+class TestSegmentedSizeChecks:
+    """Test size validation on segmented prompts"""
+
+    def test_check_prompt_size_accepts_segments(self):
+        """Oversized segmented input triggers the resend_prompt response"""
+        tool = ChatTool()
+        prompt = SegmentedPrompt.from_text("x" * (MCP_PROMPT_SIZE_LIMIT + 1))
+
+        result = tool.check_prompt_size(prompt)
+
+        assert result["status"] == "resend_prompt"
+        assert result["metadata"]["prompt_size"] == MCP_PROMPT_SIZE_LIMIT + 1
+
+    def test_validate_token_limit_uses_segment_sums(self):
+        """A declared token count over the limit is rejected without rescanning"""
+        tool = ChatTool()
+        prompt = SegmentedPrompt([PromptSegment("small text", MCP_PROMPT_SIZE_LIMIT + 1)])
+
+        with pytest.raises(ValueError, match="too large"):
+            tool._validate_token_limit(prompt, "Content")
+
+
+class TestMaterializeOnce:
+    """Test that tool prompts stay segmented until the provider call"""
+
+    @pytest.mark.asyncio
+    async def test_chat_prompt_is_rendered_once(self):
+        """build_standard_prompt returns segments and execute renders them a single time"""
+        from server import handle_call_tool
+
+        ModelProviderRegistry.register_provider(ProviderType.MOCK, MockModelProvider)
+        ModelProviderRegistry.invalidate_model_index()
+        try:
+            with patch.object(SegmentedPrompt, "render", autospec=True, side_effect=SegmentedPrompt.render) as render:
+                result = await handle_call_tool("chat", {"prompt": "Is this rendered once?", "model": "mock"})
+        finally:
+            ModelProviderRegistry.unregister_provider(ProviderType.MOCK)
+            ModelProviderRegistry.invalidate_model_index()
+
+        assert json.loads(result[0].text)["status"] in ("success", "continuation_available")
+        assert render.call_count == 1
+        assert "Is this rendered once?" in render.call_args.args[0]
+        assert {"instructions", "user"} <= set(render.call_args.args[0].breakdown())
@@ -105,3 +105,31 @@ class TestServerTools:
         assert "## Server Information" in content
         assert "## Configuration" in content
         assert "Current Version" in content
+
+
+class TestToolListCache:
+    """Test that list_tools reuses rendered schemas"""
+
+    @pytest.mark.asyncio
+    async def test_schemas_built_once_until_configuration_changes(self, monkeypatch):
+        """Repeated list_tools calls reuse the schemas; a model index change rebuilds them"""
+        from unittest.mock import patch
+
+        import server
+        from providers.registry import ModelProviderRegistry
+
+        server.invalidate_tool_list_cache()
+        with patch.object(server, "_build_tool_list", wraps=server._build_tool_list) as build:
+            first = await server.handle_list_tools()
+            second = await server.handle_list_tools()
+            assert build.call_count == 1
+            assert [tool.name for tool in first] == [tool.name for tool in second]
+            assert first is not second
+
+            ModelProviderRegistry.invalidate_model_index()
+            await server.handle_list_tools()
+            assert build.call_count == 2
+
+            monkeypatch.setattr("config.DEFAULT_MODEL", "some-other-model")
+            await server.handle_list_tools()
+            assert build.call_count == 3
@@ -0,0 +1,68 @@
+"""
+Tests for structured tool results passed to the MCP boundary
+"""
+
+import json
+from unittest.mock import patch
+
+from mcp.types import CallToolResult, TextContent
+
+from server import _extract_response_content
+from tools.models import ToolOutput, ToolResultContent
+from tools.version import VersionTool
+
+
+class TestToolResultContent:
+    """Test ToolResultContent serialization and payload access"""
+
+    def test_tool_output_serialized_once_with_payload(self):
+        """Text matches model_dump_json and the structured object is kept"""
+        output = ToolOutput(status="success", content="answer", content_type="markdown")
+
+        item = ToolResultContent.from_output(output)
+
+        assert item.text == output.model_dump_json()
+        assert item.payload is output
+        assert item.result_content == "answer"
+
+    def test_dict_payload_uses_requested_indent(self):
+        """Dict payloads are dumped like the workflow tools always did"""
+        data = {"status": "pause_for_analysis", "content": "ünïcode", "step_number": 1}
+
+        item = ToolResultContent.from_output(data, indent=2)
+
+        assert item.text == json.dumps(data, indent=2, ensure_ascii=False)
+        assert item.result_content == "ünïcode"
+
+    def test_payload_not_sent_over_the_wire(self):
+        """Only type/text reach the client"""
+        item = ToolResultContent.from_output(ToolOutput(content="x"))
+
+        wire = json.loads(CallToolResult(content=[item]).model_dump_json(exclude_none=True))
+
+        assert set(wire["content"][0]) == {"type", "text"}
+
+
+class TestServerResponseExtraction:
+    """Test that the server reads structured results without re-parsing"""
+
+    def test_structured_result_is_not_parsed(self):
+        """The payload is used directly; json.loads is never called"""
+        item = ToolResultContent.from_output(ToolOutput(content="model reply"))
+
+        with patch("server.json.loads") as mock_loads:
+            assert _extract_response_content(item) == "model reply"
+            mock_loads.assert_not_called()
+
+    def test_plain_text_content_falls_back_to_parsing(self):
+        """Third-party style TextContent still yields its content field"""
+        item = TextContent(type="text", text=json.dumps({"status": "success", "content": "legacy"}))
+
+        assert _extract_response_content(item) == "legacy"
+
+    async def test_tools_return_structured_results(self):
+        """In-tree tools hand the server a ToolResultContent"""
+        result = await VersionTool().execute({})
+
+        assert isinstance(result[0], ToolResultContent)
+        assert isinstance(result[0].payload, ToolOutput)
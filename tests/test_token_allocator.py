@@ -0,0 +1,155 @@
+"""
+Tests for demand-driven token allocation and utilization reporting
+"""
+
+from unittest.mock import Mock
+
+import pytest
+
+from utils.model_context import (
+    CONSUMER_MINIMUM_SHARES,
+    MIN_RESPONSE_TOKENS,
+    ModelContext,
+    _utilization_stats,
+    _water_fill,
+    get_utilization_summary,
+)
+
+
+def _context(context_window=200_000, max_output_tokens=100_000):
+    context = ModelContext("test-model")
+    context._capabilities = Mock(context_window=context_window, max_output_tokens=max_output_tokens)
+    return context
+
+
+class TestWaterFill:
+    """Test the max-min fair split with minimum guarantees"""
+
+    def test_small_demands_release_budget(self):
+        """Consumers needing little leave the rest to the others"""
+        granted = _water_fill(1000, {"a": 50, "b": None}, {})
+
+        assert granted == {"a": 50, "b": 950}
+
+    def test_minimum_guarantee_under_contention(self):
+        """Every consumer keeps its guaranteed share when all want everything"""
+        granted = _water_fill(1000, {"a": None, "b": None, "c": 5000}, {"a": 0.5})
+
+        assert granted["a"] >= 500
+        assert sum(granted.values()) == 1000
+
+    def test_unknown_demand_absorbs_the_residual(self):
+        """A consumer of unknown size gets its minimum share plus what known demands leave"""
+        granted = _water_fill(
+            800_000, {"prompt": None, "history": 0, "files": 2_000_000, "images": 0}, CONSUMER_MINIMUM_SHARES
+        )
+
+        assert granted == {"prompt": 40_000, "history": 0, "files": 760_000, "images": 0}
+        assert _water_fill(1000, {"a": 200, "b": None, "c": None}, {}) == {"a": 200, "b": 400, "c": 400}
+
+    def test_never_exceeds_budget_or_demand(self):
+        """Grants are capped by both demand and budget"""
+        granted = _water_fill(100, {"a": 30, "b": 30}, {"a": 0.1, "b": 0.1})
+
+        assert granted == {"a": 30, "b": 30}
+
+
+class TestAdaptiveAllocation:
+    """Test ModelContext allocation once demand is recorded"""
+
+    def test_legacy_split_without_demand(self):
+        """No recorded demand keeps the fixed ratios"""
+        allocation = _context().calculate_token_allocation()
+
+        assert allocation.content_tokens == 120_000
+        assert allocation.file_tokens == 36_000
+        assert allocation.history_tokens == 60_000
+        assert not allocation.adaptive
+
+    def test_no_history_gives_budget_to_files(self):
+        """A new conversation does not reserve history budget that files could use"""
+        context = _context()
+        context.update_demand(history=0, prompt=2_000, images=0, output=16_384)
+
+        allocation = context.calculate_token_allocation()
+
+        assert allocation.response_tokens == 16_384
+        assert allocation.history_tokens == 0
+        assert allocation.file_tokens > 36_000
+        assert allocation.prompt_tokens >= 2_000
+
+    def test_long_chat_without_files_gives_budget_to_history(self):
+        """History can use the budget files do not need"""
+        context = _context()
+        context.update_demand(history=150_000, files=0, prompt=1_000, images=0, output=16_384)
+
+        allocation = context.calculate_token_allocation()
+
+        assert allocation.file_tokens == 0
+        assert allocation.history_tokens == allocation.content_tokens - allocation.prompt_tokens
+        assert allocation.history_tokens > 60_000
+
+    def test_minimum_guarantees_when_oversubscribed(self):
+        """Huge history cannot starve files below their guaranteed share"""
+        context = _context()
+        context.update_demand(history=10_000_000, files=10_000_000, prompt=500, images=0)
+
+        allocation = context.calculate_token_allocation()
+
+        assert allocation.file_tokens >= int(allocation.content_tokens * CONSUMER_MINIMUM_SHARES["files"])
+        assert (
+            allocation.file_tokens + allocation.history_tokens + allocation.prompt_tokens <= allocation.content_tokens
+        )
+
+    def test_response_reservation_bounds(self):
+        """Expected output is raised to the minimum and capped by the model's output limit"""
+        context = _context(max_output_tokens=8_000)
+        context.update_demand(output=100)
+        assert context.calculate_token_allocation().response_tokens == MIN_RESPONSE_TOKENS
+
+        context.update_demand(output=50_000)
+        assert context.calculate_token_allocation().response_tokens == 8_000
+
+    def test_workflow_records_prompt_demand(self):
+        """Workflow steps record the expert prompt material so files are not cut for an unknown prompt"""
+        from tools.debug import DebugIssueTool
+
+        tool = DebugIssueTool()
+        tool.work_history = [{"findings": "earlier finding " * 50}]
+        request = tool.get_workflow_request_model()(
+            step="Investigate", step_number=2, total_steps=2, next_step_required=False, findings="Root cause found"
+        )
+        context = _context()
+
+        tool._record_request_demand(context, "thread-id", tool._expected_prompt_text(request))
+
+        assert 0 < context.demand.prompt < 1_000
+        context.update_demand(files=500_000)
+        allocation = context.calculate_token_allocation()
+        assert allocation.prompt_tokens == context.demand.prompt
+        assert allocation.file_tokens > allocation.content_tokens * 0.8
+
+    def test_unknown_consumer_rejected(self):
+        """Typos in consumer names fail loudly"""
+        with pytest.raises(ValueError):
+            _context().update_demand(documents=10)
+
+
+class TestUtilizationReporting:
+    """Test usage reporting against the allocation"""
+
+    def test_report_attributes_remaining_tokens_to_prompt(self):
+        """Sent tokens not recorded as history/files count as prompt, and the summary aggregates"""
+        _utilization_stats.reset()
+        context = _context()
+        context.update_demand(history=1_000, files=4_000, prompt=500)
+        context.record_usage(history=1_000, files=3_000)
+
+        report = context.report_utilization(sent_tokens=5_000)
+
+        assert report["consumers"]["prompt"]["used"] == 1_000
+        assert report["used_tokens"] == 5_000
+        assert report["utilization"] == pytest.approx(5_000 / 200_000)
+        summary = get_utilization_summary()["test-model"]
+        assert summary["requests"] == 1
+        assert summary["consumers"]["files"]["used"] == 3_000
@@ -0,0 +1,233 @@
+"""
+Tests for token estimator calibration (offline ratios and online correction factors)
+"""
+
+import importlib.util
+import json
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+from providers.base import ModelResponse, ProviderType
+from providers.router import generate_content_with_stats
+from utils import token_calibration
+from utils.file_types import get_token_estimation_ratio
+from utils.token_calibration import (
+    MIN_SAMPLES,
+    TokenCalibration,
+    calibrated_estimate,
+    get_token_calibration,
+    reset_token_calibration,
+)
+from utils.tokenizer import TokenizerService
+
+SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "calibrate_tokens.py"
+
+
+def _load_script():
+    spec = importlib.util.spec_from_file_location("calibrate_tokens", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+calibrate_tokens = _load_script()
+
+
+class FakeEncoding:
+    """Stand-in for a tiktoken Encoding with a fixed number of bytes per token"""
+
+    def __init__(self, name, bytes_per_token):
+        self.name = name
+        self.bytes_per_token = bytes_per_token
+
+    def encode_ordinary_batch(self, texts):
+        return [[0] * max(1, round(len(text.encode("utf-8")) / self.bytes_per_token)) for text in texts]
+
+
+class UsageProvider:
+    """Provider stub reporting input tokens at a fixed multiple of the character estimate"""
+
+    def __init__(self, multiple):
+        self.multiple = multiple
+
+    def get_provider_type(self):
+        return ProviderType.CUSTOM
+
+    def generate_content(self, prompt, model_name, system_prompt=None, **kwargs):
+        input_tokens = int((len(prompt) + len(system_prompt or "")) / 4 * self.multiple)
+        return ModelResponse(
+            content="ok", usage={"input_tokens": input_tokens, "output_tokens": 1}, model_name=model_name
+        )
+
+
+@pytest.fixture
+def calibration_file(tmp_path, monkeypatch):
+    path = tmp_path / "calibration.json"
+    monkeypatch.setattr("config.TOKEN_CALIBRATION_ENABLED", True)
+    monkeypatch.setattr("config.TOKEN_CALIBRATION_FILE", str(path))
+    reset_token_calibration()
+    yield path
+    reset_token_calibration()
+
+
+class TestTokenCalibration:
+    """Correction factors, extension ratios and the shared file."""
+
+    def test_factor_applies_after_min_samples(self, tmp_path):
+        calibration = TokenCalibration(tmp_path / "c.json")
+
+        for _ in range(MIN_SAMPLES - 1):
+            calibration.observe("Model-A", 1000, 1300)
+        assert calibration.correction_factor("model-a") == 1.0
+
+        calibration.observe("model-a", 1000, 1300)
+        assert calibration.correction_factor("model-a") == pytest.approx(1.3)
+        assert calibration.correction_factor("model-b") == 1.0
+
+    def test_observations_are_clamped_and_smoothed(self, tmp_path):
+        calibration = TokenCalibration(tmp_path / "c.json")
+        for _ in range(20):
+            calibration.observe("m", 1000, 1200)
+
+        calibration.observe("m", 1000, 1_000_000)
+
+        factor = calibration.correction_factor("m")
+        assert 1.2 < factor <= 1.2 + token_calibration.EWMA_ALPHA * (token_calibration.MAX_FACTOR - 1.2) + 1e-9
+
+    def test_factors_persist_and_merge_across_processes(self, tmp_path):
+        path = tmp_path / "c.json"
+        first = TokenCalibration(path)
+        second = TokenCalibration(path)
+        for _ in range(MIN_SAMPLES):
+            first.observe("model-a", 1000, 800)
+            second.observe("model-b", 1000, 1500)
+
+        first.save()
+        second.save()
+
+        restarted = TokenCalibration(path)
+        assert restarted.correction_factor("model-a") == pytest.approx(0.8)
+        assert restarted.correction_factor("model-b") == pytest.approx(1.5)
+        # The earlier writer learns what the other process saved
+        first.save()
+        assert first.correction_factor("model-b") == pytest.approx(1.5)
+
+    def test_saves_periodically(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(token_calibration, "SAVE_EVERY", 2)
+        path = tmp_path / "c.json"
+        calibration = TokenCalibration(path)
+
+        calibration.observe("m", 1000, 1000)
+        assert not path.exists()
+        calibration.observe("m", 1000, 1000)
+        assert json.loads(path.read_text())["model_factors"]["m"]["samples"] == 2
+
+    def test_extension_ratios_by_family(self, tmp_path):
+        calibration = TokenCalibration(tmp_path / "c.json")
+        calibration.set_extension_ratios({"o200k_base": {".py": 4.4}, "default": {".py": 4.0, ".go": 3.0}})
+
+        assert calibration.extension_ratio(".py", "gpt-4o") == 4.4
+        assert calibration.extension_ratio(".py", "gemini-2.5-pro") == 4.0
+        assert calibration.extension_ratio(".go", "gpt-4o") == 3.0
+        assert calibration.extension_ratio(".rs") is None
+
+    def test_unreadable_file_is_ignored(self, tmp_path):
+        path = tmp_path / "c.json"
+        path.write_text("{not json")
+
+        calibration = TokenCalibration(path)
+
+        assert calibration.correction_factor("m") == 1.0
+        calibration.observe("m", 1000, 1000)
+        calibration.save()
+        assert json.loads(path.read_text())["model_factors"]["m"]["samples"] == 1
+
+
+class TestOnlineCalibration:
+    """Provider usage corrects the estimates used for budgeting."""
+
+    def test_usage_updates_estimates(self, calibration_file):
+        provider = UsageProvider(multiple=1.5)
+        prompt = "x" * 8000
+        for _ in range(MIN_SAMPLES):
+            generate_content_with_stats(provider, prompt=prompt, model_name="custom-model")
+
+        assert calibrated_estimate(prompt, "custom-model") == 3000
+        assert TokenizerService(exact=False).count_tokens(prompt, "custom-model") == 3000
+        assert TokenizerService(exact=False).count_tokens_batch([prompt], "custom-model") == [3000]
+        assert calibrated_estimate(prompt, "other-model") == 2000
+
+        reset_token_calibration()
+        assert calibrated_estimate(prompt, "custom-model") == 3000
+
+    def test_images_and_short_prompts_are_not_observed(self, calibration_file):
+        provider = UsageProvider(multiple=3.0)
+        for _ in range(MIN_SAMPLES):
+            generate_content_with_stats(provider, prompt="x" * 8000, model_name="m", images=["/tmp/a.png"])
+            generate_content_with_stats(provider, prompt="short", model_name="m")
+
+        assert get_token_calibration().describe()["model_factors"] == {}
+
+    def test_disabled(self, calibration_file, monkeypatch):
+        monkeypatch.setattr("config.TOKEN_CALIBRATION_ENABLED", False)
+        reset_token_calibration()
+
+        generate_content_with_stats(UsageProvider(multiple=2.0), prompt="x" * 8000, model_name="m")
+
+        assert get_token_calibration() is None
+        assert not calibration_file.exists()
+
+    def test_measured_file_ratios_are_used(self, calibration_file):
+        assert get_token_estimation_ratio("/a/b.py") == 3.5
+        get_token_calibration().set_extension_ratios({"default": {".py": 4.25}})
+
+        assert get_token_estimation_ratio("/a/b.py", "gemini-2.5-pro") == 4.25
+        assert get_token_estimation_ratio("/a/b.json") == 2.5
+
+
+class TestCalibrateScript:
+    """scripts/calibrate_tokens.py measures a corpus and writes the ratios."""
+
+    def _corpus(self, root: Path) -> Path:
+        corpus = root / "project"
+        corpus.mkdir()
+        (corpus / "a.py").write_text("def f():\n    return 1\n" * 200)
+        (corpus / "b.md").write_text("# Title\n\nSome prose.\n" * 10)
+        return corpus
+
+    def test_measure(self, tmp_path):
+        files = calibrate_tokens.collect_files([str(self._corpus(tmp_path))])
+        encoders = {"o200k_base": FakeEncoding("o200k_base", 4.0), "cl100k_base": FakeEncoding("cl100k_base", 3.0)}
+
+        results = calibrate_tokens.measure(files, encoders, min_bytes=1000)
+
+        assert results["ratios"]["o200k_base"][".py"] == pytest.approx(4.0, rel=0.01)
+        assert results["ratios"]["cl100k_base"][".py"] == pytest.approx(3.0, rel=0.01)
+        assert results["ratios"]["default"][".py"] == pytest.approx(3.5, rel=0.01)
+        # Too little markdown to calibrate, but still reported
+        assert ".md" not in results["ratios"]["default"]
+        assert results["extensions"][".md"]["files"] == 1
+
+    def test_main_writes_calibration_file(self, tmp_path, monkeypatch, capsys):
+        corpus = self._corpus(tmp_path)
+        output = tmp_path / "out.json"
+        fake_tiktoken = types.SimpleNamespace(get_encoding=lambda name: FakeEncoding(name, 4.0))
+        monkeypatch.setitem(sys.modules, "tiktoken", fake_tiktoken)
+        monkeypatch.setattr(
+            sys, "argv", ["calibrate_tokens.py", str(corpus), "--min-bytes", "1000", "--output", str(output)]
+        )
+
+        assert calibrate_tokens.main() == 0
+
+        assert TokenCalibration(output).extension_ratio(".py", "gpt-4") == pytest.approx(4.0, rel=0.01)
+        assert ".py" in capsys.readouterr().out
+
+    def test_main_without_tiktoken(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.setitem(sys.modules, "tiktoken", None)
+        monkeypatch.setattr(sys, "argv", ["calibrate_tokens.py", str(tmp_path)])
+
+        assert calibrate_tokens.main() == 1
+        assert "pip install tiktoken" in capsys.readouterr().err
@@ -0,0 +1,114 @@
+"""
+Tests for the cached tokenizer service
+"""
+
+from unittest.mock import patch
+
+from utils.model_context import ModelContext
+from utils.token_utils import estimate_tokens
+from utils.tokenizer import TokenizerService, get_tokenizer
+
+
+class FakeEncoding:
+    """Stand-in for a tiktoken Encoding: one token per whitespace-separated word"""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.batch_calls = 0
+
+    def encode_ordinary(self, text):
+        self.calls += 1
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        self.batch_calls += 1
+        return [text.split() for text in texts]
+
+
+def _service_with_fake_encoder():
+    service = TokenizerService(exact=True)
+    service._encoders["o200k_base"] = FakeEncoding("o200k_base")
+    service._encoders["cl100k_base"] = FakeEncoding("cl100k_base")
+    return service
+
+
+class TestEncodingSelection:
+    """Test model family to encoding mapping"""
+
+    def test_model_families(self):
+        """OpenAI families map to their encodings, others to none"""
+        assert TokenizerService.encoding_name_for("gpt-4o-mini") == "o200k_base"
+        assert TokenizerService.encoding_name_for("openai/gpt-5") == "o200k_base"
+        assert TokenizerService.encoding_name_for("o3-mini") == "o200k_base"
+        assert TokenizerService.encoding_name_for("gpt-4-turbo") == "cl100k_base"
+        assert TokenizerService.encoding_name_for("gemini-2.5-flash") is None
+        assert TokenizerService.encoding_name_for(None) is None
+
+    def test_missing_tokenizer_falls_back_and_is_not_retried(self):
+        """A failed encoder load is cached and counts use the estimate"""
+        service = TokenizerService(exact=True)
+        text = "x" * 400
+
+        with patch.dict("sys.modules", {"tiktoken": None}):
+            assert service.count_tokens(text, "gpt-4o") == estimate_tokens(text)
+        assert "o200k_base" in service._encoders and service._encoders["o200k_base"] is None
+
+    def test_exact_disabled(self):
+        """TOKENIZER_EXACT=false forces estimates"""
+        service = TokenizerService(exact=False)
+        service._encoders["o200k_base"] = FakeEncoding("o200k_base")
+
+        assert service.count_tokens("a b c d e f g h", "gpt-4o") == estimate_tokens("a b c d e f g h")
+
+
+class TestExactCounting:
+    """Test exact counts, memoization and batching"""
+
+    def test_exact_count_is_memoized(self):
+        """Long texts are encoded once and then served from the memo"""
+        service = _service_with_fake_encoder()
+        text = "word " * 100
+
+        assert service.count_tokens(text, "gpt-4o") == 100
+        assert service.count_tokens(text, "gpt-4o") == 100
+        assert service._encoders["o200k_base"].calls == 1
+        assert service.stats["memo_hits"] == 1
+
+    def test_memo_is_bounded(self):
+        """The memo evicts least recently used entries"""
+        service = TokenizerService(memo_size=2, exact=True)
+        service._encoders["o200k_base"] = FakeEncoding("o200k_base")
+        for i in range(3):
+            service.count_tokens(f"{i} " * 200, "gpt-4o")
+
+        assert len(service._memo) == 2
+
+    def test_batch_encodes_misses_in_one_call(self):
+        """Batch counting uses the memo and one batch encode for the rest"""
+        service = _service_with_fake_encoder()
+        cached = "cached " * 100
+        service.count_tokens(cached, "gpt-4")
+
+        counts = service.count_tokens_batch([cached, "a b", "c d e"], "gpt-4")
+
+        assert counts == [100, 2, 3]
+        assert service._encoders["cl100k_base"].batch_calls == 1
+
+
+class TestTokenizerIntegration:
+    """Test that budget decisions go through the shared service"""
+
+    def test_model_context_uses_service(self):
+        """ModelContext.estimate_tokens delegates with its model name"""
+        context = ModelContext("gpt-4o")
+
+        with patch.object(get_tokenizer(), "count_tokens", return_value=7) as mock_count:
+            assert context.estimate_tokens("hello") == 7
+            mock_count.assert_called_once_with("hello", "gpt-4o")
+
+    def test_estimate_fallback_matches_token_utils(self):
+        """Models without a tokenizer get the standard estimate"""
+        context = ModelContext("gemini-2.5-flash")
+
+        assert context.estimate_tokens("y" * 400) == estimate_tokens("y" * 400)
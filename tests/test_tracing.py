@@ -0,0 +1,158 @@
+"""
+Tests for request tracing spans and the trace analyzer
+"""
+
+import importlib.util
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from tests.mock_helpers import create_mock_provider
+from utils import tracing
+
+_ANALYZER_PATH = Path(__file__).resolve().parent.parent / "scripts" / "trace_analyzer.py"
+_spec = importlib.util.spec_from_file_location("trace_analyzer", _ANALYZER_PATH)
+trace_analyzer = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(trace_analyzer)
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracing.configure_tracing(enabled=True, path=str(path))
+    yield path
+    tracing.configure_tracing(enabled=False, path=str(path))
+
+
+def _read_spans(path: Path) -> list[dict]:
+    tracing.flush_traces()
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestSpans:
+    """Span nesting, attributes and the writer."""
+
+    def test_disabled_tracing_is_noop(self, tmp_path):
+        tracing.configure_tracing(enabled=False, path=str(tmp_path / "traces.jsonl"))
+        with tracing.start_trace("tool_call") as span:
+            span.set(status="ok")
+            assert tracing.current_span() is None
+        assert not (tmp_path / "traces.jsonl").exists()
+
+    def test_child_spans_share_trace_id(self, trace_file):
+        with tracing.start_trace("tool_call", tool="chat") as root:
+            with tracing.start_span("read_files") as child:
+                tracing.set_span_attrs(files=2)
+                tracing.add_span_event("retry", attempt=1)
+            assert tracing.current_span() is root
+        assert tracing.current_span() is None
+
+        spans = {span["name"]: span for span in _read_spans(trace_file)}
+        assert spans["read_files"]["trace_id"] == spans["tool_call"]["trace_id"] == root.trace_id
+        assert spans["read_files"]["parent_id"] == root.span_id
+        assert spans["read_files"]["span_id"] == child.span_id
+        assert spans["read_files"]["attrs"] == {"files": 2}
+        assert spans["read_files"]["events"][0]["name"] == "retry"
+        assert spans["tool_call"]["parent_id"] is None
+
+    def test_exception_marks_span_as_error(self, trace_file):
+        with pytest.raises(ValueError):
+            with tracing.start_trace("tool_call"):
+                raise ValueError("boom")
+
+        (span,) = _read_spans(trace_file)
+        assert span["status"] == "error"
+        assert span["error"] == "ValueError"
+
+    @pytest.mark.asyncio
+    async def test_traced_decorator_supports_async(self, trace_file):
+        @tracing.traced("reconstruct_thread_context")
+        async def reconstruct():
+            return tracing.current_span().name
+
+        with tracing.start_trace("tool_call"):
+            assert await reconstruct() == "reconstruct_thread_context"
+
+        names = [span["name"] for span in _read_spans(trace_file)]
+        assert names == ["reconstruct_thread_context", "tool_call"]
+
+
+class TestPipelineTracing:
+    """A tool call through the server produces one trace covering every stage."""
+
+    @pytest.mark.asyncio
+    @patch("providers.ModelProviderRegistry.get_provider_for_model")
+    async def test_chat_call_is_traced_end_to_end(self, mock_get_provider, trace_file, tmp_path):
+        from server import handle_call_tool
+
+        mock_get_provider.return_value = create_mock_provider()
+        source = tmp_path / "example.py"
+        source.write_text("def add(a, b):\n    return a + b\n")
+
+        await handle_call_tool("chat", {"prompt": "Explain this", "files": [str(source)], "model": "flash"})
+
+        spans = _read_spans(trace_file)
+        assert len({span["trace_id"] for span in spans}) == 1
+        by_name = {span["name"]: span for span in spans}
+        for stage in ("tool_call", "prepare_prompt", "prepare_file_content", "expand_paths", "read_files"):
+            assert stage in by_name, stage
+        assert by_name["generate_content"]["attrs"]["output_tokens"] == 20
+        assert by_name["tool_call"]["attrs"]["tool"] == "chat"
+        assert by_name["read_files"]["parent_id"] == by_name["prepare_file_content"]["span_id"]
+        assert by_name["prepare_prompt"]["parent_id"] == by_name["tool_call"]["span_id"]
+
+
+class TestTraceAnalyzer:
+    """Per-stage breakdown across requests."""
+
+    def _span(self, trace_id, span_id, name, duration, parent=None, start=0.0, **extra):
+        return {
+            "trace_id": trace_id,
+            "span_id": span_id,
+            "parent_id": parent,
+            "name": name,
+            "start": start,
+            "duration_ms": duration,
+            "status": "ok",
+            "attrs": extra.pop("attrs", {}),
+            **extra,
+        }
+
+    def test_self_time_and_shares(self, tmp_path):
+        spans = []
+        for i, provider_ms in enumerate((800.0, 1800.0)):
+            trace = f"t{i}"
+            spans += [
+                self._span(trace, f"{trace}-root", "tool_call", 1000.0 + provider_ms, attrs={"tool": "chat"}),
+                self._span(trace, f"{trace}-files", "read_files", 150.0, parent=f"{trace}-root", start=1),
+                self._span(
+                    trace,
+                    f"{trace}-gen",
+                    "generate_content",
+                    provider_ms,
+                    parent=f"{trace}-root",
+                    start=2,
+                    events=[{"name": "retry", "offset_ms": 1.0, "attrs": {}}],
+                ),
+            ]
+        # An orphan span without its root is ignored
+        spans.append(self._span("partial", "x", "read_files", 99.0, parent="missing"))
+        path = tmp_path / "traces.jsonl"
+        path.write_text("\n".join(json.dumps(span) for span in spans) + "\nnot json\n")
+
+        results = trace_analyzer.analyze(trace_analyzer.group_traces(trace_analyzer.load_spans(path)))
+
+        assert results["requests"] == 2
+        stages = results["stages"]
+        assert stages["generate_content"]["total_ms"] == 2600.0
+        assert stages["generate_content"]["retries"] == 2
+        assert stages["tool_call"]["self_ms"] == 1700.0  # 2 x (1000 - 150)
+        assert stages["read_files"]["count"] == 2
+        assert sum(stage["self_share"] for stage in stages.values()) == pytest.approx(1.0)
+        assert results["tools"]["chat"]["count"] == 2
+
+        tree = trace_analyzer.format_tree(trace_analyzer.group_traces(spans)["t0"])
+        assert tree[0].startswith("tool_call")
+        assert "retries=1" in tree[2]
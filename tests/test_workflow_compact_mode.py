@@ -0,0 +1,129 @@
+"""
+Tests for the compact/delta response mode of workflow tools
+"""
+
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from tools.analyze import AnalyzeTool
+from tools.consensus import ConsensusTool
+
+
+def _request(step_number, response_mode="compact"):
+    return SimpleNamespace(step_number=step_number, response_mode=response_mode)
+
+
+def _step_response(step_number, files, expert=None):
+    response = {
+        "status": "analyze_in_progress",
+        "step_number": step_number,
+        "total_steps": 3,
+        "next_step_required": True,
+        "continuation_id": "thread-1",
+        "analyze_status": {"files_checked": len(files), "current_confidence": "low"},
+        "relevant_files": files,
+        "next_steps": "Continue the investigation",
+    }
+    if expert is not None:
+        response["expert_analysis"] = expert
+    return response
+
+
+class TestCompactWorkflowResponses:
+    """Test delta computation and serialization in compact mode"""
+
+    def test_full_mode_is_default_and_pretty_printed(self):
+        """Without opt-in the response is unchanged and indented"""
+        tool = AnalyzeTool()
+        data = _step_response(1, ["/a.py"])
+
+        result = tool.build_workflow_result(data, _request(1, response_mode=None), "thread-1")
+
+        assert result[0].text == json.dumps(data, indent=2, ensure_ascii=False)
+
+    def test_env_default_enables_compact_mode(self):
+        """WORKFLOW_RESPONSE_MODE=compact applies when the request does not choose"""
+        tool = AnalyzeTool()
+        with patch("config.WORKFLOW_RESPONSE_MODE", "compact"):
+            assert tool.get_request_response_mode(_request(1, response_mode=None)) == "compact"
+
+    def test_compact_mode_sends_only_changes(self):
+        """Unchanged fields are omitted, grown lists send appended items, nested dicts are diffed"""
+        tool = AnalyzeTool()
+        tool.build_workflow_result(_step_response(1, ["/a.py"]), _request(1), "thread-1")
+
+        result = tool.build_workflow_result(_step_response(2, ["/a.py", "/b.py"]), _request(2), "thread-1")
+        text = result[0].text
+        delta = json.loads(text)
+
+        assert "\n" not in text and ", " not in text
+        assert delta["step_number"] == 2
+        assert delta["continuation_id"] == "thread-1"
+        assert delta["relevant_files"] == ["/b.py"]
+        assert delta["appended_fields"] == ["relevant_files"]
+        assert delta["analyze_status"] == {"files_checked": 2}
+        assert "next_steps" not in delta
+        assert "next_steps" in delta["unchanged_fields"]
+
+    def test_removed_nested_keys_are_reported(self):
+        """Keys dropped from nested dicts are listed like removed top-level fields"""
+        tool = AnalyzeTool()
+        first = _step_response(1, ["/a.py"])
+        first["analyze_status"]["details"] = {"pending": 1, "done": 0}
+        tool.build_workflow_result(first, _request(1), "thread-1")
+
+        second = _step_response(2, ["/a.py"])
+        second["analyze_status"]["details"] = {"done": 0}
+        del second["next_steps"]
+        delta = json.loads(tool.build_workflow_result(second, _request(2), "thread-1")[0].text)
+
+        assert delta["analyze_status"] == {"details": {}}
+        assert delta["removed_fields"] == ["next_steps", "analyze_status.details.pending"]
+
+        # Removing a key does not mark the dict unchanged
+        third = _step_response(3, ["/a.py"])
+        del third["analyze_status"]["current_confidence"]
+        third["analyze_status"]["details"] = {"done": 0}
+        delta = json.loads(tool.build_workflow_result(third, _request(3), "thread-1")[0].text)
+
+        assert "analyze_status" not in delta.get("unchanged_fields", [])
+        assert "analyze_status.current_confidence" in delta["removed_fields"]
+
+    def test_expert_analysis_returned_once(self):
+        """Expert analysis is not repeated in later responses of the same thread"""
+        tool = AnalyzeTool()
+        expert = {"status": "analysis_complete", "raw_analysis": "long analysis " * 100}
+        first = tool._compact_workflow_response(_step_response(1, [], expert), _request(1), "thread-1")
+        tool._compact_workflow_response(_step_response(2, []), _request(2), "thread-1")
+
+        third = tool._compact_workflow_response(_step_response(3, [], expert), _request(3), "thread-1")
+
+        assert first["expert_analysis"] == expert
+        assert "expert_analysis" not in third
+
+    def test_threads_are_tracked_separately(self):
+        """Deltas are computed against the previous step of the same thread only"""
+        tool = AnalyzeTool()
+        tool._compact_workflow_response(_step_response(1, ["/a.py"]), _request(1), "thread-1")
+
+        other = tool._compact_workflow_response(_step_response(2, ["/a.py"]), _request(2), "thread-2")
+
+        assert other["relevant_files"] == ["/a.py"]
+
+    def test_consensus_does_not_resend_accumulated_responses(self):
+        """Consensus drops accumulated_responses in compact mode"""
+        tool = ConsensusTool()
+        response = {
+            "status": "model_consulted",
+            "step_number": 2,
+            "total_steps": 2,
+            "next_step_required": False,
+            "model_response": {"model": "o3", "verdict": "yes"},
+            "accumulated_responses": [{"model": "flash", "verdict": "no"}, {"model": "o3", "verdict": "yes"}],
+        }
+
+        delta = tool._compact_workflow_response(response, _request(2), None)
+
+        assert "accumulated_responses" not in delta
+        assert delta["model_response"] == {"model": "o3", "verdict": "yes"}
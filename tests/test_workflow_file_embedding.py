@@ -182,6 +182,7 @@ class TestWorkflowFileEmbedding:
         # Set up the tool methods
         self.mock_tool.get_current_model_context.return_value = mock_model_context
         self.mock_tool.wants_line_numbers_by_default.return_value = True
+        self.mock_tool.get_file_compaction.return_value = frozenset()
 
         # Call the method
         file_content, processed_files = self.mock_tool._force_embed_files_for_expert_analysis(self.test_files)
@@ -192,6 +193,7 @@ class TestWorkflowFileEmbedding:
             max_tokens=100000,
             reserve_tokens=1000,
             include_line_numbers=True,
+            compaction=frozenset(),
         )
 
         # Verify it expanded paths to get individual files
@@ -1,23 +1,33 @@
 """
 Tool implementations for Zen MCP Server
+
+Tool classes are imported on first attribute access, so importing a submodule
+such as tools.models or tools.shared does not load every tool and its system
+prompt.
 """
 
-from .analyze import AnalyzeTool
-from .challenge import ChallengeTool
-from .chat import ChatTool
-from .codereview import CodeReviewTool
-from .consensus import ConsensusTool
-from .debug import DebugIssueTool
-from .docgen import DocgenTool
-from .listmodels import ListModelsTool
-from .planner import PlannerTool
-from .precommit import PrecommitTool
-from .refactor import RefactorTool
-from .secaudit import SecauditTool
-from .testgen import TestGenTool
-from .thinkdeep import ThinkDeepTool
-from .tracer import TracerTool
-from .version import VersionTool
+from importlib import import_module
+
+# Tool class -> defining submodule, resolved lazily by __getattr__
+_LAZY_TOOLS = {
+    "AnalyzeTool": ".analyze",
+    "ChallengeTool": ".challenge",
+    "ChatTool": ".chat",
+    "CodeReviewTool": ".codereview",
+    "ConsensusTool": ".consensus",
+    "DebugIssueTool": ".debug",
+    "DocgenTool": ".docgen",
+    "ListModelsTool": ".listmodels",
+    "PlannerTool": ".planner",
+    "PrecommitTool": ".precommit",
+    "RefactorTool": ".refactor",
+    "SecauditTool": ".secaudit",
+    "StatsTool": ".stats",
+    "TestGenTool": ".testgen",
+    "ThinkDeepTool": ".thinkdeep",
+    "TracerTool": ".tracer",
+    "VersionTool": ".version",
+}
 
 __all__ = [
     "ThinkDeepTool",
@@ -33,7 +43,17 @@ __all__ = [
     "ChallengeTool",
     "RefactorTool",
     "SecauditTool",
+    "StatsTool",
     "TestGenTool",
     "TracerTool",
     "VersionTool",
 ]
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_TOOLS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
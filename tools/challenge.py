@@ -139,9 +139,7 @@ class ChallengeTool(SimpleTool):
         This is the main execution method that transforms the user's statement into
         a structured challenge that encourages thoughtful re-evaluation.
         """
-        import json
-
-        from mcp.types import TextContent
+        from tools.models import ToolResultContent
 
         try:
             # Validate request
@@ -163,7 +161,7 @@ class ChallengeTool(SimpleTool):
                 ),
             }
 
-            return [TextContent(type="text", text=json.dumps(response_data, indent=2, ensure_ascii=False))]
+            return [ToolResultContent.from_output(response_data, indent=2)]
 
         except Exception as e:
             import logging
@@ -177,7 +175,7 @@ class ChallengeTool(SimpleTool):
                 "content": f"Failed to create challenge prompt: {str(e)}",
             }
 
-            return [TextContent(type="text", text=json.dumps(error_data, ensure_ascii=False))]
+            return [ToolResultContent.from_output(error_data)]
 
     def _wrap_prompt_for_challenge(self, prompt: str) -> str:
         """
@@ -12,6 +12,7 @@ from pydantic import Field
 
 if TYPE_CHECKING:
     from tools.models import ToolModelCategory
+    from utils.prompt_segments import SegmentedPrompt
 
 from config import TEMPERATURE_BALANCED
 from systemprompts import CHAT_PROMPT
@@ -189,7 +190,7 @@ class ChatTool(SimpleTool):
 
     # === Hook Method Implementations ===
 
-    async def prepare_prompt(self, request: ChatRequest) -> str:
+    async def prepare_prompt(self, request: ChatRequest) -> "SegmentedPrompt":
         """
         Prepare the chat prompt with optional context files.
 
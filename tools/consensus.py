@@ -15,7 +15,6 @@ Key features:
 
 from __future__ import annotations
 
-import json
 import logging
 from typing import TYPE_CHECKING, Any
 
@@ -24,9 +23,8 @@ from pydantic import Field, model_validator
 if TYPE_CHECKING:
     from tools.models import ToolModelCategory
 
-from mcp.types import TextContent
-
 from config import TEMPERATURE_ANALYTICAL
+from providers.router import agenerate_content_with_stats
 from systemprompts import CONSENSUS_PROMPT
 from tools.shared.base_models import WorkflowRequest
 
@@ -524,11 +522,18 @@ of the evidence, even when it strongly points in one direction.""",
                     "provider_used": provider.get_provider_type().value,
                 }
 
-                return [TextContent(type="text", text=json.dumps(response_data, indent=2, ensure_ascii=False))]
+                return self.build_workflow_result(response_data, request, request.continuation_id)
 
         # Otherwise, use standard workflow execution
         return await super().execute_workflow(arguments)
 
+    def get_compact_excluded_fields(self) -> set[str]:
+        """
+        In compact mode accumulated_responses is not resent: each step's model_response
+        already delivered the newest entry, so the client has the full list.
+        """
+        return {"accumulated_responses"}
+
     async def _consult_model(self, model_config: dict, request) -> dict:
         """Consult a single model and return its response."""
         try:
@@ -553,7 +558,9 @@ of the evidence, even when it strongly points in one direction.""",
             system_prompt = self._get_stance_enhanced_prompt(stance, stance_prompt)
 
             # Call the model
-            response = provider.generate_content(
+            response = await agenerate_content_with_stats(
+                provider,
+                tool_name=self.get_name(),
                 prompt=prompt,
                 model_name=model_name,
                 system_prompt=system_prompt,
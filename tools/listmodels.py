@@ -12,7 +12,7 @@ from typing import Any, Optional
 
 from mcp.types import TextContent
 
-from tools.models import ToolModelCategory, ToolOutput
+from tools.models import ToolModelCategory, ToolOutput, ToolResultContent
 from tools.shared.base_models import ToolRequest
 from tools.shared.base_tool import BaseTool
 
@@ -153,6 +153,16 @@ class ListModelsTool(BaseTool):
 
             output_lines.append("")
 
+        # The offline mock provider is a testing aid; only list it when enabled
+        mock_provider = ModelProviderRegistry.get_provider(ProviderType.MOCK)
+        if mock_provider:
+            output_lines.append("## Mock (offline) ✅")
+            output_lines.append("**Status**: Enabled (MOCK_PROVIDER_ENABLED) - replayed or templated responses")
+            output_lines.append("\n**Models**:")
+            for model_name, capabilities in mock_provider.get_model_configurations().items():
+                output_lines.append(f"- `{model_name}` - {capabilities.context_window // 1_000}K context")
+            output_lines.append("")
+
         # Check OpenRouter
         openrouter_key = os.getenv("OPENROUTER_API_KEY")
         is_openrouter_configured = openrouter_key and openrouter_key != "your_openrouter_api_key_here"
@@ -279,6 +289,8 @@ class ListModelsTool(BaseTool):
             configured_count += 1
         if custom_url:
             configured_count += 1
+        if mock_provider:
+            configured_count += 1
 
         output_lines.append(f"**Configured Providers**: {configured_count}")
 
@@ -313,7 +325,7 @@ class ListModelsTool(BaseTool):
             },
         )
 
-        return [TextContent(type="text", text=tool_output.model_dump_json())]
+        return [ToolResultContent.from_output(tool_output)]
 
     def get_model_category(self) -> ToolModelCategory:
         """Return the model category for this tool."""
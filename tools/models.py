@@ -2,10 +2,12 @@
 Data models for tool responses and interactions
 """
 
+import json
 from enum import Enum
-from typing import Any, Literal, Optional
+from typing import Any, Literal, Optional, Union
 
-from pydantic import BaseModel, Field
+from mcp.types import TextContent
+from pydantic import BaseModel, Field, PrivateAttr
 
 
 class ToolModelCategory(Enum):
@@ -16,6 +18,14 @@ class ToolModelCategory(Enum):
     BALANCED = "balanced"  # Balance of capability and performance
 
 
+# Typical response size per tool category, used as output demand for token allocation
+EXPECTED_OUTPUT_TOKENS = {
+    ToolModelCategory.EXTENDED_REASONING: 32_768,
+    ToolModelCategory.BALANCED: 16_384,
+    ToolModelCategory.FAST_RESPONSE: 8_192,
+}
+
+
 class ContinuationOffer(BaseModel):
     """Offer for CLI agent to continue conversation when Gemini doesn't ask follow-up"""
 
@@ -43,6 +53,7 @@ class ToolOutput(BaseModel):
         "code_too_large",
         "continuation_available",
         "no_bug_found",
+        "dry_run",
     ] = "success"
     content: Optional[str] = Field(None, description="The main content/response from the tool")
     content_type: Literal["text", "markdown", "json"] = "text"
@@ -52,6 +63,60 @@ class ToolOutput(BaseModel):
     )
 
 
+class ToolResultContent(TextContent):
+    """
+    MCP text content that keeps the structured result it was serialized from.
+
+    Tools build their response as a ToolOutput or a plain dict and wrap it with
+    from_output(), which serializes it exactly once. The server reads the structured
+    result back through ``payload`` (e.g. to record the assistant turn) instead of
+    re-parsing the JSON text. The payload is a private attribute and never leaves
+    the process.
+    """
+
+    _payload: Union[ToolOutput, dict[str, Any], None] = PrivateAttr(default=None)
+
+    @classmethod
+    def from_output(
+        cls, output: Union[ToolOutput, dict[str, Any]], indent: Optional[int] = None, compact: bool = False
+    ) -> "ToolResultContent":
+        """
+        Serialize a structured tool result into MCP text content.
+
+        Args:
+            output: ToolOutput model or JSON-compatible dict
+            indent: Optional JSON indentation
+            compact: Use the most compact JSON form (no indentation, no separator spaces)
+
+        Returns:
+            ToolResultContent carrying both the JSON text and the original object
+        """
+        if isinstance(output, ToolOutput):
+            text = output.model_dump_json(indent=None if compact else indent)
+        elif compact:
+            text = json.dumps(output, separators=(",", ":"), ensure_ascii=False)
+        else:
+            text = json.dumps(output, indent=indent, ensure_ascii=False)
+        content = cls(type="text", text=text)
+        content._payload = output
+        return content
+
+    @property
+    def payload(self) -> Union[ToolOutput, dict[str, Any], None]:
+        """The structured result behind ``text``."""
+        return self._payload
+
+    @property
+    def result_content(self) -> Optional[str]:
+        """The ``content`` field of the structured result, if it has one."""
+        if isinstance(self._payload, ToolOutput):
+            return self._payload.content
+        if isinstance(self._payload, dict):
+            content = self._payload.get("content")
+            return content if isinstance(content, str) else None
+        return None
+
+
 class FilesNeededRequest(BaseModel):
     """Request for missing files / code to continue"""
 
@@ -11,7 +11,7 @@ Key Models:
 """
 
 import logging
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
@@ -84,6 +84,10 @@ WORKFLOW_FIELD_DESCRIPTIONS = {
         "Set to False to skip expert analysis and rely solely on Claude's investigation. "
         "Defaults to True for comprehensive validation."
     ),
+    "response_mode": (
+        "Response format: 'full' returns the complete workflow state every step; 'compact' returns unindented "
+        "JSON with only the fields that changed since the previous step (expert analysis is sent once)"
+    ),
 }
 
 
@@ -159,6 +163,9 @@ class WorkflowRequest(BaseWorkflowRequest):
         None, ge=1, description=WORKFLOW_FIELD_DESCRIPTIONS["backtrack_from_step"]
     )
     use_assistant_model: Optional[bool] = Field(True, description=WORKFLOW_FIELD_DESCRIPTIONS["use_assistant_model"])
+    response_mode: Optional[Literal["full", "compact"]] = Field(
+        None, description=WORKFLOW_FIELD_DESCRIPTIONS["response_mode"]
+    )
 
     @field_validator("files_checked", "relevant_files", "relevant_context", mode="before")
     @classmethod
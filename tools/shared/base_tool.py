@@ -12,7 +12,7 @@ conversation handling, file processing, and response formatting.
 import logging
 import os
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Any, Optional
+from typing import TYPE_CHECKING, Any, Optional, Union
 
 from mcp.types import TextContent
 
@@ -27,7 +27,10 @@ from utils.conversation_memory import (
     get_conversation_file_list,
     get_thread,
 )
-from utils.file_utils import read_file_content, read_files
+from utils.dry_run import note_check, note_skipped_file
+from utils.file_utils import read_file_content, read_file_segments
+from utils.prompt_segments import SegmentedPrompt
+from utils.tracing import traced
 
 # Import models from tools.models for compatibility
 try:
@@ -498,6 +501,20 @@ class BaseTool(ABC):
         """
         return True  # All tools get line numbers by default for consistency
 
+    def get_file_compaction(self) -> frozenset[str]:
+        """
+        Return the token compaction operations applied to files this tool embeds.
+
+        Configured with FILE_COMPACTION and per tool with FILE_COMPACTION_TOOLS;
+        override to fix the behaviour of a tool (see utils/file_compaction.py).
+
+        Returns:
+            frozenset[str]: Operation names, empty when compaction is off
+        """
+        from utils.file_compaction import compaction_for_tool
+
+        return compaction_for_tool(self.get_name())
+
     def get_default_thinking_mode(self) -> str:
         """
         Return the default thinking mode for this tool.
@@ -525,6 +542,21 @@ class BaseTool(ABC):
 
         return ToolModelCategory.BALANCED
 
+    def get_expected_output_tokens(self) -> Optional[int]:
+        """
+        Return how many tokens this tool's responses typically need.
+
+        Used as the output demand for adaptive token allocation, so the response
+        reservation fits the tool instead of being a fixed share of the context
+        window. Defaults by model category; override for unusual output sizes.
+
+        Returns:
+            Optional[int]: Expected response tokens, or None to keep the default reservation
+        """
+        from tools.models import EXPECTED_OUTPUT_TOKENS
+
+        return EXPECTED_OUTPUT_TOKENS.get(self.get_model_category())
+
     @abstractmethod
     def get_request_model(self):
         """
@@ -580,24 +612,31 @@ class BaseTool(ABC):
 
         return None
 
-    def _validate_token_limit(self, content: str, content_type: str = "Content") -> None:
+    def _validate_token_limit(self, content: Union[str, SegmentedPrompt], content_type: str = "Content") -> None:
         """
         Validate that content doesn't exceed the MCP prompt size limit.
 
         Args:
-            content: The content to validate
+            content: The content to validate. For a SegmentedPrompt the precomputed
+                     segment token sums are used instead of rescanning the text.
             content_type: Description of the content type for error messages
 
         Raises:
             ValueError: If content exceeds size limit
         """
-        is_valid, token_count = check_token_limit(content, MCP_PROMPT_SIZE_LIMIT)
+        if isinstance(content, SegmentedPrompt):
+            token_count = content.token_count
+            is_valid = token_count <= MCP_PROMPT_SIZE_LIMIT
+        else:
+            is_valid, token_count = check_token_limit(content, MCP_PROMPT_SIZE_LIMIT)
+        note_check("token_limit", is_valid, f"{content_type}: ~{token_count:,} of {MCP_PROMPT_SIZE_LIMIT:,} tokens")
         if not is_valid:
             error_msg = f"~{token_count:,} tokens. Maximum is {MCP_PROMPT_SIZE_LIMIT:,} tokens."
             logger.error(f"{self.name} tool {content_type.lower()} validation failed: {error_msg}")
             raise ValueError(f"{content_type} too large: {error_msg}")
 
-        logger.debug(f"{self.name} tool {content_type.lower()} token validation passed: {token_count:,} tokens")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"{self.name} tool {content_type.lower()} token validation passed: {token_count:,} tokens")
 
     def get_model_provider(self, model_name: str) -> ModelProvider:
         """
@@ -654,7 +693,7 @@ class BaseTool(ABC):
             return []
 
         embedded_files = get_conversation_file_list(thread_context)
-        logger.debug(f"[FILES] {self.name}: Found {len(embedded_files)} embedded files")
+        logger.debug("[FILES] %s: Found %s embedded files", self.name, len(embedded_files))
         return embedded_files
 
     def filter_new_files(self, requested_files: list[str], continuation_id: Optional[str]) -> list[str]:
@@ -673,40 +712,48 @@ class BaseTool(ABC):
         Returns:
             list[str]: List of files that need to be embedded (not already in history)
         """
-        logger.debug(f"[FILES] {self.name}: Filtering {len(requested_files)} requested files")
+        logger.debug("[FILES] %s: Filtering %s requested files", self.name, len(requested_files))
 
         if not continuation_id:
             # New conversation, all files are new
-            logger.debug(f"[FILES] {self.name}: New conversation, all {len(requested_files)} files are new")
+            logger.debug("[FILES] %s: New conversation, all %s files are new", self.name, len(requested_files))
             return requested_files
 
         try:
             embedded_files = set(self.get_conversation_embedded_files(continuation_id))
-            logger.debug(f"[FILES] {self.name}: Found {len(embedded_files)} embedded files in conversation")
+            logger.debug("[FILES] %s: Found %s embedded files in conversation", self.name, len(embedded_files))
 
             # Safety check: If no files are marked as embedded but we have a continuation_id,
             # this might indicate an issue with conversation history. Be conservative.
             if not embedded_files:
-                logger.debug(f"{self.name} tool: No files found in conversation history for thread {continuation_id}")
                 logger.debug(
-                    f"[FILES] {self.name}: No embedded files found, returning all {len(requested_files)} requested files"
+                    "%s tool: No files found in conversation history for thread %s", self.name, continuation_id
+                )
+                logger.debug(
+                    "[FILES] %s: No embedded files found, returning all %s requested files",
+                    self.name,
+                    len(requested_files),
                 )
                 return requested_files
 
             # Return only files that haven't been embedded yet
             new_files = [f for f in requested_files if f not in embedded_files]
             logger.debug(
-                f"[FILES] {self.name}: After filtering: {len(new_files)} new files, {len(requested_files) - len(new_files)} already embedded"
+                "[FILES] %s: After filtering: %s new files, %s already embedded",
+                self.name,
+                len(new_files),
+                len(requested_files) - len(new_files),
             )
-            logger.debug(f"[FILES] {self.name}: New files to embed: {new_files}")
+            logger.debug("[FILES] %s: New files to embed: %s", self.name, new_files)
 
             # Log filtering results for debugging
-            if len(new_files) < len(requested_files):
+            if len(new_files) < len(requested_files) and logger.isEnabledFor(logging.DEBUG):
                 skipped = [f for f in requested_files if f in embedded_files]
                 logger.debug(
-                    f"{self.name} tool: Filtering {len(skipped)} files already in conversation history: {', '.join(skipped)}"
+                    f"{self.name} tool: Filtering {len(skipped)} files already in conversation history: "
+                    f"{', '.join(skipped)}"
                 )
-                logger.debug(f"[FILES] {self.name}: Skipped (already embedded): {skipped}")
+                logger.debug("[FILES] %s: Skipped (already embedded): %s", self.name, skipped)
 
             return new_files
 
@@ -716,7 +763,9 @@ class BaseTool(ABC):
             logger.warning(f"{self.name} tool: Error checking conversation history for {continuation_id}: {e}")
             logger.warning(f"{self.name} tool: Including all requested files as fallback")
             logger.debug(
-                f"[FILES] {self.name}: Exception in filter_new_files, returning all {len(requested_files)} files as fallback"
+                "[FILES] %s: Exception in filter_new_files, returning all %s files as fallback",
+                self.name,
+                len(requested_files),
             )
             return requested_files
 
@@ -834,7 +883,7 @@ class BaseTool(ABC):
         # Default implementation: validate the full user content
         return user_content
 
-    def check_prompt_size(self, text: str) -> Optional[dict[str, Any]]:
+    def check_prompt_size(self, text: Union[str, SegmentedPrompt]) -> Optional[dict[str, Any]]:
         """
         Check if USER INPUT text is too large for MCP transport boundary.
 
@@ -843,12 +892,15 @@ class BaseTool(ABC):
         internal MCP Server operations.
 
         Args:
-            text: The user input text to check (NOT internal prompt content)
+            text: The user input text to check (NOT internal prompt content). A SegmentedPrompt
+                  is measured from its segment lengths without being rendered.
 
         Returns:
             Optional[Dict[str, Any]]: Response asking for file handling if too large, None otherwise
         """
-        if text and len(text) > MCP_PROMPT_SIZE_LIMIT:
+        size = len(text) if text else 0
+        note_check("prompt_size", size <= MCP_PROMPT_SIZE_LIMIT, f"{size:,} of {MCP_PROMPT_SIZE_LIMIT:,} characters")
+        if size > MCP_PROMPT_SIZE_LIMIT:
             return {
                 "status": "resend_prompt",
                 "content": (
@@ -868,6 +920,7 @@ class BaseTool(ABC):
             }
         return None
 
+    @traced("prepare_file_content")
     def _prepare_file_content_for_prompt(
         self,
         request_files: list[str],
@@ -883,6 +936,8 @@ class BaseTool(ABC):
         Centralized file processing implementing dual prioritization strategy.
 
         This method is the heart of conversation-aware file processing across all tools.
+        It renders the result of _prepare_file_segments_for_prompt(); tools that compose
+        larger prompts should use the segment variant to avoid copying file content.
 
         Args:
             request_files: List of files requested for current tool execution
@@ -900,8 +955,67 @@ class BaseTool(ABC):
                 - actually_processed_files: List of individual file paths that were actually read and embedded
                   (directories are expanded to individual files)
         """
+        segments, processed_files = self._prepare_file_segments_for_prompt(
+            request_files,
+            continuation_id,
+            context_description,
+            max_tokens=max_tokens,
+            reserve_tokens=reserve_tokens,
+            remaining_budget=remaining_budget,
+            arguments=arguments,
+            model_context=model_context,
+        )
+        return segments.render(), processed_files
+
+    def _record_file_demand(self, model_context: Any, request_files: list[str]) -> None:
+        """Estimate file demand from file sizes unless it was already recorded."""
+        from utils.model_context import TokenDemand
+
+        demand = getattr(model_context, "demand", None)
+        if isinstance(demand, TokenDemand) and demand.files is None:
+            from utils.file_utils import estimate_file_tokens, expand_paths
+
+            model_name = getattr(model_context, "model_name", None)
+            model_context.update_demand(
+                files=sum(estimate_file_tokens(path, model_name) for path in expand_paths(request_files))
+            )
+
+    def _prepare_file_segments_for_prompt(
+        self,
+        request_files: list[str],
+        continuation_id: Optional[str],
+        context_description: str = "New files",
+        max_tokens: Optional[int] = None,
+        reserve_tokens: int = 1_000,
+        remaining_budget: Optional[int] = None,
+        arguments: Optional[dict] = None,
+        model_context: Optional[Any] = None,
+    ) -> tuple[SegmentedPrompt, list[str]]:
+        """
+        Segment-based file processing behind _prepare_file_content_for_prompt().
+
+        File content is returned as prompt segments carrying their token estimates, so
+        the caller can size-check and compose the final prompt without joining or
+        rescanning the (potentially multi-megabyte) text.
+
+        Args:
+            request_files: List of files requested for current tool execution
+            continuation_id: Thread continuation ID, or None for new conversations
+            context_description: Description for token limit validation (e.g. "Code", "New files")
+            max_tokens: Maximum tokens to use (defaults to remaining budget or model-specific content allocation)
+            reserve_tokens: Tokens to reserve for additional prompt content (default 1K)
+            remaining_budget: Remaining token budget after conversation history (from server.py)
+            arguments: Original tool arguments (used to extract _remaining_tokens if available)
+            model_context: Model context object with all model information including token allocation
+
+        Returns:
+            tuple[SegmentedPrompt, list[str]]: (file_segments, actually_processed_files)
+                - file_segments: Formatted file content as segments ready for prompt inclusion
+                - actually_processed_files: List of individual file paths that were actually read and embedded
+                  (directories are expanded to individual files)
+        """
         if not request_files:
-            return "", []
+            return SegmentedPrompt(), []
 
         # Extract remaining budget from arguments if available
         if remaining_budget is None:
@@ -928,13 +1042,15 @@ class BaseTool(ABC):
 
             # This is now the single source of truth for token allocation.
             try:
+                self._record_file_demand(model_context, request_files)
                 token_allocation = model_context.calculate_token_allocation()
                 # Standardize on `file_tokens` for consistency and correctness.
                 effective_max_tokens = token_allocation.file_tokens - reserve_tokens
-                logger.debug(
-                    f"[FILES] {self.name}: Using model context for {model_context.model_name}: "
-                    f"{token_allocation.file_tokens:,} file tokens from {token_allocation.total_tokens:,} total"
-                )
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        f"[FILES] {self.name}: Using model context for {model_context.model_name}: "
+                        f"{token_allocation.file_tokens:,} file tokens from {token_allocation.total_tokens:,} total"
+                    )
             except Exception as e:
                 logger.error(
                     f"[FILES] {self.name}: Failed to calculate token allocation from model context: {e}", exc_info=True
@@ -947,7 +1063,7 @@ class BaseTool(ABC):
         effective_max_tokens = max(1000, effective_max_tokens)
 
         files_to_embed = self.filter_new_files(request_files, continuation_id)
-        logger.debug(f"[FILES] {self.name}: Will embed {len(files_to_embed)} files after filtering")
+        logger.debug("[FILES] %s: Will embed %s files after filtering", self.name, len(files_to_embed))
 
         # Log the specific files for debugging/testing
         if files_to_embed:
@@ -959,80 +1075,93 @@ class BaseTool(ABC):
                 f"[FILE_PROCESSING] {self.name} tool: No new files to embed (all files already in conversation history)"
             )
 
-        content_parts = []
+        content_parts = SegmentedPrompt()
         actually_processed_files = []
 
         # Read content of new files only
         if files_to_embed:
-            logger.debug(f"{self.name} tool embedding {len(files_to_embed)} new files: {', '.join(files_to_embed)}")
-            logger.debug(
-                f"[FILES] {self.name}: Starting file embedding with token budget {effective_max_tokens + reserve_tokens:,}"
-            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"{self.name} tool embedding {len(files_to_embed)} new files: {', '.join(files_to_embed)}")
+                logger.debug(
+                    f"[FILES] {self.name}: Starting file embedding with token budget {effective_max_tokens + reserve_tokens:,}"
+                )
             try:
                 # Before calling read_files, expand directories to get individual file paths
                 from utils.file_utils import expand_paths
 
                 expanded_files = expand_paths(files_to_embed)
                 logger.debug(
-                    f"[FILES] {self.name}: Expanded {len(files_to_embed)} paths to {len(expanded_files)} individual files"
+                    "[FILES] %s: Expanded %s paths to %s individual files",
+                    self.name,
+                    len(files_to_embed),
+                    len(expanded_files),
                 )
 
-                file_content = read_files(
+                file_segments = read_file_segments(
                     files_to_embed,
                     max_tokens=effective_max_tokens + reserve_tokens,
                     reserve_tokens=reserve_tokens,
                     include_line_numbers=self.wants_line_numbers_by_default(),
+                    model_name=model_context.model_name if model_context else None,
+                    compaction=self.get_file_compaction(),
                 )
-                self._validate_token_limit(file_content, context_description)
-                content_parts.append(file_content)
+                self._validate_token_limit(file_segments, context_description)
+                content_parts.extend(file_segments)
 
                 # Track the expanded files as actually processed
                 actually_processed_files.extend(expanded_files)
 
-                # Estimate tokens for debug logging
-                from utils.token_utils import estimate_tokens
-
-                content_tokens = estimate_tokens(file_content)
-                logger.debug(
-                    f"{self.name} tool successfully embedded {len(files_to_embed)} files ({content_tokens:,} tokens)"
-                )
-                logger.debug(f"[FILES] {self.name}: Successfully embedded files - {content_tokens:,} tokens used")
+                content_tokens = file_segments.token_count
+                usage_context = model_context or getattr(self, "_model_context", None)
+                if usage_context is not None and hasattr(usage_context, "record_usage"):
+                    usage_context.record_usage(files=content_tokens)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        f"{self.name} tool successfully embedded {len(files_to_embed)} files ({content_tokens:,} tokens)"
+                    )
+                    logger.debug(f"[FILES] {self.name}: Successfully embedded files - {content_tokens:,} tokens used")
                 logger.debug(
-                    f"[FILES] {self.name}: Actually processed {len(actually_processed_files)} individual files"
+                    "[FILES] %s: Actually processed %s individual files", self.name, len(actually_processed_files)
                 )
             except Exception as e:
                 logger.error(f"{self.name} tool failed to embed files {files_to_embed}: {type(e).__name__}: {e}")
-                logger.debug(f"[FILES] {self.name}: File embedding failed - {type(e).__name__}: {e}")
+                logger.debug("[FILES] %s: File embedding failed - %s: %s", self.name, type(e).__name__, e)
                 raise
         else:
-            logger.debug(f"[FILES] {self.name}: No files to embed after filtering")
+            logger.debug("[FILES] %s: No files to embed after filtering", self.name)
 
         # Generate note about files already in conversation history
         if continuation_id and len(files_to_embed) < len(request_files):
             embedded_files = self.get_conversation_embedded_files(continuation_id)
             skipped_files = [f for f in request_files if f in embedded_files]
+            for skipped_path in skipped_files:
+                note_skipped_file(skipped_path, "already embedded in conversation history", "request")
             if skipped_files:
-                logger.debug(
-                    f"{self.name} tool skipping {len(skipped_files)} files already in conversation history: {', '.join(skipped_files)}"
-                )
-                logger.debug(f"[FILES] {self.name}: Adding note about {len(skipped_files)} skipped files")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        f"{self.name} tool skipping {len(skipped_files)} files already in conversation history: "
+                        f"{', '.join(skipped_files)}"
+                    )
+                logger.debug("[FILES] %s: Adding note about %s skipped files", self.name, len(skipped_files))
                 if content_parts:
-                    content_parts.append("\n\n")
+                    content_parts.append("\n\n", kind="separator", tokens=0)
                 note_lines = [
                     "--- NOTE: Additional files referenced in conversation history ---",
                     "The following files are already available in our conversation context:",
                     "\n".join(f"  - {f}" for f in skipped_files),
                     "--- END NOTE ---",
                 ]
-                content_parts.append("\n".join(note_lines))
+                content_parts.append("\n".join(note_lines), kind="note")
             else:
-                logger.debug(f"[FILES] {self.name}: No skipped files to note")
+                logger.debug("[FILES] %s: No skipped files to note", self.name)
 
-        result = "".join(content_parts) if content_parts else ""
         logger.debug(
-            f"[FILES] {self.name}: _prepare_file_content_for_prompt returning {len(result)} chars, {len(actually_processed_files)} processed files"
+            "[FILES] %s: _prepare_file_segments_for_prompt returning %s chars, %s processed files",
+            self.name,
+            content_parts.char_count,
+            len(actually_processed_files),
         )
-        return result, actually_processed_files
+        return content_parts, actually_processed_files
 
     def get_websearch_instruction(self, use_websearch: bool, tool_specific: Optional[str] = None) -> str:
         """
@@ -1107,7 +1236,7 @@ When recommending searches, be specific about what information you need and why
     # === ABSTRACT METHODS FOR SIMPLE TOOLS ===
 
     @abstractmethod
-    async def prepare_prompt(self, request) -> str:
+    async def prepare_prompt(self, request) -> Union[str, SegmentedPrompt]:
         """
         Prepare the complete prompt for the AI model.
 
@@ -1121,7 +1250,8 @@ When recommending searches, be specific about what information you need and why
             request: The validated request object
 
         Returns:
-            str: Complete prompt ready for the AI model
+            Complete prompt ready for the AI model. Returning a SegmentedPrompt (as
+            build_standard_prompt() does) keeps it unrendered until the provider call.
         """
         pass
 
@@ -1235,7 +1365,7 @@ When recommending searches, be specific about what information you need and why
         if model_context and resolved_model_name:
             # Model was already resolved at MCP boundary
             model_name = resolved_model_name
-            logger.debug(f"Using pre-resolved model '{model_name}' from MCP boundary")
+            logger.debug("Using pre-resolved model '%s' from MCP boundary", model_name)
         else:
             # Fallback for direct execute calls
             model_name = getattr(request, "model", None)
@@ -1243,7 +1373,7 @@ When recommending searches, be specific about what information you need and why
                 from config import DEFAULT_MODEL
 
                 model_name = DEFAULT_MODEL
-            logger.debug(f"Using fallback model resolution for '{model_name}' (test mode)")
+            logger.debug("Using fallback model resolution for '%s' (test mode)", model_name)
 
             # For tests: Check if we should require model selection (auto mode)
             if self._should_require_model_selection(model_name):
@@ -1279,6 +1409,58 @@ When recommending searches, be specific about what information you need and why
 
         return model_name, model_context
 
+    def _record_request_demand(
+        self,
+        model_context: Any,
+        continuation_id: Optional[str],
+        prompt_text: Optional[str] = None,
+        images: Optional[list] = None,
+    ) -> None:
+        """
+        Record what this request needs from the context window for adaptive allocation.
+
+        Demand already recorded (e.g. by server-side conversation reconstruction) is kept;
+        this fills in the expected output, the tool prompt and, for new conversations,
+        the fact that there is no history. A prompt of None stays unknown, which lets the
+        prompt absorb whatever the other consumers leave.
+
+        Args:
+            model_context: Model context for the current request
+            continuation_id: Thread being continued, or None for a new conversation
+            prompt_text: User prompt for this request, if the tool has one
+            images: Images attached to the request, if any
+        """
+        from utils.model_context import IMAGE_TOKEN_ESTIMATE, TokenDemand
+
+        demand = getattr(model_context, "demand", None)
+        if not isinstance(demand, TokenDemand):
+            return
+
+        model_context.update_demand(output=self.get_expected_output_tokens())
+        if demand.history is None and not continuation_id:
+            model_context.update_demand(history=0)
+        if demand.prompt is None and prompt_text is not None:
+            model_context.update_demand(prompt=model_context.estimate_tokens(prompt_text))
+        if demand.images is None:
+            model_context.update_demand(images=len(images or []) * IMAGE_TOKEN_ESTIMATE)
+
+    def _report_token_utilization(self, model_context: Any, sent_tokens: int, **used: int) -> None:
+        """
+        Record final token usage on the model context and report utilization.
+
+        Reporting is diagnostic only and never fails the request.
+
+        Args:
+            model_context: Model context for the current request
+            sent_tokens: Total tokens of the prompt sent to the model
+            **used: Additional per-consumer usage (e.g. images)
+        """
+        try:
+            model_context.record_usage(**used)
+            model_context.report_utilization(sent_tokens=sent_tokens)
+        except Exception as e:
+            logger.debug("[TOKEN_ALLOCATION] %s: utilization not reported: %s", self.name, e)
+
     def validate_and_correct_temperature(self, temperature: float, model_context: Any) -> tuple[float, list[str]]:
         """
         Validate and correct temperature for the specified model.
@@ -1490,7 +1672,8 @@ When recommending searches, be specific about what information you need and why
             }
 
         # All validations passed
-        logger.debug(f"Image validation passed: {len(images)} images, {total_size_mb:.1f}MB total")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Image validation passed: {len(images)} images, {total_size_mb:.1f}MB total")
         return None
 
     def _parse_response(self, raw_text: str, request, model_info: Optional[dict] = None):
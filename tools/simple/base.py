@@ -12,12 +12,19 @@ and inherit all the conversation, file processing, and model handling
 capabilities from BaseTool.
 """
 
+import logging
 from abc import abstractmethod
 from typing import Any, Optional
 
+from providers.router import agenerate_content_with_stats
 from tools.shared.base_models import ToolRequest
 from tools.shared.base_tool import BaseTool
 from tools.shared.schema_builders import SchemaBuilder
+from utils.dry_run import note_check
+from utils.model_context import IMAGE_TOKEN_ESTIMATE
+from utils.prompt_segments import SegmentedPrompt
+
+logger = logging.getLogger(__name__)
 
 
 class SimpleTool(BaseTool):
@@ -282,12 +289,12 @@ class SimpleTool(BaseTool):
 
         This method replicates the proven execution pattern while using SimpleTool hooks.
         """
-        import json
         import logging
 
         from mcp.types import TextContent
 
-        from tools.models import ToolOutput
+        from tools.models import ToolOutput, ToolResultContent
+        from utils.tracing import start_span
 
         logger = logging.getLogger(f"tools.{self.get_name()}")
 
@@ -311,7 +318,7 @@ class SimpleTool(BaseTool):
                     content=path_error,
                     content_type="text",
                 )
-                return [TextContent(type="text", text=error_output.model_dump_json())]
+                return [ToolResultContent.from_output(error_output)]
 
             # Handle model resolution like old base.py
             model_name = self.get_request_model_name(request)
@@ -337,86 +344,97 @@ class SimpleTool(BaseTool):
             # Get images if present
             images = self.get_request_images(request)
             continuation_id = self.get_request_continuation_id(request)
+            self._record_request_demand(
+                self._model_context, continuation_id, self.get_request_prompt(request), images
+            )
 
             # Handle conversation history and prompt preparation
-            if continuation_id:
-                # Check if conversation history is already embedded
-                field_value = self.get_request_prompt(request)
-                if "=== CONVERSATION HISTORY ===" in field_value:
-                    # Use pre-embedded history
-                    prompt = field_value
-                    logger.debug(f"{self.get_name()}: Using pre-embedded conversation history")
+            with start_span("prepare_prompt"):
+                if continuation_id:
+                    # Check if conversation history is already embedded
+                    field_value = self.get_request_prompt(request)
+                    if "=== CONVERSATION HISTORY ===" in field_value:
+                        # Use pre-embedded history
+                        prompt = SegmentedPrompt.from_text(field_value)
+                        logger.debug(f"{self.get_name()}: Using pre-embedded conversation history")
                     
-                    # Extract and record only the NEW user input from embedded prompt
-                    # Don't record the full prompt which contains duplicated history
-                    if "=== NEW USER INPUT ===" in field_value:
-                        parts = field_value.split("=== NEW USER INPUT ===")
-                        if len(parts) > 1:
-                            actual_new_input = parts[-1].strip()
-                            # Remove any continuation instructions at the end
-                            if "CONVERSATION CONTINUATION:" in actual_new_input:
-                                actual_new_input = actual_new_input.split("CONVERSATION CONTINUATION:")[0].strip()
+                        # Extract and record only the NEW user input from embedded prompt
+                        # Don't record the full prompt which contains duplicated history
+                        if "=== NEW USER INPUT ===" in field_value:
+                            parts = field_value.split("=== NEW USER INPUT ===")
+                            if len(parts) > 1:
+                                actual_new_input = parts[-1].strip()
+                                # Remove any continuation instructions at the end
+                                if "CONVERSATION CONTINUATION:" in actual_new_input:
+                                    actual_new_input = actual_new_input.split("CONVERSATION CONTINUATION:")[0].strip()
                             
-                            user_files = self.get_request_files(request)
+                                user_files = self.get_request_files(request)
                             
-                            # Record only the clean new input
-                            from utils.conversation_memory import add_turn
-                            if actual_new_input:
-                                add_turn(continuation_id, "user", actual_new_input, files=user_files)
-                                logger.debug(f"{self.get_name()}: Added clean new user input to conversation")
-                else:
-                    # No embedded history - this means it's the first turn or in-process call
-                    # Only record if it's truly new content
-                    logger.debug(f"{self.get_name()}: No embedded history found, treating as new conversation")
+                                # Record only the clean new input
+                                from utils.conversation_memory import add_turn
+                                if actual_new_input:
+                                    add_turn(continuation_id, "user", actual_new_input, files=user_files)
+                                    logger.debug(f"{self.get_name()}: Added clean new user input to conversation")
+                    else:
+                        # No embedded history - this means it's the first turn or in-process call
+                        # Only record if it's truly new content
+                        logger.debug(f"{self.get_name()}: No embedded history found, treating as new conversation")
 
-                    # Get thread context
-                    from utils.conversation_memory import add_turn, build_conversation_history, get_thread
+                        # Get thread context
+                        from utils.conversation_memory import add_turn, build_conversation_history, get_thread
 
-                    thread_context = get_thread(continuation_id)
-                    if thread_context:
-                        user_prompt = self.get_request_prompt(request)
-                        user_files = self.get_request_files(request)
+                        thread_context = get_thread(continuation_id)
+                        if thread_context:
+                            user_prompt = self.get_request_prompt(request)
+                            user_files = self.get_request_files(request)
                         
-                        # Only add if this is the very first turn (no existing turns)
-                        if user_prompt and len(thread_context.turns) == 0:
-                            add_turn(continuation_id, "user", user_prompt, files=user_files)
-                            logger.debug(f"{self.get_name()}: Added initial user turn to conversation")
-
-                        # Get conversation history
-                        conversation_history, conversation_tokens = build_conversation_history(
-                            thread_context, self._model_context
-                        )
-
-                        # Get the base prompt from the tool
-                        base_prompt = await self.prepare_prompt(request)
-
-                        # Combine with conversation history
-                        if conversation_history:
-                            prompt = f"{conversation_history}\n\n=== NEW USER INPUT ===\n{base_prompt}"
+                            # Only add if this is the very first turn (no existing turns)
+                            if user_prompt and len(thread_context.turns) == 0:
+                                add_turn(continuation_id, "user", user_prompt, files=user_files)
+                                logger.debug(f"{self.get_name()}: Added initial user turn to conversation")
+
+                            # Get conversation history
+                            conversation_history, conversation_tokens = build_conversation_history(
+                                thread_context, self._model_context
+                            )
+
+                            # Get the base prompt from the tool
+                            base_prompt = await self.prepare_prompt(request)
+
+                            # Combine with conversation history (segments: no copy until the provider call)
+                            prompt = SegmentedPrompt()
+                            if conversation_history:
+                                prompt.append(conversation_history, kind="history", tokens=conversation_tokens)
+                                prompt.append("\n\n=== NEW USER INPUT ===\n", kind="instructions")
+                            prompt.extend(SegmentedPrompt.coerce(base_prompt, kind="prompt"))
                         else:
-                            prompt = base_prompt
-                    else:
-                        # Thread not found, prepare normally
-                        logger.warning(f"Thread {continuation_id} not found, preparing prompt normally")
-                        prompt = await self.prepare_prompt(request)
-            else:
-                # New conversation, prepare prompt normally
-                prompt = await self.prepare_prompt(request)
+                            # Thread not found, prepare normally
+                            logger.warning(f"Thread {continuation_id} not found, preparing prompt normally")
+                            prompt = SegmentedPrompt.coerce(await self.prepare_prompt(request), kind="prompt")
+                else:
+                    # New conversation, prepare prompt normally
+                    prompt = SegmentedPrompt.coerce(await self.prepare_prompt(request), kind="prompt")
 
-                # Add follow-up instructions for new conversations
-                from server import get_follow_up_instructions
+                    # Add follow-up instructions for new conversations
+                    from server import get_follow_up_instructions
 
-                follow_up_instructions = get_follow_up_instructions(0)
-                prompt = f"{prompt}\n\n{follow_up_instructions}"
-                logger.debug(
-                    f"Added follow-up instructions for new {self.get_name()} conversation"
-                )  # Validate images if any were provided
+                    follow_up_instructions = get_follow_up_instructions(0)
+                    prompt.append(f"\n\n{follow_up_instructions}", kind="instructions")
+                    logger.debug(
+                        f"Added follow-up instructions for new {self.get_name()} conversation"
+                    )  # Validate images if any were provided
             if images:
                 image_validation_error = self._validate_image_limits(
                     images, model_context=self._model_context, continuation_id=continuation_id
                 )
+                note_check(
+                    "image_limits",
+                    image_validation_error is None,
+                    f"{len(images)} images"
+                    + (f": {image_validation_error.get('content')}" if image_validation_error else ""),
+                )
                 if image_validation_error:
-                    return [TextContent(type="text", text=json.dumps(image_validation_error, ensure_ascii=False))]
+                    return [ToolResultContent.from_output(image_validation_error)]
 
             # Get and validate temperature against model constraints
             temperature, temp_warnings = self.get_validated_temperature(request, self._model_context)
@@ -443,15 +461,18 @@ class SimpleTool(BaseTool):
                 f"Using model: {self._model_context.model_name} via {provider.get_provider_type().value} provider"
             )
 
-            # Estimate tokens for logging
-            from utils.token_utils import estimate_tokens
-
-            estimated_tokens = estimate_tokens(prompt)
-            logger.debug(f"Prompt length: {len(prompt)} characters (~{estimated_tokens:,} tokens)")
+            # Token estimate comes from the segment sums - no rescan of the full prompt
+            estimated_tokens = prompt.token_count
+            logger.debug(f"Prompt length: {prompt.char_count} characters (~{estimated_tokens:,} tokens)")
 
-            # Generate content with provider abstraction
-            model_response = provider.generate_content(
-                prompt=prompt,
+            # Generate content with provider abstraction; the prompt is materialized once, here.
+            # Other requests run on this tool instance while the call is awaited, so restore ours after.
+            model_context, current_model_name = self._model_context, self._current_model_name
+            model_response = await agenerate_content_with_stats(
+                provider,
+                tool_name=self.get_name(),
+                estimated_tokens=estimated_tokens,
+                prompt=prompt.render(),
                 model_name=self._current_model_name,
                 system_prompt=system_prompt,
                 temperature=temperature,
@@ -459,7 +480,14 @@ class SimpleTool(BaseTool):
                 images=images if images else None,
             )
 
+            self._model_context, self._current_model_name = model_context, current_model_name
             logger.info(f"Received response from {provider.get_provider_type().value} API for {self.get_name()}")
+            self._report_token_utilization(
+                self._model_context,
+                estimated_tokens,
+                images=len(images or []) * IMAGE_TOKEN_ESTIMATE,
+                output=(getattr(model_response, "usage", None) or {}).get("output_tokens"),
+            )
 
             # Process the model's response
             if model_response.content:
@@ -473,7 +501,8 @@ class SimpleTool(BaseTool):
                 }
 
                 # Parse response using the same logic as old base.py
-                tool_output = self._parse_response(raw_text, request, model_info)
+                with start_span("parse_response"):
+                    tool_output = self._parse_response(raw_text, request, model_info)
                 logger.info(f"✅ {self.get_name()} tool completed successfully")
 
             else:
@@ -487,7 +516,7 @@ class SimpleTool(BaseTool):
                 )
 
             # Return the tool output as TextContent
-            return [TextContent(type="text", text=tool_output.model_dump_json())]
+            return [ToolResultContent.from_output(tool_output)]
 
         except Exception as e:
             # Special handling for MCP size check errors
@@ -502,7 +531,7 @@ class SimpleTool(BaseTool):
                 content=f"Error in {self.get_name()}: {str(e)}",
                 content_type="text",
             )
-            return [TextContent(type="text", text=error_output.model_dump_json())]
+            return [ToolResultContent.from_output(error_output)]
 
     def _parse_response(self, raw_text: str, request, model_info: Optional[dict] = None):
         """
@@ -702,7 +731,7 @@ class SimpleTool(BaseTool):
 
     def build_standard_prompt(
         self, system_prompt: str, user_content: str, request, file_context_title: str = "CONTEXT FILES"
-    ) -> str:
+    ) -> SegmentedPrompt:
         """
         Build a standard prompt with system prompt, user content, and optional files.
 
@@ -719,8 +748,11 @@ class SimpleTool(BaseTool):
             file_context_title: Title for the file context section
 
         Returns:
-            Complete formatted prompt ready for the AI model
+            SegmentedPrompt: Complete prompt; execute() renders it once, at the provider call
         """
+        # Assemble as segments so file content is copied exactly once, in the final render
+        user_segments = SegmentedPrompt.from_text(user_content, kind="user")
+
         # Add context files if provided
         files = self.get_request_files(request)
         if files:
@@ -732,10 +764,12 @@ class SimpleTool(BaseTool):
             )
             self._actually_processed_files = processed_files
             if file_content:
-                user_content = f"{user_content}\n\n=== {file_context_title} ===\n{file_content}\n=== END CONTEXT ===="
+                user_segments.append(f"\n\n=== {file_context_title} ===\n", kind="instructions")
+                user_segments.append(file_content, kind="file")
+                user_segments.append("\n=== END CONTEXT ====", kind="instructions")
 
-        # Check token limits
-        self._validate_token_limit(user_content, "Content")
+        # Check token limits using the precomputed segment estimates
+        self._validate_token_limit(user_segments, "Content")
 
         # Add web search instruction if enabled
         websearch_instruction = ""
@@ -744,13 +778,12 @@ class SimpleTool(BaseTool):
             websearch_instruction = self.get_websearch_instruction(use_websearch, self.get_websearch_guidance())
 
         # Combine system prompt with user content
-        full_prompt = f"""{system_prompt}{websearch_instruction}
-
-=== USER REQUEST ===
-{user_content}
-=== END REQUEST ===
-
-Please provide a thoughtful, comprehensive response:"""
+        full_prompt = SegmentedPrompt()
+        full_prompt.append(f"{system_prompt}{websearch_instruction}\n\n=== USER REQUEST ===\n", kind="instructions")
+        full_prompt.extend(user_segments)
+        full_prompt.append(
+            "\n=== END REQUEST ===\n\nPlease provide a thoughtful, comprehensive response:", kind="instructions"
+        )
 
         return full_prompt
 
@@ -890,7 +923,7 @@ Please provide a thoughtful, comprehensive response:"""
 
         return None
 
-    def prepare_chat_style_prompt(self, request, system_prompt: str = None) -> str:
+    def prepare_chat_style_prompt(self, request, system_prompt: str = None) -> SegmentedPrompt:
         """
         Prepare a prompt using Chat tool-style patterns.
 
@@ -905,7 +938,7 @@ Please provide a thoughtful, comprehensive response:"""
             system_prompt: System prompt to use (uses get_system_prompt() if None)
 
         Returns:
-            Complete formatted prompt
+            SegmentedPrompt: Complete formatted prompt
         """
         # Use provided system prompt or get from tool
         if system_prompt is None:
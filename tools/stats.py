@@ -0,0 +1,283 @@
+"""
+Stats Tool - Display latency, token and cache metrics for this server process
+
+This tool reports the in-process metrics collected by utils.metrics since the
+server started: per-tool and per-provider latency, provider retries and errors,
+prompt/completion tokens, file bytes read, conversation storage timings,
+context budget utilization, cache hit ratios, provider admission queues and,
+when the loop watchdog is enabled, event-loop stalls by call site. It never
+calls a model.
+"""
+
+import json
+import logging
+from typing import Any, Optional
+
+from mcp.types import TextContent
+
+from tools.models import ToolModelCategory, ToolOutput, ToolResultContent
+from tools.shared.base_models import ToolRequest
+from tools.shared.base_tool import BaseTool
+
+logger = logging.getLogger(__name__)
+
+
+def _format_seconds(value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    if value == float("inf"):
+        return "> 300s"
+    return f"{value * 1000:.0f}ms" if value < 1 else f"{value:.1f}s"
+
+
+def _latency_table(title: str, series: list[dict[str, Any]], label_names: tuple[str, ...]) -> list[str]:
+    lines = [f"## {title}"]
+    if not series:
+        return lines + ["No calls recorded yet.", ""]
+    header = " | ".join(name.capitalize() for name in label_names)
+    lines.append(f"| {header} | Calls | Mean | p50 | p95 |")
+    lines.append("|" + "---|" * (len(label_names) + 4))
+    for item in sorted(series, key=lambda s: -s["count"]):
+        labels = " | ".join(item["labels"].get(name, "") for name in label_names)
+        lines.append(
+            f"| {labels} | {item['count']} | {_format_seconds(item['mean'])} | "
+            f"{_format_seconds(item['p50'])} | {_format_seconds(item['p95'])} |"
+        )
+    return lines + [""]
+
+
+def _counter_lines(series: list[dict[str, Any]], label_names: tuple[str, ...]) -> list[str]:
+    return [
+        f"- {', '.join(item['labels'].get(name, '') for name in label_names)}: {int(item['value']):,}"
+        for item in sorted(series, key=lambda s: -s["value"])
+    ]
+
+
+class StatsTool(BaseTool):
+    """
+    Tool for displaying server metrics.
+
+    This tool provides:
+    - Tool and provider latency (mean, p50, p95)
+    - Provider retries and errors by exception class
+    - Prompt and completion token totals
+    - File bytes read and storage operation timings
+    - Context budget utilization per model
+    - Cache hit ratios and model routing statistics
+    - Provider admission queues, waits and limits
+    - Event-loop lag and stalls by blocking call site (LOOP_WATCHDOG_ENABLED)
+    """
+
+    def get_name(self) -> str:
+        return "stats"
+
+    def get_description(self) -> str:
+        return (
+            "SERVER METRICS - Show latency, token, retry/error and cache statistics collected by this server "
+            "since startup. Useful for diagnosing slow or failing requests."
+        )
+
+    def get_input_schema(self) -> dict[str, Any]:
+        """Return the JSON schema for the tool's input"""
+        return {
+            "type": "object",
+            "properties": {
+                "model": {"type": "string", "description": "Model to use (ignored by stats tool)"},
+                "format": {
+                    "type": "string",
+                    "enum": ["summary", "json"],
+                    "description": "summary (default) for a readable report, json for the raw metrics snapshot",
+                },
+            },
+            "required": [],
+        }
+
+    def get_annotations(self) -> Optional[dict[str, Any]]:
+        """Return tool annotations indicating this is a read-only tool"""
+        return {"readOnlyHint": True}
+
+    def get_system_prompt(self) -> str:
+        """No AI model needed for this tool"""
+        return ""
+
+    def get_request_model(self):
+        """Return the Pydantic model for request validation."""
+        return ToolRequest
+
+    def requires_model(self) -> bool:
+        return False
+
+    async def prepare_prompt(self, request: ToolRequest) -> str:
+        """Not used for this utility tool"""
+        return ""
+
+    def format_response(self, response: str, request: ToolRequest, model_info: dict = None) -> str:
+        """Not used for this utility tool"""
+        return response
+
+    async def execute(self, arguments: dict[str, Any]) -> list[TextContent]:
+        """
+        Report the metrics collected since startup.
+
+        Args:
+            arguments: Optional "format" ("summary" or "json")
+
+        Returns:
+            Metrics report, with the raw snapshot in the metadata
+        """
+        from providers.admission import get_admission_controller
+        from utils.loop_watchdog import get_stall_reports
+        from utils.metrics import cache_hit_ratio, get_metrics
+        from utils.model_context import get_utilization_summary
+        from utils.token_calibration import get_token_calibration
+
+        snapshot = get_metrics().snapshot()
+        metrics = snapshot["metrics"]
+
+        try:
+            from providers.router import get_model_router
+
+            routing = get_model_router().describe()
+        except Exception as e:
+            logger.debug(f"Could not describe model router: {e}")
+            routing = None
+
+        calibration = get_token_calibration()
+        calibration = calibration.describe() if calibration is not None else None
+
+        if arguments.get("format") == "json":
+            content = json.dumps(
+                {
+                    **snapshot,
+                    "budget_utilization": get_utilization_summary(),
+                    "routing": routing,
+                    "event_loop_stalls": get_stall_reports(),
+                    "admission": get_admission_controller().describe(),
+                    "token_calibration": calibration,
+                },
+                indent=2,
+            )
+            content_type = "json"
+        else:
+            content = self._format_summary(
+                snapshot, cache_hit_ratio, get_stall_reports(), get_admission_controller().describe(), calibration
+            )
+            content_type = "markdown"
+
+        tool_output = ToolOutput(
+            status="success",
+            content=content,
+            content_type=content_type,
+            metadata={
+                "tool_name": self.name,
+                "uptime_seconds": snapshot["uptime_seconds"],
+                "metric_names": sorted(metrics),
+            },
+        )
+        return [ToolResultContent.from_output(tool_output)]
+
+    def _format_summary(
+        self,
+        snapshot: dict[str, Any],
+        cache_hit_ratio,
+        stall_reports: Optional[list[dict[str, Any]]] = None,
+        admission: Optional[dict[str, Any]] = None,
+        calibration: Optional[dict[str, Any]] = None,
+    ) -> str:
+        metrics = snapshot["metrics"]
+
+        def series(name: str) -> list[dict[str, Any]]:
+            return metrics.get(name, {}).get("series", [])
+
+        lines = ["# Zen MCP Server Stats", "", f"**Uptime**: {snapshot['uptime_seconds']:.0f}s", ""]
+        lines += _latency_table("Tool Latency", series("zen_tool_duration_seconds"), ("tool", "status"))
+        lines += _latency_table("Provider Latency", series("zen_provider_duration_seconds"), ("provider", "model"))
+
+        lines.append("## Provider Retries and Errors")
+        retries = _counter_lines(series("zen_provider_retries_total"), ("provider", "error"))
+        errors = _counter_lines(series("zen_provider_errors_total"), ("provider", "error"))
+        lines += ["**Retries**:"] + (retries or ["- none"]) + ["**Errors**:"] + (errors or ["- none"]) + [""]
+
+        lines.append("## Tokens")
+        lines += _counter_lines(series("zen_tokens_total"), ("provider", "kind")) or ["No usage reported yet."]
+        lines.append("")
+
+        if calibration is not None:
+            lines.append("## Token Estimate Calibration")
+            for model, entry in calibration["model_factors"].items():
+                state = "applied" if entry["applied"] else "learning"
+                lines.append(f"- {model}: x{entry['factor']:.2f} from {entry['samples']} responses ({state})")
+            if not calibration["model_factors"]:
+                lines.append("No usage observed yet.")
+            if calibration["calibrated_extensions"]:
+                lines.append(f"**Measured file ratios**: {', '.join(calibration['calibrated_extensions'])}")
+            lines.append("")
+
+        file_bytes = sum(item["value"] for item in series("zen_file_bytes_read_total"))
+        lines += ["## Files", f"**Bytes read**: {int(file_bytes):,}", ""]
+        lines += _latency_table("Storage Operations", series("zen_storage_duration_seconds"), ("backend", "op"))
+
+        lines.append("## Context Budget Utilization")
+        utilization = series("zen_budget_utilization_ratio")
+        if utilization:
+            for item in sorted(utilization, key=lambda s: -s["count"]):
+                lines.append(
+                    f"- {item['labels'].get('model', '')}: mean {item['mean']:.1%} over {item['count']} requests"
+                )
+        else:
+            lines.append("No requests recorded yet.")
+        lines.append("")
+
+        lines.append("## Caches")
+        caches = sorted({item["labels"].get("cache", "") for item in series("zen_cache_requests_total")})
+        for cache in caches:
+            ratio = cache_hit_ratio(cache)
+            lines.append(f"- {cache}: {ratio:.1%} hit ratio" if ratio is not None else f"- {cache}: no lookups")
+        if not caches:
+            lines.append("No cache lookups recorded yet.")
+
+        if admission is not None:
+            lines += ["", "## Admission Control"]
+            lines.append(
+                f"**Queued**: {admission['queued']}, **timeouts**: {admission['timeouts']}, "
+                f"**prompt chars in flight**: {admission['inflight_prompt_chars']:,}"
+            )
+            for item in sorted(series("zen_admission_wait_seconds"), key=lambda s: -s["count"]):
+                lines.append(
+                    f"- {item['labels'].get('provider', '')}: waited p50 {_format_seconds(item['p50'])}, "
+                    f"p95 {_format_seconds(item['p95'])} over {item['count']} calls"
+                )
+            for name, scope in admission["scopes"].items():
+                limits = ", ".join(
+                    f"{label} {scope[key]:g}"
+                    for key, label in (
+                        ("max_concurrency", "concurrency"),
+                        ("requests_per_minute", "rpm"),
+                        ("tokens_per_minute", "tpm"),
+                    )
+                    if scope[key]
+                )
+                lines.append(f"- {name} ({limits}): {scope['in_flight']} in flight, {scope['queued']} queued")
+
+        if stall_reports is not None:
+            lines += ["", "## Event Loop"]
+            lag = series("zen_event_loop_lag_seconds")
+            if lag:
+                lines.append(
+                    f"**Lag**: p50 {_format_seconds(lag[0]['p50'])}, p95 {_format_seconds(lag[0]['p95'])} "
+                    f"over {lag[0]['count']} heartbeats"
+                )
+            if stall_reports:
+                lines.append("| Blocking call site | Stalls | Total | Max |")
+                lines.append("|---|---|---|---|")
+                for report in stall_reports:
+                    lines.append(
+                        f"| {report['site']} | {report['count']} | {report['total_ms']:.0f}ms | {report['max_ms']:.0f}ms |"
+                    )
+            else:
+                lines.append("No stalls recorded.")
+        return "\n".join(lines)
+
+    def get_model_category(self) -> ToolModelCategory:
+        """Return the model category for this tool."""
+        return ToolModelCategory.FAST_RESPONSE  # Metrics report, no AI needed
@@ -24,7 +24,7 @@ except ImportError:
 from mcp.types import TextContent
 
 from config import __author__, __updated__, __version__
-from tools.models import ToolModelCategory, ToolOutput
+from tools.models import ToolModelCategory, ToolOutput, ToolResultContent
 from tools.shared.base_models import ToolRequest
 from tools.shared.base_tool import BaseTool
 
@@ -326,7 +326,7 @@ class VersionTool(BaseTool):
             },
         )
 
-        return [TextContent(type="text", text=tool_output.model_dump_json())]
+        return [ToolResultContent.from_output(tool_output)]
 
     def get_model_category(self) -> ToolModelCategory:
         """Return the model category for this tool."""
@@ -82,6 +82,11 @@ class WorkflowSchemaBuilder:
             "default": True,
             "description": WORKFLOW_FIELD_DESCRIPTIONS["use_assistant_model"],
         },
+        "response_mode": {
+            "type": "string",
+            "enum": ["full", "compact"],
+            "description": WORKFLOW_FIELD_DESCRIPTIONS["response_mode"],
+        },
     }
 
     @staticmethod
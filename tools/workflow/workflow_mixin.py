@@ -20,21 +20,40 @@ Features:
 - Comprehensive type annotations for IDE support
 """
 
+import asyncio
+import hashlib
 import json
 import logging
 import os
+import weakref
 from abc import ABC, abstractmethod
 from typing import Any, Optional
 
 from mcp.types import TextContent
 
 from config import MCP_PROMPT_SIZE_LIMIT
+from providers.router import agenerate_content_with_stats
+from tools.models import ToolResultContent
 from utils.conversation_memory import add_turn, create_thread
+from utils.prompt_segments import SegmentedPrompt
+from utils.tracing import traced
 
 from ..shared.base_models import ConsolidatedFindings
 
 logger = logging.getLogger(__name__)
 
+# Fields every compact-mode response keeps so the client can always orient itself
+COMPACT_ALWAYS_INCLUDED_FIELDS = ("status", "step_number", "total_steps", "next_step_required", "continuation_id")
+
+# Number of threads whose previous step response is remembered for compact-mode deltas
+COMPACT_STATE_MAX_THREADS = 64
+
+# Per-instance locks serializing workflow calls, with the event loop each was created on. Keyed weakly by
+# tool instance, so a copy of a tool (e.g. for a dry run) gets its own lock.
+_workflow_locks: "weakref.WeakKeyDictionary[Any, tuple[asyncio.AbstractEventLoop, asyncio.Lock]]" = (
+    weakref.WeakKeyDictionary()
+)
+
 
 class BaseWorkflowMixin(ABC):
     """
@@ -406,6 +425,7 @@ class BaseWorkflowMixin(ABC):
             max_tokens=max_tokens,
             reserve_tokens=1000,
             include_line_numbers=self.wants_line_numbers_by_default(),
+            compaction=self.get_file_compaction(),
         )
 
         # Expand paths to get individual files for tracking
@@ -425,12 +445,15 @@ class BaseWorkflowMixin(ABC):
         """
         return True  # Most workflow tools benefit from line numbers for analysis
 
-    def _add_files_to_expert_context(self, expert_context: str, file_content: str) -> str:
+    def _add_files_to_expert_context(self, expert_context: SegmentedPrompt, file_content: str) -> SegmentedPrompt:
         """
         Add file content to the expert context.
         Override this to customize how files are added to the context.
         """
-        return f"{expert_context}\n\n=== ESSENTIAL FILES ===\n{file_content}\n=== END ESSENTIAL FILES ==="
+        expert_context.append("\n\n=== ESSENTIAL FILES ===\n", kind="instructions")
+        expert_context.append(file_content, kind="file")
+        expert_context.append("\n=== END ESSENTIAL FILES ===", kind="instructions")
+        return expert_context
 
     # ================================================================================
     # Context-Aware File Embedding - Core Implementation
@@ -609,8 +632,6 @@ class BaseWorkflowMixin(ABC):
         7. Step guidance and required actions
         8. Conversation memory integration
         """
-        from mcp.types import TextContent
-
         try:
             # Store arguments for access by helper methods
             self._current_arguments = arguments
@@ -644,7 +665,7 @@ class BaseWorkflowMixin(ABC):
                         content=path_error,
                         content_type="text",
                     )
-                    return [TextContent(type="text", text=error_output.model_dump_json())]
+                    return [ToolResultContent.from_output(error_output)]
             except AttributeError:
                 # validate_file_paths method not available - skip validation
                 pass
@@ -656,6 +677,12 @@ class BaseWorkflowMixin(ABC):
                 # Store for later use
                 self._current_model_name = model_name
                 self._model_context = model_context
+                self._record_request_demand(
+                    model_context,
+                    request.continuation_id,
+                    self._expected_prompt_text(request),
+                    images=self.get_request_images(request),
+                )
             except ValueError as e:
                 # Model resolution failed - in production this would be an error,
                 # but for tests we defer to allow mocks to handle model resolution
@@ -734,7 +761,7 @@ class BaseWorkflowMixin(ABC):
             if continuation_id:
                 self.store_conversation_turn(continuation_id, response_data, request)
 
-            return [TextContent(type="text", text=json.dumps(response_data, indent=2, ensure_ascii=False))]
+            return self.build_workflow_result(response_data, request, continuation_id)
 
         except Exception as e:
             logger.error(f"Error in {self.get_name()} work: {e}", exc_info=True)
@@ -747,7 +774,7 @@ class BaseWorkflowMixin(ABC):
             # Add metadata to error responses too
             self._add_workflow_metadata(error_data, arguments)
 
-            return [TextContent(type="text", text=json.dumps(error_data, indent=2, ensure_ascii=False))]
+            return [ToolResultContent.from_output(error_data, indent=2)]
 
     # Hook methods for tool customization
 
@@ -1108,6 +1135,113 @@ class BaseWorkflowMixin(ABC):
 
         return response_data
 
+    # ================================================================================
+    # Response Serialization (full / compact delta mode)
+    # ================================================================================
+
+    def get_request_response_mode(self, request) -> str:
+        """Get the response mode for this call: the request value, else WORKFLOW_RESPONSE_MODE."""
+        try:
+            mode = request.response_mode
+        except AttributeError:
+            mode = None
+        if mode:
+            return mode
+
+        from config import WORKFLOW_RESPONSE_MODE
+
+        return WORKFLOW_RESPONSE_MODE
+
+    def get_compact_excluded_fields(self) -> set[str]:
+        """
+        Fields dropped entirely in compact mode.
+
+        Override when a field only repeats information the client already received
+        through other fields (e.g. consensus accumulated_responses).
+        """
+        return set()
+
+    def build_workflow_result(self, response_data: dict, request, continuation_id: Optional[str]) -> list:
+        """
+        Serialize the final step response once, honouring the requested response mode.
+
+        Full mode returns the complete, pretty-printed response. Compact mode returns
+        unindented JSON containing only what changed since the previous step of the
+        same thread (see _compact_workflow_response).
+        """
+        if self.get_request_response_mode(request) != "compact":
+            return [ToolResultContent.from_output(response_data, indent=2)]
+
+        compact_data = self._compact_workflow_response(response_data, request, continuation_id)
+        return [ToolResultContent.from_output(compact_data, compact=True)]
+
+    def _compact_workflow_response(self, response_data: dict, request, continuation_id: Optional[str]) -> dict:
+        """
+        Reduce a step response to the delta against the previous step of the same thread.
+
+        - Fields equal to the previous response are omitted (nested dicts are diffed)
+        - Fields that disappeared are listed in "removed_fields", nested keys as dotted paths
+          (e.g. "analyze_status.current_confidence")
+        - Lists that only grew are sent as the appended items (listed in "appended_fields")
+        - Expert analysis is sent once per thread, however many responses repeat it
+        - Orientation fields (status, step numbers, continuation_id) are always kept
+        """
+        states = self.__dict__.setdefault("_compact_response_state", {})
+        key = continuation_id or ""
+        state = states.pop(key, None)
+        if state is None or self.get_request_step_number(request) == 1:
+            state = {"last": {}, "expert_sent": set()}
+        states[key] = state  # re-insert as most recently used
+        while len(states) > COMPACT_STATE_MAX_THREADS:
+            states.pop(next(iter(states)))
+
+        excluded = self.get_compact_excluded_fields()
+        current = {k: v for k, v in response_data.items() if k not in excluded}
+        previous = state["last"]
+
+        delta: dict[str, Any] = {}
+        appended = []
+        removed = [field for field in previous if field not in current]
+        for field, value in current.items():
+            if field in COMPACT_ALWAYS_INCLUDED_FIELDS:
+                delta[field] = value
+            elif field not in previous:
+                delta[field] = value
+            elif previous[field] == value:
+                continue
+            elif isinstance(value, dict) and isinstance(previous[field], dict):
+                delta[field] = _dict_delta(previous[field], value, field, removed)
+            elif (
+                isinstance(value, list)
+                and isinstance(previous[field], list)
+                and value[: len(previous[field])] == previous[field]
+            ):
+                delta[field] = value[len(previous[field]) :]
+                appended.append(field)
+            else:
+                delta[field] = value
+
+        if "expert_analysis" in delta:
+            digest = hashlib.sha256(
+                json.dumps(delta["expert_analysis"], sort_keys=True, default=str).encode("utf-8")
+            ).hexdigest()
+            if digest in state["expert_sent"]:
+                del delta["expert_analysis"]
+            else:
+                state["expert_sent"].add(digest)
+
+        unchanged = [field for field in current if field not in delta]
+        delta["response_mode"] = "compact"
+        if appended:
+            delta["appended_fields"] = appended
+        if unchanged:
+            delta["unchanged_fields"] = unchanged
+        if removed:
+            delta["removed_fields"] = removed
+
+        state["last"] = current
+        return delta
+
     def store_conversation_turn(self, continuation_id: str, response_data: dict, request):
         """
         Store the conversation turn. Tools can override for custom memory storage.
@@ -1256,6 +1390,17 @@ class BaseWorkflowMixin(ABC):
 
     # Core workflow logic methods
 
+    def _expected_prompt_text(self, request) -> str:
+        """
+        Text the expert analysis prompt is built from, as known before the step is processed.
+
+        Used as the prompt demand for token allocation: the step, its findings and the findings
+        of earlier steps, which the expert context summarizes. Files are budgeted separately.
+        """
+        parts = [entry.get("findings") or "" for entry in self.work_history]
+        parts.extend([request.step or "", getattr(request, "findings", None) or ""])
+        return "\n".join(parts)
+
     async def handle_work_completion(self, response_data: dict, request, arguments: dict) -> dict:
         """
         Handle work completion logic - expert analysis decision and response building.
@@ -1433,6 +1578,7 @@ class BaseWorkflowMixin(ABC):
 
         return "\n".join(summary_parts)
 
+    @traced("expert_analysis")
     async def _call_expert_analysis(self, arguments: dict, request) -> dict:
         """Call external model for expert analysis"""
         try:
@@ -1457,8 +1603,11 @@ class BaseWorkflowMixin(ABC):
 
             provider = self._model_context.provider
 
-            # Prepare expert analysis context
-            expert_context = self.prepare_expert_analysis_context(self.consolidated_findings)
+            # Prepare expert analysis context as segments: each part is estimated once and the
+            # prompt (with its file content) is materialized only at the provider call
+            expert_context = SegmentedPrompt.from_text(
+                self.prepare_expert_analysis_context(self.consolidated_findings), kind="prompt"
+            )
 
             # Check if tool wants to include files in prompt
             if self.should_include_files_in_expert_prompt():
@@ -1471,7 +1620,9 @@ class BaseWorkflowMixin(ABC):
 
             # Check if tool wants system prompt embedded in main prompt
             if self.should_embed_system_prompt():
-                prompt = f"{system_prompt}\n\n{expert_context}\n\n{self.get_expert_analysis_instruction()}"
+                prompt = SegmentedPrompt().append(f"{system_prompt}\n\n", kind="instructions")
+                prompt.extend(expert_context)
+                prompt.append(f"\n\n{self.get_expert_analysis_instruction()}", kind="instructions")
                 system_prompt = ""  # Clear it since we embedded it
             else:
                 prompt = expert_context
@@ -1484,8 +1635,11 @@ class BaseWorkflowMixin(ABC):
                 logger.warning(warning)
 
             # Generate AI response - use request parameters if available
-            model_response = provider.generate_content(
-                prompt=prompt,
+            model_response = await agenerate_content_with_stats(
+                provider,
+                tool_name=self.get_name(),
+                estimated_tokens=prompt.token_count,
+                prompt=prompt.render(),
                 model_name=model_name,
                 system_prompt=system_prompt,
                 temperature=validated_temperature,
@@ -1493,6 +1647,11 @@ class BaseWorkflowMixin(ABC):
                 use_websearch=self.get_request_use_websearch(request),
                 images=list(set(self.consolidated_findings.images)) if self.consolidated_findings.images else None,
             )
+            self._report_token_utilization(
+                self._model_context,
+                prompt.token_count,
+                output=(getattr(model_response, "usage", None) or {}).get("output_tokens"),
+            )
 
             if model_response.content:
                 try:
@@ -1545,10 +1704,10 @@ class BaseWorkflowMixin(ABC):
                 error_data = {"status": "error", "content": "No arguments provided"}
                 # Add basic metadata even for validation errors
                 error_data["metadata"] = {"tool_name": self.get_name()}
-                return [TextContent(type="text", text=json.dumps(error_data, ensure_ascii=False))]
+                return [ToolResultContent.from_output(error_data)]
 
             # Delegate to execute_workflow
-            return await self.execute_workflow(arguments)
+            return await self.execute_workflow_serialized(arguments)
 
         except Exception as e:
             logger.error(f"Error in {self.get_name()} tool execution: {e}", exc_info=True)
@@ -1557,12 +1716,26 @@ class BaseWorkflowMixin(ABC):
                 "content": f"Error in {self.get_name()}: {str(e)}",
             }  # Add metadata to error responses
             self._add_workflow_metadata(error_data, arguments)
-            return [
-                TextContent(
-                    type="text",
-                    text=json.dumps(error_data, ensure_ascii=False),
-                )
-            ]
+            return [ToolResultContent.from_output(error_data)]
+
+    async def execute_workflow_serialized(self, arguments: dict[str, Any]) -> list[TextContent]:
+        """
+        Run execute_workflow() once no other call is running on this tool instance.
+
+        Step history, consolidated findings and the current model live on the instance, and
+        provider calls are awaited off the event loop, so two overlapping calls would mix
+        each other's steps into their responses. Calls to the same tool therefore run one
+        at a time; different tools still run concurrently.
+        """
+        loop = asyncio.get_running_loop()
+        entry = _workflow_locks.get(self)
+        if entry is None or entry[0] is not loop:
+            entry = _workflow_locks[self] = (loop, asyncio.Lock())
+        lock = entry[1]
+        if lock.locked():
+            logger.debug(f"[WORKFLOW] {self.get_name()}: waiting for the running call on this tool to finish")
+        async with lock:
+            return await self.execute_workflow(arguments)
 
     # Default implementations for methods that workflow-based tools typically don't need
 
@@ -1603,3 +1776,23 @@ class BaseWorkflowMixin(ABC):
         The BaseWorkflowMixin formats responses internally.
         """
         return response
+
+
+def _dict_delta(previous: dict, current: dict, path: str, removed: list[str]) -> dict:
+    """
+    Recursively keep only the keys of current whose values differ from previous.
+
+    Keys of previous missing from current are appended to removed as dotted paths
+    below path, so a client can tell a removed key from an unchanged one.
+    """
+    delta = {}
+    for key, value in current.items():
+        if key not in previous:
+            delta[key] = value
+        elif previous[key] != value:
+            if isinstance(value, dict) and isinstance(previous[key], dict):
+                delta[key] = _dict_delta(previous[key], value, f"{path}.{key}", removed)
+            else:
+                delta[key] = value
+    removed.extend(f"{path}.{key}" for key in previous if key not in current)
+    return delta
@@ -0,0 +1,266 @@
+"""
+Content-addressed blob store for large conversation attachments
+
+Conversation turns used to carry images as raw strings, which meant data-URL
+screenshots (often several MB of base64) lived inside every serialized
+ThreadContext. Each get_thread/add_turn round trip re-serialized, re-wrote and
+re-parsed that payload. This module moves such attachments out of the thread
+payload into a content-addressed store next to the conversation files; turns
+keep only a short reference of the form ``blob:sha256:<hex digest>``.
+
+Key Features:
+- Content addressing: identical attachments are stored exactly once
+- Reference counting by owner (thread ID), so a blob shared by several threads
+  survives until the last of them expires
+- Garbage collection hooked into thread expiry in the storage backend
+- Atomic writes (temp file + rename) so readers never see partial blobs
+- Reference index persisted alongside the blobs so refcounts survive restarts
+
+Several server processes (one per stdio client) can share a storage directory,
+so the index on disk is the source of truth rather than any process's memory.
+Every change re-reads refs.json under an exclusive file lock, applies its
+delta and rewrites the file atomically; garbage collection checks the merged
+index under the same lock, so it never deletes a blob that a thread of another
+process still references.
+
+Layout on disk:
+    <storage_dir>/blobs/<first two hex chars>/<digest>
+    <storage_dir>/blobs/refs.json
+    <storage_dir>/blobs/refs.lock
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+BLOB_REF_PREFIX = "blob:sha256:"
+
+# Blobs on disk without any recorded owner are only removed after this grace period,
+# so a blob written just before a crash (and before its owner was indexed) is not
+# deleted out from under a concurrent writer.
+ORPHAN_GRACE_SECONDS = 3600
+
+
+def is_blob_ref(value: Optional[str]) -> bool:
+    """Return True if the value is a blob reference produced by BlobStore.put()."""
+    return isinstance(value, str) and value.startswith(BLOB_REF_PREFIX)
+
+
+@contextlib.contextmanager
+def _exclusive_file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on path against other processes (blocking)."""
+    with open(path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class BlobStore:
+    """Thread-safe, reference-counted, content-addressed store for large attachments."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._index_path = self.root / "refs.json"
+        self._lock_path = self.root / "refs.lock"
+        self._lock = threading.Lock()
+        # digest -> owners referencing it, and the reverse mapping for O(owned) release.
+        # A copy of refs.json, refreshed whenever another process has rewritten the file.
+        self._owners_by_digest: dict[str, set[str]] = {}
+        self._digests_by_owner: dict[str, set[str]] = {}
+        self._index_signature: Optional[tuple[int, int, int]] = None
+        with self._locked():
+            pass  # loads the current index
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the thread and inter-process locks with the in-memory index matching refs.json."""
+        with self._lock, _exclusive_file_lock(self._lock_path):
+            self._load_index()
+            yield
+
+    def _load_index(self) -> None:
+        """Re-read the reference index if it changed on disk. Caller must hold the locks."""
+        try:
+            st = self._index_path.stat()
+        except FileNotFoundError:
+            signature = None
+        else:
+            signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if signature == self._index_signature:
+            return
+        self._owners_by_digest = {}
+        self._digests_by_owner = {}
+        self._index_signature = signature
+        if signature is None:
+            return
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            for digest, owners in data.items():
+                if self._blob_path(digest).exists():
+                    self._owners_by_digest[digest] = set(owners)
+                    for owner in owners:
+                        self._digests_by_owner.setdefault(owner, set()).add(digest)
+        except Exception as e:
+            logger.warning(f"Could not load blob reference index {self._index_path}: {e}")
+
+    def _save_index(self) -> None:
+        """Persist the reference index atomically. Caller must hold the locks."""
+        payload = {digest: sorted(owners) for digest, owners in self._owners_by_digest.items()}
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".refs-", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self._index_path)
+            st = self._index_path.stat()
+            self._index_signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except Exception as e:
+            logger.error(f"Failed to persist blob reference index: {e}")
+
+    def put(self, content: str, owner: str) -> str:
+        """
+        Store content (if not already present) and record a reference from owner.
+
+        Args:
+            content: Attachment payload, e.g. a base64 data URL
+            owner: Identifier of the referencing entity (a conversation thread ID)
+
+        Returns:
+            str: Blob reference to store in place of the content
+        """
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+
+        with self._locked():
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".blob-", suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                logger.debug(f"[BLOBS] Stored blob {digest[:12]} ({len(data):,} bytes)")
+            owners = self._owners_by_digest.setdefault(digest, set())
+            if owner not in owners:
+                owners.add(owner)
+                self._digests_by_owner.setdefault(owner, set()).add(digest)
+                self._save_index()
+
+        return f"{BLOB_REF_PREFIX}{digest}"
+
+    def get(self, ref: str) -> Optional[str]:
+        """
+        Resolve a blob reference back to its content.
+
+        Returns:
+            str: Original content, or None if the reference is invalid or collected
+        """
+        if not is_blob_ref(ref):
+            return None
+        path = self._blob_path(ref[len(BLOB_REF_PREFIX) :])
+        try:
+            return path.read_bytes().decode("utf-8")
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to read blob {ref}: {e}")
+            return None
+
+    def owners(self) -> list[str]:
+        """All owners currently holding at least one reference."""
+        with self._locked():
+            return list(self._digests_by_owner)
+
+    def refcount(self, ref: str) -> int:
+        """Number of distinct owners currently referencing the blob."""
+        with self._locked():
+            return len(self._owners_by_digest.get(ref[len(BLOB_REF_PREFIX) :], ()))
+
+    def release_owner(self, owner: str) -> int:
+        """
+        Drop every reference held by owner and delete blobs that become unreferenced.
+
+        Called by the storage backend when a conversation thread expires.
+
+        Returns:
+            int: Number of blobs deleted
+        """
+        deleted = 0
+        with self._locked():
+            digests = self._digests_by_owner.pop(owner, None)
+            if not digests:
+                return 0
+            for digest in digests:
+                owners = self._owners_by_digest.get(digest)
+                if owners is None:
+                    continue
+                owners.discard(owner)
+                if not owners:
+                    del self._owners_by_digest[digest]
+                    try:
+                        self._blob_path(digest).unlink()
+                        deleted += 1
+                    except FileNotFoundError:
+                        pass
+            self._save_index()
+        if deleted:
+            logger.debug(f"[BLOBS] Released owner {owner}: collected {deleted} blob(s)")
+        return deleted
+
+    def collect_garbage(self, grace_seconds: int = ORPHAN_GRACE_SECONDS) -> int:
+        """
+        Delete blob files on disk that have no recorded owner.
+
+        Orphans appear when a process dies between writing a blob and indexing it,
+        or when an index from a previous process referenced threads that expired
+        while no server was running. Ownership is checked against the index as
+        merged by all processes sharing the directory.
+
+        Returns:
+            int: Number of orphaned blobs deleted
+        """
+        cutoff = time.time() - grace_seconds
+        deleted = 0
+        with self._locked():
+            for path in self.root.glob("??/*"):
+                if path.name.startswith(".") or path.name in self._owners_by_digest:
+                    continue
+                try:
+                    if path.stat().st_mtime <= cutoff:
+                        path.unlink()
+                        deleted += 1
+                except FileNotFoundError:
+                    continue
+        if deleted:
+            logger.debug(f"[BLOBS] Garbage-collected {deleted} orphaned blob(s)")
+        return deleted
@@ -0,0 +1,151 @@
+"""
+Per-client session state for the multi-client HTTP transport
+
+Over stdio every client gets its own server process, so process-wide state is
+client state: the tool instances in server.TOOLS (workflow tools keep their
+step history on the instance) and the "most recent conversation" that tools
+continue when no continuation_id is given.
+
+With MCP_TRANSPORT=http one process serves many clients at once. Shared
+resources (provider connection pools, file and response caches, conversation
+storage) stay shared, which is the point of the long-lived process, but the
+per-client pieces must not leak between clients:
+
+- each MCP session gets its own instance of every tool it calls, created on
+  first use and dropped with the session
+- the default conversation is the last thread created or updated by the same
+  session, never another client's (see FileBasedStorage.get_default_conversation_id)
+
+Sessions are keyed by the mcp ServerSession object through a weak mapping, so
+the state is released when the transport discards the session (DELETE, idle
+timeout or disconnect). The state of the call being handled is published in a
+ContextVar by client_call_scope(); code outside a client call (stdio mode,
+tests, background tasks) sees no client session and keeps the process-wide
+behaviour.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import time
+import uuid
+import weakref
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ClientState:
+    """State owned by one MCP client session."""
+
+    session_id: str
+    created_at: float = field(default_factory=time.time)
+    calls: int = 0
+    tools: dict[str, Any] = field(default_factory=dict)
+
+    def tool(self, name: str, shared: Any) -> Any:
+        """This session's instance of a tool, created from the shared instance's class on first use."""
+        instance = self.tools.get(name)
+        if instance is None:
+            instance = self.tools[name] = type(shared)()
+        return instance
+
+
+_current: contextvars.ContextVar[Optional[ClientState]] = contextvars.ContextVar("zen_client_session", default=None)
+_states: "weakref.WeakKeyDictionary[Any, ClientState]" = weakref.WeakKeyDictionary()
+_isolation_enabled = False
+_call_limit = 0
+_call_slots: Optional[asyncio.Semaphore] = None
+
+
+def enable_session_isolation(max_concurrent_calls: int = 0) -> None:
+    """
+    Give each MCP session its own state and bound concurrent tool calls (HTTP transport).
+
+    Args:
+        max_concurrent_calls: Tool calls executing at once across all sessions (0 = unlimited)
+    """
+    global _isolation_enabled, _call_limit, _call_slots
+
+    _isolation_enabled = True
+    _call_limit = max_concurrent_calls
+    # Created lazily on the serving loop
+    _call_slots = None
+
+
+def disable_session_isolation() -> None:
+    global _isolation_enabled, _call_limit, _call_slots
+
+    _isolation_enabled = False
+    _call_limit = 0
+    _call_slots = None
+    _states.clear()
+
+
+def state_for(session: Any) -> ClientState:
+    """State for an MCP session object, created on first use."""
+    state = _states.get(session)
+    if state is None:
+        state = _states[session] = ClientState(session_id=uuid.uuid4().hex)
+        logger.info(f"[HTTP] New client session {state.session_id[:8]} ({len(_states)} active)")
+    return state
+
+
+def current_client_state() -> Optional[ClientState]:
+    """State of the client whose tool call is being handled, or None outside isolated calls."""
+    return _current.get()
+
+
+def current_client_session_id() -> Optional[str]:
+    state = _current.get()
+    return state.session_id if state is not None else None
+
+
+def active_sessions() -> int:
+    return len(_states)
+
+
+def session_tool(name: str, shared: Any) -> Any:
+    """The tool instance to use for this call: per-session when isolated, else the shared one."""
+    state = _current.get()
+    return state.tool(name, shared) if state is not None else shared
+
+
+@contextlib.asynccontextmanager
+async def client_call_scope(session: Any) -> AsyncIterator[Optional[ClientState]]:
+    """
+    Run a tool call as the given MCP session: publish its state and hold a call slot.
+
+    A no-op unless enable_session_isolation() was called.
+
+    Args:
+        session: The mcp ServerSession the request arrived on (None when unknown)
+
+    Yields:
+        The session's ClientState, or None when isolation is off
+    """
+    global _call_slots
+
+    if not _isolation_enabled or session is None:
+        yield None
+        return
+
+    state = state_for(session)
+    state.calls += 1
+    token = _current.set(state)
+    try:
+        if _call_limit:
+            if _call_slots is None:
+                _call_slots = asyncio.Semaphore(_call_limit)
+            if _call_slots.locked():
+                logger.debug(f"[HTTP] Session {state.session_id[:8]} waiting for one of {_call_limit} call slots")
+            async with _call_slots:
+                yield state
+        else:
+            yield state
+    finally:
+        _current.reset(token)
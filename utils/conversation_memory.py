@@ -112,6 +112,9 @@ from typing import Any, Optional
 
 from pydantic import BaseModel
 
+from utils.dry_run import note_history, note_planned_file, note_skipped_file, reset_history_files, suppress_write
+from utils.tracing import traced
+
 logger = logging.getLogger(__name__)
 
 # Configuration constants
@@ -143,6 +146,16 @@ except ValueError:
 
 CONVERSATION_TIMEOUT_SECONDS = CONVERSATION_TIMEOUT_HOURS * 3600
 
+# Images (typically base64 data URLs) longer than this many characters are moved out of the
+# thread payload into the content-addressed blob store; the turn keeps only a hash reference.
+try:
+    BLOB_INLINE_THRESHOLD = int(os.getenv("BLOB_INLINE_THRESHOLD", "4096"))
+except ValueError:
+    logger.warning(
+        f"Invalid BLOB_INLINE_THRESHOLD value ('{os.getenv('BLOB_INLINE_THRESHOLD')}'), using default of 4096"
+    )
+    BLOB_INLINE_THRESHOLD = 4096
+
 
 class ConversationTurn(BaseModel):
     """
@@ -156,7 +169,8 @@ class ConversationTurn(BaseModel):
         content: The actual message content/response
         timestamp: ISO timestamp when this turn was created
         files: List of file paths referenced in this specific turn
-        images: List of image paths referenced in this specific turn
+        images: List of image paths referenced in this specific turn. Large inline
+                images are stored as ``blob:sha256:<digest>`` references.
         tool_name: Which tool generated this turn (for cross-tool tracking)
         model_provider: Provider used (e.g., "google", "openai")
         model_name: Specific model used (e.g., "gemini-2.5-flash", "o3-mini")
@@ -213,6 +227,74 @@ def get_storage():
     return get_storage_backend()
 
 
+def _store_image_blobs(thread_id: str, images: Optional[list[str]]) -> Optional[list[str]]:
+    """
+    Replace large inline images with blob references owned by the thread.
+
+    File path references are short and are kept as-is. Data URLs and other oversized
+    payloads are written to the blob store so the serialized ThreadContext stays small
+    regardless of how many screenshots a conversation accumulates.
+
+    Args:
+        thread_id: Thread that will own the blob references
+        images: Image paths or data URLs as supplied by the tool request
+
+    Returns:
+        Image list with large entries replaced by ``blob:sha256:...`` references
+    """
+    if not images:
+        return images
+
+    from .blob_store import is_blob_ref
+
+    stored = []
+    blobs = None
+    for image in images:
+        if is_blob_ref(image) or len(image) <= BLOB_INLINE_THRESHOLD:
+            stored.append(image)
+            continue
+        try:
+            if blobs is None:
+                blobs = get_storage().blobs
+            stored.append(blobs.put(image, thread_id))
+        except Exception as e:
+            # Fall back to inline storage rather than losing the attachment
+            logger.warning(f"[BLOBS] Failed to store image in blob store, keeping inline: {e}")
+            stored.append(image)
+    return stored
+
+
+def resolve_image_refs(images: list[str]) -> list[str]:
+    """
+    Resolve blob references back into their original image content.
+
+    References whose blob has already been garbage-collected are dropped.
+
+    Args:
+        images: Image entries as stored on conversation turns
+
+    Returns:
+        list[str]: Image paths and data URLs usable by providers
+    """
+    from .blob_store import is_blob_ref
+
+    if not any(is_blob_ref(image) for image in images):
+        return images
+
+    blobs = get_storage().blobs
+    resolved = []
+    for image in images:
+        if not is_blob_ref(image):
+            resolved.append(image)
+            continue
+        content = blobs.get(image)
+        if content is None:
+            logger.debug("[BLOBS] Dropping reference to collected blob %s", image)
+            continue
+        resolved.append(content)
+    return resolved
+
+
 def create_thread(tool_name: str, initial_request: dict[str, Any], parent_thread_id: Optional[str] = None) -> str:
     """
     Create new conversation thread and return thread ID
@@ -255,12 +337,15 @@ def create_thread(tool_name: str, initial_request: dict[str, Any], parent_thread
         initial_context=filtered_context,
     )
 
+    if suppress_write(f"create {tool_name} thread"):
+        return thread_id
+
     # Store in memory with configurable TTL to prevent indefinite accumulation
     storage = get_storage()
     key = f"thread:{thread_id}"
     storage.setex(key, CONVERSATION_TIMEOUT_SECONDS, context.model_dump_json())
 
-    logger.debug(f"[THREAD] Created new thread {thread_id} with parent {parent_thread_id}")
+    logger.debug("[THREAD] Created new thread %s with parent %s", thread_id, parent_thread_id)
 
     return thread_id
 
@@ -295,8 +380,8 @@ def get_thread(thread_id: str) -> Optional[ThreadContext]:
 
         if data:
             context = ThreadContext.model_validate_json(data)
-            # Refresh the TTL in memory after successful retrieval from file
-            storage.setex(key, CONVERSATION_TIMEOUT_SECONDS, context.model_dump_json())
+            # Refresh the TTL only - rewriting the unchanged payload on every read is wasted I/O
+            storage.expire(key, CONVERSATION_TIMEOUT_SECONDS)
             return context
         return None
     except Exception:
@@ -348,25 +433,28 @@ def add_turn(
         - Image references are preserved for cross-tool visual context
         - Model information enables cross-provider conversations
     """
-    logger.debug(f"[FLOW] Adding {role} turn to {thread_id} ({tool_name})")
+    logger.debug("[FLOW] Adding %s turn to %s (%s)", role, thread_id, tool_name)
 
     context = get_thread(thread_id)
     if not context:
-        logger.debug(f"[FLOW] Thread {thread_id} not found for turn addition")
+        logger.debug("[FLOW] Thread %s not found for turn addition", thread_id)
         return False
 
     # Check turn limit to prevent runaway conversations
     if len(context.turns) >= MAX_CONVERSATION_TURNS:
-        logger.debug(f"[FLOW] Thread {thread_id} at max turns ({MAX_CONVERSATION_TURNS})")
+        logger.debug("[FLOW] Thread %s at max turns (%s)", thread_id, MAX_CONVERSATION_TURNS)
         return False
 
+    if suppress_write(f"add {role} turn to thread {thread_id}"):
+        return True
+
     # Create new turn with complete metadata
     turn = ConversationTurn(
         role=role,
         content=content,
         timestamp=datetime.now(timezone.utc).isoformat(),
         files=files,  # Preserved for cross-tool file context
-        images=images,  # Preserved for cross-tool visual context
+        images=_store_image_blobs(thread_id, images),  # Large images become blob references
         tool_name=tool_name,  # Track which tool generated this turn
         model_provider=model_provider,  # Track model provider
         model_name=model_name,  # Track specific model
@@ -383,7 +471,7 @@ def add_turn(
         storage.setex(key, CONVERSATION_TIMEOUT_SECONDS, context.model_dump_json())  # Refresh TTL to configured timeout
         return True
     except Exception as e:
-        logger.debug(f"[FLOW] Failed to save turn to storage: {type(e).__name__}")
+        logger.debug("[FLOW] Failed to save turn to storage: %s", type(e).__name__)
         return False
 
 
@@ -416,7 +504,7 @@ def get_thread_chain(thread_id: str, max_depth: int = 20) -> list[ThreadContext]
 
         context = get_thread(current_id)
         if not context:
-            logger.debug(f"[THREAD] Thread {current_id} not found in chain traversal")
+            logger.debug("[THREAD] Thread %s not found in chain traversal", current_id)
             break
 
         chain.append(context)
@@ -425,7 +513,7 @@ def get_thread_chain(thread_id: str, max_depth: int = 20) -> list[ThreadContext]
     # Reverse to get chronological order (oldest first)
     chain.reverse()
 
-    logger.debug(f"[THREAD] Retrieved chain of {len(chain)} threads for {thread_id}")
+    logger.debug("[THREAD] Retrieved chain of %s threads for %s", len(chain), thread_id)
     return chain
 
 
@@ -478,7 +566,7 @@ def get_conversation_file_list(context: ThreadContext) -> list[str]:
     seen_files = set()
     file_list = []
 
-    logger.debug(f"[FILES] Collecting files from {len(context.turns)} turns (newest first)")
+    logger.debug("[FILES] Collecting files from %s turns (newest first)", len(context.turns))
 
     # Process turns in reverse order (newest first) - this is the CORE of newest-first prioritization
     # By iterating from len-1 down to 0, we encounter newer turns before older turns
@@ -486,18 +574,18 @@ def get_conversation_file_list(context: ThreadContext) -> list[str]:
     for i in range(len(context.turns) - 1, -1, -1):  # REVERSE: newest turn first
         turn = context.turns[i]
         if turn.files:
-            logger.debug(f"[FILES] Turn {i + 1} has {len(turn.files)} files: {turn.files}")
+            logger.debug("[FILES] Turn %s has %s files: %s", i + 1, len(turn.files), turn.files)
             for file_path in turn.files:
                 if file_path not in seen_files:
                     # First time seeing this file - add it (this is the NEWEST reference)
                     seen_files.add(file_path)
                     file_list.append(file_path)
-                    logger.debug(f"[FILES] Added new file: {file_path} (from turn {i + 1})")
+                    logger.debug("[FILES] Added new file: %s (from turn %s)", file_path, i + 1)
                 else:
                     # File already seen from a NEWER turn - skip this older reference
-                    logger.debug(f"[FILES] Skipping duplicate file: {file_path} (newer version already included)")
+                    logger.debug("[FILES] Skipping duplicate file: %s (newer version already included)", file_path)
 
-    logger.debug(f"[FILES] Final file list ({len(file_list)}): {file_list}")
+    logger.debug("[FILES] Final file list (%s): %s", len(file_list), file_list)
     return file_list
 
 
@@ -550,7 +638,7 @@ def get_conversation_image_list(context: ThreadContext) -> list[str]:
     seen_images = set()
     image_list = []
 
-    logger.debug(f"[IMAGES] Collecting images from {len(context.turns)} turns (newest first)")
+    logger.debug("[IMAGES] Collecting images from %s turns (newest first)", len(context.turns))
 
     # Process turns in reverse order (newest first) - this is the CORE of newest-first prioritization
     # By iterating from len-1 down to 0, we encounter newer turns before older turns
@@ -558,19 +646,19 @@ def get_conversation_image_list(context: ThreadContext) -> list[str]:
     for i in range(len(context.turns) - 1, -1, -1):  # REVERSE: newest turn first
         turn = context.turns[i]
         if turn.images:
-            logger.debug(f"[IMAGES] Turn {i + 1} has {len(turn.images)} images: {turn.images}")
+            logger.debug("[IMAGES] Turn %s has %s images: %s", i + 1, len(turn.images), turn.images)
             for image_path in turn.images:
                 if image_path not in seen_images:
                     # First time seeing this image - add it (this is the NEWEST reference)
                     seen_images.add(image_path)
                     image_list.append(image_path)
-                    logger.debug(f"[IMAGES] Added new image: {image_path} (from turn {i + 1})")
+                    logger.debug("[IMAGES] Added new image: %s (from turn %s)", image_path, i + 1)
                 else:
                     # Image already seen from a NEWER turn - skip this older reference
-                    logger.debug(f"[IMAGES] Skipping duplicate image: {image_path} (newer version already included)")
+                    logger.debug("[IMAGES] Skipping duplicate image: %s (newer version already included)", image_path)
 
-    logger.debug(f"[IMAGES] Final image list ({len(image_list)}): {image_list}")
-    return image_list
+    logger.debug("[IMAGES] Final image list (%s): %s", len(image_list), image_list)
+    return resolve_image_refs(image_list)
 
 
 def _plan_file_inclusion_by_size(all_files: list[str], max_file_tokens: int) -> tuple[list[str], list[str], int]:
@@ -592,8 +680,10 @@ def _plan_file_inclusion_by_size(all_files: list[str], max_file_tokens: int) ->
     files_to_include = []
     files_to_skip = []
     total_tokens = 0
+    reset_history_files()
 
-    logger.debug(f"[FILES] Planning inclusion for {len(all_files)} files with budget {max_file_tokens:,} tokens")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"[FILES] Planning inclusion for {len(all_files)} files with budget {max_file_tokens:,} tokens")
 
     for file_path in all_files:
         try:
@@ -606,34 +696,49 @@ def _plan_file_inclusion_by_size(all_files: list[str], max_file_tokens: int) ->
                 if total_tokens + estimated_tokens <= max_file_tokens:
                     files_to_include.append(file_path)
                     total_tokens += estimated_tokens
-                    logger.debug(
-                        f"[FILES] Including {file_path} - {estimated_tokens:,} tokens (total: {total_tokens:,})"
-                    )
+                    note_planned_file(file_path, estimated_tokens, "history")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(
+                            f"[FILES] Including {file_path} - {estimated_tokens:,} tokens (total: {total_tokens:,})"
+                        )
                 else:
                     files_to_skip.append(file_path)
-                    logger.debug(
-                        f"[FILES] Skipping {file_path} - would exceed budget (needs {estimated_tokens:,} tokens)"
+                    note_skipped_file(
+                        file_path,
+                        f"history file budget ({estimated_tokens:,} tokens, {max_file_tokens - total_tokens:,} left)",
+                        "history",
+                        tokens=estimated_tokens,
                     )
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(
+                            f"[FILES] Skipping {file_path} - would exceed budget (needs {estimated_tokens:,} tokens)"
+                        )
             else:
                 files_to_skip.append(file_path)
                 # More descriptive message for missing files
                 if not os.path.exists(file_path):
+                    note_skipped_file(file_path, "file no longer exists", "history")
                     logger.debug(
-                        f"[FILES] Skipping {file_path} - file no longer exists (may have been moved/deleted since conversation)"
+                        "[FILES] Skipping %s - file no longer exists (may have been moved/deleted since conversation)",
+                        file_path,
                     )
                 else:
-                    logger.debug(f"[FILES] Skipping {file_path} - file not accessible (not a regular file)")
+                    note_skipped_file(file_path, "not a regular file", "history")
+                    logger.debug("[FILES] Skipping %s - file not accessible (not a regular file)", file_path)
 
         except Exception as e:
             files_to_skip.append(file_path)
-            logger.debug(f"[FILES] Skipping {file_path} - error during processing: {type(e).__name__}: {e}")
+            note_skipped_file(file_path, f"error: {type(e).__name__}: {e}", "history")
+            logger.debug("[FILES] Skipping %s - error during processing: %s: %s", file_path, type(e).__name__, e)
 
-    logger.debug(
-        f"[FILES] Inclusion plan: {len(files_to_include)} include, {len(files_to_skip)} skip, {total_tokens:,} tokens"
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"[FILES] Inclusion plan: {len(files_to_include)} include, {len(files_to_skip)} skip, {total_tokens:,} tokens"
+        )
     return files_to_include, files_to_skip, total_tokens
 
 
+@traced()
 def build_conversation_history(context: ThreadContext, model_context=None, read_files_func=None) -> tuple[str, int]:
     """
     Build formatted conversation history for tool prompts with embedded file contents.
@@ -757,7 +862,7 @@ def build_conversation_history(context: ThreadContext, model_context=None, read_
             initial_context=context.initial_context,
         )
         all_files = get_conversation_file_list(temp_context)  # Applies newest-first logic to entire chain
-        logger.debug(f"[THREAD] Built history from {len(chain)} threads with {total_turns} total turns")
+        logger.debug("[THREAD] Built history from %s threads with %s total turns", len(chain), total_turns)
     else:
         # Single thread, no parent chain
         all_turns = context.turns
@@ -767,7 +872,7 @@ def build_conversation_history(context: ThreadContext, model_context=None, read_
     if not all_turns:
         return "", 0
 
-    logger.debug(f"[FILES] Found {len(all_files)} unique files in conversation history")
+    logger.debug("[FILES] Found %s unique files in conversation history", len(all_files))
 
     # Get model-specific token allocation early (needed for both files and turns)
     if model_context is None:
@@ -789,9 +894,10 @@ def build_conversation_history(context: ThreadContext, model_context=None, read_
     max_file_tokens = token_allocation.file_tokens
     max_history_tokens = token_allocation.history_tokens
 
-    logger.debug(f"[HISTORY] Using model-specific limits for {model_context.model_name}:")
-    logger.debug(f"[HISTORY]   Max file tokens: {max_file_tokens:,}")
-    logger.debug(f"[HISTORY]   Max history tokens: {max_history_tokens:,}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"[HISTORY] Using model-specific limits for {model_context.model_name}:")
+        logger.debug(f"[HISTORY]   Max file tokens: {max_file_tokens:,}")
+        logger.debug(f"[HISTORY]   Max history tokens: {max_history_tokens:,}")
 
     history_parts = [
         "=== CONVERSATION HISTORY (CONTINUATION) ===",
@@ -804,7 +910,7 @@ def build_conversation_history(context: ThreadContext, model_context=None, read_
 
     # Embed files referenced in this conversation with size-aware selection
     if all_files:
-        logger.debug(f"[FILES] Starting embedding for {len(all_files)} files")
+        logger.debug("[FILES] Starting embedding for %s files", len(all_files))
 
         # Plan file inclusion based on size constraints
         # CRITICAL: all_files is already ordered by newest-first prioritization from get_conversation_file_list()
@@ -841,17 +947,18 @@ def build_conversation_history(context: ThreadContext, model_context=None, read_
 
                 for file_path in files_to_include:
                     try:
-                        logger.debug(f"[FILES] Processing file {file_path}")
+                        logger.debug("[FILES] Processing file %s", file_path)
                         formatted_content, content_tokens = read_file_content(file_path)
                         if formatted_content:
                             file_contents.append(formatted_content)
                             total_tokens += content_tokens
                             files_included += 1
-                            logger.debug(
-                                f"File embedded in conversation history: {file_path} ({content_tokens:,} tokens)"
-                            )
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug(
+                                    f"File embedded in conversation history: {file_path} ({content_tokens:,} tokens)"
+                                )
                         else:
-                            logger.debug(f"File skipped (empty content): {file_path}")
+                            logger.debug("File skipped (empty content): %s", file_path)
                     except Exception as e:
                         # More descriptive error handling for missing files
                         try:
@@ -878,12 +985,13 @@ def build_conversation_history(context: ThreadContext, model_context=None, read_
                             f"These were older files from earlier conversation turns.]\n"
                         )
                     history_parts.append(files_content)
-                    logger.debug(
-                        f"Conversation history file embedding complete: {files_included} files embedded, {len(files_to_skip)} omitted, {total_tokens:,} total tokens"
-                    )
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(
+                            f"Conversation history file embedding complete: {files_included} files embedded, {len(files_to_skip)} omitted, {total_tokens:,} total tokens"
+                        )
                 else:
                     history_parts.append("(No accessible files found)")
-                    logger.debug(f"[FILES] No accessible files found from {len(files_to_include)} planned files")
+                    logger.debug("[FILES] No accessible files found from %s planned files", len(files_to_include))
             else:
                 # Fallback to original read_files function
                 files_content = read_files_func(all_files)
@@ -953,12 +1061,13 @@ def build_conversation_history(context: ThreadContext, model_context=None, read_
         # Check if adding this turn would exceed history budget
         if file_embedding_tokens + total_turn_tokens + turn_tokens > max_history_tokens:
             # Stop adding turns - we've reached the limit
-            logger.debug(f"[HISTORY] Stopping at turn {turn_num} - would exceed history budget")
-            logger.debug(f"[HISTORY]   File tokens: {file_embedding_tokens:,}")
-            logger.debug(f"[HISTORY]   Turn tokens so far: {total_turn_tokens:,}")
-            logger.debug(f"[HISTORY]   This turn: {turn_tokens:,}")
-            logger.debug(f"[HISTORY]   Would total: {file_embedding_tokens + total_turn_tokens + turn_tokens:,}")
-            logger.debug(f"[HISTORY]   Budget: {max_history_tokens:,}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"[HISTORY] Stopping at turn {turn_num} - would exceed history budget")
+                logger.debug(f"[HISTORY]   File tokens: {file_embedding_tokens:,}")
+                logger.debug(f"[HISTORY]   Turn tokens so far: {total_turn_tokens:,}")
+                logger.debug(f"[HISTORY]   This turn: {turn_tokens:,}")
+                logger.debug(f"[HISTORY]   Would total: {file_embedding_tokens + total_turn_tokens + turn_tokens:,}")
+                logger.debug(f"[HISTORY]   Budget: {max_history_tokens:,}")
             break
 
         # Add this turn to our collection (we'll reverse it later for chronological presentation)
@@ -1007,15 +1116,53 @@ def build_conversation_history(context: ThreadContext, model_context=None, read_
     total_conversation_tokens = estimate_tokens(complete_history)
 
     # Summary log of what was built
-    user_turns = len([t for t in all_turns if t.role == "user"])
-    assistant_turns = len([t for t in all_turns if t.role == "assistant"])
-    logger.debug(
-        f"[FLOW] Built conversation history: {user_turns} user + {assistant_turns} assistant turns, {len(all_files)} files, {total_conversation_tokens:,} tokens"
+    if logger.isEnabledFor(logging.DEBUG):
+        user_turns = len([t for t in all_turns if t.role == "user"])
+        assistant_turns = len([t for t in all_turns if t.role == "assistant"])
+        logger.debug(
+            f"[FLOW] Built conversation history: {user_turns} user + {assistant_turns} assistant turns, {len(all_files)} files, {total_conversation_tokens:,} tokens"
+        )
+
+    kept_turns = [idx + 1 for idx, _ in turn_entries]
+    note_history(
+        total_turns=len(all_turns),
+        kept_turns=kept_turns,
+        dropped_turns=[number for number in range(1, len(all_turns) + 1) if number not in kept_turns],
+        tokens=total_conversation_tokens,
+        history_budget=max_history_tokens,
+        file_budget=max_file_tokens,
     )
 
+    if hasattr(model_context, "record_usage"):
+        model_context.record_usage(history=total_conversation_tokens)
+
     return complete_history, total_conversation_tokens
 
 
+def estimate_thread_demand(context: ThreadContext, extra_files: Optional[list[str]] = None) -> dict[str, int]:
+    """
+    Estimate how many tokens a thread's history and files will need.
+
+    Used to record demand for adaptive token allocation before the history is
+    built. Turn text uses the character estimate and files use size-based
+    estimates, so no file is read here.
+
+    Args:
+        context: Thread whose turns and files should be estimated
+        extra_files: Files referenced by the incoming request, if any
+
+    Returns:
+        dict: {"history": tokens for turn text, "files": tokens for all referenced files}
+    """
+    from utils.file_utils import estimate_file_tokens, expand_paths
+    from utils.token_utils import estimate_tokens
+
+    history_tokens = sum(estimate_tokens(turn.content) for turn in context.turns)
+    files = list(dict.fromkeys(get_conversation_file_list(context) + list(extra_files or [])))
+    file_tokens = sum(estimate_file_tokens(path) for path in expand_paths(files)) if files else 0
+    return {"history": history_tokens, "files": file_tokens}
+
+
 def _get_tool_formatted_content(turn: ConversationTurn) -> list[str]:
     """
     Get tool-specific formatting for a conversation turn.
@@ -1046,7 +1193,7 @@ def _get_tool_formatted_content(turn: ConversationTurn) -> list[str]:
                     pass
         except Exception as e:
             # Log but don't fail - fall back to default formatting
-            logger.debug(f"[HISTORY] Could not get tool-specific formatting for {turn.tool_name}: {e}")
+            logger.debug("[HISTORY] Could not get tool-specific formatting for %s: %s", turn.tool_name, e)
 
     # Default formatting
     return _default_turn_formatting(turn)
@@ -0,0 +1,416 @@
+"""
+Persistent cross-process cache for file-derived data
+
+A stdio server process lives for one client session, so its in-memory caches
+(the tokenizer memo, anything computed from repository files) start cold every
+time. The next session re-reads, re-formats and re-counts the same files. This
+module keeps those results in a SQLite database that every server process on
+the machine shares:
+
+- line-numbered file content (what read_file_content() puts in prompts for
+  tools that reference lines), keyed by path and stat signature, so an
+  unchanged file is served without reading or re-numbering it
+- exact token counts keyed by encoding and content hash (blake2b of the text),
+  so a file, history turn or prompt section is tokenized once per machine
+  rather than once per process
+- any other derived artifact through the generic get()/put() and
+  get_file()/put_file() methods, namespaced by a "kind" string
+
+Validity of file entries is decided by the stat signature (size, mtime, ctime
+and inode, all in nanoseconds where the platform has them); a mismatch is a
+miss and the entry is replaced on the next write. A file modified within
+RACY_WINDOW_SECONDS of being cached is not stored, because a second edit in the
+same timestamp tick would keep the same signature. Content-keyed entries never
+go stale.
+
+Concurrency: the database runs in WAL mode, so readers never block and writers
+only briefly serialize. Each process holds one connection guarded by a lock;
+a busy or broken database degrades to cache misses instead of failing a tool
+call. A database locked by other processes while opening is retried with
+backoff and, if still locked, reopened later; only a corrupt file ("file is
+not a database", "database disk image is malformed") is moved aside and
+recreated, never one that other processes are using.
+
+Size is bounded by DISK_CACHE_MAX_MB: entries record their size and last access
+time, and after writes the least recently used entries are evicted down to 90%
+of the limit. Access times are refreshed lazily (batched with the next write)
+to keep reads write-free.
+
+Configuration: DISK_CACHE_ENABLED (default true), DISK_CACHE_DIR (default
+$XDG_CACHE_HOME/zen-mcp-server or ~/.cache/zen-mcp-server), DISK_CACHE_MAX_MB.
+"""
+
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DB_FILENAME = "cache.sqlite3"
+SCHEMA_VERSION = 1
+
+# Files modified this recently are not cached (their signature could repeat after another edit)
+RACY_WINDOW_SECONDS = 2.0
+
+# Entries larger than this fraction of the size limit are not stored
+MAX_ENTRY_FRACTION = 0.125
+
+# Writes between two checks of the total size, and the fraction of the limit eviction shrinks to
+EVICTION_CHECK_INTERVAL = 64
+EVICTION_TARGET = 0.9
+
+# Pending access-time refreshes flushed together
+TOUCH_BATCH = 256
+
+BUSY_TIMEOUT_MS = 2000
+
+# Opening a database locked by other processes: attempts, first backoff delay (doubled per attempt)
+# and how long lookups are misses before the next attempt
+OPEN_ATTEMPTS = 5
+OPEN_RETRY_DELAY = 0.05
+REOPEN_INTERVAL = 5.0
+
+_CORRUPTION_MESSAGES = ("file is not a database", "database disk image is malformed")
+_BUSY_MESSAGES = ("database is locked", "database table is locked", "database is busy")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    signature TEXT,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+def _is_corrupt(error: sqlite3.Error) -> bool:
+    message = str(error).lower()
+    return any(text in message for text in _CORRUPTION_MESSAGES)
+
+
+def _is_busy(error: sqlite3.Error) -> bool:
+    message = str(error).lower()
+    return any(text in message for text in _BUSY_MESSAGES)
+
+
+@dataclass(frozen=True)
+class FileSignature:
+    """Stat fields that change whenever a file's content may have changed."""
+
+    size: int
+    mtime_ns: int
+    ctime_ns: int
+    inode: int
+
+    @classmethod
+    def from_stat(cls, st: os.stat_result) -> "FileSignature":
+        return cls(size=st.st_size, mtime_ns=st.st_mtime_ns, ctime_ns=st.st_ctime_ns, inode=st.st_ino)
+
+    def encode(self) -> str:
+        return f"{self.size}:{self.mtime_ns}:{self.ctime_ns}:{self.inode}"
+
+    def is_racy(self, now: Optional[float] = None) -> bool:
+        """Whether the file changed too recently for its signature to be trusted."""
+        now = time.time() if now is None else now
+        return now - max(self.mtime_ns, self.ctime_ns) / 1e9 < RACY_WINDOW_SECONDS
+
+
+class DiskCache:
+    """SQLite-backed key/value cache shared by all server processes on the machine."""
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.path = self.directory / DB_FILENAME
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._pending_touches: set[tuple[str, str]] = set()
+        self._writes_since_check = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        # Monotonic time of the next open attempt while the database is locked by other processes
+        self._reopen_at: Optional[float] = None
+        self._open()
+
+    def _open(self, attempts: int = OPEN_ATTEMPTS) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for attempt in range(attempts):
+            try:
+                self._conn = self._connect()
+                break
+            except sqlite3.DatabaseError as e:
+                if _is_corrupt(e):
+                    self._quarantine(e)
+                    self._conn = self._connect()
+                    break
+                if not _is_busy(e):
+                    raise
+                if attempt + 1 < attempts:
+                    time.sleep(OPEN_RETRY_DELAY * 2**attempt)
+        else:
+            # Other processes hold the database (e.g. several opening it at once): serve misses and try again
+            # later rather than touching a database they are using
+            self.stats["errors"] += 1
+            self._reopen_at = time.monotonic() + REOPEN_INTERVAL
+            logger.debug(f"[DISK_CACHE] {self.path} is locked; retrying in {REOPEN_INTERVAL:g}s")
+            return
+        self._reopen_at = None
+        # Checking the size on the first write also trims a cache left over-full by an earlier process
+        self._writes_since_check = EVICTION_CHECK_INTERVAL
+
+    def _quarantine(self, error: sqlite3.Error) -> None:
+        """Move a corrupt database file (and its WAL files) aside so a fresh one can be created."""
+        aside = self.path.with_name(f"{DB_FILENAME}.corrupt-{int(time.time())}")
+        logger.warning(f"[DISK_CACHE] Cache database unusable ({error}); moving it to {aside.name}")
+        for suffix in ("", "-wal", "-shm"):
+            source = Path(str(self.path) + suffix)
+            if source.exists():
+                source.replace(Path(str(aside) + suffix))
+
+    def _connection_ready(self) -> bool:
+        """Whether a connection is open, retrying one that was locked when opened (caller holds the lock)."""
+        if self._conn is None and self._reopen_at is not None and time.monotonic() >= self._reopen_at:
+            try:
+                self._open(attempts=1)
+            except sqlite3.Error as e:
+                self._reopen_at = None
+                self._error("Reopen", e)
+        return self._conn is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode; writes open explicit transactions. The connection is shared by threads under _lock.
+        conn = sqlite3.connect(
+            str(self.path), timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False
+        )
+        try:
+            conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            # Switching the journal mode needs an exclusive lock; skip it once another process has done it
+            if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != "wal":
+                conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Re-check under the write lock: another process may have migrated meanwhile
+                    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                        conn.execute("DROP TABLE IF EXISTS entries")
+                        for statement in _SCHEMA.strip().split(";"):
+                            if statement.strip():
+                                conn.execute(statement)
+                        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            conn.execute("SELECT 1 FROM entries LIMIT 1").fetchall()
+        except BaseException:
+            conn.close()
+            raise
+        logger.debug(f"[DISK_CACHE] Opened {self.path}")
+        return conn
+
+    def _error(self, action: str, error: Exception) -> None:
+        self.stats["errors"] += 1
+        logger.debug(f"[DISK_CACHE] {action} failed: {error}")
+
+    # ----------------------------------------------------------------------------------------------
+    # Generic entries
+    # ----------------------------------------------------------------------------------------------
+
+    def get(self, kind: str, key: str, signature: Optional[str] = None) -> Optional[bytes]:
+        """
+        Look up an entry.
+
+        Args:
+            kind: Namespace of the entry (e.g. "tokens", "formatted_file")
+            key: Key within the namespace
+            signature: When given, the stored signature must match or the lookup is a miss
+
+        Returns:
+            The stored bytes, or None on a miss
+        """
+        with self._lock:
+            if not self._connection_ready():
+                return None
+            try:
+                row = self._conn.execute(
+                    "SELECT value, signature FROM entries WHERE kind = ? AND key = ?", (kind, key)
+                ).fetchone()
+            except sqlite3.Error as e:
+                self._error("Lookup", e)
+                return None
+            if row is None or (signature is not None and row[1] != signature):
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self._pending_touches.add((kind, key))
+            if len(self._pending_touches) >= TOUCH_BATCH:
+                self._write(())
+        return row[0]
+
+    def put(self, kind: str, key: str, value: bytes, signature: Optional[str] = None) -> bool:
+        """
+        Store an entry, replacing any previous value.
+
+        Returns:
+            bool: Whether the entry was stored (False if too large or the database is busy)
+        """
+        if len(value) > self.max_bytes * MAX_ENTRY_FRACTION:
+            return False
+        with self._lock:
+            if not self._connection_ready():
+                return False
+            return self._write([(kind, key, signature, value, len(value), time.time())])
+
+    def _write(self, rows) -> bool:
+        """Insert rows and flush pending access times in one transaction (caller holds the lock)."""
+        now = time.time()
+        touches = [(now, kind, key) for kind, key in self._pending_touches]
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if touches:
+                    self._conn.executemany("UPDATE entries SET accessed = ? WHERE kind = ? AND key = ?", touches)
+                if rows:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO entries (kind, key, signature, value, size, accessed) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    self._writes_since_check += len(rows)
+                    if self._writes_since_check >= EVICTION_CHECK_INTERVAL:
+                        self._writes_since_check = 0
+                        self._evict()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            self._error("Write", e)
+            return False
+        self._pending_touches.clear()
+        self.stats["writes"] += len(rows)
+        return True
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is under EVICTION_TARGET of the limit."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * EVICTION_TARGET)
+        victims = []
+        for kind, key, size in self._conn.execute("SELECT kind, key, size FROM entries ORDER BY accessed"):
+            victims.append((kind, key))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM entries WHERE kind = ? AND key = ?", victims)
+        self.stats["evicted"] += len(victims)
+        logger.debug(f"[DISK_CACHE] Evicted {len(victims)} entries ({total:,} bytes over {self.max_bytes:,} limit)")
+
+    # ----------------------------------------------------------------------------------------------
+    # File-derived entries
+    # ----------------------------------------------------------------------------------------------
+
+    def get_file(self, kind: str, key: str, signature: FileSignature) -> Optional[bytes]:
+        """Look up data derived from a file; a changed stat signature is a miss."""
+        return self.get(kind, key, signature.encode())
+
+    def put_file(self, kind: str, key: str, signature: FileSignature, value: bytes) -> bool:
+        """Store data derived from a file unless the file changed too recently to trust its signature."""
+        if signature.is_racy():
+            return False
+        return self.put(kind, key, value, signature.encode())
+
+    def describe(self) -> dict:
+        """Entry count, stored bytes and counters of this process."""
+        entries = size = 0
+        if self._conn is not None:
+            with self._lock:
+                try:
+                    entries, size = self._conn.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    self._error("Describe", e)
+        return {"path": str(self.path), "entries": entries, "bytes": size, "max_bytes": self.max_bytes, **self.stats}
+
+    def clear(self) -> None:
+        if self._conn is None:
+            return
+        with self._lock:
+            self._pending_touches.clear()
+            try:
+                self._conn.execute("DELETE FROM entries")
+            except sqlite3.Error as e:
+                self._error("Clear", e)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                if self._pending_touches:
+                    self._write(())
+                self._conn.close()
+                self._conn = None
+            self._reopen_at = None
+
+
+def default_cache_dir() -> Path:
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "zen-mcp-server"
+
+
+_disk_cache: Optional[DiskCache] = None
+_disk_cache_failed = False
+_disk_cache_lock = threading.Lock()
+
+
+def get_disk_cache() -> Optional[DiskCache]:
+    """
+    Get the process-wide disk cache, opening it on first use.
+
+    Returns:
+        The cache, or None when DISK_CACHE_ENABLED is off or the database cannot be opened
+    """
+    global _disk_cache, _disk_cache_failed
+
+    if _disk_cache is not None or _disk_cache_failed:
+        return _disk_cache
+    with _disk_cache_lock:
+        if _disk_cache is None and not _disk_cache_failed:
+            from config import DISK_CACHE_DIR, DISK_CACHE_ENABLED, DISK_CACHE_MAX_MB
+
+            if not DISK_CACHE_ENABLED:
+                _disk_cache_failed = True
+                return None
+            directory = Path(DISK_CACHE_DIR).expanduser() if DISK_CACHE_DIR else default_cache_dir()
+            try:
+                _disk_cache = DiskCache(directory, int(DISK_CACHE_MAX_MB * 1024 * 1024))
+                # Flush batched access times so eviction order survives the process
+                atexit.register(_disk_cache.close)
+                logger.info(f"[DISK_CACHE] Using {_disk_cache.path} (max {DISK_CACHE_MAX_MB:g} MB)")
+            except (OSError, sqlite3.Error) as e:
+                _disk_cache_failed = True
+                logger.warning(f"[DISK_CACHE] Disabled: cannot open cache in {directory}: {e}")
+    return _disk_cache
+
+
+def reset_disk_cache() -> None:
+    """Close the process-wide cache so the next get_disk_cache() reopens it with current settings."""
+    global _disk_cache, _disk_cache_failed
+
+    with _disk_cache_lock:
+        if _disk_cache is not None:
+            _disk_cache.close()
+        _disk_cache = None
+        _disk_cache_failed = False
@@ -0,0 +1,368 @@
+"""
+Budget dry runs: explain how a tool call's context would be assembled
+
+When a call drops files or conversation history, the only trace of it used to
+be debug logging, and tuning the budgets cost real model calls. A dry run
+runs the complete assembly pipeline of a tool call - thread reconstruction,
+history file planning (_plan_file_inclusion_by_size), read_files budgeting,
+image validation and prompt size checks - and stops right before the
+provider would be called. Instead of the model's answer the caller gets a
+report of:
+
+- the files that would be embedded, with their token estimates
+- the files that would be skipped, with the reason for each
+- the conversation turns that would be kept and dropped
+- the final prompt size against the model's context window
+- the time spent in each stage (the tracing spans of the call)
+
+A dry run is requested per call with ``"dry_run": true`` in the tool
+arguments (advertised in every tool schema while DRY_RUN_ENABLED is on). The
+server pops the flag, runs the call on a copy of the tool inside
+dry_run_scope() and turns the report into the tool result.
+
+The report lives in a contextvar, so the pipeline records into it through
+the note_*() helpers without being passed around; they do nothing outside a
+dry run. agenerate_content_with_stats() calls stop_before_model_call(), which
+records the assembled prompt and raises DryRunComplete. It derives from
+BaseException so the tools' ``except Exception`` error handling lets it
+through to the server. Calls that finish without reaching a model (an
+intermediate workflow step, a failed size check) are reported with the
+outcome the tool returned.
+
+Dry runs do not change conversation threads: add_turn() and create_thread()
+skip their storage writes while a report is active.
+"""
+
+import contextlib
+import copy
+import logging
+import time
+from collections.abc import Iterator
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Argument that requests a dry run; popped by the server before the tool sees the arguments
+DRY_RUN_ARGUMENT = "dry_run"
+
+DRY_RUN_FIELD_SCHEMA = {
+    "type": "boolean",
+    "description": (
+        "Assemble the context (files, conversation history, prompt) without calling the model and return "
+        "a report of what would be sent: planned and skipped files, kept and dropped turns, prompt size "
+        "against the context window and time per stage."
+    ),
+    "default": False,
+}
+
+
+class DryRunComplete(BaseException):
+    """Raised in place of the provider call of a dry run; caught by the server."""
+
+
+@dataclass
+class DryRunReport:
+    """Everything recorded while assembling the context of one dry-run call."""
+
+    tool_name: str
+    model_name: Optional[str] = None
+    context_window: Optional[int] = None
+    planned_files: list[dict[str, Any]] = field(default_factory=list)
+    skipped_files: list[dict[str, Any]] = field(default_factory=list)
+    history: Optional[dict[str, Any]] = None
+    checks: list[dict[str, Any]] = field(default_factory=list)
+    prompt: Optional[dict[str, Any]] = None
+    suppressed_writes: list[str] = field(default_factory=list)
+    spans: list[dict[str, Any]] = field(default_factory=list)
+    outcome: Optional[str] = None
+    started: float = field(default_factory=time.perf_counter)
+    elapsed_ms: Optional[float] = None
+
+    def stop_before_model_call(self, provider: Any, estimated_tokens: Optional[int], kwargs: dict[str, Any]) -> None:
+        """
+        Record the prompt that would be sent and end the call.
+
+        Args:
+            provider: Provider the call would go to
+            estimated_tokens: Prompt token estimate passed by the tool, if any
+            kwargs: generate_content arguments
+
+        Raises:
+            DryRunComplete: Always
+        """
+        from .model_context import IMAGE_TOKEN_ESTIMATE
+        from .token_calibration import calibrated_estimate
+
+        model_name = kwargs.get("model_name") or self.model_name
+        prompt_text = kwargs.get("prompt") or ""
+        system_prompt = kwargs.get("system_prompt") or ""
+        images = kwargs.get("images") or []
+        try:
+            capabilities = provider.get_capabilities(model_name)
+        except Exception:
+            capabilities = None
+
+        prompt_tokens = (
+            estimated_tokens if estimated_tokens is not None else calibrated_estimate(prompt_text, model_name)
+        )
+        system_tokens = calibrated_estimate(system_prompt, model_name)
+        total = prompt_tokens + system_tokens + len(images) * IMAGE_TOKEN_ESTIMATE
+        context_window = getattr(capabilities, "context_window", None) or self.context_window
+        self.model_name = model_name
+        self.context_window = context_window
+        self.prompt = {
+            "chars": len(prompt_text),
+            "tokens": prompt_tokens,
+            "system_prompt_chars": len(system_prompt),
+            "system_prompt_tokens": system_tokens,
+            "images": len(images),
+            "image_tokens": len(images) * IMAGE_TOKEN_ESTIMATE,
+            "total_tokens": total,
+            "context_window": context_window,
+            "max_output_tokens": getattr(capabilities, "max_output_tokens", None),
+            "fits": context_window is None or total <= context_window,
+        }
+        logger.debug(f"[DRY_RUN] {self.tool_name}: stopping before {model_name} call (~{total:,} tokens)")
+        raise DryRunComplete()
+
+    def stages(self) -> list[dict[str, Any]]:
+        """Finished spans in start order, with their nesting depth."""
+        depths: dict[str, int] = {}
+        stages = []
+        for span in sorted(self.spans, key=lambda record: record["start"]):
+            depth = depths.get(span.get("parent_id"), -1) + 1
+            depths[span["span_id"]] = depth
+            stage = {"name": span["name"], "duration_ms": span["duration_ms"], "depth": depth}
+            if span.get("error") == DryRunComplete.__name__:
+                stage["stopped"] = True
+            elif span.get("status") == "error":
+                stage["error"] = span.get("error")
+            stages.append(stage)
+        return stages
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSON-compatible form of the report."""
+        return {
+            "tool": self.tool_name,
+            "model": self.model_name,
+            "context_window": self.context_window,
+            "model_call": self.prompt is not None,
+            "outcome": self.outcome,
+            "prompt": self.prompt,
+            "files": {
+                "planned": self.planned_files,
+                "skipped": self.skipped_files,
+                "planned_tokens": sum(entry.get("tokens") or 0 for entry in self.planned_files),
+            },
+            "history": self.history,
+            "checks": self.checks,
+            "suppressed_writes": self.suppressed_writes,
+            "stages": self.stages(),
+            "elapsed_ms": self.elapsed_ms,
+        }
+
+
+_current_report: ContextVar[Optional[DryRunReport]] = ContextVar("zen_dry_run_report", default=None)
+
+
+def current_dry_run() -> Optional[DryRunReport]:
+    """The report of the dry run in progress, or None during a normal call."""
+    return _current_report.get()
+
+
+def is_dry_run_requested(value: Any) -> bool:
+    """Interpret the dry_run argument (booleans and the usual string spellings)."""
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes", "on")
+    return bool(value)
+
+
+@contextlib.contextmanager
+def dry_run_scope(tool_name: str) -> Iterator[DryRunReport]:
+    """
+    Collect a dry-run report for the tool call run inside the block.
+
+    Args:
+        tool_name: Tool being called
+
+    Yields:
+        The report, complete once the block exits
+    """
+    from .tracing import collect_spans
+
+    report = DryRunReport(tool_name=tool_name)
+    token = _current_report.set(report)
+    try:
+        with collect_spans() as spans:
+            yield report
+    finally:
+        _current_report.reset(token)
+        report.spans = list(spans)
+        report.elapsed_ms = round((time.perf_counter() - report.started) * 1000, 3)
+
+
+def isolated_tool(tool: Any) -> Any:
+    """
+    Copy of a tool instance whose per-call state can change without affecting the original.
+
+    Workflow tools keep step history and findings on the instance; a dry run must not
+    advance them. Attributes that cannot be copied are shared.
+    """
+    clone = copy.copy(tool)
+    for name, value in vars(tool).items():
+        try:
+            setattr(clone, name, copy.deepcopy(value))
+        except Exception:
+            pass
+    return clone
+
+
+def note_model(model_name: str, context_window: Optional[int]) -> None:
+    """Record the model resolved for the call."""
+    report = _current_report.get()
+    if report is not None:
+        report.model_name = model_name
+        report.context_window = context_window
+
+
+def note_planned_file(path: str, tokens: int, source: str) -> None:
+    """
+    Record a file that would be embedded.
+
+    Args:
+        path: File path
+        tokens: Token estimate of its embedded content
+        source: "request" for files of this call, "history" for files from earlier turns
+    """
+    report = _current_report.get()
+    if report is not None:
+        entry = {"path": path, "tokens": tokens, "source": source}
+        # Workflow tools read the same files for their own prompt and for expert analysis
+        if entry not in report.planned_files:
+            report.planned_files.append(entry)
+
+
+def note_skipped_file(path: str, reason: str, source: str, tokens: Optional[int] = None) -> None:
+    """Record a file that would not be embedded, and why."""
+    report = _current_report.get()
+    if report is not None:
+        entry: dict[str, Any] = {"path": path, "reason": reason, "source": source}
+        if tokens is not None:
+            entry["tokens"] = tokens
+        if entry not in report.skipped_files:
+            report.skipped_files.append(entry)
+
+
+def reset_history_files() -> None:
+    """Forget history file entries before history is planned again (it may be built more than once)."""
+    report = _current_report.get()
+    if report is not None:
+        report.planned_files = [entry for entry in report.planned_files if entry["source"] != "history"]
+        report.skipped_files = [entry for entry in report.skipped_files if entry["source"] != "history"]
+
+
+def note_history(**details: Any) -> None:
+    """Record the outcome of building conversation history (turns kept and dropped, tokens, budgets)."""
+    report = _current_report.get()
+    if report is not None:
+        report.history = details
+
+
+def note_check(name: str, passed: bool, detail: str) -> None:
+    """Record the result of a validation step (prompt size, image limits, file size)."""
+    report = _current_report.get()
+    if report is not None:
+        report.checks.append({"name": name, "passed": passed, "detail": detail})
+
+
+def suppress_write(description: str) -> bool:
+    """
+    Whether a conversation storage write must be skipped because a dry run is active.
+
+    Args:
+        description: What the write would have done, for the report
+
+    Returns:
+        bool: True during a dry run (the write was recorded instead)
+    """
+    report = _current_report.get()
+    if report is None:
+        return False
+    report.suppressed_writes.append(description)
+    return True
+
+
+def format_report(report: DryRunReport) -> str:
+    """Render a report as markdown for the tool result."""
+    data = report.to_dict()
+    lines = [f"# Dry run: {report.tool_name}" + (f" with {report.model_name}" if report.model_name else ""), ""]
+
+    prompt = data["prompt"]
+    if prompt is not None:
+        lines.append("No model was called. The prompt below is what would have been sent.")
+        lines.extend(["", "## Prompt"])
+        lines.append(f"- Prompt: ~{prompt['tokens']:,} tokens ({prompt['chars']:,} chars)")
+        lines.append(f"- System prompt: ~{prompt['system_prompt_tokens']:,} tokens")
+        if prompt["images"]:
+            lines.append(f"- Images: {prompt['images']} (~{prompt['image_tokens']:,} tokens)")
+        if prompt["context_window"]:
+            share = prompt["total_tokens"] / prompt["context_window"] * 100
+            verdict = "fits" if prompt["fits"] else "EXCEEDS the context window"
+            lines.append(
+                f"- Total: ~{prompt['total_tokens']:,} of {prompt['context_window']:,} tokens ({share:.1f}%), {verdict}"
+            )
+        else:
+            lines.append(f"- Total: ~{prompt['total_tokens']:,} tokens (context window unknown)")
+    else:
+        outcome = f" (tool returned status '{report.outcome}')" if report.outcome else ""
+        lines.append(f"The call would not reach a model{outcome}.")
+
+    planned = data["files"]["planned"]
+    lines.extend(["", f"## Planned files ({len(planned)}, ~{data['files']['planned_tokens']:,} tokens)"])
+    if planned:
+        lines.extend(["| File | Tokens | Source |", "|---|---:|---|"])
+        lines.extend(f"| {entry['path']} | {entry['tokens']:,} | {entry['source']} |" for entry in planned)
+    else:
+        lines.append("None")
+
+    skipped = data["files"]["skipped"]
+    if skipped:
+        lines.extend(["", f"## Skipped files ({len(skipped)})", "| File | Reason | Source |", "|---|---|---|"])
+        lines.extend(f"| {entry['path']} | {entry['reason']} | {entry['source']} |" for entry in skipped)
+
+    history = data["history"]
+    if history:
+        lines.extend(["", "## Conversation history"])
+        lines.append(
+            f"- Turns kept: {len(history['kept_turns'])} of {history['total_turns']}"
+            + (f" {history['kept_turns']}" if history["kept_turns"] else "")
+        )
+        if history["dropped_turns"]:
+            lines.append(f"- Turns dropped (history budget): {history['dropped_turns']}")
+        lines.append(
+            f"- History: ~{history['tokens']:,} tokens (turn budget {history['history_budget']:,}, "
+            f"file budget {history['file_budget']:,})"
+        )
+
+    if data["checks"]:
+        lines.extend(["", "## Checks"])
+        lines.extend(
+            f"- {check['name']}: {'passed' if check['passed'] else 'FAILED'} ({check['detail']})"
+            for check in data["checks"]
+        )
+
+    if data["stages"]:
+        lines.extend(["", f"## Stages ({data['elapsed_ms']:,.1f} ms total)", "| Stage | ms |", "|---|---:|"])
+        for stage in data["stages"]:
+            name = "&nbsp;&nbsp;" * stage["depth"] + stage["name"]
+            if stage.get("stopped"):
+                name += " (stopped before model call)"
+            elif stage.get("error"):
+                name += f" (failed: {stage['error']})"
+            lines.append(f"| {name} | {stage['duration_ms']:,.1f} |")
+
+    if data["suppressed_writes"]:
+        lines.extend(["", "Conversation writes skipped: " + "; ".join(data["suppressed_writes"])])
+    return "\n".join(lines)
@@ -0,0 +1,237 @@
+"""
+Token compaction for embedded file content
+
+Every file a tool embeds pays tokens for bytes the model does not need:
+trailing whitespace, long runs of blank lines, the same license header at the
+top of every file, the padded line-number gutter, notebook outputs and JSON
+indentation. This module removes them as an optional stage of
+read_file_content() / read_file_segments(). Operations:
+
+- whitespace: strip trailing whitespace; in numbered content also collapse
+  runs of blank lines to one
+- license: replace a leading license/copyright comment block that is
+  identical to one already embedded in the same request by a one-line
+  reference (numbered content only)
+- gutter: number lines as "45│ code" instead of padding every number to at
+  least four columns
+- notebook: show .ipynb files as their cell sources, without outputs,
+  execution counts and metadata
+- json: minify .json files; in numbered content only drop indentation, so
+  every line keeps its number
+
+Line numbers stay accurate: operations that remove lines only run on numbered
+content, where each remaining line keeps the number it has in the file and a
+gap shows what was removed. Unnumbered content keeps its line count (except
+for notebooks and minified JSON, whose layout is replaced by design).
+
+Which operations run is configured per tool: FILE_COMPACTION is the default
+for all tools and FILE_COMPACTION_TOOLS overrides it per tool, e.g.
+"codereview=all,chat=whitespace+gutter". Tools can also override
+BaseTool.get_file_compaction().
+"""
+
+import hashlib
+import json
+import logging
+import re
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_OPERATIONS = ("whitespace", "license", "gutter", "notebook", "json")
+
+NO_COMPACTION: frozenset[str] = frozenset()
+
+# Comment prefixes that may make up a license header
+_COMMENT_PREFIXES = ("#", "//", "/*", "*", "*/", "<!--", "-->", "--", ";", "rem ", "::")
+
+_LICENSE_KEYWORDS = re.compile(r"licen[cs]e|copyright|spdx-license-identifier|\(c\)", re.IGNORECASE)
+
+# Headers shorter than this are cheaper to repeat than to reference
+MIN_LICENSE_LINES = 3
+
+# Shebang-adjacent source encoding declaration, e.g. "# -*- coding: utf-8 -*-"
+_ENCODING_LINE = re.compile(r"^#.*coding[:=]")
+
+# Gutter of a numbered line: "  45│ code" (padded) or "45│ code" (narrow)
+_NUMBERED_LINE = re.compile(r"^ *(\d+)│ ?(.*)$")
+
+
+def parse_compaction(spec: Optional[str]) -> frozenset[str]:
+    """
+    Parse a compaction setting: "off", "all", or operations joined by "+" or ",".
+
+    Args:
+        spec: Setting value, e.g. "whitespace+gutter"
+
+    Returns:
+        frozenset of operation names (unknown names are logged and ignored)
+    """
+    value = (spec or "").strip().lower()
+    if value in ("", "off", "none", "false", "0", "no"):
+        return NO_COMPACTION
+    if value in ("all", "on", "true", "1", "yes"):
+        return frozenset(COMPACTION_OPERATIONS)
+    operations = set()
+    for name in re.split(r"[+,]", value):
+        name = name.strip()
+        if name in COMPACTION_OPERATIONS:
+            operations.add(name)
+        elif name:
+            logger.warning(f"[COMPACTION] Ignoring unknown compaction operation: {name!r}")
+    return frozenset(operations)
+
+
+def compaction_for_tool(tool_name: str) -> frozenset[str]:
+    """Operations configured for a tool (FILE_COMPACTION_TOOLS entry, else FILE_COMPACTION)."""
+    import config
+
+    for item in config.FILE_COMPACTION_TOOLS.split(","):
+        name, _, spec = item.partition("=")
+        if name.strip().lower() == tool_name.lower() and spec:
+            return parse_compaction(spec)
+    return parse_compaction(config.FILE_COMPACTION)
+
+
+def cache_tag(operations: frozenset[str]) -> str:
+    """Stable name for the per-file operations, for caching compacted content."""
+    return "+".join(sorted(operations - {"license"}))
+
+
+def compact_file_content(content: str, file_path: str, operations: frozenset[str], add_line_numbers: bool) -> str:
+    """
+    Compact and optionally number the content of one file.
+
+    Replaces the plain _add_line_numbers() / line-ending normalization step of
+    read_file_content() when compaction is on. Repeated license headers are
+    handled across files by drop_repeated_license().
+
+    Args:
+        content: Raw file content
+        file_path: Path of the file (selects notebook and JSON handling)
+        operations: Operations to apply (see COMPACTION_OPERATIONS)
+        add_line_numbers: Whether to number lines
+
+    Returns:
+        str: File body ready to be wrapped in BEGIN/END FILE markers
+    """
+    text = content.replace("\r\n", "\n").replace("\r", "\n")
+    lower_path = file_path.lower()
+    note = None
+
+    if "notebook" in operations and lower_path.endswith(".ipynb"):
+        cells = _notebook_cells(text)
+        if cells is not None:
+            text = cells
+            note = "(notebook cell sources; outputs removed, line numbers refer to this listing)"
+    elif "json" in operations and lower_path.endswith(".json"):
+        text = _compact_json(text, keep_lines=add_line_numbers)
+
+    lines = text.split("\n")
+    if "whitespace" in operations:
+        lines = [line.rstrip() for line in lines]
+
+    if add_line_numbers:
+        numbered = list(enumerate(lines, 1))
+        if "whitespace" in operations:
+            numbered = [item for i, item in enumerate(numbered) if item[1] or i == 0 or numbered[i - 1][1]]
+        if "gutter" in operations:
+            rendered = [f"{number}│ {line}" if line else f"{number}│" for number, line in numbered]
+        else:
+            width = max(len(str(len(lines))), 4)
+            rendered = [f"{number:{width}d}│ {line}" for number, line in numbered]
+        lines = rendered
+
+    if note:
+        lines.insert(0, note)
+    return "\n".join(lines)
+
+
+def drop_repeated_license(formatted: str, file_path: str, seen: dict[str, str]) -> str:
+    """
+    Replace a license header already embedded from another file by a reference to it.
+
+    Works on the numbered, formatted output of read_file_content(); the first
+    file with a given header keeps it and is remembered in ``seen``.
+
+    Args:
+        formatted: Formatted file content with BEGIN/END markers and line numbers
+        file_path: Path of the file
+        seen: Header digest -> path of the file that embedded it; updated in place
+
+    Returns:
+        str: The formatted content, with the header replaced when it is a repeat
+    """
+    parts = formatted.split("\n")
+    # "", "--- BEGIN FILE ---", body..., "--- END FILE ---", ""
+    body = parts[2:-2]
+    parsed = []
+    for line in body:
+        match = _NUMBERED_LINE.match(line)
+        if match is None:
+            break
+        parsed.append((match.group(1), match.group(2)))
+    span = _license_span([text for _, text in parsed])
+    if span is None:
+        return formatted
+    start, end = span
+    digest = hashlib.blake2b(
+        "\n".join(text for _, text in parsed[start:end]).encode("utf-8", "surrogatepass"), digest_size=16
+    ).hexdigest()
+    first = seen.setdefault(digest, file_path)
+    if first == file_path:
+        return formatted
+    marker = f"{parsed[start][0]}-{parsed[end - 1][0]}│ (license header identical to {first})"
+    return "\n".join(parts[:2] + body[:start] + [marker] + body[end:] + parts[-2:])
+
+
+def _license_span(lines: list[str]) -> Optional[tuple[int, int]]:
+    """[start, end) of a leading comment block that mentions a license, if any."""
+    start = 0
+    while start < len(lines) and (lines[start].startswith("#!") or _ENCODING_LINE.match(lines[start])):
+        start += 1
+    end = start
+    comment_lines = 0
+    for i in range(start, len(lines)):
+        stripped = lines[i].strip()
+        if not stripped:
+            continue
+        if not stripped.lower().startswith(_COMMENT_PREFIXES):
+            break
+        comment_lines += 1
+        end = i + 1
+    if comment_lines < MIN_LICENSE_LINES or not _LICENSE_KEYWORDS.search("\n".join(lines[start:end])):
+        return None
+    return start, end
+
+
+def _notebook_cells(text: str) -> Optional[str]:
+    """Cell sources of a Jupyter notebook, or None if the text is not a notebook."""
+    try:
+        notebook = json.loads(text)
+        cells = notebook["cells"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    language = (notebook.get("metadata", {}).get("kernelspec") or {}).get("language", "")
+    rendered = []
+    for index, cell in enumerate(cells, 1):
+        if not isinstance(cell, dict):
+            continue
+        source = cell.get("source", "")
+        if isinstance(source, list):
+            source = "".join(source)
+        cell_type = cell.get("cell_type", "code")
+        label = f"{cell_type} {language}".strip() if cell_type == "code" else cell_type
+        rendered.append(f"# %% [{label}] cell {index}")
+        rendered.append(source.rstrip("\n"))
+    return "\n".join(rendered)
+
+
+def _compact_json(text: str, keep_lines: bool) -> str:
+    """Minified JSON, or with indentation dropped when line numbers must stay valid."""
+    if keep_lines:
+        return "\n".join(line.lstrip() for line in text.split("\n"))
+    try:
+        return json.dumps(json.loads(text), separators=(",", ":"), ensure_ascii=False)
+    except ValueError:
+        return text
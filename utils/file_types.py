@@ -5,6 +5,8 @@ This module centralizes all file type and extension definitions used
 throughout the MCP server for consistent file handling.
 """
 
+from typing import Optional
+
 # Programming language file extensions - core code files
 PROGRAMMING_LANGUAGES = {
     ".py",  # Python
@@ -86,6 +88,7 @@ TEXT_DATA = {
     ".sbt",  # SBT
     ".pom",  # Maven POM
     ".lock",  # Lock files
+    ".ipynb",  # Jupyter notebooks (JSON)
 }
 
 # Image file extensions - limited to what AI models actually support
@@ -227,19 +230,28 @@ TOKEN_ESTIMATION_RATIOS = {
 }
 
 
-def get_token_estimation_ratio(file_path: str) -> float:
+def get_token_estimation_ratio(file_path: str, model_name: Optional[str] = None) -> float:
     """
     Get the token estimation ratio for a file based on its extension.
 
+    Ratios measured by scripts/calibrate_tokens.py take precedence over the
+    built-in TOKEN_ESTIMATION_RATIOS (see utils/token_calibration.py).
+
     Args:
         file_path: Path to the file
+        model_name: Model the estimate is for; selects ratios measured for its tokenizer family
 
     Returns:
         Token-to-byte ratio for the file type (default: 3.5 for unknown types)
     """
     from pathlib import Path
 
+    from .token_calibration import calibrated_extension_ratio
+
     extension = Path(file_path).suffix.lower()
+    measured = calibrated_extension_ratio(extension, model_name)
+    if measured:
+        return measured
     return TOKEN_ESTIMATION_RATIOS.get(extension, 3.5)  # Conservative default
 
 
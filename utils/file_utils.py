@@ -43,9 +43,14 @@ import os
 from pathlib import Path
 from typing import Optional
 
+from .dry_run import note_check, note_planned_file, note_skipped_file
 from .file_types import BINARY_EXTENSIONS, CODE_EXTENSIONS, IMAGE_EXTENSIONS, TEXT_EXTENSIONS
+from .metrics import record_cache_access, record_file_read
+from .prompt_segments import PromptSegment, SegmentedPrompt
 from .security_config import EXCLUDED_DIRS, is_dangerous_path
 from .token_utils import DEFAULT_CONTEXT_WINDOW, estimate_tokens
+from .tokenizer import count_tokens
+from .tracing import set_span_attrs, traced
 
 
 def _is_builtin_custom_models_config(path_str: str) -> bool:
@@ -79,6 +84,9 @@ def _is_builtin_custom_models_config(path_str: str) -> bool:
 
 logger = logging.getLogger(__name__)
 
+# Disk cache namespace for line-numbered read_file_content() output (see utils/disk_cache.py)
+FORMATTED_FILE_CACHE_KIND = "formatted_file"
+
 
 def is_mcp_directory(path: Path) -> bool:
     """
@@ -174,7 +182,7 @@ def is_home_directory_root(path: Path) -> bool:
                         return True
 
     except Exception as e:
-        logger.debug(f"Error checking if path is home directory: {e}")
+        logger.debug("Error checking if path is home directory: %s", e)
 
     return False
 
@@ -323,6 +331,7 @@ def resolve_and_validate_path(path_str: str) -> Path:
     return resolved_path
 
 
+@traced()
 def expand_paths(paths: list[str], extensions: Optional[set[str]] = None) -> list[str]:
     """
     Expand paths to individual files, handling both files and directories.
@@ -392,7 +401,7 @@ def expand_paths(paths: list[str], extensions: Optional[set[str]] = None) -> lis
                     # Skip MCP directories found during traversal
                     dir_path = Path(root) / d
                     if is_mcp_directory(dir_path):
-                        logger.debug(f"Skipping MCP directory during traversal: {dir_path}")
+                        logger.debug("Skipping MCP directory during traversal: %s", dir_path)
                         continue
                     dirs.append(d)
 
@@ -417,8 +426,51 @@ def expand_paths(paths: list[str], extensions: Optional[set[str]] = None) -> lis
     return expanded_files
 
 
+def _formatted_cache_kind(compaction: frozenset[str]) -> str:
+    """Disk cache namespace for formatted content; compacted variants are kept apart."""
+    from .file_compaction import cache_tag
+
+    tag = cache_tag(compaction)
+    return f"{FORMATTED_FILE_CACHE_KIND}:{tag}" if tag else FORMATTED_FILE_CACHE_KIND
+
+
+def _get_cached_formatted_file(
+    file_path: str, file_stat: os.stat_result, compaction: frozenset[str] = frozenset()
+) -> Optional[str]:
+    """Line-numbered content stored by an earlier read of the same, unchanged file (any process)."""
+    from .disk_cache import FileSignature, get_disk_cache
+
+    cache = get_disk_cache()
+    if cache is None:
+        return None
+    data = cache.get_file(_formatted_cache_kind(compaction), file_path, FileSignature.from_stat(file_stat))
+    record_cache_access("disk_file", data is not None)
+    if data is None:
+        return None
+    try:
+        return data.decode("utf-8", "surrogatepass")
+    except UnicodeDecodeError:
+        return None
+
+
+def _cache_formatted_file(
+    file_path: str, file_stat: os.stat_result, formatted: str, compaction: frozenset[str] = frozenset()
+) -> None:
+    from .disk_cache import FileSignature, get_disk_cache
+
+    cache = get_disk_cache()
+    if cache is not None:
+        data = formatted.encode("utf-8", "surrogatepass")
+        cache.put_file(_formatted_cache_kind(compaction), file_path, FileSignature.from_stat(file_stat), data)
+
+
 def read_file_content(
-    file_path: str, max_size: int = 1_000_000, *, include_line_numbers: Optional[bool] = None
+    file_path: str,
+    max_size: int = 1_000_000,
+    *,
+    include_line_numbers: Optional[bool] = None,
+    model_name: Optional[str] = None,
+    compaction: Optional[frozenset[str]] = None,
 ) -> tuple[str, int]:
     """
     Read a single file and format it for inclusion in AI prompts.
@@ -431,61 +483,81 @@ def read_file_content(
         file_path: Path to file (must be absolute)
         max_size: Maximum file size to read (default 1MB to prevent memory issues)
         include_line_numbers: Whether to add line numbers. If None, auto-detects based on file type
+        model_name: Model the content is for; selects an exact tokenizer when one is available
+        compaction: Token compaction operations to apply (see utils/file_compaction.py)
 
     Returns:
-        Tuple of (formatted_content, estimated_tokens)
+        Tuple of (formatted_content, token_count)
         Content is wrapped with clear delimiters for AI parsing
     """
-    logger.debug(f"[FILES] read_file_content called for: {file_path}")
+    logger.debug("[FILES] read_file_content called for: %s", file_path)
+    compaction = compaction or frozenset()
     try:
         # Validate path security before any file operations
         path = resolve_and_validate_path(file_path)
-        logger.debug(f"[FILES] Path validated and resolved: {path}")
+        logger.debug("[FILES] Path validated and resolved: %s", path)
     except (ValueError, PermissionError) as e:
         # Return error in a format that provides context to the AI
-        logger.debug(f"[FILES] Path validation failed for {file_path}: {type(e).__name__}: {e}")
+        logger.debug("[FILES] Path validation failed for %s: %s: %s", file_path, type(e).__name__, e)
         error_msg = str(e)
         content = f"\n--- ERROR ACCESSING FILE: {file_path} ---\nError: {error_msg}\n--- END FILE ---\n"
         tokens = estimate_tokens(content)
-        logger.debug(f"[FILES] Returning error content for {file_path}: {tokens} tokens")
+        logger.debug("[FILES] Returning error content for %s: %s tokens", file_path, tokens)
         return content, tokens
 
     try:
         # Validate file existence and type
         if not path.exists():
-            logger.debug(f"[FILES] File does not exist: {file_path}")
+            logger.debug("[FILES] File does not exist: %s", file_path)
             content = f"\n--- FILE NOT FOUND: {file_path} ---\nError: File does not exist\n--- END FILE ---\n"
             return content, estimate_tokens(content)
 
         if not path.is_file():
-            logger.debug(f"[FILES] Path is not a file: {file_path}")
+            logger.debug("[FILES] Path is not a file: %s", file_path)
             content = f"\n--- NOT A FILE: {file_path} ---\nError: Path is not a file\n--- END FILE ---\n"
             return content, estimate_tokens(content)
 
         # Check file size to prevent memory exhaustion
-        file_size = path.stat().st_size
-        logger.debug(f"[FILES] File size for {file_path}: {file_size:,} bytes")
+        file_stat = path.stat()
+        file_size = file_stat.st_size
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[FILES] File size for {file_path}: {file_size:,} bytes")
         if file_size > max_size:
-            logger.debug(f"[FILES] File too large: {file_path} ({file_size:,} > {max_size:,} bytes)")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"[FILES] File too large: {file_path} ({file_size:,} > {max_size:,} bytes)")
             content = f"\n--- FILE TOO LARGE: {file_path} ---\nFile size: {file_size:,} bytes (max: {max_size:,})\n--- END FILE ---\n"
             return content, estimate_tokens(content)
 
         # Determine if we should add line numbers
         add_line_numbers = should_add_line_numbers(file_path, include_line_numbers)
-        logger.debug(f"[FILES] Line numbers for {file_path}: {'enabled' if add_line_numbers else 'disabled'}")
+        logger.debug("[FILES] Line numbers for %s: %s", file_path, "enabled" if add_line_numbers else "disabled")
+
+        # Numbering lines costs more than reading the file, so numbered content of an unchanged
+        # file is served from the persistent cache. Plain content is cheaper to read again.
+        formatted = _get_cached_formatted_file(file_path, file_stat, compaction) if add_line_numbers else None
+        if formatted is not None:
+            tokens = count_tokens(formatted, model_name)
+            logger.debug("[FILES] Served %s from disk cache: %s chars, %s tokens", file_path, len(formatted), tokens)
+            return formatted, tokens
 
         # Read the file with UTF-8 encoding, replacing invalid characters
         # This ensures we can handle files with mixed encodings
-        logger.debug(f"[FILES] Reading file content for {file_path}")
+        logger.debug("[FILES] Reading file content for %s", file_path)
         with open(path, encoding="utf-8", errors="replace") as f:
             file_content = f.read()
+        record_file_read(file_size)
 
-        logger.debug(f"[FILES] Successfully read {len(file_content)} characters from {file_path}")
+        logger.debug("[FILES] Successfully read %s characters from %s", len(file_content), file_path)
 
         # Add line numbers if requested or auto-detected
-        if add_line_numbers:
+        if compaction:
+            from .file_compaction import compact_file_content
+
+            file_content = compact_file_content(file_content, file_path, compaction, add_line_numbers)
+            logger.debug("[FILES] Compacted %s (%s)", file_path, ", ".join(sorted(compaction)))
+        elif add_line_numbers:
             file_content = _add_line_numbers(file_content)
-            logger.debug(f"[FILES] Added line numbers to {file_path}")
+            logger.debug("[FILES] Added line numbers to %s", file_path)
         else:
             # Still normalize line endings for consistency
             file_content = _normalize_line_endings(file_content)
@@ -496,15 +568,17 @@ def read_file_content(
         # ("--- BEGIN DIFF: ... ---") to allow AI to distinguish between complete file content
         # vs. partial diff content when files appear in both sections
         formatted = f"\n--- BEGIN FILE: {file_path} ---\n{file_content}\n--- END FILE: {file_path} ---\n"
-        tokens = estimate_tokens(formatted)
-        logger.debug(f"[FILES] Formatted content for {file_path}: {len(formatted)} chars, {tokens} tokens")
+        if add_line_numbers:
+            _cache_formatted_file(file_path, file_stat, formatted, compaction)
+        tokens = count_tokens(formatted, model_name)
+        logger.debug("[FILES] Formatted content for %s: %s chars, %s tokens", file_path, len(formatted), tokens)
         return formatted, tokens
 
     except Exception as e:
-        logger.debug(f"[FILES] Exception reading file {file_path}: {type(e).__name__}: {e}")
+        logger.debug("[FILES] Exception reading file %s: %s: %s", file_path, type(e).__name__, e)
         content = f"\n--- ERROR READING FILE: {file_path} ---\nError: {str(e)}\n--- END FILE ---\n"
         tokens = estimate_tokens(content)
-        logger.debug(f"[FILES] Returning error content for {file_path}: {tokens} tokens")
+        logger.debug("[FILES] Returning error content for %s: %s tokens", file_path, tokens)
         return content, tokens
 
 
@@ -515,6 +589,7 @@ def read_files(
     reserve_tokens: int = 50_000,
     *,
     include_line_numbers: bool = False,
+    compaction: Optional[frozenset[str]] = None,
 ) -> str:
     """
     Read multiple files and optional direct code with smart token management.
@@ -524,80 +599,152 @@ def read_files(
     within token limits. It prioritizes direct code and reads files until
     the token budget is exhausted.
 
+    Callers that keep assembling a larger prompt should prefer read_file_segments(),
+    which returns the same content without joining it into one string.
+
     Args:
         file_paths: List of file or directory paths (absolute paths required)
         code: Optional direct code to include (prioritized over files)
         max_tokens: Maximum tokens to use (defaults to DEFAULT_CONTEXT_WINDOW)
         reserve_tokens: Tokens to reserve for prompt and response (default 50K)
         include_line_numbers: Whether to add line numbers to file content
+        compaction: Token compaction operations to apply (see utils/file_compaction.py)
 
     Returns:
         str: All file contents formatted for AI consumption
     """
+    return read_file_segments(
+        file_paths, code, max_tokens, reserve_tokens, include_line_numbers=include_line_numbers, compaction=compaction
+    ).render()
+
+
+@traced("read_files")
+def read_file_segments(
+    file_paths: list[str],
+    code: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    reserve_tokens: int = 50_000,
+    *,
+    include_line_numbers: bool = False,
+    model_name: Optional[str] = None,
+    compaction: Optional[frozenset[str]] = None,
+) -> SegmentedPrompt:
+    """
+    Segment-based variant of read_files().
+
+    Produces one segment per file (carrying the token estimate computed by
+    read_file_content) so callers can size-check and compose the result without
+    copying file content. render() yields exactly what read_files() returns.
+
+    Args:
+        file_paths: List of file or directory paths (absolute paths required)
+        code: Optional direct code to include (prioritized over files)
+        max_tokens: Maximum tokens to use (defaults to DEFAULT_CONTEXT_WINDOW)
+        reserve_tokens: Tokens to reserve for prompt and response (default 50K)
+        include_line_numbers: Whether to add line numbers to file content
+        model_name: Model the prompt is for; budgets use its exact tokenizer when available
+        compaction: Token compaction operations to apply (see utils/file_compaction.py); a license
+            header repeated across the files is embedded once
+
+    Returns:
+        SegmentedPrompt: File contents as ordered segments
+    """
     if max_tokens is None:
         max_tokens = DEFAULT_CONTEXT_WINDOW
 
-    logger.debug(f"[FILES] read_files called with {len(file_paths)} paths")
-    logger.debug(
-        f"[FILES] Token budget: max={max_tokens:,}, reserve={reserve_tokens:,}, available={max_tokens - reserve_tokens:,}"
-    )
+    logger.debug("[FILES] read_files called with %s paths", len(file_paths))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"[FILES] Token budget: max={max_tokens:,}, reserve={reserve_tokens:,}, available={max_tokens - reserve_tokens:,}"
+        )
 
-    content_parts = []
+    content_parts: list[PromptSegment] = []
     total_tokens = 0
     available_tokens = max_tokens - reserve_tokens
 
     files_skipped = []
+    # License header digests already embedded by this call
+    seen_licenses: Optional[dict[str, str]] = {} if compaction and "license" in compaction else None
 
     # Priority 1: Handle direct code if provided
     # Direct code is prioritized because it's explicitly provided by the user
     if code:
         formatted_code = f"\n--- BEGIN DIRECT CODE ---\n{code}\n--- END DIRECT CODE ---\n"
-        code_tokens = estimate_tokens(formatted_code)
+        code_tokens = count_tokens(formatted_code, model_name)
 
         if code_tokens <= available_tokens:
-            content_parts.append(formatted_code)
+            content_parts.append(PromptSegment(formatted_code, code_tokens, kind="code"))
             total_tokens += code_tokens
             available_tokens -= code_tokens
 
     # Priority 2: Process file paths
     if file_paths:
         # Expand directories to get all individual files
-        logger.debug(f"[FILES] Expanding {len(file_paths)} file paths")
+        logger.debug("[FILES] Expanding %s file paths", len(file_paths))
         all_files = expand_paths(file_paths)
-        logger.debug(f"[FILES] After expansion: {len(all_files)} individual files")
+        logger.debug("[FILES] After expansion: %s individual files", len(all_files))
 
         if not all_files and file_paths:
             # No files found but paths were provided
             logger.debug("[FILES] No files found from provided paths")
-            content_parts.append(f"\n--- NO FILES FOUND ---\nProvided paths: {', '.join(file_paths)}\n--- END ---\n")
+            content_parts.append(
+                PromptSegment(
+                    f"\n--- NO FILES FOUND ---\nProvided paths: {', '.join(file_paths)}\n--- END ---\n", 0, kind="note"
+                )
+            )
         else:
             # Read files sequentially until token limit is reached
-            logger.debug(f"[FILES] Reading {len(all_files)} files with token budget {available_tokens:,}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"[FILES] Reading {len(all_files)} files with token budget {available_tokens:,}")
             for i, file_path in enumerate(all_files):
                 if total_tokens >= available_tokens:
-                    logger.debug(f"[FILES] Token budget exhausted, skipping remaining {len(all_files) - i} files")
+                    logger.debug("[FILES] Token budget exhausted, skipping remaining %s files", len(all_files) - i)
                     files_skipped.extend(all_files[i:])
+                    for skipped_path in all_files[i:]:
+                        note_skipped_file(skipped_path, "file token budget exhausted", "request")
                     break
 
-                file_content, file_tokens = read_file_content(file_path, include_line_numbers=include_line_numbers)
-                logger.debug(f"[FILES] File {file_path}: {file_tokens:,} tokens")
+                file_content, file_tokens = read_file_content(
+                    file_path, include_line_numbers=include_line_numbers, model_name=model_name, compaction=compaction
+                )
+                if seen_licenses is not None and include_line_numbers:
+                    from .file_compaction import drop_repeated_license
+
+                    compacted = drop_repeated_license(file_content, file_path, seen_licenses)
+                    if compacted is not file_content:
+                        file_content, file_tokens = compacted, count_tokens(compacted, model_name)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"[FILES] File {file_path}: {file_tokens:,} tokens")
 
                 # Check if adding this file would exceed limit
                 if total_tokens + file_tokens <= available_tokens:
-                    content_parts.append(file_content)
+                    content_parts.append(PromptSegment(file_content, file_tokens, kind="file", source=file_path))
                     total_tokens += file_tokens
-                    logger.debug(f"[FILES] Added file {file_path}, total tokens: {total_tokens:,}")
+                    note_planned_file(file_path, file_tokens, "request")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f"[FILES] Added file {file_path}, total tokens: {total_tokens:,}")
                 else:
                     # File too large for remaining budget
-                    logger.debug(
-                        f"[FILES] File {file_path} too large for remaining budget ({file_tokens:,} tokens, {available_tokens - total_tokens:,} remaining)"
-                    )
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(
+                            f"[FILES] File {file_path} too large for remaining budget ({file_tokens:,} tokens, {available_tokens - total_tokens:,} remaining)"
+                        )
                     files_skipped.append(file_path)
+                    note_skipped_file(
+                        file_path,
+                        f"file token budget ({file_tokens:,} tokens, {available_tokens - total_tokens:,} left)",
+                        "request",
+                        tokens=file_tokens,
+                    )
+                    if seen_licenses:
+                        # A header that was not embedded cannot be referenced by later files
+                        for digest in [d for d, path in seen_licenses.items() if path == file_path]:
+                            del seen_licenses[digest]
 
     # Add informative note about skipped files to help users understand
     # what was omitted and why
     if files_skipped:
-        logger.debug(f"[FILES] {len(files_skipped)} files skipped due to token limits")
+        logger.debug("[FILES] %s files skipped due to token limits", len(files_skipped))
         skip_note = "\n\n--- SKIPPED FILES (TOKEN LIMIT) ---\n"
         skip_note += f"Total skipped: {len(files_skipped)}\n"
         # Show first 10 skipped files as examples
@@ -606,19 +753,27 @@ def read_files(
         if len(files_skipped) > 10:
             skip_note += f"  ... and {len(files_skipped) - 10} more\n"
         skip_note += "--- END SKIPPED FILES ---\n"
-        content_parts.append(skip_note)
-
-    result = "\n\n".join(content_parts) if content_parts else ""
-    logger.debug(f"[FILES] read_files complete: {len(result)} chars, {total_tokens:,} tokens used")
+        content_parts.append(PromptSegment(skip_note, estimate_tokens(skip_note), kind="note"))
+
+    # Same layout as "\n\n".join(parts), expressed as separator segments instead of a copy
+    result = SegmentedPrompt()
+    for i, part in enumerate(content_parts):
+        if i:
+            result.append("\n\n", kind="separator", tokens=0)
+        result.add_segment(part)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"[FILES] read_files complete: {result.char_count} chars, {total_tokens:,} tokens used")
+    set_span_attrs(files=len(content_parts), skipped=len(files_skipped), tokens=total_tokens)
     return result
 
 
-def estimate_file_tokens(file_path: str) -> int:
+def estimate_file_tokens(file_path: str, model_name: Optional[str] = None) -> int:
     """
     Estimate tokens for a file using file-type aware ratios.
 
     Args:
         file_path: Path to the file
+        model_name: Model the estimate is for (selects calibrated ratios for its tokenizer family)
 
     Returns:
         Estimated token count for the file
@@ -632,7 +787,7 @@ def estimate_file_tokens(file_path: str) -> int:
         # Get the appropriate ratio for this file type
         from .file_types import get_token_estimation_ratio
 
-        ratio = get_token_estimation_ratio(file_path)
+        ratio = get_token_estimation_ratio(file_path, model_name)
 
         return int(file_size / ratio)
     except Exception:
@@ -839,6 +994,11 @@ def check_total_file_size(files: list[str], model_name: str) -> Optional[dict]:
 
     # Use centralized file size checking (threshold already applied to max_file_tokens)
     within_limit, total_estimated_tokens, file_count = check_files_size_limit(files, max_file_tokens)
+    note_check(
+        "total_file_size",
+        within_limit,
+        f"~{total_estimated_tokens:,} of {max_file_tokens:,} tokens in {file_count} files",
+    )
 
     if not within_limit:
         return {
@@ -0,0 +1,196 @@
+"""
+Streamable HTTP / SSE transport: one server process for many clients
+
+With the default stdio transport every MCP client launches its own server
+process, which starts with cold file and response caches, opens its own
+provider connections and keeps its own conversation storage. Setting
+MCP_TRANSPORT=http runs a single long-lived process instead:
+
+- streamable HTTP (the current MCP transport) at MCP_HTTP_PATH, default /mcp
+- the legacy HTTP+SSE transport at /sse (messages posted to /messages/) for
+  older clients
+
+All sessions share the provider registry and its connection pools, the
+in-process caches and the conversation storage, so a thread started by one
+call can be continued by any later call that passes its continuation_id.
+Per-client state is isolated by utils/client_session.py: every session gets
+its own tool instances and only ever defaults to its own last conversation.
+
+Load is bounded at two levels: at most MCP_HTTP_MAX_SESSIONS sessions are open
+at once (further clients are answered with HTTP 503 and may retry), and at
+most MCP_HTTP_MAX_CONCURRENT_CALLS tool calls execute at once across all
+sessions; further calls wait for a slot. Provider-level limits still apply
+on top (see providers/admission.py). Sessions without requests for
+MCP_HTTP_SESSION_IDLE_TIMEOUT seconds are closed.
+
+The server has no authentication of its own and listens on 127.0.0.1 by
+default. Requires mcp>=1.8 for the streamable HTTP session manager.
+"""
+
+import contextlib
+import inspect
+import logging
+from collections.abc import AsyncIterator
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+SSE_PATH = "/sse"
+SSE_MESSAGES_PATH = "/messages/"
+
+
+def _session_manager_class():
+    try:
+        from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    except ImportError as e:
+        raise RuntimeError(
+            "MCP_TRANSPORT=http needs the streamable HTTP transport from mcp>=1.8; "
+            "upgrade with: pip install -U 'mcp>=1.8'"
+        ) from e
+    return StreamableHTTPSessionManager
+
+
+class HTTPTransport:
+    """Starlette application serving the MCP server over streamable HTTP and SSE."""
+
+    def __init__(
+        self,
+        mcp_server: Any,
+        initialization_options: Any,
+        path: str = "/mcp",
+        max_sessions: int = 0,
+        session_idle_timeout: Optional[float] = None,
+        max_concurrent_calls: int = 0,
+    ):
+        from mcp.server.sse import SseServerTransport
+        from starlette.applications import Starlette
+        from starlette.routing import Mount, Route
+
+        self.mcp_server = mcp_server
+        self.initialization_options = initialization_options
+        self.path = path
+        self.max_sessions = max_sessions
+        self.max_concurrent_calls = max_concurrent_calls
+        self.open_sse_sessions = 0
+
+        manager_class = _session_manager_class()
+        options = {"app": mcp_server}
+        # Older mcp releases have no idle timeout; their sessions live until the client ends them
+        if session_idle_timeout and "session_idle_timeout" in inspect.signature(manager_class).parameters:
+            options["session_idle_timeout"] = session_idle_timeout
+        self.session_manager = manager_class(**options)
+        # The session manager offers no public session count; refuse to run a limit we cannot enforce
+        if max_sessions and not isinstance(getattr(self.session_manager, "_server_instances", None), dict):
+            raise RuntimeError(
+                f"MCP_HTTP_MAX_SESSIONS needs the session table of {manager_class.__name__}, which this mcp "
+                "release does not expose; set MCP_HTTP_MAX_SESSIONS=0 or install a supported mcp version"
+            )
+        self.sse = SseServerTransport(SSE_MESSAGES_PATH)
+
+        self.app = Starlette(
+            routes=[
+                Route(path, endpoint=_ASGIEndpoint(self._handle_streamable_http), methods=["GET", "POST", "DELETE"]),
+                Route(SSE_PATH, endpoint=_ASGIEndpoint(self._handle_sse), methods=["GET"]),
+                Mount(SSE_MESSAGES_PATH, app=self.sse.handle_post_message),
+            ],
+            lifespan=self._lifespan,
+        )
+
+    def open_sessions(self) -> int:
+        """Streamable HTTP sessions tracked by the session manager plus connected SSE clients."""
+        sessions = getattr(self.session_manager, "_server_instances", None)
+        if not isinstance(sessions, dict):
+            raise RuntimeError("The MCP session manager does not expose its open sessions")
+        return len(sessions) + self.open_sse_sessions
+
+    def _at_session_limit(self) -> bool:
+        return bool(self.max_sessions) and self.open_sessions() >= self.max_sessions
+
+    @contextlib.asynccontextmanager
+    async def _lifespan(self, app: Any) -> AsyncIterator[None]:
+        from utils.client_session import disable_session_isolation, enable_session_isolation
+
+        enable_session_isolation(self.max_concurrent_calls)
+        try:
+            async with self.session_manager.run():
+                yield
+        finally:
+            disable_session_isolation()
+
+    async def _handle_streamable_http(self, scope: dict, receive: Any, send: Any) -> None:
+        from mcp.server.streamable_http import MCP_SESSION_ID_HEADER
+
+        header_names = {name.decode("latin-1").lower() for name, _ in scope.get("headers", [])}
+        opens_session = scope.get("method") == "POST" and MCP_SESSION_ID_HEADER.lower() not in header_names
+        if opens_session and self._at_session_limit():
+            await self._reject(scope, receive, send)
+            return
+        await self.session_manager.handle_request(scope, receive, send)
+
+    async def _handle_sse(self, scope: dict, receive: Any, send: Any) -> None:
+        if self._at_session_limit():
+            await self._reject(scope, receive, send)
+            return
+        self.open_sse_sessions += 1
+        try:
+            async with self.sse.connect_sse(scope, receive, send) as (read_stream, write_stream):
+                await self.mcp_server.run(read_stream, write_stream, self.initialization_options)
+        finally:
+            self.open_sse_sessions -= 1
+
+    async def _reject(self, scope: dict, receive: Any, send: Any) -> None:
+        from starlette.responses import JSONResponse
+
+        logger.warning(f"[HTTP] Refusing new client session: {self.open_sessions()} of {self.max_sessions} open")
+        response = JSONResponse(
+            {"error": f"Too many open sessions (limit {self.max_sessions}); retry later"},
+            status_code=503,
+            headers={"Retry-After": "5"},
+        )
+        await response(scope, receive, send)
+
+
+class _ASGIEndpoint:
+    """Lets a Starlette Route hand the raw ASGI call to a transport handler."""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        await self.handler(scope, receive, send)
+
+
+async def serve_http(mcp_server: Any, initialization_options: Any) -> None:
+    """
+    Serve the MCP server over HTTP until the process is interrupted.
+
+    Args:
+        mcp_server: The low-level mcp Server with its handlers registered
+        initialization_options: Options announced to clients during the handshake (SSE transport)
+    """
+    import uvicorn
+
+    from config import (
+        MCP_HTTP_HOST,
+        MCP_HTTP_MAX_CONCURRENT_CALLS,
+        MCP_HTTP_MAX_SESSIONS,
+        MCP_HTTP_PATH,
+        MCP_HTTP_PORT,
+        MCP_HTTP_SESSION_IDLE_TIMEOUT,
+    )
+
+    transport = HTTPTransport(
+        mcp_server,
+        initialization_options,
+        path=MCP_HTTP_PATH,
+        max_sessions=MCP_HTTP_MAX_SESSIONS,
+        session_idle_timeout=MCP_HTTP_SESSION_IDLE_TIMEOUT,
+        max_concurrent_calls=MCP_HTTP_MAX_CONCURRENT_CALLS,
+    )
+    logger.info(
+        f"[HTTP] Serving MCP on http://{MCP_HTTP_HOST}:{MCP_HTTP_PORT}{MCP_HTTP_PATH} (SSE: {SSE_PATH}); "
+        f"max {MCP_HTTP_MAX_SESSIONS or 'unlimited'} sessions, "
+        f"{MCP_HTTP_MAX_CONCURRENT_CALLS or 'unlimited'} concurrent tool calls"
+    )
+    config = uvicorn.Config(transport.app, host=MCP_HTTP_HOST, port=MCP_HTTP_PORT, log_level="warning")
+    await uvicorn.Server(config).serve()
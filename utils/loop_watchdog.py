@@ -0,0 +1,251 @@
+"""
+Event-loop stall watchdog
+
+Tool handlers run on the single asyncio event loop that also serves the MCP
+stdio transport. A blocking call inside an async path (a synchronous provider
+SDK call, time.sleep in a retry loop, urlopen, synchronous file or storage
+I/O) freezes every other in-flight request and even ping responses for as
+long as it runs. Such calls are easy to reintroduce and invisible in latency
+metrics of the tool that made them.
+
+When LOOP_WATCHDOG_ENABLED is set, the server runs two cooperating pieces:
+
+- a heartbeat task on the loop that sleeps LOOP_WATCHDOG_INTERVAL_MS and
+  measures how late it woke up (the event-loop lag), recorded in the
+  zen_event_loop_lag_seconds histogram
+- a daemon thread that notices when the heartbeat is overdue by more than
+  LOOP_WATCHDOG_THRESHOLD_MS and captures the loop thread's stack while the
+  blocking call is still running
+
+Each stall is attributed to a call site: the innermost stack frame in this
+project's code (outside site-packages), e.g. "tools/version.py:68 in
+fetch_github_version". Stalls are aggregated per site into
+zen_event_loop_stalls_total{site} and a report shown by the stats tool.
+The first stall at a site is logged with its full stack; repeats log one line.
+
+The watchdog is off by default; the heartbeat costs one timer callback per
+interval and the thread one wake-up per quarter threshold.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Site used when a stall ended before the watchdog thread could capture a stack
+UNKNOWN_SITE = "unknown"
+
+
+@dataclass
+class StallReport:
+    """Stalls attributed to one call site."""
+
+    site: str
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    innermost: str = ""
+    stack: list[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "site": self.site,
+            "count": self.count,
+            "total_ms": round(self.total_seconds * 1000, 1),
+            "max_ms": round(self.max_seconds * 1000, 1),
+            "innermost": self.innermost,
+            "stack": self.stack,
+        }
+
+
+def _is_project_frame(filename: str) -> bool:
+    path = os.path.abspath(filename)
+    return path.startswith(PROJECT_ROOT + os.sep) and "site-packages" not in path and path != os.path.abspath(__file__)
+
+
+def _describe(frame: traceback.FrameSummary) -> str:
+    filename = frame.filename
+    if _is_project_frame(filename):
+        filename = os.path.relpath(os.path.abspath(filename), PROJECT_ROOT)
+    return f"{filename}:{frame.lineno} in {frame.name}"
+
+
+def attribute_stack(stack: traceback.StackSummary) -> tuple[str, str]:
+    """
+    Pick the call site responsible for a blocked loop.
+
+    Args:
+        stack: Loop thread stack, outermost frame first
+
+    Returns:
+        (site, innermost): the innermost project frame (or the innermost frame
+        when no project code is on the stack) and the innermost frame overall
+    """
+    if not stack:
+        return UNKNOWN_SITE, ""
+    innermost = _describe(stack[-1])
+    for frame in reversed(stack):
+        if _is_project_frame(frame.filename):
+            return _describe(frame), innermost
+    return innermost, innermost
+
+
+class LoopWatchdog:
+    """Measures event-loop lag and captures the stack of callbacks that block it."""
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, stack_depth: int = 30):
+        self.threshold = threshold
+        self.interval = interval
+        self.stack_depth = stack_depth
+        self.reports: dict[str, StallReport] = {}
+        self.stalls = 0
+        self._lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        # (heartbeat it belongs to, stack) captured by the watchdog thread for the ongoing stall
+        self._captured: Optional[tuple[float, traceback.StackSummary]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start the heartbeat and watchdog thread; must be called from the running loop."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat(), name="loop-watchdog-heartbeat")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"[LOOP] Watching event loop: stalls above {self.threshold * 1000:.0f}ms are reported "
+            f"(heartbeat every {self.interval * 1000:.0f}ms)"
+        )
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    async def _heartbeat(self) -> None:
+        from utils.metrics import record_loop_lag
+
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - self._last_beat - self.interval)
+            beat = self._last_beat
+            self._last_beat = now
+            record_loop_lag(lag)
+            if lag >= self.threshold:
+                with self._lock:
+                    captured = self._captured
+                    self._captured = None
+                stack = captured[1] if captured and captured[0] == beat else None
+                self._record_stall(lag, stack)
+
+    def _watch(self) -> None:
+        poll = max(0.001, self.threshold / 4)
+        while not self._stop.wait(poll):
+            beat = self._last_beat
+            overdue = time.monotonic() - beat - self.interval
+            if overdue < self.threshold:
+                continue
+            with self._lock:
+                if self._captured is not None and self._captured[0] == beat:
+                    continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame, limit=self.stack_depth)
+            with self._lock:
+                # The loop may have recovered while the stack was extracted
+                if self._last_beat == beat:
+                    self._captured = (beat, stack)
+
+    def _record_stall(self, duration: float, stack: Optional[traceback.StackSummary]) -> None:
+        from utils.metrics import record_loop_stall
+
+        site, innermost = attribute_stack(stack) if stack else (UNKNOWN_SITE, "")
+        self.stalls += 1
+        report = self.reports.get(site)
+        first = report is None
+        if first:
+            report = self.reports[site] = StallReport(site=site)
+        report.count += 1
+        report.total_seconds += duration
+        report.max_seconds = max(report.max_seconds, duration)
+        if stack:
+            report.innermost = innermost
+            report.stack = [_describe(frame) for frame in stack]
+        record_loop_stall(site)
+
+        if first and stack:
+            logger.warning(
+                f"[LOOP] Event loop blocked for {duration * 1000:.0f}ms at {site}:\n"
+                + "".join(traceback.format_list(stack)).rstrip()
+            )
+        else:
+            logger.warning(
+                f"[LOOP] Event loop blocked for {duration * 1000:.0f}ms at {site} "
+                f"({report.count} stalls, max {report.max_seconds * 1000:.0f}ms)"
+            )
+
+    def summary(self) -> list[dict[str, Any]]:
+        """Stall reports ordered by total blocked time."""
+        return [report.to_dict() for report in sorted(self.reports.values(), key=lambda r: -r.total_seconds)]
+
+
+_watchdog: Optional[LoopWatchdog] = None
+
+
+def start_loop_watchdog(threshold: Optional[float] = None, interval: Optional[float] = None) -> Optional[LoopWatchdog]:
+    """
+    Start the watchdog on the running loop when LOOP_WATCHDOG_ENABLED is set (idempotent).
+
+    Args:
+        threshold: Stall threshold in seconds; defaults to LOOP_WATCHDOG_THRESHOLD_MS
+        interval: Heartbeat interval in seconds; defaults to LOOP_WATCHDOG_INTERVAL_MS
+
+    Returns:
+        The running watchdog, or None if it is disabled
+    """
+    global _watchdog
+
+    from config import LOOP_WATCHDOG_ENABLED, LOOP_WATCHDOG_INTERVAL_MS, LOOP_WATCHDOG_THRESHOLD_MS
+
+    if threshold is None and not LOOP_WATCHDOG_ENABLED:
+        return None
+    if _watchdog is not None:
+        return _watchdog
+    _watchdog = LoopWatchdog(
+        threshold=threshold if threshold is not None else LOOP_WATCHDOG_THRESHOLD_MS / 1000,
+        interval=interval if interval is not None else LOOP_WATCHDOG_INTERVAL_MS / 1000,
+    )
+    _watchdog.start()
+    return _watchdog
+
+
+def stop_loop_watchdog() -> None:
+    global _watchdog
+
+    if _watchdog is not None:
+        _watchdog.stop()
+        _watchdog = None
+
+
+def get_stall_reports() -> Optional[list[dict[str, Any]]]:
+    """Aggregated stall reports, or None when the watchdog is not running."""
+    return _watchdog.summary() if _watchdog is not None else None
@@ -0,0 +1,470 @@
+"""
+In-process metrics registry
+
+The activity log only records free-text TOOL_CALL / TOOL_COMPLETED lines. This
+module keeps counters and latency histograms that the server updates as it
+works, so operators can see where time and tokens go without parsing logs:
+
+- zen_tool_duration_seconds{tool,status}: end-to-end tool call latency
+- zen_provider_duration_seconds{provider,model}: generate_content() latency
+- zen_provider_errors_total{provider,error}: failed provider calls by exception class
+- zen_provider_retries_total{provider,error}: retry attempts inside provider retry loops
+- zen_tokens_total{provider,kind}: prompt / completion tokens from ModelResponse.usage
+- zen_file_bytes_read_total: bytes read from disk for prompts
+- zen_storage_duration_seconds{backend,op}: conversation storage operation latency
+- zen_budget_utilization_ratio{model}: share of the context window actually used per request
+- zen_cache_requests_total{cache,result}: hits and misses of in-process caches (tool list, token counts)
+- zen_admission_wait_seconds{provider}: time provider calls waited for admission (providers/admission.py)
+- zen_admission_timeouts_total{provider}: provider calls rejected after waiting ADMISSION_TIMEOUT
+- zen_event_loop_lag_seconds: how late the loop watchdog heartbeat woke up (LOOP_WATCHDOG_ENABLED)
+- zen_event_loop_stalls_total{site}: loop stalls above LOOP_WATCHDOG_THRESHOLD_MS by blocking call site
+
+Metrics are exposed through the ``stats`` tool and, when METRICS_EXPORT_INTERVAL
+is set, written periodically in the Prometheus text exposition format to
+METRICS_EXPORT_PATH (logs/metrics.prom by default) for node_exporter's textfile
+collector or any scraper that can read a file.
+
+Recording never raises: a metrics failure must not affect a request.
+"""
+
+import bisect
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds (seconds) covering cache hits up to long reasoning calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Buckets for ratios such as context window utilization
+RATIO_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = ((name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for name, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return [{"labels": dict(key), "value": value} for key, value in self._values.items()]
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_number(value)}" for key, value in items]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Histogram with fixed buckets and labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[LabelKey, _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        # Index of the first bucket whose bound is >= value; len(buckets) means +Inf only
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets) + 1)
+            series.counts[index] += 1
+            series.total += value
+            series.count += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the wall-clock duration of the enclosed block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def quantile(self, q: float, **labels: Any) -> Optional[float]:
+        """Approximate quantile (bucket upper bound) for one label set, or None without samples."""
+        series = self._series.get(_label_key(labels))
+        return self._quantile(series, q) if series else None
+
+    def _quantile(self, series: _HistogramSeries, q: float) -> Optional[float]:
+        if not series.count:
+            return None
+        target = q * series.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        with self._lock:
+            items = [(key, list(s.counts), s.total, s.count) for key, s in self._series.items()]
+        result = []
+        for key, counts, total, count in items:
+            series = _HistogramSeries(0)
+            series.counts, series.total, series.count = counts, total, count
+            result.append(
+                {
+                    "labels": dict(key),
+                    "count": count,
+                    "sum": round(total, 6),
+                    "mean": round(total / count, 6) if count else None,
+                    "p50": self._quantile(series, 0.5),
+                    "p95": self._quantile(series, 0.95),
+                }
+            )
+        return result
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(s.counts), s.total, s.count) for key, s in self._series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_number(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_number(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class MetricsRegistry:
+    """Named collection of counters and histograms."""
+
+    def __init__(self):
+        self._metrics: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if existing.kind != metric.kind:
+                    raise ValueError(f"Metric {metric.name} already registered as a {existing.kind}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, description: str) -> Counter:
+        """Get or create a counter."""
+        return self._register(Counter(name, description))
+
+    def histogram(self, name: str, description: str, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        """Get or create a histogram."""
+        return self._register(Histogram(name, description, buckets))
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def snapshot(self) -> dict[str, Any]:
+        """JSON-compatible view of every metric."""
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "metrics": {
+                name: {"type": metric.kind, "description": metric.description, "series": metric.snapshot()}
+                for name, metric in sorted(self._metrics.items())
+            },
+        }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Drop all recorded values (metric definitions stay registered)."""
+        for metric in list(self._metrics.values()):
+            metric.reset()
+        self.started_at = time.time()
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Get the process-wide metrics registry."""
+    return _registry
+
+
+TOOL_DURATION = _registry.histogram("zen_tool_duration_seconds", "Tool call latency in seconds")
+PROVIDER_DURATION = _registry.histogram("zen_provider_duration_seconds", "Model provider call latency in seconds")
+PROVIDER_ERRORS = _registry.counter("zen_provider_errors_total", "Failed model provider calls by exception class")
+PROVIDER_RETRIES = _registry.counter("zen_provider_retries_total", "Retried model provider attempts by exception class")
+TOKENS = _registry.counter("zen_tokens_total", "Prompt and completion tokens reported by providers")
+FILE_BYTES_READ = _registry.counter("zen_file_bytes_read_total", "Bytes read from files for prompts")
+STORAGE_DURATION = _registry.histogram(
+    "zen_storage_duration_seconds", "Conversation storage operation latency in seconds"
+)
+BUDGET_UTILIZATION = _registry.histogram(
+    "zen_budget_utilization_ratio", "Share of the model context window used per request", RATIO_BUCKETS
+)
+
+CACHE_REQUESTS = _registry.counter("zen_cache_requests_total", "In-process cache lookups by cache and result")
+ADMISSION_WAIT = _registry.histogram("zen_admission_wait_seconds", "Provider call admission wait in seconds")
+ADMISSION_TIMEOUTS = _registry.counter(
+    "zen_admission_timeouts_total", "Provider calls that timed out waiting for admission"
+)
+LOOP_LAG = _registry.histogram("zen_event_loop_lag_seconds", "Event loop heartbeat lag in seconds")
+LOOP_STALLS = _registry.counter("zen_event_loop_stalls_total", "Event loop stalls by blocking call site")
+
+
+def _provider_label(provider: Any) -> str:
+    try:
+        provider_type = provider.get_provider_type()
+        return getattr(provider_type, "value", str(provider_type))
+    except Exception:
+        return type(provider).__name__
+
+
+def record_tool_call(tool_name: str, duration: float, status: str) -> None:
+    """Record one completed tool call."""
+    try:
+        TOOL_DURATION.observe(duration, tool=tool_name, status=status)
+    except Exception as e:
+        logger.debug(f"[METRICS] Could not record tool call: {e}")
+
+
+def record_provider_call(
+    provider: Any, model_name: str, duration: float, response: Any = None, error: Optional[BaseException] = None
+) -> None:
+    """Record the latency, error class and token usage of one generate_content() call."""
+    try:
+        provider_label = _provider_label(provider)
+        PROVIDER_DURATION.observe(duration, provider=provider_label, model=model_name)
+        if error is not None:
+            # Providers wrap the last failure of their retry loop; count the underlying class
+            cause = error.__cause__ if isinstance(error.__cause__, Exception) else error
+            PROVIDER_ERRORS.inc(provider=provider_label, error=type(cause).__name__)
+            return
+        usage = getattr(response, "usage", None)
+        if isinstance(usage, dict):
+            if usage.get("input_tokens"):
+                TOKENS.inc(usage["input_tokens"], provider=provider_label, kind="prompt")
+            if usage.get("output_tokens"):
+                TOKENS.inc(usage["output_tokens"], provider=provider_label, kind="completion")
+    except Exception as e:
+        logger.debug(f"[METRICS] Could not record provider call: {e}")
+
+
+def record_provider_retry(provider: Any, error: BaseException) -> None:
+    """Record a retry inside a provider's retry loop."""
+    try:
+        PROVIDER_RETRIES.inc(provider=_provider_label(provider), error=type(error).__name__)
+    except Exception as e:
+        logger.debug(f"[METRICS] Could not record provider retry: {e}")
+
+
+def record_file_read(num_bytes: int) -> None:
+    """Record bytes read from disk for prompt content."""
+    try:
+        FILE_BYTES_READ.inc(num_bytes)
+    except Exception as e:
+        logger.debug(f"[METRICS] Could not record file read: {e}")
+
+
+def record_budget_utilization(model_name: str, ratio: float) -> None:
+    """Record the share of the context window a request used."""
+    try:
+        BUDGET_UTILIZATION.observe(ratio, model=model_name)
+    except Exception as e:
+        logger.debug(f"[METRICS] Could not record budget utilization: {e}")
+
+
+def record_cache_access(cache: str, hit: bool) -> None:
+    """Record one lookup in an in-process cache."""
+    try:
+        CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+    except Exception as e:
+        logger.debug(f"[METRICS] Could not record cache access: {e}")
+
+
+def cache_hit_ratio(cache: str) -> Optional[float]:
+    """Share of lookups in a cache that were hits, or None before the first lookup."""
+    hits = CACHE_REQUESTS.value(cache=cache, result="hit")
+    total = hits + CACHE_REQUESTS.value(cache=cache, result="miss")
+    return hits / total if total else None
+
+
+def record_admission(provider: str, waited: float, timed_out: bool = False) -> None:
+    """Record how long a provider call waited for admission."""
+    try:
+        if timed_out:
+            ADMISSION_TIMEOUTS.inc(provider=provider)
+        else:
+            ADMISSION_WAIT.observe(waited, provider=provider)
+    except Exception as e:
+        logger.debug(f"[METRICS] Could not record admission: {e}")
+
+
+def record_loop_lag(lag: float) -> None:
+    """Record how late one event loop heartbeat ran."""
+    try:
+        LOOP_LAG.observe(lag)
+    except Exception as e:
+        logger.debug(f"[METRICS] Could not record loop lag: {e}")
+
+
+def record_loop_stall(site: str) -> None:
+    """Record one event loop stall attributed to a call site."""
+    try:
+        LOOP_STALLS.inc(site=site)
+    except Exception as e:
+        logger.debug(f"[METRICS] Could not record loop stall: {e}")
+
+
+@contextmanager
+def time_storage_op(backend: str, op: str) -> Iterator[None]:
+    """Observe the duration of a conversation storage operation."""
+    with STORAGE_DURATION.time(backend=backend, op=op):
+        yield
+
+
+def write_prometheus_file(path: Optional[str] = None) -> Path:
+    """
+    Write the current metrics in Prometheus text format, replacing the file atomically.
+
+    Args:
+        path: Destination; defaults to METRICS_EXPORT_PATH
+
+    Returns:
+        Path that was written
+    """
+    if path is None:
+        from config import METRICS_EXPORT_PATH
+
+        path = METRICS_EXPORT_PATH
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    temp.write_text(_registry.render_prometheus(), encoding="utf-8")
+    os.replace(temp, target)
+    return target
+
+
+_exporter_thread: Optional[threading.Thread] = None
+_exporter_path: Optional[str] = None
+_exporter_stop = threading.Event()
+
+
+def start_metrics_exporter(interval: Optional[float] = None, path: Optional[str] = None) -> Optional[threading.Thread]:
+    """
+    Periodically write the Prometheus file on a daemon thread (idempotent).
+
+    Args:
+        interval: Seconds between writes; defaults to METRICS_EXPORT_INTERVAL. Zero disables.
+        path: Destination; defaults to METRICS_EXPORT_PATH
+
+    Returns:
+        The exporter thread, or None if export is disabled
+    """
+    global _exporter_thread, _exporter_path
+
+    if interval is None:
+        from config import METRICS_EXPORT_INTERVAL
+
+        interval = METRICS_EXPORT_INTERVAL
+    if interval <= 0:
+        return None
+    if _exporter_thread is not None and _exporter_thread.is_alive():
+        return _exporter_thread
+
+    _exporter_stop.clear()
+    _exporter_path = path
+
+    def _export() -> None:
+        while not _exporter_stop.wait(interval):
+            try:
+                write_prometheus_file(path)
+            except Exception as e:
+                logger.warning(f"[METRICS] Could not write Prometheus metrics file: {e}")
+
+    _exporter_thread = threading.Thread(target=_export, name="metrics-exporter", daemon=True)
+    _exporter_thread.start()
+    logger.info(f"[METRICS] Writing Prometheus metrics every {interval}s")
+    return _exporter_thread
+
+
+def stop_metrics_exporter() -> None:
+    """Stop the exporter thread and write the metrics one last time, to the path it was started with."""
+    global _exporter_thread, _exporter_path
+
+    _exporter_stop.set()
+    if _exporter_thread is not None:
+        _exporter_thread.join(timeout=5)
+        _exporter_thread = None
+        try:
+            write_prometheus_file(_exporter_path)
+        except Exception as e:
+            logger.debug(f"[METRICS] Final metrics write failed: {e}")
+        _exporter_path = None
@@ -24,18 +24,62 @@ optimal token allocation for multi-turn conversations:
    - Provides consistent token budgets across different tools
    - Enables seamless conversation continuation between tools
    - Supports conversation reconstruction with proper budget management
+
+4. DEMAND-DRIVEN ALLOCATION:
+   - Callers record what each consumer actually needs (history, files, images,
+     tool prompt, expected output) with ModelContext.update_demand()
+   - Once demand is known the context window is split by water-filling: every
+     consumer is guaranteed a minimum share, and budget one consumer does not
+     need is redistributed to the others instead of sitting unused
+   - Actual usage is recorded back and summarized per model so we can see how
+     much of each context window is used (get_utilization_summary())
 """
 
 import logging
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, fields
 from typing import Any, Optional
 
 from config import DEFAULT_MODEL
 from providers import ModelCapabilities, ModelProviderRegistry
+from utils.metrics import record_budget_utilization
 
 logger = logging.getLogger(__name__)
 
 
+# Content consumers that share the context window, in the order they are reported
+CONTENT_CONSUMERS = ("prompt", "history", "files", "images")
+
+# Minimum share of the content budget each consumer is guaranteed (capped at its demand)
+CONSUMER_MINIMUM_SHARES = {"prompt": 0.05, "history": 0.10, "files": 0.10, "images": 0.05}
+
+# Never reserve less than this for the response when the expected output is known
+MIN_RESPONSE_TOKENS = 4_096
+
+# Rough token cost of one attached image, used as image demand
+IMAGE_TOKEN_ESTIMATE = 1_600
+
+
+@dataclass
+class TokenDemand:
+    """
+    Tokens each consumer wants from the context window.
+
+    None means the demand is unknown; such consumers are elastic and absorb
+    whatever budget the consumers with known demand leave over.
+    """
+
+    history: Optional[int] = None
+    files: Optional[int] = None
+    images: Optional[int] = None
+    prompt: Optional[int] = None
+    output: Optional[int] = None
+
+    def is_known(self) -> bool:
+        """Whether any demand has been recorded."""
+        return any(getattr(self, f.name) is not None for f in fields(self))
+
+
 @dataclass
 class TokenAllocation:
     """Token allocation strategy for a model."""
@@ -45,12 +89,136 @@ class TokenAllocation:
     response_tokens: int
     file_tokens: int
     history_tokens: int
+    image_tokens: int = 0
+    prompt_tokens: int = 0
+    demand: Optional[TokenDemand] = None
 
     @property
     def available_for_prompt(self) -> int:
         """Tokens available for the actual prompt after allocations."""
         return self.content_tokens - self.file_tokens - self.history_tokens
 
+    @property
+    def adaptive(self) -> bool:
+        """Whether this allocation was derived from recorded demand."""
+        return self.demand is not None
+
+    def allocated_for(self, consumer: str) -> int:
+        """Budget assigned to a content consumer or to the response ("output")."""
+        return {
+            "prompt": self.prompt_tokens if self.adaptive else self.available_for_prompt,
+            "history": self.history_tokens,
+            "files": self.file_tokens,
+            "images": self.image_tokens,
+            "output": self.response_tokens,
+        }[consumer]
+
+
+def _water_fill(budget: int, demands: dict[str, Optional[int]], minimum_shares: dict[str, float]) -> dict[str, int]:
+    """
+    Split a budget between consumers by max-min fairness with minimum guarantees.
+
+    Each consumer first receives min(demand, minimum share of budget). The rest is
+    handed out in equal rounds to consumers whose known demand is still unmet, so a
+    consumer that needs little releases its share to the others. Consumers with unknown
+    demand (None) keep their minimum share and then split whatever the known demands
+    leave, rather than competing with them as if they needed the whole budget.
+
+    Returns:
+        dict: Tokens granted per consumer; the sum never exceeds the budget
+    """
+    elastic = [name for name, demand in demands.items() if demand is None]
+    wants = {name: max(0, demand) for name, demand in demands.items() if demand is not None}
+    granted = {}
+    for name in demands:
+        guaranteed = int(budget * minimum_shares.get(name, 0.0))
+        granted[name] = min(wants[name], guaranteed) if name in wants else guaranteed
+    remaining = budget - sum(granted.values())
+
+    while remaining > 0:
+        unmet = [name for name in wants if granted[name] < wants[name]]
+        if not unmet:
+            break
+        share = max(1, remaining // len(unmet))
+        for name in unmet:
+            grant = min(share, wants[name] - granted[name], remaining)
+            granted[name] += grant
+            remaining -= grant
+            if remaining <= 0:
+                break
+
+    if elastic and remaining > 0:
+        share = remaining // len(elastic)
+        for name in elastic:
+            granted[name] += share
+        granted[elastic[0]] += remaining - share * len(elastic)
+
+    return granted
+
+
+class _UtilizationStats:
+    """Process-wide record of how much of each model's context window requests used."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: dict[str, dict[str, Any]] = {}
+
+    def record(self, model_name: str, allocation: TokenAllocation, used: dict[str, int]) -> None:
+        with self._lock:
+            entry = self._models.setdefault(
+                model_name,
+                {
+                    "requests": 0,
+                    "context_window": allocation.total_tokens,
+                    "used_tokens": 0,
+                    "consumers": {},
+                },
+            )
+            entry["requests"] += 1
+            entry["context_window"] = allocation.total_tokens
+            entry["used_tokens"] += sum(used.values())
+            for consumer, tokens in used.items():
+                totals = entry["consumers"].setdefault(consumer, {"allocated": 0, "used": 0})
+                totals["allocated"] += allocation.allocated_for(consumer)
+                totals["used"] += tokens
+
+    def summary(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            report = {}
+            for model_name, entry in self._models.items():
+                window = entry["context_window"] * entry["requests"]
+                report[model_name] = {
+                    "requests": entry["requests"],
+                    "context_window": entry["context_window"],
+                    "mean_utilization": entry["used_tokens"] / window if window else 0.0,
+                    "consumers": {
+                        consumer: {
+                            **totals,
+                            "utilization": totals["used"] / totals["allocated"] if totals["allocated"] else 0.0,
+                        }
+                        for consumer, totals in entry["consumers"].items()
+                    },
+                }
+            return report
+
+    def reset(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+
+_utilization_stats = _UtilizationStats()
+
+
+def get_utilization_summary() -> dict[str, dict[str, Any]]:
+    """
+    Summarize context window utilization per model since startup.
+
+    Returns:
+        dict: model name -> requests, context_window, mean_utilization (share of the
+        window actually sent) and per-consumer allocated/used totals
+    """
+    return _utilization_stats.summary()
+
 
 class ModelContext:
     """
@@ -66,6 +234,8 @@ class ModelContext:
         self._provider = None
         self._capabilities = None
         self._token_allocation = None
+        self.demand = TokenDemand()
+        self._usage: dict[str, int] = {}
 
     @property
     def provider(self):
@@ -84,6 +254,20 @@ class ModelContext:
             self._capabilities = self.provider.get_capabilities(self.model_name)
         return self._capabilities
 
+    def update_demand(self, **demand: Optional[int]) -> None:
+        """
+        Record how many tokens consumers need for the current request.
+
+        Args:
+            **demand: Any of history, files, images, prompt, output. Values replace
+                earlier ones; None leaves a consumer's demand unchanged.
+        """
+        for name, tokens in demand.items():
+            if not hasattr(self.demand, name):
+                raise ValueError(f"Unknown token consumer: {name}")
+            if tokens is not None:
+                setattr(self.demand, name, max(0, int(tokens)))
+
     def calculate_token_allocation(self, reserved_for_response: Optional[int] = None) -> TokenAllocation:
         """
         Calculate token allocation based on model capacity and conversation requirements.
@@ -106,6 +290,10 @@ class ModelContext:
            - File allocation supports newest-first file prioritization in tools
            - Remaining budget passed to tools via _remaining_tokens parameter
 
+        4. DEMAND-DRIVEN MODE:
+           - When update_demand() has recorded any demand, the fixed ratios above only
+             cap the response reservation; content is split by _allocate_adaptive()
+
         Args:
             reserved_for_response: Override response token reservation
 
@@ -128,6 +316,9 @@ class ModelContext:
             file_ratio = 0.4  # 40% of content for files
             history_ratio = 0.4  # 40% of content for history
 
+        if self.demand.is_known():
+            return self._allocate_adaptive(total_tokens, int(total_tokens * response_ratio), reserved_for_response)
+
         # Calculate allocations
         content_tokens = int(total_tokens * content_ratio)
         response_tokens = reserved_for_response or int(total_tokens * response_ratio)
@@ -153,16 +344,123 @@ class ModelContext:
 
         return allocation
 
+    def _allocate_adaptive(
+        self, total_tokens: int, default_response_tokens: int, reserved_for_response: Optional[int]
+    ) -> TokenAllocation:
+        """
+        Split the context window according to recorded demand.
+
+        The response keeps the default reservation unless the expected output is known,
+        in which case only that much (bounded by MIN_RESPONSE_TOKENS and the model's
+        max_output_tokens) is held back. Content consumers are then water-filled, and
+        budget left after every demand is met goes to files and history as headroom
+        for estimation error.
+        """
+        demand = self.demand
+        response_tokens = reserved_for_response or default_response_tokens
+        if not reserved_for_response and demand.output is not None:
+            wanted = max(demand.output, MIN_RESPONSE_TOKENS)
+            max_output = getattr(self.capabilities, "max_output_tokens", None)
+            if isinstance(max_output, int) and max_output > 0:
+                wanted = min(wanted, max_output)
+            response_tokens = min(default_response_tokens, wanted)
+
+        content_tokens = max(0, total_tokens - response_tokens)
+        wants = {name: getattr(demand, name) for name in CONTENT_CONSUMERS}
+        # Images are validated against model limits separately; unknown means none
+        wants["images"] = wants["images"] or 0
+        granted = _water_fill(content_tokens, wants, CONSUMER_MINIMUM_SHARES)
+
+        slack = content_tokens - sum(granted.values())
+        headroom = granted["files"] + granted["history"]
+        if slack > 0 and headroom > 0:
+            file_slack = slack * granted["files"] // headroom
+            granted["files"] += file_slack
+            granted["history"] += slack - file_slack
+
+        allocation = TokenAllocation(
+            total_tokens=total_tokens,
+            content_tokens=content_tokens,
+            response_tokens=response_tokens,
+            file_tokens=granted["files"],
+            history_tokens=granted["history"],
+            image_tokens=granted["images"],
+            prompt_tokens=granted["prompt"],
+            demand=TokenDemand(**{f.name: getattr(demand, f.name) for f in fields(demand)}),
+        )
+
+        logger.debug(
+            f"[TOKEN_ALLOCATION] Adaptive allocation for {self.model_name} ({total_tokens:,} window): "
+            f"response={response_tokens:,} prompt={allocation.prompt_tokens:,} history={allocation.history_tokens:,} "
+            f"files={allocation.file_tokens:,} images={allocation.image_tokens:,} demand={demand}"
+        )
+        return allocation
+
+    def record_usage(self, **used: int) -> None:
+        """
+        Record tokens actually consumed for the current request.
+
+        Args:
+            **used: Tokens per consumer (history, files, images, prompt, output).
+                Values replace earlier ones for the same consumer.
+        """
+        for name, tokens in used.items():
+            if tokens is not None:
+                self._usage[name] = max(0, int(tokens))
+
+    def report_utilization(self, sent_tokens: Optional[int] = None) -> dict[str, Any]:
+        """
+        Compare recorded usage with the allocation and add it to the process-wide summary.
+
+        Args:
+            sent_tokens: Total tokens of the prompt sent to the model. The part not
+                already recorded for history, files or images is attributed to the prompt.
+
+        Returns:
+            dict: context_window, used tokens, utilization and per-consumer allocated/used
+        """
+        if sent_tokens is not None:
+            attributed = sum(self._usage.get(name, 0) for name in CONTENT_CONSUMERS if name != "prompt")
+            self._usage["prompt"] = max(0, sent_tokens - attributed)
+
+        allocation = self.calculate_token_allocation()
+        used = dict(self._usage)
+        used_total = sum(used.values())
+        report = {
+            "model": self.model_name,
+            "context_window": allocation.total_tokens,
+            "used_tokens": used_total,
+            "utilization": used_total / allocation.total_tokens if allocation.total_tokens else 0.0,
+            "adaptive": allocation.adaptive,
+            "consumers": {
+                name: {"allocated": allocation.allocated_for(name), "used": tokens} for name, tokens in used.items()
+            },
+        }
+        _utilization_stats.record(self.model_name, allocation, used)
+        record_budget_utilization(self.model_name, report["utilization"])
+        logger.debug(
+            f"[TOKEN_ALLOCATION] {self.model_name} used {used_total:,}/{allocation.total_tokens:,} tokens "
+            f"({report['utilization']:.1%}): "
+            + ", ".join(f"{name}={v['used']:,}/{v['allocated']:,}" for name, v in report["consumers"].items())
+        )
+        return report
+
     def estimate_tokens(self, text: str) -> int:
         """
-        Estimate token count for text using model-specific tokenizer.
+        Count tokens for text using the model's tokenizer.
 
-        For now, uses simple estimation. Can be enhanced with model-specific
-        tokenizers (tiktoken for OpenAI, etc.) in the future.
+        Uses the shared tokenizer service: exact (and memoized) for model families
+        with a local tokenizer, the standard character estimate otherwise.
         """
-        # TODO: Integrate model-specific tokenizers
-        # For now, use conservative estimation
-        return len(text) // 3  # Conservative estimate
+        from utils.tokenizer import get_tokenizer
+
+        return get_tokenizer().count_tokens(text, self.model_name)
+
+    def estimate_tokens_batch(self, texts: list[str]) -> list[int]:
+        """Count tokens for several texts at once (see TokenizerService.count_tokens_batch)."""
+        from utils.tokenizer import get_tokenizer
+
+        return get_tokenizer().count_tokens_batch(texts, self.model_name)
 
     @classmethod
     def from_arguments(cls, arguments: dict[str, Any]) -> "ModelContext":
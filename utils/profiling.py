@@ -0,0 +1,330 @@
+"""
+On-demand CPU and memory profiling of tool calls
+
+Slow tool calls (a tracer step on a large repository, a codereview with many
+files) are hard to reproduce outside the user's environment. When profiling is
+enabled, handle_call_tool runs tool.execute() under a profiler and writes the
+results to PROFILE_DIR (logs/profiles/ by default):
+
+- ``<stamp>_<tool>_<id>.prof``: cProfile statistics (mode "cprofile"), loadable
+  with pstats, snakeviz or any pstats viewer
+- ``<stamp>_<tool>_<id>.folded``: folded stacks (mode "sampling"), one
+  ``frame;frame;frame count`` line per stack, for flamegraph.pl or speedscope
+- ``<stamp>_<tool>_<id>.summary.txt``: duration, top functions, peak traced
+  memory and allocations by module
+
+Two profilers are available:
+
+- cprofile: deterministic, every call is timed; precise but slows Python-heavy
+  code noticeably. Use it to investigate a specific call.
+- sampling: a background thread samples the calling thread's stack every
+  PROFILE_SAMPLING_INTERVAL_MS; overhead is proportional to the sampling
+  frequency and independent of how much code runs, so it can stay enabled.
+
+Memory tracking uses tracemalloc (peak traced memory and the allocations still
+held at the end of the call, grouped by module). It has a real cost and can be
+turned off with PROFILE_MEMORY=false.
+
+Profiling is enabled for every tool by PROFILING_MODE, with PROFILE_SAMPLE_RATE
+choosing the fraction of calls that are profiled (e.g. sampling mode at 0.01
+keeps production overhead negligible), or for a single call by passing
+``"_profile": true`` (or a mode name) in the tool arguments.
+
+Only one call is profiled at a time; calls arriving while a profile is running
+execute normally. The event loop thread is shared by concurrent requests, so a
+profile can include work done for other calls that interleaved with it.
+"""
+
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from collections.abc import Awaitable
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+# Number of entries shown in the summary's top function and allocation tables
+SUMMARY_TOP_N = 15
+
+_session_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", os.path.basename(code.co_filename))
+    return f"{module}:{code.co_name}"
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a daemon thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                # Root first, as in the folded stack format
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self) -> str:
+        """Folded stack lines ("root;...;leaf count"), most frequent first."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int = SUMMARY_TOP_N) -> list[tuple[str, int, int]]:
+        """(function, self samples, total samples) ordered by total samples."""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        return [(label, own[label], count) for label, count in total.most_common(limit)]
+
+
+class ProfileSession:
+    """One profiled tool call: CPU profiler plus optional tracemalloc tracking."""
+
+    def __init__(
+        self,
+        tool_name: str,
+        mode: str,
+        output_dir: Union[str, Path],
+        sampling_interval: float = 0.005,
+        track_memory: bool = True,
+        tracemalloc_frames: int = 1,
+    ):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}' (expected one of {', '.join(PROFILE_MODES)})")
+        self.tool_name = tool_name
+        self.mode = mode
+        self.output_dir = Path(output_dir)
+        self.sampling_interval = sampling_interval
+        self.track_memory = track_memory
+        self.tracemalloc_frames = tracemalloc_frames
+        self.duration = 0.0
+        self.peak_memory: Optional[int] = None
+        self.memory_snapshot: Optional[tracemalloc.Snapshot] = None
+        self.artifacts: list[Path] = []
+        self._profiler: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+        self._started_tracemalloc = False
+        self._t0 = 0.0
+
+    def start(self) -> None:
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.tracemalloc_frames)
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident(), self.sampling_interval)
+            self._sampler.start()
+        self._t0 = time.perf_counter()
+
+    def stop(self) -> None:
+        self.duration = time.perf_counter() - self._t0
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self.track_memory and tracemalloc.is_tracing():
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            self.memory_snapshot = tracemalloc.take_snapshot()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+    def summary(self) -> str:
+        """Short human-readable report: duration, top functions, peak memory, allocations by module."""
+        lines = [
+            f"Tool: {self.tool_name}",
+            f"Mode: {self.mode}",
+            f"Duration: {self.duration * 1000:.1f} ms",
+        ]
+        if self._profiler is not None:
+            lines += ["", f"Top functions by cumulative time (of {SUMMARY_TOP_N}):"]
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=stream)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(SUMMARY_TOP_N)
+            lines += [line for line in stream.getvalue().splitlines() if line.strip()][-(SUMMARY_TOP_N + 1) :]
+        if self._sampler is not None:
+            lines += [
+                "",
+                f"Top functions by samples ({self._sampler.samples} samples every "
+                f"{self.sampling_interval * 1000:g} ms):",
+                f"{'total':>7} {'self':>7}  function",
+            ]
+            for label, own, total in self._sampler.top_functions():
+                lines.append(f"{total:>7} {own:>7}  {label}")
+        if self.peak_memory is not None:
+            lines += ["", f"Peak traced memory: {self.peak_memory / (1024 * 1024):.2f} MiB"]
+        if self.memory_snapshot is not None:
+            lines += ["Allocations held at end of call by module:"]
+            for module, size, count in self._allocations_by_module():
+                lines.append(f"  {size / 1024:>10.1f} KiB {count:>8} blocks  {module}")
+        return "\n".join(lines) + "\n"
+
+    def _allocations_by_module(self) -> list[tuple[str, int, int]]:
+        sizes: Counter = Counter()
+        counts: Counter = Counter()
+        snapshot = self.memory_snapshot.filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+        )
+        for stat in snapshot.statistics("filename"):
+            module = _module_for_path(stat.traceback[0].filename)
+            sizes[module] += stat.size
+            counts[module] += stat.count
+        return [(module, size, counts[module]) for module, size in sizes.most_common(SUMMARY_TOP_N)]
+
+    def write(self) -> list[Path]:
+        """Write the profile artifact and summary; returns the written paths."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = self.output_dir / f"{stamp}_{self.tool_name}_{uuid.uuid4().hex[:8]}"
+        if self._profiler is not None:
+            artifact = base.with_suffix(".prof")
+            self._profiler.dump_stats(str(artifact))
+        else:
+            artifact = base.with_suffix(".folded")
+            artifact.write_text(self._sampler.folded(), encoding="utf-8")
+        summary = base.with_suffix(".summary.txt")
+        summary.write_text(self.summary(), encoding="utf-8")
+        self.artifacts = [artifact, summary]
+        return self.artifacts
+
+
+def _module_for_path(filename: str) -> str:
+    """Dotted module name for a source path, relative to the first sys.path entry containing it."""
+    path = os.path.abspath(filename)
+    for root in sorted((os.path.abspath(p) for p in sys.path if p), key=len, reverse=True):
+        if path.startswith(root + os.sep):
+            relative = os.path.splitext(os.path.relpath(path, root))[0]
+            return relative.replace(os.sep, ".").removesuffix(".__init__")
+    return filename
+
+
+def prune_profiles(output_dir: Union[str, Path], max_files: int) -> int:
+    """
+    Delete the oldest files in the profile directory beyond max_files.
+
+    Returns:
+        int: Number of files removed
+    """
+    directory = Path(output_dir)
+    if max_files <= 0 or not directory.is_dir():
+        return 0
+    files = sorted((p for p in directory.iterdir() if p.is_file()), key=lambda p: p.stat().st_mtime)
+    excess = files[: max(0, len(files) - max_files)]
+    for path in excess:
+        try:
+            path.unlink()
+        except OSError as e:
+            logger.debug(f"[PROFILE] Could not remove {path}: {e}")
+    return len(excess)
+
+
+def resolve_profile_mode(requested: Any = None) -> Optional[str]:
+    """
+    Decide whether (and how) to profile one tool call.
+
+    Args:
+        requested: The call's "_profile" argument: True, a mode name, or None/False
+
+    Returns:
+        The profiler mode to use, or None to run without profiling
+    """
+    import config
+
+    configured = config.PROFILING_MODE if config.PROFILING_MODE in PROFILE_MODES else None
+    if isinstance(requested, str) and requested.lower() in PROFILE_MODES:
+        return requested.lower()
+    if requested is True or (isinstance(requested, str) and requested.lower() in ("true", "1", "yes", "on")):
+        return configured or "cprofile"
+    if configured and config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE:
+        return configured
+    return None
+
+
+async def profile_tool_call(
+    tool_name: str,
+    execute: Callable[[dict[str, Any]], Awaitable[Any]],
+    arguments: dict[str, Any],
+    requested: Any = None,
+) -> Any:
+    """
+    Run execute(arguments), profiled if profiling applies to this call.
+
+    Args:
+        tool_name: Tool being called (used in artifact names)
+        execute: The tool's execute coroutine function
+        arguments: Tool arguments
+        requested: Per-call "_profile" argument, if any
+
+    Returns:
+        Whatever execute returns; exceptions propagate unchanged
+    """
+    mode = resolve_profile_mode(requested)
+    if mode is None or not _session_lock.acquire(blocking=False):
+        if mode is not None:
+            logger.debug(f"[PROFILE] Another call is being profiled; running {tool_name} unprofiled")
+        return await execute(arguments)
+
+    import config
+
+    try:
+        session = ProfileSession(
+            tool_name,
+            mode,
+            config.PROFILE_DIR,
+            sampling_interval=config.PROFILE_SAMPLING_INTERVAL_MS / 1000,
+            track_memory=config.PROFILE_MEMORY,
+            tracemalloc_frames=config.PROFILE_TRACEMALLOC_FRAMES,
+        )
+        session.start()
+        try:
+            return await execute(arguments)
+        finally:
+            session.stop()
+            try:
+                # Artifact and summary rendering is file I/O; keep it off the event loop
+                paths = await asyncio.to_thread(session.write)
+                await asyncio.to_thread(prune_profiles, config.PROFILE_DIR, config.PROFILE_MAX_FILES)
+                logger.info(f"[PROFILE] {tool_name} ({mode}, {session.duration * 1000:.0f} ms) written to {paths[-1]}")
+            except Exception as e:
+                logger.warning(f"[PROFILE] Could not write profile for {tool_name}: {e}")
+    finally:
+        _session_lock.release()
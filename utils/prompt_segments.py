@@ -0,0 +1,148 @@
+"""
+Segment-based prompt representation
+
+Large prompts used to be copied many times on their way to a provider: read_files
+joined the per-file parts, _prepare_file_content_for_prompt joined again, tools
+wrapped the result in f-strings, SimpleTool.execute prepended conversation history,
+and each size check re-estimated the full text.
+
+A SegmentedPrompt keeps the prompt as an ordered list of segments. Every segment
+carries its token estimate, computed once when the segment is created (file
+segments reuse the count produced by read_file_content, history reuses the count
+from build_conversation_history). Size checks use the segment sums, and the text
+is materialized a single time with render() at the provider boundary.
+
+Example:
+    prompt = SegmentedPrompt()
+    prompt.append(conversation_history, kind="history", tokens=history_tokens)
+    prompt.append("\\n\\n=== NEW USER INPUT ===\\n")
+    prompt.extend(file_segments)
+    prompt.token_count   # sum of precomputed estimates, no rescan
+    prompt.render()      # single join, cached until the next mutation
+"""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from .token_utils import estimate_tokens
+
+
+@dataclass(frozen=True)
+class PromptSegment:
+    """
+    One contiguous piece of prompt text with its precomputed token estimate.
+
+    Attributes:
+        text: The segment text
+        tokens: Estimated tokens for text
+        kind: Category used for breakdowns (e.g. "file", "history", "instructions")
+        source: Optional origin of the segment, such as a file path
+    """
+
+    text: str
+    tokens: int
+    kind: str = "text"
+    source: Optional[str] = None
+
+
+class SegmentedPrompt:
+    """Ordered collection of prompt segments that is rendered to a string once."""
+
+    def __init__(self, segments: Optional[Iterable[PromptSegment]] = None):
+        self._segments: list[PromptSegment] = []
+        self._tokens = 0
+        self._chars = 0
+        self._rendered: Optional[str] = None
+        if segments:
+            for segment in segments:
+                self.add_segment(segment)
+
+    @classmethod
+    def from_text(cls, text: str, kind: str = "text", tokens: Optional[int] = None) -> "SegmentedPrompt":
+        """Wrap an already materialized string as a single-segment prompt."""
+        prompt = cls()
+        prompt.append(text, kind=kind, tokens=tokens)
+        return prompt
+
+    @classmethod
+    def coerce(cls, prompt: Union[str, "SegmentedPrompt"], kind: str = "text") -> "SegmentedPrompt":
+        """Return prompt unchanged if it is already segmented, otherwise wrap the string."""
+        return prompt if isinstance(prompt, SegmentedPrompt) else cls.from_text(prompt, kind=kind)
+
+    def add_segment(self, segment: PromptSegment) -> "SegmentedPrompt":
+        """Append a pre-built segment. Empty segments are ignored."""
+        if segment.text:
+            self._segments.append(segment)
+            self._tokens += segment.tokens
+            self._chars += len(segment.text)
+            self._rendered = None
+        return self
+
+    def append(
+        self, text: str, kind: str = "text", tokens: Optional[int] = None, source: Optional[str] = None
+    ) -> "SegmentedPrompt":
+        """
+        Append text as a new segment.
+
+        Args:
+            text: Segment text
+            kind: Category used for breakdowns
+            tokens: Precomputed token estimate; estimated from text if omitted
+            source: Optional origin of the text (e.g. file path)
+        """
+        if not text:
+            return self
+        return self.add_segment(
+            PromptSegment(
+                text=text, tokens=estimate_tokens(text) if tokens is None else tokens, kind=kind, source=source
+            )
+        )
+
+    def extend(self, other: Union["SegmentedPrompt", Iterable[PromptSegment]]) -> "SegmentedPrompt":
+        """Append all segments of another prompt without copying their text."""
+        for segment in other.segments if isinstance(other, SegmentedPrompt) else other:
+            self.add_segment(segment)
+        return self
+
+    @property
+    def segments(self) -> tuple[PromptSegment, ...]:
+        return tuple(self._segments)
+
+    @property
+    def token_count(self) -> int:
+        """Sum of the segment token estimates."""
+        return self._tokens
+
+    @property
+    def char_count(self) -> int:
+        """Total length of the rendered prompt in characters."""
+        return self._chars
+
+    def __len__(self) -> int:
+        return self._chars
+
+    def __bool__(self) -> bool:
+        return bool(self._segments)
+
+    def __contains__(self, text: str) -> bool:
+        return text in self.render()
+
+    def breakdown(self) -> dict[str, int]:
+        """Token estimate per segment kind, in first-seen order."""
+        totals: dict[str, int] = {}
+        for segment in self._segments:
+            totals[segment.kind] = totals.get(segment.kind, 0) + segment.tokens
+        return totals
+
+    def render(self) -> str:
+        """Materialize the prompt. The result is cached until the prompt is modified."""
+        if self._rendered is None:
+            if len(self._segments) == 1:
+                self._rendered = self._segments[0].text
+            else:
+                self._rendered = "".join(segment.text for segment in self._segments)
+        return self._rendered
+
+    def __str__(self) -> str:
+        return self.render()
@@ -10,6 +10,12 @@ conversations only need to persist during a single Claude session.
     This is why simulator tests that run server.py as separate subprocesses cannot
     share conversation state between tool calls.
 
+The storage directory defaults to ``.zenMcpSession`` in the working directory and
+can be redirected with the ZEN_SESSION_DIR environment variable (tests point it at a
+temporary directory). Large attachments such as data-URL images are kept in a
+content-addressed blob store under ``<storage_dir>/blobs`` (see utils/blob_store.py);
+blob references held by a thread are released when that thread expires.
+
 Key Features:
 - Thread-safe operations using locks
 - TTL support with automatic expiration
@@ -22,24 +28,65 @@ import logging
 import os
 import threading
 import time
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional
 import json
 from pathlib import Path
 import re
 
+from .metrics import time_storage_op
+
+if TYPE_CHECKING:
+    from .blob_store import BlobStore
+
 logger = logging.getLogger(__name__)
 
+# Minimum seconds between opportunistic sweeps of expired entries (performed during writes)
+PURGE_INTERVAL_SECONDS = 300
+
+# Client sessions whose last thread is remembered for default continuation (HTTP transport)
+MAX_TRACKED_SESSIONS = 4096
+
 
 class FileBasedStorage:
     """Thread-safe storage for conversation threads with file-based persistence."""
 
-    def __init__(self):
+    def __init__(self, storage_dir: Optional[str] = None):
         self._store: dict[str, tuple[str, float]] = {}
-        self._lock = threading.Lock()
-        self.storage_dir = Path(".zenMcpSession")
+        # Re-entrant: get() repopulates the memory cache through setex() while holding the lock
+        self._lock = threading.RLock()
+        self.storage_dir = Path(storage_dir or os.getenv("ZEN_SESSION_DIR") or ".zenMcpSession")
         self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self._last_purge = time.time()
+        self._blob_store = None
+        # Last thread written by each client session (see utils/client_session.py)
+        self._session_threads: "OrderedDict[str, str]" = OrderedDict()
         logger.info(f"File-based storage initialized at {self.storage_dir.resolve()}")
 
+    @property
+    def blobs(self) -> "BlobStore":
+        """Content-addressed blob store living next to the conversation files."""
+        if self._blob_store is None:
+            from .blob_store import BlobStore
+
+            with self._lock:
+                if self._blob_store is None:
+                    self._blob_store = BlobStore(self.storage_dir / "blobs")
+                    self._release_stale_blob_owners()
+        return self._blob_store
+
+    def _release_stale_blob_owners(self) -> None:
+        """Release references held by threads that expired while no server process was running."""
+        ttl = int(os.getenv("CONVERSATION_TIMEOUT_HOURS", "3")) * 3600
+        now = time.time()
+        for owner in self._blob_store.owners():
+            if f"thread:{owner}" in self._store:
+                continue
+            file_path = self.storage_dir / f"{owner}.md"
+            if not file_path.exists() or file_path.stat().st_mtime + ttl <= now:
+                self._blob_store.release_owner(owner)
+        self._blob_store.collect_garbage()
+
     def _format_to_markdown(self, data: str) -> str:
         try:
             context = json.loads(data)
@@ -118,15 +165,27 @@ class FileBasedStorage:
 
     def setex(self, key: str, ttl_seconds: int, value: str) -> None:
         """Store value in file and memory with expiration."""
-        with self._lock:
+        with time_storage_op("file", "setex"), self._lock:
             expires_at = time.time() + ttl_seconds
             self._store[key] = (value, expires_at)
             self._write_to_file(key, value)
+            self._note_session_thread(key)
             logger.debug(f"Stored key {key} in-memory and on-disk.")
+            if time.time() - self._last_purge >= PURGE_INTERVAL_SECONDS:
+                self.purge_expired()
+
+    def expire(self, key: str, ttl_seconds: int) -> bool:
+        """Refresh the TTL of a cached key without re-serializing or rewriting its file."""
+        with time_storage_op("file", "expire"), self._lock:
+            if key not in self._store:
+                return False
+            value, _ = self._store[key]
+            self._store[key] = (value, time.time() + ttl_seconds)
+            return True
 
     def get(self, key: str) -> Optional[str]:
         """Retrieve value from memory first, then from file."""
-        with self._lock:
+        with time_storage_op("file", "get"), self._lock:
             # Check memory first
             if key in self._store:
                 value, expires_at = self._store[key]
@@ -136,6 +195,7 @@ class FileBasedStorage:
                 else:
                     # Expired from memory, but might still be on disk
                     del self._store[key]
+                    self._release_thread_blobs(key)
                     logger.debug(f"Key {key} expired from memory cache.")
 
             # If not in memory, try loading from file
@@ -151,8 +211,63 @@ class FileBasedStorage:
 
         return None
 
+    def purge_expired(self) -> int:
+        """
+        Drop expired entries from the memory cache and release their blob references.
+
+        Blobs whose last referencing thread expired are garbage-collected here, so
+        attachments never outlive the conversations that reference them.
+
+        Returns:
+            int: Number of expired keys removed
+        """
+        with self._lock:
+            now = time.time()
+            expired = [key for key, (_, expires_at) in self._store.items() if expires_at <= now]
+            for key in expired:
+                del self._store[key]
+                self._release_thread_blobs(key)
+            self._last_purge = now
+        if expired:
+            logger.debug(f"Purged {len(expired)} expired keys from memory cache")
+        return len(expired)
+
+    def _release_thread_blobs(self, key: str) -> None:
+        """Release blob references held by an expired thread key."""
+        if not key.startswith("thread:") or self._blob_store is None:
+            return
+        self._blob_store.release_owner(key.split(":", 1)[1])
+
+    def _note_session_thread(self, key: str) -> None:
+        """Remember the thread a client session wrote last (caller holds the lock)."""
+        from .client_session import current_client_session_id
+
+        session_id = current_client_session_id()
+        if session_id is None or not key.startswith("thread:"):
+            return
+        self._session_threads[session_id] = key.split(":", 1)[1]
+        self._session_threads.move_to_end(session_id)
+        while len(self._session_threads) > MAX_TRACKED_SESSIONS:
+            self._session_threads.popitem(last=False)
+
     def get_default_conversation_id(self) -> Optional[str]:
-        """Get the most recent conversation thread ID to use as default."""
+        """
+        Get the most recent conversation thread ID to use as default.
+
+        Inside a client session of the HTTP transport this is the last thread that
+        session wrote; other clients' conversations are never offered.
+        """
+        from .client_session import current_client_session_id
+
+        session_id = current_client_session_id()
+        if session_id is not None:
+            with self._lock:
+                thread_id = self._session_threads.get(session_id)
+            if thread_id and self.get(f"thread:{thread_id}"):
+                logger.debug(f"Found default conversation ID for session {session_id[:8]}: {thread_id}")
+                return thread_id
+            return None
+
         try:
             # Get all conversation files
             conversation_files = list(self.storage_dir.glob("*.md"))
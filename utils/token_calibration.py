@@ -0,0 +1,339 @@
+"""
+Calibration of the cheap token estimators
+
+Budget decisions for models without an offline tokenizer rely on two
+estimators: estimate_tokens() (4 characters per token) for prompts and
+history, and the hand-picked bytes-per-token ratios in
+file_types.TOKEN_ESTIMATION_RATIOS for files. Real ratios differ per
+language and per model family, so budgets drift in one direction for a
+given codebase. This module corrects both from measurements:
+
+- Offline: scripts/calibrate_tokens.py tokenizes a corpus with the exact
+  tokenizers and stores measured bytes-per-token ratios per extension, both
+  per tokenizer family (o200k_base, cl100k_base) and averaged over families.
+  get_token_estimation_ratio() prefers a measured ratio over the built-in one.
+- Online: every provider response that reports usage["input_tokens"] is
+  compared with the uncalibrated estimate of the prompt that produced it.
+  The observed/estimated ratio is folded into a per-model correction factor
+  (an exponentially weighted moving average), which then scales the
+  estimate for that model. Requests with images and very short prompts are
+  ignored, since their token counts are not driven by prompt length.
+
+Both live in one JSON file (TOKEN_CALIBRATION_FILE, by default next to the
+disk cache) that is written atomically and re-read before every write, so
+the offline command and several server processes can share it. Correction
+factors are only applied once a model has MIN_SAMPLES observations and are
+clamped to [MIN_FACTOR, MAX_FACTOR], so a few odd responses cannot wreck the
+budgets.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from .token_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_FILENAME = "token_calibration.json"
+FORMAT_VERSION = 1
+
+# Weight of each new observation in a model's correction factor
+EWMA_ALPHA = 0.1
+
+# Observations needed before a model's factor is applied
+MIN_SAMPLES = 3
+
+# Prompts shorter than this are dominated by per-message overhead and are not observed
+MIN_OBSERVED_CHARS = 2000
+
+# Bounds for a single observation and for the applied factor
+MIN_FACTOR = 0.25
+MAX_FACTOR = 4.0
+
+# Write the file after this many new observations (and at exit)
+SAVE_EVERY = 10
+
+# Key for ratios averaged over all tokenizer families
+ALL_FAMILIES = "default"
+
+
+def _model_key(model_name: Optional[str]) -> str:
+    return (model_name or "").strip().lower()
+
+
+class TokenCalibration:
+    """Measured extension ratios and per-model correction factors backed by a JSON file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._extension_ratios: dict[str, dict[str, float]] = {}
+        self._corpus: dict[str, Any] = {}
+        self._factors: dict[str, dict[str, Any]] = {}
+        # Models observed by this process since the last save; their entries win when merging
+        self._observed: set[str] = set()
+        self._unsaved = 0
+        self._load()
+
+    def _read_file(self) -> dict[str, Any]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"[CALIBRATION] Ignoring unreadable calibration file {self.path}: {e}")
+            return {}
+        if not isinstance(data, dict) or data.get("version") != FORMAT_VERSION:
+            logger.warning(f"[CALIBRATION] Ignoring calibration file {self.path} with unknown format")
+            return {}
+        return data
+
+    def _load(self) -> None:
+        data = self._read_file()
+        try:
+            self._extension_ratios = {
+                family: {ext: float(ratio) for ext, ratio in ratios.items() if float(ratio) > 0}
+                for family, ratios in (data.get("extension_ratios") or {}).items()
+            }
+            self._corpus = data.get("corpus") or {}
+            self._factors = {
+                model: entry
+                for model, entry in (data.get("model_factors") or {}).items()
+                if isinstance(entry, dict) and MIN_FACTOR <= float(entry.get("factor", 0)) <= MAX_FACTOR
+            }
+        except (AttributeError, TypeError, ValueError) as e:
+            logger.warning(f"[CALIBRATION] Ignoring malformed calibration file {self.path}: {e}")
+            self._extension_ratios, self._corpus, self._factors = {}, {}, {}
+
+    def extension_ratio(self, extension: str, model_name: Optional[str] = None) -> Optional[float]:
+        """
+        Measured bytes-per-token ratio for a file extension, or None if it was not calibrated.
+
+        Args:
+            extension: Lower-case extension including the dot
+            model_name: Model the estimate is for; selects its tokenizer family's ratios when measured
+
+        Returns:
+            The ratio for the model's family if measured, else the all-family average, else None
+        """
+        if model_name:
+            from .tokenizer import TokenizerService
+
+            family = TokenizerService.encoding_name_for(model_name)
+            ratio = self._extension_ratios.get(family or "", {}).get(extension)
+            if ratio:
+                return ratio
+        return self._extension_ratios.get(ALL_FAMILIES, {}).get(extension)
+
+    def correction_factor(self, model_name: Optional[str]) -> float:
+        """Factor to scale estimate_tokens() by for this model (1.0 until enough observations)."""
+        entry = self._factors.get(_model_key(model_name))
+        if entry is None or entry.get("samples", 0) < MIN_SAMPLES:
+            return 1.0
+        return entry["factor"]
+
+    def observe(self, model_name: str, estimated_tokens: int, input_tokens: int) -> None:
+        """
+        Fold one observed prompt size into the model's correction factor.
+
+        Args:
+            model_name: Model that served the request
+            estimated_tokens: Uncalibrated estimate_tokens() of the prompt sent
+            input_tokens: Input tokens reported by the provider
+        """
+        key = _model_key(model_name)
+        if not key or estimated_tokens <= 0 or input_tokens <= 0:
+            return
+        ratio = min(MAX_FACTOR, max(MIN_FACTOR, input_tokens / estimated_tokens))
+        with self._lock:
+            entry = self._factors.get(key)
+            if entry is None:
+                entry = self._factors[key] = {"factor": ratio, "samples": 0}
+            else:
+                # Plain mean while the sample is small, so the first observation does not dominate
+                weight = max(EWMA_ALPHA, 1.0 / (entry["samples"] + 1))
+                entry["factor"] = entry["factor"] + weight * (ratio - entry["factor"])
+            entry["samples"] += 1
+            entry["updated"] = time.time()
+            self._observed.add(key)
+            self._unsaved += 1
+            save = self._unsaved >= SAVE_EVERY
+        if save:
+            self.save()
+
+    def set_extension_ratios(
+        self, ratios: dict[str, dict[str, float]], corpus: Optional[dict[str, Any]] = None
+    ) -> None:
+        """Replace the measured extension ratios (offline calibration) and write the file."""
+        with self._lock:
+            self._extension_ratios = {family: dict(values) for family, values in ratios.items()}
+            self._corpus = dict(corpus or {})
+        self.save(replace_ratios=True)
+
+    def save(self, replace_ratios: bool = False) -> None:
+        """
+        Write the calibration file atomically, merging with what other processes wrote.
+
+        Args:
+            replace_ratios: Write this process's extension ratios instead of keeping the file's
+        """
+        with self._lock:
+            current = self._read_file()
+            factors = dict(current.get("model_factors") or {})
+            for key in self._observed:
+                factors[key] = dict(self._factors[key])
+            if replace_ratios or "extension_ratios" not in current:
+                ratios, corpus = self._extension_ratios, self._corpus
+            else:
+                ratios, corpus = current.get("extension_ratios") or {}, current.get("corpus") or {}
+            data = {
+                "version": FORMAT_VERSION,
+                "extension_ratios": ratios,
+                "corpus": corpus,
+                "model_factors": factors,
+            }
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(prefix=".calibration-", dir=str(self.path.parent))
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"[CALIBRATION] Could not write {self.path}: {e}")
+                return
+            # Pick up factors other processes learned for models this one has not seen
+            self._factors = {**factors, **{key: self._factors[key] for key in self._observed}}
+            self._extension_ratios = {family: dict(values) for family, values in ratios.items()}
+            self._corpus = corpus
+            self._observed.clear()
+            self._unsaved = 0
+
+    def flush(self) -> None:
+        """Save pending observations, if any."""
+        if self._unsaved:
+            self.save()
+
+    def describe(self) -> dict[str, Any]:
+        """Current factors and calibrated extensions for the stats tool."""
+        with self._lock:
+            return {
+                "path": str(self.path),
+                "model_factors": {
+                    model: {
+                        "factor": round(entry["factor"], 3),
+                        "samples": entry["samples"],
+                        "applied": entry["samples"] >= MIN_SAMPLES,
+                    }
+                    for model, entry in sorted(self._factors.items())
+                },
+                "calibrated_extensions": sorted(self._extension_ratios.get(ALL_FAMILIES, {})),
+                "corpus": self._corpus,
+            }
+
+
+def calibration_path() -> Path:
+    """Configured calibration file: TOKEN_CALIBRATION_FILE, else next to the disk cache."""
+    import config
+
+    if config.TOKEN_CALIBRATION_FILE:
+        return Path(config.TOKEN_CALIBRATION_FILE).expanduser()
+    from .disk_cache import default_cache_dir
+
+    directory = Path(config.DISK_CACHE_DIR).expanduser() if config.DISK_CACHE_DIR else default_cache_dir()
+    return directory / CALIBRATION_FILENAME
+
+
+_calibration: Optional[TokenCalibration] = None
+_calibration_lock = threading.Lock()
+
+
+def get_token_calibration() -> Optional[TokenCalibration]:
+    """
+    Get the process-wide calibration, loading it on first use.
+
+    Returns:
+        The calibration, or None when TOKEN_CALIBRATION_ENABLED is off
+    """
+    global _calibration
+    import config
+
+    if not config.TOKEN_CALIBRATION_ENABLED:
+        return None
+    if _calibration is None:
+        with _calibration_lock:
+            if _calibration is None:
+                import atexit
+
+                _calibration = TokenCalibration(calibration_path())
+                atexit.register(_calibration.flush)
+    return _calibration
+
+
+def reset_token_calibration() -> None:
+    """Save and forget the process-wide calibration (tests, config changes)."""
+    global _calibration
+
+    with _calibration_lock:
+        if _calibration is not None:
+            _calibration.flush()
+        _calibration = None
+
+
+def calibrated_estimate(text: str, model_name: Optional[str] = None) -> int:
+    """
+    estimate_tokens() scaled by the model's learned correction factor.
+
+    Args:
+        text: Text to estimate
+        model_name: Model the estimate is for
+
+    Returns:
+        int: Estimated token count
+    """
+    estimate = estimate_tokens(text)
+    calibration = get_token_calibration() if model_name else None
+    if calibration is None:
+        return estimate
+    return int(estimate * calibration.correction_factor(model_name))
+
+
+def calibrated_extension_ratio(extension: str, model_name: Optional[str] = None) -> Optional[float]:
+    """Measured bytes-per-token ratio for an extension, or None to use the built-in one."""
+    calibration = get_token_calibration()
+    return calibration.extension_ratio(extension, model_name) if calibration is not None else None
+
+
+def observe_usage(model_name: str, prompt: str, system_prompt: Optional[str], usage: Any) -> None:
+    """
+    Learn from the input token count a provider reported for a prompt.
+
+    Never raises: calibration must not affect the request itself.
+
+    Args:
+        model_name: Model that served the request
+        prompt: Prompt sent
+        system_prompt: System prompt sent
+        usage: ModelResponse.usage
+    """
+    try:
+        if not isinstance(usage, dict):
+            return
+        input_tokens = usage.get("input_tokens")
+        if not isinstance(input_tokens, int) or isinstance(input_tokens, bool) or input_tokens <= 0:
+            return
+        if len(prompt or "") + len(system_prompt or "") < MIN_OBSERVED_CHARS:
+            return
+        calibration = get_token_calibration()
+        if calibration is None:
+            return
+        estimated = estimate_tokens(prompt or "") + estimate_tokens(system_prompt or "")
+        calibration.observe(model_name, estimated, input_tokens)
+    except Exception as e:
+        logger.debug(f"[CALIBRATION] Could not record usage for {model_name}: {e}")
@@ -0,0 +1,275 @@
+"""
+Cached tokenizer service for token budget decisions
+
+Token counts used to be estimated in several unrelated ways (len//4 in
+token_utils, len//3 in ModelContext, per-extension ratios for files) and
+OpenAICompatibleProvider.count_tokens re-resolved a tiktoken encoding on every
+call. This module is the single place budget decisions go through:
+
+- Encodings are selected per model family (o200k_base for GPT-4o/4.1/5 and the
+  o-series, cl100k_base for GPT-4/3.5). Families without a public offline
+  tokenizer (Gemini, Grok, most custom models) use the cheap estimator.
+- Encoder objects are created once per process and cached; an encoding that
+  fails to load is remembered so it is never retried on the hot path.
+- Exact counts are memoized by content hash in a bounded LRU, so re-counting
+  the same file or history turn across requests is a dictionary lookup.
+  Counts for larger texts are also kept in the persistent disk cache
+  (utils/disk_cache.py), so a new server process does not tokenize them again.
+- count_tokens_batch() encodes many texts in one call for file sets.
+
+Exact counting uses the optional ``tiktoken`` package. Encodings are read from
+tiktoken's cache directory; set TOKENIZER_ENCODINGS_DIR to a directory of
+bundled encoding files for fully offline deployments. Without tiktoken (or
+with TOKENIZER_EXACT=false) every count falls back to estimate_tokens(),
+scaled by the model's learned correction factor (utils/token_calibration.py).
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from .metrics import record_cache_access
+from .token_calibration import calibrated_estimate
+
+logger = logging.getLogger(__name__)
+
+# Model-name prefixes (after stripping any "vendor/" prefix) mapped to tiktoken encodings.
+# Checked in order, so more specific prefixes must come first.
+MODEL_FAMILY_ENCODINGS = (
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("gpt-5", "o200k_base"),
+    ("chatgpt-4o", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("o4", "o200k_base"),
+    ("gpt-4", "cl100k_base"),
+    ("gpt-3.5", "cl100k_base"),
+)
+
+# Texts shorter than this are encoded directly; hashing them would cost about as much
+MEMO_MIN_CHARS = 256
+
+# Exact counts of texts at least this long are persisted in the disk cache
+DISK_MIN_CHARS = 2048
+
+# Disk cache namespace for exact token counts
+TOKEN_COUNT_CACHE_KIND = "tokens"
+
+
+class TokenizerService:
+    """Process-wide token counter with cached encoders and memoized exact counts."""
+
+    def __init__(self, memo_size: int = 4096, exact: Optional[bool] = None):
+        if exact is None:
+            exact = os.getenv("TOKENIZER_EXACT", "true").lower() not in ("0", "false", "no", "off")
+        self.exact_enabled = exact
+        self._memo_size = memo_size
+        self._memo: OrderedDict[tuple[str, bytes], int] = OrderedDict()
+        self._encoders: dict[str, object] = {}
+        self._lock = threading.Lock()
+        self.stats = {"exact": 0, "estimated": 0, "memo_hits": 0, "disk_hits": 0}
+
+        encodings_dir = os.getenv("TOKENIZER_ENCODINGS_DIR")
+        if encodings_dir and not os.getenv("TIKTOKEN_CACHE_DIR"):
+            os.environ["TIKTOKEN_CACHE_DIR"] = encodings_dir
+
+    @staticmethod
+    def encoding_name_for(model_name: Optional[str]) -> Optional[str]:
+        """Return the tiktoken encoding for a model family, or None if none applies."""
+        if not model_name:
+            return None
+        name = model_name.lower().rsplit("/", 1)[-1]
+        for prefix, encoding_name in MODEL_FAMILY_ENCODINGS:
+            if name.startswith(prefix):
+                return encoding_name
+        return None
+
+    def get_encoder(self, model_name: Optional[str]):
+        """Return the cached encoder for the model, loading it on first use, or None."""
+        if not self.exact_enabled:
+            return None
+        encoding_name = self.encoding_name_for(model_name)
+        if encoding_name is None:
+            return None
+        if encoding_name in self._encoders:
+            return self._encoders[encoding_name]
+
+        with self._lock:
+            if encoding_name not in self._encoders:
+                encoder = None
+                try:
+                    import tiktoken
+
+                    encoder = tiktoken.get_encoding(encoding_name)
+                    logger.debug(f"[TOKENIZER] Loaded encoding {encoding_name}")
+                except ImportError:
+                    logger.debug("[TOKENIZER] tiktoken not installed; using estimated token counts")
+                except Exception as e:
+                    logger.debug(f"[TOKENIZER] Could not load encoding {encoding_name}: {e}")
+                # Failures are cached too, so a missing encoding is never retried per call
+                self._encoders[encoding_name] = encoder
+        return self._encoders[encoding_name]
+
+    def has_exact(self, model_name: Optional[str]) -> bool:
+        """Whether counts for this model are exact rather than estimated."""
+        return self.get_encoder(model_name) is not None
+
+    def _memo_key(self, encoding_name: str, text: str) -> tuple[str, bytes]:
+        return encoding_name, hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def _memo_get(self, key: tuple[str, bytes]) -> Optional[int]:
+        with self._lock:
+            tokens = self._memo.get(key)
+            if tokens is not None:
+                self._memo.move_to_end(key)
+                self.stats["memo_hits"] += 1
+        record_cache_access("token_count", tokens is not None)
+        return tokens
+
+    def _memo_put(self, key: tuple[str, bytes], tokens: int) -> None:
+        with self._lock:
+            self._memo[key] = tokens
+            self._memo.move_to_end(key)
+            while len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+
+    def _disk_get(self, key: tuple[str, bytes]) -> Optional[int]:
+        """Count persisted by any server process, promoted into the in-memory memo."""
+        from .disk_cache import get_disk_cache
+
+        cache = get_disk_cache()
+        if cache is None:
+            return None
+        data = cache.get(TOKEN_COUNT_CACHE_KIND, f"{key[0]}:{key[1].hex()}")
+        record_cache_access("disk_tokens", data is not None)
+        if data is None:
+            return None
+        try:
+            tokens = int(data)
+        except ValueError:
+            return None
+        self.stats["disk_hits"] += 1
+        self._memo_put(key, tokens)
+        return tokens
+
+    def _disk_put(self, key: tuple[str, bytes], tokens: int) -> None:
+        from .disk_cache import get_disk_cache
+
+        cache = get_disk_cache()
+        if cache is not None:
+            cache.put(TOKEN_COUNT_CACHE_KIND, f"{key[0]}:{key[1].hex()}", str(tokens).encode())
+
+    def count_exact(self, text: str, model_name: Optional[str]) -> Optional[int]:
+        """
+        Count tokens with the model's real tokenizer.
+
+        Returns:
+            int: Exact token count, or None if no tokenizer is available for the model
+        """
+        encoder = self.get_encoder(model_name)
+        if encoder is None:
+            return None
+        if not text:
+            return 0
+
+        key = None
+        if len(text) >= MEMO_MIN_CHARS:
+            key = self._memo_key(encoder.name, text)
+            cached = self._memo_get(key)
+            if cached is None and len(text) >= DISK_MIN_CHARS:
+                cached = self._disk_get(key)
+            if cached is not None:
+                return cached
+
+        tokens = len(encoder.encode_ordinary(text))
+        self.stats["exact"] += 1
+        if key is not None:
+            self._memo_put(key, tokens)
+            if len(text) >= DISK_MIN_CHARS:
+                self._disk_put(key, tokens)
+        return tokens
+
+    def count_tokens(self, text: str, model_name: Optional[str] = None) -> int:
+        """
+        Count tokens for budgeting: exact when a tokenizer exists, estimated otherwise.
+
+        Args:
+            text: Text to count
+            model_name: Model whose tokenizer should be used (canonical name or alias)
+
+        Returns:
+            int: Token count
+        """
+        exact = self.count_exact(text, model_name)
+        if exact is not None:
+            return exact
+        self.stats["estimated"] += 1
+        return calibrated_estimate(text, model_name)
+
+    def count_tokens_batch(self, texts: list[str], model_name: Optional[str] = None) -> list[int]:
+        """
+        Count tokens for many texts, encoding all cache misses in one batch call.
+
+        Args:
+            texts: Texts to count (e.g. formatted file contents)
+            model_name: Model whose tokenizer should be used
+
+        Returns:
+            list[int]: Token counts in input order
+        """
+        encoder = self.get_encoder(model_name)
+        if encoder is None:
+            self.stats["estimated"] += len(texts)
+            return [calibrated_estimate(text, model_name) for text in texts]
+
+        results: list[Optional[int]] = [None] * len(texts)
+        pending: list[int] = []
+        keys: dict[int, tuple[str, bytes]] = {}
+        for i, text in enumerate(texts):
+            if len(text) >= MEMO_MIN_CHARS:
+                keys[i] = self._memo_key(encoder.name, text)
+                results[i] = self._memo_get(keys[i])
+                if results[i] is None and len(text) >= DISK_MIN_CHARS:
+                    results[i] = self._disk_get(keys[i])
+            if results[i] is None:
+                pending.append(i)
+
+        if pending:
+            encoded = encoder.encode_ordinary_batch([texts[i] for i in pending])
+            self.stats["exact"] += len(pending)
+            for i, tokens in zip(pending, encoded):
+                results[i] = len(tokens)
+                if i in keys:
+                    self._memo_put(keys[i], results[i])
+                    if len(texts[i]) >= DISK_MIN_CHARS:
+                        self._disk_put(keys[i], results[i])
+
+        return results
+
+    def clear(self) -> None:
+        """Drop memoized counts (encoders stay loaded)."""
+        with self._lock:
+            self._memo.clear()
+
+
+_tokenizer: Optional[TokenizerService] = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer() -> TokenizerService:
+    """Get the process-wide tokenizer service (singleton)."""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                _tokenizer = TokenizerService()
+    return _tokenizer
+
+
+def count_tokens(text: str, model_name: Optional[str] = None) -> int:
+    """Convenience wrapper for get_tokenizer().count_tokens()."""
+    return get_tokenizer().count_tokens(text, model_name)
@@ -0,0 +1,309 @@
+"""
+Lightweight request tracing
+
+Metrics (utils/metrics.py) show that calls are slow; spans show where the time
+of one call went. handle_call_tool opens a root span with a fresh trace id and
+every stage below it opens a child span:
+
+    tool_call
+    ├── reconstruct_thread_context
+    ├── prepare_prompt
+    │   └── prepare_file_content
+    │       ├── expand_paths
+    │       └── read_files
+    ├── generate_content (retry events, token usage)
+    └── parse_response
+
+Workflow tools add an expert_analysis span around their expert model call.
+build_conversation_history gets its own span wherever history is assembled.
+
+The current span is held in a contextvar, so it follows the request across
+awaits and into asyncio.to_thread() workers without being passed around.
+
+Finished spans are written as JSON lines to TRACE_FILE (logs/traces.jsonl by
+default) by a background thread, so the request path only enqueues a dict.
+Tracing is off unless TRACING_ENABLED is set; disabled spans cost one
+attribute check. scripts/trace_analyzer.py aggregates a trace file into a
+per-stage time breakdown. collect_spans() records the spans of one request in
+memory even while tracing is off (dry runs report their stage timings this way).
+
+Each line looks like:
+    {"trace_id": "...", "span_id": "...", "parent_id": "...", "name": "read_files",
+     "start": 1718000000.123, "duration_ms": 12.4, "status": "ok",
+     "attrs": {"files": 3}, "events": [{"name": "retry", "offset_ms": 1003.2, "attrs": {...}}]}
+"""
+
+import atexit
+import contextlib
+import functools
+import inspect
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("zen_current_span", default=None)
+
+# Finished span records of the current request, when collect_spans() is active
+_collected_spans: ContextVar[Optional[list[dict[str, Any]]]] = ContextVar("zen_collected_spans", default=None)
+
+
+class Span:
+    """One timed stage of a request. Use as a context manager or call finish()."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attrs", "events", "start", "_t0", "_token", "_ended")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attrs: Optional[dict[str, Any]] = None):
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.attrs = dict(attrs or {})
+        self.events: list[dict[str, Any]] = []
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self._token = _current_span.set(self)
+        self._ended = False
+
+    def set(self, **attrs: Any) -> None:
+        """Attach attributes (e.g. token counts known only at the end)."""
+        self.attrs.update(attrs)
+
+    def add_event(self, name: str, **attrs: Any) -> None:
+        """Record a point-in-time event such as a retry."""
+        self.events.append(
+            {"name": name, "offset_ms": round((time.perf_counter() - self._t0) * 1000, 3), "attrs": attrs}
+        )
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """End the span, restore the parent as current span and queue the record."""
+        if self._ended:
+            return
+        self._ended = True
+        duration_ms = (time.perf_counter() - self._t0) * 1000
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Finished from a different context than it was started in; just drop the reference
+            _current_span.set(None)
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(duration_ms, 3),
+            "status": "error" if error is not None else "ok",
+            "attrs": self.attrs,
+        }
+        if error is not None:
+            record["error"] = type(error).__name__
+        if self.events:
+            record["events"] = self.events
+        collected = _collected_spans.get()
+        if collected is not None:
+            collected.append(record)
+        _writer.write(record)
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.finish(exc)
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled."""
+
+    trace_id = None
+    span_id = None
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def add_event(self, name: str, **attrs: Any) -> None:
+        pass
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _TraceWriter:
+    """Appends span records to the trace file from a daemon thread."""
+
+    def __init__(self):
+        self.enabled = False
+        self.path: Optional[Path] = None
+        self._queue: queue.Queue[dict[str, Any]] = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: bool, path: Optional[str]) -> None:
+        with self._lock:
+            self.flush()
+            self.path = Path(path) if path else None
+            self.enabled = bool(enabled and self.path)
+            if self.enabled and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+
+    def write(self, record: dict[str, Any]) -> None:
+        if self.enabled:
+            self._queue.put(record)
+
+    def flush(self) -> None:
+        """Block until every queued span has been written."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            lines = []
+            try:
+                lines.append(json.dumps(record, default=str))
+                # Drain whatever else is queued so a burst of spans costs one file open
+                while True:
+                    try:
+                        extra = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    self._queue.task_done()
+                    lines.append(json.dumps(extra, default=str))
+                path = self.path
+                if path is not None:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(path, "a", encoding="utf-8") as f:
+                        f.write("\n".join(lines) + "\n")
+            except Exception as e:
+                logger.debug(f"[TRACE] Could not write {len(lines)} spans: {e}")
+            finally:
+                self._queue.task_done()
+
+
+_writer = _TraceWriter()
+atexit.register(_writer.flush)
+
+
+def configure_tracing(enabled: Optional[bool] = None, path: Optional[str] = None) -> None:
+    """
+    Enable or disable span recording.
+
+    Args:
+        enabled: Record spans; defaults to TRACING_ENABLED
+        path: JSON lines destination; defaults to TRACE_FILE
+    """
+    if enabled is None or path is None:
+        import config
+
+        enabled = config.TRACING_ENABLED if enabled is None else enabled
+        path = config.TRACE_FILE if path is None else path
+    _writer.configure(enabled, path)
+    if _writer.enabled:
+        logger.info(f"[TRACE] Writing request spans to {path}")
+
+
+def tracing_enabled() -> bool:
+    return _writer.enabled
+
+
+def flush_traces() -> None:
+    """Wait until all finished spans are on disk (tests, shutdown)."""
+    _writer.flush()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+@contextlib.contextmanager
+def collect_spans() -> Iterator[list[dict[str, Any]]]:
+    """
+    Record the spans finished in this context, whether or not tracing is enabled.
+
+    The list follows the context into asyncio.to_thread() workers like the current span.
+
+    Yields:
+        List that receives each finished span record
+    """
+    collected: list[dict[str, Any]] = []
+    token = _collected_spans.set(collected)
+    try:
+        yield collected
+    finally:
+        _collected_spans.reset(token)
+
+
+def start_trace(name: str, **attrs: Any):
+    """Open a root span with a new trace id, regardless of any span already current."""
+    if not _writer.enabled and _collected_spans.get() is None:
+        return _NOOP_SPAN
+    return Span(name, None, attrs)
+
+
+def start_span(name: str, **attrs: Any):
+    """Open a child of the current span (a root span if there is none)."""
+    if not _writer.enabled and _collected_spans.get() is None:
+        return _NOOP_SPAN
+    return Span(name, _current_span.get(), attrs)
+
+
+def set_span_attrs(**attrs: Any) -> None:
+    """Attach attributes to the current span, if any."""
+    span = _current_span.get()
+    if span is not None:
+        span.set(**attrs)
+
+
+def add_span_event(name: str, **attrs: Any) -> None:
+    """Add an event to the current span, if any."""
+    span = _current_span.get()
+    if span is not None:
+        span.add_event(name, **attrs)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator running a function (sync or async) inside a child span."""
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with start_span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator